@@ -1,7 +1,59 @@
+import os
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 import mysql.connector
 from datetime import datetime
+import bulk_import
+import prescriptions
+import purge
+import report_export
+import stock_update
+from backend import KEYSET_ORDERS, MIN_PREFIX_LENGTH, MySQLBackend
+from db_pool import ConnectionPool, DB_CONFIG, POOL_SIZE
+import validation
+from key_index import FIELD_ENTITIES, NEW_KEY_FIELDS, KeyIndex, KeyPicker
+from perf_monitor import PerfMonitor
+from query_cache import QueryCache, is_cacheable
+from query_executor import QueryExecutor
+from replica import Mirror, ReplicaBackend
+from repositories import Repositories
+from result_grid import (MAX_STREAM_ROWS, PAGE_SIZE, KeysetPageSource, ProcedurePageSource, ResultGrid,
+                         StaticSource, StreamSource)
+from service_client import ServiceClient, ServiceError
+from sqlite_backend import SQLiteBackend
+
+# Number of background threads running database work; kept below the pool
+# size so a batch job can still get a connection while the UI is busy
+QUERY_WORKERS = POOL_SIZE - 1
+
+# URL of a running service.py; when set the GUI is a thin client of that
+# service and opens no MySQL connections of its own
+SERVICE_URL_ENV = "NOVA_SERVICE_URL"
+# Path of a SQLite stand-in database (sqlite_backend.py), for trying the GUI
+# without a MySQL server
+SQLITE_PATH_ENV = "NOVA_SQLITE"
+# Set to 1 to run the hot lookups as prepared statements on the local pool
+PREPARED_ENV = "NOVA_PREPARED"
+# Path of a local read replica (replica.py) to answer lookups from while it
+# is fresh, and the address of this branch's own pharmacy, whose stock and
+# contracts it keeps; used with the local pool only
+REPLICA_PATH_ENV = "NOVA_REPLICA"
+REPLICA_PHARMACY_ENV = "NOVA_REPLICA_PHARMACY"
+
+# Reports that can be exported to a file: label -> (procedure, argument labels)
+EXPORT_REPORTS = {
+    "Chain-wide Stock": ("print_chain_stock", []),
+    "Pharmacy Stock": ("print_stock_position", ["Pharmacy Address:"]),
+    "Patient Prescriptions": ("prescription_report", ["Patient ID:", "Start Date (YYYY-MM-DD):", "End Date (YYYY-MM-DD):"]),
+    "Company Drugs": ("drug_details", ["Company Name:"]),
+    "Drug Availability": ("drug_availability", ["Trade Name Prefix:", "Stock Greater Than:"]),
+    "Doctor's Patients": ("print_patients_for_doctor", ["Doctor ID:"]),
+    "Pharmacy Inventory": ("print_pharmacy_inventory", []),
+    "Company Inventory": ("print_company_inventory", []),
+}
+
+# Forms whose key and name fields the pickers' index is updated from after a write
+KEY_FIELDS = {"Patient": ("p_id", "p_name"), "Doctor": ("d_id", "d_name"), "Pharmacy": ("ph_address", "ph_name")}
 
 class NovaPharmacyApp:
     def __init__(self, root):
@@ -12,9 +64,42 @@ class NovaPharmacyApp:
         # Set up dark mode theme
         self.setup_dark_theme()
         
-        # Database connection
-        self.conn = None
-        self.cursor = None
+        # Where procedures run: through service.py when NOVA_SERVICE_URL is
+        # set, on a SQLite stand-in when NOVA_SQLITE is, otherwise on a local
+        # connection pool where every operation checks out its own connection
+        # and cursor
+        service_url = os.environ.get(SERVICE_URL_ENV)
+        sqlite_path = os.environ.get(SQLITE_PATH_ENV)
+        if service_url:
+            self.pool = None
+            self.backend = ServiceClient(service_url)
+        elif sqlite_path:
+            self.pool = None
+            self.backend = SQLiteBackend(sqlite_path)
+        else:
+            prepared = os.environ.get(PREPARED_ENV) == "1"
+            self.pool = ConnectionPool(DB_CONFIG, pool_size=POOL_SIZE, reset_session=not prepared)
+            self.backend = MySQLBackend(self.pool, prepared=prepared)
+            replica_path = os.environ.get(REPLICA_PATH_ENV)
+            if replica_path:
+                mirror = Mirror(self.pool, replica_path, os.environ.get(REPLICA_PHARMACY_ENV))
+                mirror.start()
+                self.backend = ReplicaBackend(self.backend, mirror)
+        self.repos = Repositories(self.backend)
+        
+        # Read-through cache for reference lookups, invalidated by submit_form writes
+        self.cache = QueryCache()
+        
+        # Timings for every database call, shown in the Performance panel and
+        # written to a rotating log
+        self.monitor = PerfMonitor()
+        
+        # Background executor so database calls never block the Tk main loop
+        self.executor = QueryExecutor(self.root, max_workers=QUERY_WORKERS, kill_query=self.kill_query)
+        
+        # In-memory key prefix indexes behind the form pickers, loaded on first use
+        self.key_index = KeyIndex(self.backend, self.executor, monitor=self.monitor)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Create main frames
         self.create_frames()
@@ -50,23 +135,202 @@ class NovaPharmacyApp:
         self.style.map('TCombobox', selectbackground=[('readonly', self.entry_bg)])
         self.style.map('TCombobox', selectforeground=[('readonly', self.fg_color)])
         
+        # Configure result grid colors
+        self.style.configure(
+            "Results.Treeview",
+            background=self.entry_bg,
+            foreground=self.fg_color,
+            fieldbackground=self.entry_bg,
+            rowheight=22
+        )
+        self.style.configure("Results.Treeview.Heading", background=self.accent_color, foreground=self.fg_color)
+        self.style.map("Results.Treeview", background=[("selected", self.accent_color)])
+        
         # Configure dropdown menu colors
         self.root.option_add("*TCombobox*Listbox*Background", self.entry_bg)
         self.root.option_add("*TCombobox*Listbox*Foreground", self.fg_color)
 
     def connect_to_database(self):
+        def work(task):
+            # Opens the pool's connections (or reaches the service) and proves
+            # the database is reachable
+            with self.monitor.track("connect"):
+                self.backend.ping()
+
+        def on_error(err):
+            messagebox.showerror("Database Connection Error", f"Error: {err}")
+
+        self.executor.submit(
+            "connect",
+            work,
+            on_success=lambda result: messagebox.showinfo("Connection", "Successfully connected to the database!"),
+            on_error=on_error
+        )
+
+    def kill_query(self, connection_id):
+        # Runs on a helper thread: interrupt the statement running on a pooled connection
         try:
-            self.conn = mysql.connector.connect(
-                host="",
-                port=3306,
-                user="",
-                password="",  # Replace with your MySQL password
-                database="nova"
+            self.backend.kill_query(connection_id)
+        except (mysql.connector.Error, ServiceError) as err:
+            print(f"Failed to cancel query: {err}")
+
+    def on_close(self):
+        self.executor.shutdown()
+        self.backend.close()
+        self.monitor.close()
+        self.root.destroy()
+
+    def run_report(self, procedure, args, popup=None, paged=False):
+        def close_popup():
+            if popup is not None and popup.winfo_exists():
+                popup.destroy()
+
+        def on_error(err):
+            timer.finish(err)
+            self.show_query_error(err)
+
+        if paged:
+            # Large reports are read a page at a time through <procedure>_page
+            timer = self.monitor.start(f"{procedure}_page", args)
+
+            def work(task):
+                if procedure in KEYSET_ORDERS:
+                    source = KeysetPageSource(self.backend, procedure, args, KEYSET_ORDERS[procedure],
+                                              cache=self.cache)
+                else:
+                    source = ProcedurePageSource(self.backend, procedure, args, cache=self.cache)
+                source.prefetch(PAGE_SIZE, timer)
+                return source
+
+            def on_success(source):
+                with timer.rendering():
+                    self.display_source(source)
+                timer.finish()
+                close_popup()
+
+            self.executor.submit(procedure, work, on_success=on_success, on_error=on_error)
+        elif is_cacheable(procedure):
+            # Small reference lookups: serve repeated requests from the cache
+            timer = self.monitor.start(procedure, args)
+            timer.cached = True
+
+            def load(task):
+                timer.cached = False
+                results = []
+                for headers, rows in self.backend.stream(procedure, args, task=task, timer=timer):
+                    if results and results[-1][0] == headers:
+                        results[-1][1].extend(rows)
+                    else:
+                        results.append((headers, list(rows)))
+                return results
+
+            def on_success(results):
+                with timer.rendering():
+                    for headers, rows in results:
+                        self.display_results(headers, rows)
+                    if not results:
+                        self.display_results([], [])
+                if timer.cached:
+                    timer.add_rows(sum(len(rows) for headers, rows in results))
+                timer.finish()
+                close_popup()
+
+            self.executor.submit(
+                procedure,
+                lambda task: self.cache.cached_call(procedure, args, lambda: load(task)),
+                on_success=on_success,
+                on_error=on_error
             )
-            self.cursor = self.conn.cursor(buffered=True)
-            messagebox.showinfo("Connection", "Successfully connected to the database!")
-        except mysql.connector.Error as err:
-            messagebox.showerror("Database Connection Error", f"Error: {err}")
+        else:
+            self.stream_results(
+                procedure,
+                lambda task, timer: self.backend.stream(procedure, args, task=task, timer=timer),
+                popup,
+                args=args
+            )
+
+    def stream_results(self, name, open_stream, popup=None, on_empty=None, args=()):
+        # Rows are fetched in batches on a worker thread and handed to the
+        # result source as they arrive, so the first rows show up right away.
+        # open_stream(task, timer) returns a backend stream generator. A
+        # result set longer than MAX_STREAM_ROWS is cut off there and the
+        # StreamSource reads on from a new stream when the grid gets to it;
+        # result sets after it are not read.
+        current = {"source": None}
+        timer = self.monitor.start(name, args)
+
+        def work(task):
+            rows_read = 0
+            kept = 0
+            last_headers = None
+            stream = open_stream(task, timer)
+            try:
+                for headers, rows in stream:
+                    if headers != last_headers:
+                        last_headers = headers
+                        kept = 0
+                    rows = rows[:MAX_STREAM_ROWS - kept]
+                    kept += len(rows)
+                    rows_read += len(rows)
+                    task.deliver((headers, rows))
+                    task.report_progress(f"{rows_read} rows")
+                    if kept >= MAX_STREAM_ROWS:
+                        return rows_read, True
+            finally:
+                stream.close()
+            return rows_read, False
+
+        def on_data(batch):
+            with timer.rendering():
+                show_batch(batch)
+
+        def show_batch(batch):
+            headers, rows = batch
+            source = current["source"]
+            if source is not None and source.headers == headers:
+                source.append(rows)
+                return
+            
+            # First batch, or the first batch of the next result set
+            if source is not None:
+                source.finish()
+            source = StreamSource(name, args, open_stream, headers, rows)
+            current["source"] = source
+            self.display_source(source)
+            if popup is not None and popup.winfo_exists():
+                popup.destroy()
+
+        def on_success(result):
+            rows_read, truncated = result
+            source = current["source"]
+            if source is not None:
+                with timer.rendering():
+                    if truncated:
+                        source.truncate()
+                    else:
+                        source.finish()
+                timer.finish()
+                return
+            
+            timer.finish()
+            if on_empty is not None:
+                on_empty()
+            else:
+                self.display_results([], [])
+            if popup is not None and popup.winfo_exists():
+                popup.destroy()
+
+        def on_error(err):
+            timer.finish(err)
+            self.show_query_error(err)
+
+        self.executor.submit(name, work, on_success=on_success, on_error=on_error, on_data=on_data)
+
+    def show_query_error(self, err):
+        if isinstance(err, (mysql.connector.Error, ServiceError)):
+            messagebox.showerror("Database Error", f"Error: {err}")
+        else:
+            messagebox.showerror("Error", f"An error occurred: {err}")
 
     def create_frames(self):
         # Top frame for database operations
@@ -77,6 +341,10 @@ class NovaPharmacyApp:
         self.middle_frame = tk.Frame(self.root, bg=self.bg_color, pady=10)
         self.middle_frame.pack(fill=tk.BOTH, expand=True)
         
+        # Status bar showing background queries
+        self.status_frame = tk.Frame(self.root, bg=self.bg_color)
+        self.status_frame.pack(fill=tk.X, side=tk.BOTTOM, before=self.middle_frame)
+        
         # We're removing the bottom_frame that previously held the results
         # Instead, we'll store results in memory and display them on demand
 
@@ -85,6 +353,88 @@ class NovaPharmacyApp:
         self.create_operation_widgets()
         self.create_input_widgets()
         self.create_report_buttons()
+        self.create_status_widgets()
+
+    def create_status_widgets(self):
+        self.status_label = tk.Label(
+            self.status_frame,
+            text="Ready",
+            bg=self.bg_color,
+            fg=self.fg_color,
+            font=("Arial", 10),
+            anchor="w"
+        )
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=20, pady=5)
+        
+        self.cancel_btn = tk.Button(
+            self.status_frame,
+            text="Cancel",
+            command=self.executor.cancel_all,
+            bg="#808080",
+            fg=self.fg_color,
+            font=("Arial", 10),
+            relief=tk.FLAT,
+            padx=10,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(side=tk.RIGHT, padx=20, pady=5)
+        
+        self.perf_btn = tk.Button(
+            self.status_frame,
+            text="Performance",
+            command=self.show_performance_panel,
+            bg=self.accent_color,
+            fg=self.fg_color,
+            font=("Arial", 10),
+            relief=tk.FLAT,
+            padx=10,
+            cursor="hand2"
+        )
+        self.perf_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        self.perf_btn.bind("<Enter>", lambda e: self.perf_btn.config(bg=self.hover_color))
+        self.perf_btn.bind("<Leave>", lambda e: self.perf_btn.config(bg=self.accent_color))
+        
+        # Cache hit/miss counters, to confirm the cache is saving round-trips
+        self.cache_label = tk.Label(
+            self.status_frame,
+            text="",
+            bg=self.bg_color,
+            fg=self.fg_color,
+            font=("Arial", 10)
+        )
+        self.cache_label.pack(side=tk.RIGHT, padx=10, pady=5)
+        
+        self.progress_bar = ttk.Progressbar(self.status_frame, mode="indeterminate", length=150)
+        self.progress_bar.pack(side=tk.RIGHT, padx=10, pady=5)
+        self.progress_running = False
+        
+        self.executor.add_listener(self.update_status)
+
+    def update_status(self, tasks):
+        busy = len(tasks) > 0
+        if busy != self.progress_running:
+            if busy:
+                self.progress_bar.start(10)
+            else:
+                self.progress_bar.stop()
+            self.progress_running = busy
+        
+        stats = self.cache.stats()
+        self.cache_label.config(
+            text=f"Cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})"
+        )
+        
+        if tasks:
+            names = ", ".join(task.name for task in tasks)
+            progress = [str(task.progress) for task in tasks if task.progress is not None]
+            text = f"Running: {names}"
+            if progress:
+                text += f" ({'; '.join(progress)})"
+            self.status_label.config(text=text)
+            self.cancel_btn.config(state=tk.NORMAL, bg="#e53935", cursor="hand2")
+        else:
+            self.status_label.config(text="Ready")
+            self.cancel_btn.config(state=tk.DISABLED, bg="#808080", cursor="arrow")
 
 
     def create_operation_widgets(self):
@@ -92,10 +442,12 @@ class NovaPharmacyApp:
         dropdown_frame = tk.Frame(self.top_frame, bg=self.bg_color)
         dropdown_frame.pack(pady=10)
         
-        # Operation dropdown (add, delete, update)
+        # Operation dropdown (add, delete, dispense, purge, update). Purge
+        # removes a doctor, pharmacy or company in small background batches;
+        # Dispense fills a prescription from a pharmacy's stock
         tk.Label(dropdown_frame, text="Operation:", bg=self.bg_color, fg=self.fg_color, font=("Arial", 12)).grid(row=0, column=0, padx=10)
         self.operation_var = tk.StringVar()
-        operations = ["Add", "Delete", "Update"]
+        operations = ["Add", "Delete", "Dispense", "Purge", "Update"]
         self.operation_dropdown = ttk.Combobox(dropdown_frame, textvariable=self.operation_var, values=operations, width=15, state="readonly")
         self.operation_dropdown.grid(row=0, column=1, padx=10)
         self.operation_dropdown.current(0)
@@ -137,8 +489,7 @@ class NovaPharmacyApp:
         self.results_btn.pack(pady=10)
     
         # Store results data
-        self.results_headers = None
-        self.results_data = None
+        self.results_source = None
         self.has_results = False
         self.submit_btn.grid(row=0, column=4, padx=20)
         
@@ -146,6 +497,40 @@ class NovaPharmacyApp:
         self.submit_btn.bind("<Enter>", lambda e: self.submit_btn.config(bg="#66bb6a"))
         self.submit_btn.bind("<Leave>", lambda e: self.submit_btn.config(bg=self.success_color))
         
+        # Bulk import button for loading many rows from a file
+        self.import_btn = tk.Button(
+            dropdown_frame,
+            text="Bulk Import",
+            command=self.bulk_import,
+            bg=self.accent_color,
+            fg=self.fg_color,
+            font=("Arial", 12),
+            relief=tk.FLAT,
+            padx=15,
+            pady=5,
+            cursor="hand2"
+        )
+        self.import_btn.grid(row=0, column=5, padx=10)
+        self.import_btn.bind("<Enter>", lambda e: self.import_btn.config(bg=self.hover_color))
+        self.import_btn.bind("<Leave>", lambda e: self.import_btn.config(bg=self.accent_color))
+        
+        # Stock update button for applying a pharmacy's price list in bulk
+        self.stock_btn = tk.Button(
+            dropdown_frame,
+            text="Stock Update",
+            command=self.stock_update,
+            bg=self.accent_color,
+            fg=self.fg_color,
+            font=("Arial", 12),
+            relief=tk.FLAT,
+            padx=15,
+            pady=5,
+            cursor="hand2"
+        )
+        self.stock_btn.grid(row=0, column=6, padx=10)
+        self.stock_btn.bind("<Enter>", lambda e: self.stock_btn.config(bg=self.hover_color))
+        self.stock_btn.bind("<Leave>", lambda e: self.stock_btn.config(bg=self.accent_color))
+        
         # Bind events to dropdowns
         self.operation_dropdown.bind("<<ComboboxSelected>>", lambda e: self.clear_form())
         self.table_dropdown.bind("<<ComboboxSelected>>", lambda e: self.clear_form())
@@ -201,7 +586,7 @@ class NovaPharmacyApp:
                 self.create_form_field(form_frame, "Years of Experience:", "d_years_exp", 3)
                 if operation == "Update":
                     self.create_form_field(form_frame, "Patient ID to Add (Optional):", "d_patient_id", 4)
-            else:  # Delete
+            else:  # Delete or Purge
                 self.create_form_field(form_frame, "Doctor ID (Aadhar):", "d_id", 0)
         
         elif table == "Pharmacy":
@@ -209,7 +594,7 @@ class NovaPharmacyApp:
                 self.create_form_field(form_frame, "Pharmacy Name:", "ph_name", 0)
                 self.create_form_field(form_frame, "Address:", "ph_address", 1)
                 self.create_form_field(form_frame, "Phone:", "ph_phone", 2)
-            else:  # Delete
+            else:  # Delete or Purge
                 self.create_form_field(form_frame, "Pharmacy Address:", "ph_address", 0)
         
         elif table == "PharmaceuticalCompany":
@@ -218,7 +603,7 @@ class NovaPharmacyApp:
                 self.create_form_field(form_frame, "Phone Number:", "company_phone", 1)
                 if operation == "Update":
                     self.create_form_field(form_frame, "New Company Name:", "new_company_name", 2)
-            else:  # Delete
+            else:  # Delete or Purge
                 self.create_form_field(form_frame, "Company Name:", "company_name", 0)
         
         elif table == "Drug":
@@ -237,6 +622,7 @@ class NovaPharmacyApp:
                 self.create_form_field(form_frame, "Prescription Date (YYYY-MM-DD):", "pres_date", 2)
                 self.create_form_field(form_frame, "Drug ID:", "drug_id", 3)
                 self.create_form_field(form_frame, "Quantity:", "quantity", 4)
+                self.create_drug_list_editor(form_frame, 5)
             elif operation == "Update":
                 self.create_form_field(form_frame, "Old Patient ID:", "old_p_id", 0)
                 self.create_form_field(form_frame, "Old Doctor ID:", "old_d_id", 1)
@@ -246,6 +632,11 @@ class NovaPharmacyApp:
                 self.create_form_field(form_frame, "New Prescription Date (YYYY-MM-DD):", "new_pres_date", 5)
                 self.create_form_field(form_frame, "New Drug ID:", "new_drug_id", 6)
                 self.create_form_field(form_frame, "New Quantity:", "new_quantity", 7)
+            elif operation == "Dispense":
+                self.create_form_field(form_frame, "Patient ID:", "p_id", 0)
+                self.create_form_field(form_frame, "Doctor ID:", "d_id", 1)
+                self.create_form_field(form_frame, "Prescription Date (YYYY-MM-DD):", "pres_date", 2)
+                self.create_form_field(form_frame, "Pharmacy Address:", "ph_address", 3)
             else:  # Delete
                 self.create_form_field(form_frame, "Patient ID:", "p_id", 0)
                 self.create_form_field(form_frame, "Doctor ID:", "d_id", 1)
@@ -324,6 +715,20 @@ class NovaPharmacyApp:
                 borderwidth=1
             )
             entry.grid(row=row, column=1, sticky="w", padx=8, pady=3)  # Reduced padding
+        elif self.picker_entity(field_name):
+            entry = KeyPicker(
+                parent,
+                self.key_index,
+                self.picker_entity(field_name),
+                bg=self.entry_bg,
+                fg=self.fg_color,
+                select_bg=self.accent_color,
+                width=25,
+                font=("Arial", 10),
+                relief=tk.FLAT,
+                borderwidth=1
+            )
+            entry.grid(row=row, column=1, sticky="w", padx=8, pady=3)
         else:
             entry = tk.Entry(
                 parent,
@@ -339,6 +744,82 @@ class NovaPharmacyApp:
         
         self.entries[field_name] = entry
 
+    def picker_entity(self, field_name):
+        key = (self.table_var.get(), self.operation_var.get())
+        if NEW_KEY_FIELDS.get(key) == field_name:
+            return None
+        return FIELD_ENTITIES.get(field_name)
+
+    def update_key_index(self, table, operation, values):
+        # Applies a successful write to the pickers' index: the form's own key
+        # in place where it is known, otherwise a reload when next used
+        fields = KEY_FIELDS.get(table)
+        if fields is None:
+            self.key_index.invalidate_write(table)
+        elif operation in ("Delete", "Purge"):
+            self.key_index.remove(table, values.get(fields[0]))
+        else:
+            self.key_index.upsert(table, values.get(fields[0]), values.get(fields[1]))
+
+
+    def create_drug_list_editor(self, parent, row):
+        # Line items for a multi-drug prescription; the Drug ID and Quantity
+        # fields above are added to the list with the Add Drug button
+        self.prescription_items = []
+        
+        button_frame = tk.Frame(parent, bg=self.frame_bg)
+        button_frame.grid(row=row, column=0, columnspan=2, sticky="w", padx=8, pady=3)
+        
+        items_tree = ttk.Treeview(
+            parent,
+            columns=["Drug ID", "Quantity"],
+            show="headings",
+            height=4,
+            style="Results.Treeview"
+        )
+        for column in ["Drug ID", "Quantity"]:
+            items_tree.heading(column, text=column)
+            items_tree.column(column, width=120)
+        items_tree.grid(row=row + 1, column=0, columnspan=2, sticky="ew", padx=8, pady=3)
+        
+        def add_item():
+            drug_id = self.entries["drug_id"].get().strip()
+            quantity = self.entries["quantity"].get().strip()
+            try:
+                item = prescriptions.normalize_items(self.prescription_items + [(drug_id, quantity)])[-1]
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self.prescription_items.append(item)
+            items_tree.insert("", tk.END, values=item)
+            self.entries["drug_id"].delete(0, tk.END)
+            self.entries["quantity"].delete(0, tk.END)
+            self.entries["drug_id"].focus_set()
+        
+        def remove_item():
+            for item_id in items_tree.selection():
+                index = items_tree.index(item_id)
+                del self.prescription_items[index]
+                items_tree.delete(item_id)
+        
+        for text, command in [("Add Drug", add_item), ("Remove Selected", remove_item)]:
+            btn = tk.Button(
+                button_frame,
+                text=text,
+                command=command,
+                bg=self.accent_color,
+                fg=self.fg_color,
+                font=("Arial", 10),
+                relief=tk.FLAT,
+                padx=10,
+                cursor="hand2"
+            )
+            btn.pack(side=tk.LEFT, padx=(0, 8))
+            btn.bind("<Enter>", lambda e, b=btn: b.config(bg=self.hover_color))
+            btn.bind("<Leave>", lambda e, b=btn: b.config(bg=self.accent_color))
+        
+        # Enter in the quantity field adds the line, for quick keyboard entry
+        self.entries["quantity"].bind("<Return>", lambda e: add_item())
 
     def create_result_widgets(self):
         # Create a frame for results
@@ -383,8 +864,13 @@ class NovaPharmacyApp:
             ("Company Drugs", self.company_drugs),
             ("Pharmacy Stock", self.pharmacy_stock),
             ("Pharmacy Contact", self.pharmacy_contact),
+            ("Company Contact", self.company_contact),
             ("Doctor's Patients", self.doctor_patients),
-            ("Display Contract", self.display_contract)
+            ("Display Contract", self.display_contract),
+            ("Drug Availability", self.drug_availability),
+            ("Inventory Summary", self.inventory_summary),
+            ("Export Report", self.export_report),
+            ("Purge Jobs", self.purge_jobs)
         ]
         
         # Create buttons in a grid layout
@@ -409,6 +895,120 @@ class NovaPharmacyApp:
             col = i % 4
             btn.grid(row=row, column=col, padx=10, pady=10)
 
+    def form_operation(self, table, operation, values):
+        # The repository call for a form submission, as a function taking
+        # (task, timer); None when the table has no such operation
+        repos = self.repos
+
+        def optional(key):
+            return values.get(key) or None
+
+        operations = {
+            ("Patient", "Add"): lambda task, timer: repos.patients.add(
+                values.get('p_id', ''), values.get('p_name', ''), int(values.get('p_age', 0)),
+                values.get('p_address', ''), values.get('p_primary_physician_id', ''),
+                optional('p_additional_doctor_id'), task=task, timer=timer),
+            ("Patient", "Update"): lambda task, timer: repos.patients.update(
+                values.get('p_id', ''), values.get('p_name', ''), int(values.get('p_age', 0)),
+                values.get('p_address', ''), values.get('p_primary_physician_id', ''),
+                optional('p_additional_doctor_id'), task=task, timer=timer),
+            ("Patient", "Delete"): lambda task, timer: repos.patients.delete(
+                values.get('p_id', ''), task=task, timer=timer),
+
+            ("Doctor", "Add"): lambda task, timer: repos.doctors.add(
+                values.get('d_id', ''), values.get('d_name', ''), values.get('d_speciality', ''),
+                int(values.get('d_years_exp', 0)), task=task, timer=timer),
+            ("Doctor", "Update"): lambda task, timer: repos.doctors.update(
+                values.get('d_id', ''), values.get('d_name', ''), values.get('d_speciality', ''),
+                int(values.get('d_years_exp', 0)), optional('d_patient_id'), task=task, timer=timer),
+            ("Doctor", "Delete"): lambda task, timer: repos.doctors.delete(
+                values.get('d_id', ''), task=task, timer=timer),
+            ("Doctor", "Purge"): lambda task, timer: self.run_purge("Doctor", values.get('d_id', ''), task),
+
+            ("Pharmacy", "Add"): lambda task, timer: repos.pharmacies.add(
+                values.get('ph_name', ''), values.get('ph_address', ''), values.get('ph_phone', ''),
+                task=task, timer=timer),
+            ("Pharmacy", "Update"): lambda task, timer: repos.pharmacies.update(
+                values.get('ph_address', ''), values.get('ph_name', ''), values.get('ph_phone', ''),
+                task=task, timer=timer),
+            ("Pharmacy", "Delete"): lambda task, timer: repos.pharmacies.delete(
+                values.get('ph_address', ''), task=task, timer=timer),
+            ("Pharmacy", "Purge"): lambda task, timer: self.run_purge("Pharmacy", values.get('ph_address', ''), task),
+
+            ("PharmaceuticalCompany", "Add"): lambda task, timer: repos.companies.add(
+                values.get('company_name', ''), values.get('company_phone', ''), task=task, timer=timer),
+            ("PharmaceuticalCompany", "Update"): lambda task, timer: repos.companies.update(
+                values.get('company_name', ''), values.get('new_company_name', ''), values.get('company_phone', ''),
+                task=task, timer=timer),
+            ("PharmaceuticalCompany", "Delete"): lambda task, timer: repos.companies.delete(
+                values.get('company_name', ''), task=task, timer=timer),
+            ("PharmaceuticalCompany", "Purge"): lambda task, timer: self.run_purge(
+                "PharmaceuticalCompany", values.get('company_name', ''), task),
+
+            ("Drug", "Add"): lambda task, timer: repos.drugs.add(
+                values.get('trade_name', ''), values.get('formula', ''), values.get('company_name', ''),
+                task=task, timer=timer),
+            ("Drug", "Delete"): lambda task, timer: repos.drugs.delete(
+                values.get('trade_name', ''), values.get('company_name', ''), task=task, timer=timer),
+
+            ("Prescription", "Update"): lambda task, timer: repos.prescriptions.update(
+                values.get('old_p_id', ''), values.get('old_d_id', ''), values.get('old_pres_date', ''),
+                values.get('new_p_id', ''), values.get('new_d_id', ''), values.get('new_pres_date', ''),
+                int(values.get('new_drug_id', 0)), int(values.get('new_quantity', 0)), task=task, timer=timer),
+            ("Prescription", "Delete"): lambda task, timer: repos.prescriptions.delete(
+                values.get('p_id', ''), values.get('d_id', ''), values.get('pres_date', ''), task=task, timer=timer),
+            ("Prescription", "Dispense"): lambda task, timer: repos.prescriptions.dispense(
+                values.get('p_id', ''), values.get('d_id', ''), values.get('pres_date', ''),
+                values.get('ph_address', ''), task=task, timer=timer),
+
+            ("Sells", "Add"): lambda task, timer: repos.sells.add(
+                values.get('ph_address', ''), int(values.get('drug_id', 0)), int(values.get('stock', 0)),
+                values.get('price', 0), task=task, timer=timer),
+            ("Sells", "Update"): lambda task, timer: repos.sells.update(
+                values.get('ph_address', ''), int(values.get('drug_id', 0)), int(values.get('stock', 0)),
+                values.get('price', 0), task=task, timer=timer),
+            ("Sells", "Delete"): lambda task, timer: repos.sells.delete(
+                values.get('ph_address', ''), int(values.get('drug_id', 0)), task=task, timer=timer),
+
+            ("Contract", "Add"): lambda task, timer: repos.contracts.add(
+                values.get('company_name', ''), values.get('ph_address', ''), values.get('content', ''),
+                values.get('start_date', ''), values.get('end_date', ''), values.get('supervisor', ''),
+                task=task, timer=timer),
+            ("Contract", "Update"): lambda task, timer: repos.contracts.update(
+                values.get('company_name', ''), values.get('ph_address', ''), values.get('content', ''),
+                values.get('start_date', ''), values.get('end_date', ''), values.get('supervisor', ''),
+                task=task, timer=timer),
+            ("Contract", "Delete"): lambda task, timer: repos.contracts.delete(
+                values.get('company_name', ''), values.get('ph_address', ''), task=task, timer=timer),
+        }
+
+        if (table, operation) == ("Prescription", "Add"):
+            items = list(self.prescription_items)
+            # A drug typed in but not yet added to the list is included too
+            if values.get('drug_id') or values.get('quantity'):
+                items.append((values.get('drug_id', ''), values.get('quantity', '')))
+            # Checked here so a bad list is reported before anything runs
+            prescriptions.normalize_items(items)
+            # All drugs go in one call and one transaction
+            return lambda task, timer: repos.prescriptions.add(
+                values.get('p_id', ''), values.get('d_id', ''), values.get('pres_date', ''), items,
+                task=task, timer=timer)
+        return operations.get((table, operation))
+
+    def run_purge(self, entity, key, task):
+        # Starts the purge, then runs its batches on this worker with the
+        # progress in the status bar. A purge that is cancelled or fails part
+        # way is finished from Purge Jobs.
+        job_id = purge.start_purge(self.backend, entity, key)
+        # The entity is hidden from here on; drop lookups cached before
+        self.cache.invalidate_write(entity)
+        return purge.run_job(
+            self.backend,
+            job_id,
+            progress=lambda job: task.report_progress(f"{job['Step']}: {job['Rows_Deleted']} rows deleted"),
+            should_stop=task.check_cancelled
+        )
+
     def submit_form(self):
         operation = self.operation_var.get()
         table = self.table_var.get()
@@ -416,178 +1016,62 @@ class NovaPharmacyApp:
         try:
             # Get values from form fields
             values = self.get_form_values()
+            run = self.form_operation(table, operation, values)
             
-            # Call appropriate stored procedure based on operation and table
-            if table == "Patient":
-                if operation == "Add":
-                    self.cursor.callproc('add_patient', [
-                        values.get('p_id', ''),
-                        values.get('p_name', ''),
-                        int(values.get('p_age', 0)),
-                        values.get('p_address', ''),
-                        values.get('p_primary_physician_id', ''),
-                        values.get('p_additional_doctor_id', None) if values.get('p_additional_doctor_id', '').strip() else None
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_patient', [values.get('p_id', '')])
-                elif operation == "Update":
-                    self.cursor.callproc('update_patient', [
-                        values.get('p_id', ''),
-                        values.get('p_name', ''),
-                        int(values.get('p_age', 0)),
-                        values.get('p_address', ''),
-                        values.get('p_primary_physician_id', ''),
-                        values.get('p_additional_doctor_id', None) if values.get('p_additional_doctor_id', '').strip() else None
-                    ])
-            
-            elif table == "Doctor":
-                if operation == "Add":
-                    self.cursor.callproc('add_doctor', [
-                        values.get('d_id', ''),
-                        values.get('d_name', ''),
-                        values.get('d_speciality', ''),
-                        int(values.get('d_years_exp', 0))
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_doctor', [values.get('d_id', '')])
-                elif operation == "Update":
-                    self.cursor.callproc('update_doctor', [
-                        values.get('d_id', ''),
-                        values.get('d_name', ''),
-                        values.get('d_speciality', ''),
-                        int(values.get('d_years_exp', 0)),
-                        values.get('d_patient_id', None)
-                    ])
-            
-            elif table == "Pharmacy":
-                if operation == "Add":
-                    self.cursor.callproc('add_pharmacy', [
-                        values.get('ph_name', ''),
-                        values.get('ph_address', ''),
-                        values.get('ph_phone', '')
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_pharmacy', [values.get('ph_address', '')])
-                elif operation == "Update":
-                    self.cursor.callproc('update_pharmacy', [
-                        values.get('ph_address', ''),
-                        values.get('ph_name', ''),
-                        values.get('ph_phone', '')
-                    ])
+            if run is None:
+                messagebox.showerror("Error", f"{operation} is not supported for {table}")
+                return
             
-            elif table == "PharmaceuticalCompany":
-                if operation == "Add":
-                    self.cursor.callproc('add_company', [
-                        values.get('company_name', ''),
-                        values.get('company_phone', '')
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_company', [values.get('company_name', '')])
-                elif operation == "Update":
-                    self.cursor.callproc('update_company', [
-                        values.get('company_name', ''),
-                        values.get('new_company_name', ''),
-                        values.get('company_phone', '')
-                    ])
+            # Checked before anything is sent; the procedure still has the final say
+            errors, warnings = validation.check_form(table, operation, values, self.key_index)
             
-            elif table == "Drug":
-                if operation == "Add":
-                    self.cursor.callproc('add_drug', [
-                        values.get('trade_name', ''),
-                        values.get('formula', ''),
-                        values.get('company_name', '')
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_drug', [
-                        values.get('trade_name', ''),
-                        values.get('company_name', '')
-                    ])
-            
-            elif table == "Prescription":
-                if operation == "Add":
-                    self.cursor.callproc('add_prescription', [
-                        values.get('p_id', ''),
-                        values.get('d_id', ''),
-                        values.get('pres_date', ''),
-                        int(values.get('drug_id', 0)),
-                        int(values.get('quantity', 0))
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_prescription', [
-                        values.get('p_id', ''),
-                        values.get('d_id', ''),
-                        values.get('pres_date', '')
-                    ])
-                elif operation == "Update":
-                    self.cursor.callproc('update_prescription', [
-                        values.get('old_p_id', ''),
-                        values.get('old_d_id', ''),
-                        values.get('old_pres_date', ''),
-                        values.get('new_p_id', ''),
-                        values.get('new_d_id', ''),
-                        values.get('new_pres_date', ''),
-                        int(values.get('new_drug_id', 0)),
-                        int(values.get('new_quantity', 0))
-                    ])
-            elif table == "Sells":
-                if operation == "Add":
-                    self.cursor.callproc('add_sells_entry', [
-                        values.get('ph_address', ''),
-                        int(values.get('drug_id', 0)),
-                        int(values.get('stock', 0)),
-                        float(values.get('price', 0))
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_sells_entry', [
-                        values.get('ph_address', ''),
-                        int(values.get('drug_id', 0))
-                    ])
-                elif operation == "Update":
-                    # Assuming there's an update_sells_entry procedure
-                    self.cursor.callproc('add_drug_to_pharmacy', [
-                        int(values.get('drug_id', 0)),
-                        values.get('ph_address', ''),
-                        int(values.get('stock', 0)),
-                        float(values.get('price', 0))
-                    ])
-            
-            elif table == "Contract":
-                if operation == "Add":
-                    self.cursor.callproc('add_contract', [
-                        values.get('company_name', ''),
-                        values.get('ph_address', ''),
-                        values.get('content', ''),
-                        values.get('start_date', ''),
-                        values.get('end_date', ''),
-                        values.get('supervisor', '')
-                    ])
-                elif operation == "Delete":
-                    self.cursor.callproc('delete_contract', [
-                        values.get('company_name', ''),
-                        values.get('ph_address', '')
-                    ])
-                elif operation == "Update":
-                    self.cursor.callproc('update_contract', [
-                        values.get('company_name', ''),
-                        values.get('ph_address', ''),
-                        values.get('content', ''),
-                        values.get('start_date', ''),
-                        values.get('end_date', ''),
-                        values.get('supervisor', '')
-                    ])
-            
-            # Commit the transaction
-            self.conn.commit()
-            messagebox.showinfo("Success", f"{operation} operation on {table} completed successfully!")
-            
-            # Clear the form
-            self.clear_form()
-            
-        except mysql.connector.Error as err:
-            self.conn.rollback()
-            messagebox.showerror("Database Error", f"Error: {err}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
+            return
+        
+        if errors:
+            messagebox.showerror("Invalid Input", "\n".join(errors))
+            return
+        if warnings:
+            if not messagebox.askyesno("Check Input", "\n".join(warnings) + "\n\nSubmit anyway?"):
+                return
+            # The pickers' index disagreed with the user; reload it when next used
+            for field in values:
+                if field in FIELD_ENTITIES:
+                    self.key_index.invalidate(FIELD_ENTITIES[field])
+        
+        entries = self.entries
+        timer = self.monitor.start(f"{operation} {table}", list(values.values()))
+        
+        def work(task):
+            # Committed by the backend; a failed call is rolled back and not retried
+            return run(task, timer)
+        
+        def on_success(result):
+            timer.finish()
+            # Drop cached lookups that this write (or its cascades) may have changed
+            if operation == "Dispense":
+                # Only the pharmacy's stock changes
+                self.cache.invalidate_write("Sells")
+            else:
+                self.cache.invalidate_write(table)
+                self.update_key_index(table, operation, values)
+            messagebox.showinfo("Success", f"{operation} operation on {table} completed successfully!")
+            
+            # Clear the form, unless the user has already moved on to another one
+            if self.entries is entries:
+                self.clear_form()
+        
+        def on_error(err):
+            timer.finish(err)
+            if operation == "Purge":
+                # A purge stopped part way may already have hidden the entity
+                # and deleted some of its records
+                self.cache.invalidate_write(table)
+                self.key_index.invalidate_write(table)
+            self.show_query_error(err)
+        
+        self.executor.submit(f"{operation} {table}", work, on_success=on_success, on_error=on_error)
 
     def get_form_values(self):
         values = {}
@@ -599,16 +1083,15 @@ class NovaPharmacyApp:
         return values
 
     def display_results(self, headers, data):
-        # Store the results instead of displaying them directly
-        self.results_headers = headers
-        self.results_data = data
-        
-        # Debug output
-        print(f"Headers: {headers}")
-        print(f"Data: {data}")
+        self.display_source(StaticSource(headers, data))
+
+    def display_source(self, source):
+        # Store the result source instead of displaying it directly; the grid
+        # pulls rows from it a page at a time when the popup is opened
+        self.results_source = source
         
         # Enable and highlight the results button if we have data
-        if data and len(data) > 0:
+        if source.has_rows():
             self.has_results = True
             self.results_btn.config(
                 state=tk.NORMAL,
@@ -636,35 +1119,6 @@ class NovaPharmacyApp:
         # Create a popup window for results
         popup = self.create_styled_popup("Query Results", "800x500")
         
-        # Create a scrolled text widget for displaying results
-        result_text = scrolledtext.ScrolledText(
-            popup,
-            width=90,
-            height=25,
-            bg=self.entry_bg,
-            fg=self.fg_color,
-            insertbackground=self.fg_color,
-            relief=tk.FLAT,
-            borderwidth=1,
-            font=("Consolas", 10)  # Monospaced font for better alignment
-        )
-        result_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Display results in the popup
-        if not self.results_data:
-            result_text.insert(tk.END, "No results found.\n")
-            return
-        
-        # Format headers
-        header_text = "  ".join(str(h).ljust(20) for h in self.results_headers)
-        result_text.insert(tk.END, header_text + "\n")
-        result_text.insert(tk.END, "-" * len(header_text) + "\n")
-        
-        # Format data
-        for row in self.results_data:
-            row_text = "  ".join(str(item).ljust(20) for item in row)
-            result_text.insert(tk.END, row_text + "\n")
-        
         # Add a close button
         close_btn = tk.Button(
             popup,
@@ -678,9 +1132,243 @@ class NovaPharmacyApp:
             pady=5,
             cursor="hand2"
         )
-        close_btn.pack(pady=10)
+        close_btn.pack(side=tk.BOTTOM, pady=10)
         close_btn.bind("<Enter>", lambda e: close_btn.config(bg=self.hover_color))
         close_btn.bind("<Leave>", lambda e: close_btn.config(bg=self.accent_color))
+        
+        # Grid that loads one page of rows at a time as the user scrolls
+        grid = ResultGrid(popup, self.executor, self.results_source, bg=self.bg_color, fg=self.fg_color, monitor=self.monitor)
+        grid.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def show_performance_panel(self):
+        popup = self.create_styled_popup("Performance", "900x560")
+        
+        # Slow threshold, applied to operations that finish from now on
+        controls = tk.Frame(popup, bg=self.bg_color)
+        controls.pack(fill=tk.X, padx=10, pady=10)
+        tk.Label(controls, text="Slow threshold (ms):", bg=self.bg_color, fg=self.fg_color).pack(side=tk.LEFT)
+        threshold = tk.Entry(controls, width=8, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        threshold.insert(0, f"{self.monitor.slow_threshold_ms:g}")
+        threshold.pack(side=tk.LEFT, padx=5)
+        
+        def apply_threshold():
+            try:
+                value = float(threshold.get().strip())
+            except ValueError:
+                messagebox.showerror("Error", "Threshold must be a number of milliseconds", parent=popup)
+                return
+            if value <= 0:
+                messagebox.showerror("Error", "Threshold must be positive", parent=popup)
+                return
+            self.monitor.set_threshold(value)
+        
+        tk.Button(controls, text="Apply", command=apply_threshold, bg=self.accent_color, fg=self.fg_color, relief=tk.FLAT, cursor="hand2").pack(side=tk.LEFT, padx=5)
+        
+        def make_tree(title, columns, height):
+            frame = tk.LabelFrame(popup, text=title, font=("Arial", 11, "bold"), bg=self.frame_bg, fg=self.fg_color)
+            frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+            tree = ttk.Treeview(frame, columns=columns, show="headings", height=height, style="Results.Treeview")
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=90, minwidth=60, stretch=True)
+            vsb = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=vsb.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            vsb.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.tag_configure("slow", foreground="#ff8a80")
+            return tree
+        
+        summary_tree = make_tree(
+            "Hot operations (slowest p95 first)",
+            ["Operation", "Calls", "Slow", "Errors", "Avg ms", "P95 ms", "Max ms", "Avg rows"],
+            6
+        )
+        recent_tree = make_tree(
+            "Recent operations",
+            ["Time", "Operation", "Args", "Server ms", "Fetch ms", "Render ms", "Total ms", "Rows", "Notes"],
+            10
+        )
+        
+        def fmt(value):
+            return "-" if value is None else f"{value:.1f}"
+        
+        def refresh():
+            if not popup.winfo_exists():
+                return
+            summary_tree.delete(*summary_tree.get_children())
+            for item in self.monitor.summary():
+                summary_tree.insert("", tk.END, values=[
+                    item["name"], item["calls"], item["slow"], item["errors"],
+                    fmt(item["avg_ms"]), fmt(item["p95_ms"]), fmt(item["max_ms"]), item["avg_rows"]
+                ], tags=("slow",) if item["slow"] else ())
+            
+            recent_tree.delete(*recent_tree.get_children())
+            for record in self.monitor.recent():
+                notes = []
+                if record["slow"]:
+                    notes.append("SLOW")
+                if record["cached"]:
+                    notes.append("cached")
+                if record["error"]:
+                    notes.append(f"error: {record['error']}")
+                recent_tree.insert("", tk.END, values=[
+                    record["time"][11:], record["name"], record["args_hash"],
+                    fmt(record["server_ms"]), fmt(record["fetch_ms"]), fmt(record["render_ms"]),
+                    fmt(record["total_ms"]), record["rows"], ", ".join(notes)
+                ], tags=("slow",) if record["slow"] or record["error"] else ())
+            popup.after(1000, refresh)
+        
+        refresh()
+
+    def bulk_import(self):
+        if self.pool is None:
+            # Batch jobs load files straight into MySQL; they are not offered by the service
+            messagebox.showerror("Bulk Import", "Bulk Import needs a direct database connection. Run bulk_import.py where the service runs.")
+            return
+        
+        # Create a popup window for choosing the table and input file
+        popup = self.create_styled_popup("Bulk Import", "520x180")
+        
+        tk.Label(popup, text="Table:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        table_var = tk.StringVar()
+        table_dropdown = ttk.Combobox(popup, textvariable=table_var, values=bulk_import.IMPORT_TABLES, width=20, state="readonly")
+        table_dropdown.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+        table_dropdown.current(0)
+        
+        tk.Label(popup, text="File (CSV or JSONL):", bg=self.bg_color, fg=self.fg_color).grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        file_path = tk.Entry(popup, width=35, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        file_path.grid(row=1, column=1, padx=10, pady=10)
+        
+        def browse():
+            path = filedialog.askopenfilename(
+                parent=popup,
+                filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("All files", "*.*")]
+            )
+            if path:
+                file_path.delete(0, tk.END)
+                file_path.insert(0, path)
+        
+        tk.Button(popup, text="Browse...", command=browse, bg=self.entry_bg, fg=self.fg_color, relief=tk.FLAT).grid(row=1, column=2, padx=5)
+        
+        def submit():
+            table = table_var.get()
+            path = file_path.get().strip()
+            if not path:
+                messagebox.showerror("Error", "Choose a file to import!")
+                return
+            
+            def work(task):
+                with self.monitor.track(f"import {table}", [path]) as timer:
+                    result = bulk_import.import_file(
+                        self.pool,
+                        table,
+                        path,
+                        progress=lambda loaded, rejected: task.report_progress(f"{loaded} loaded, {rejected} rejected"),
+                        should_stop=task.check_cancelled
+                    )
+                    timer.add_rows(result["loaded"])
+                    return result
+            
+            def on_success(result):
+                self.cache.invalidate_write(table)
+                messagebox.showinfo(
+                    "Bulk Import",
+                    f"Loaded {result['loaded']} rows into {table}.\n"
+                    f"Rejected {result['rejected']} rows (see {result['error_report']})."
+                )
+            
+            self.executor.submit(f"Import {table}", work, on_success=on_success, on_error=self.show_query_error)
+            popup.destroy()
+        
+        import_btn = tk.Button(
+            popup,
+            text="Start Import",
+            command=submit,
+            bg=self.success_color,
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        import_btn.grid(row=2, column=0, columnspan=3, pady=20)
+        import_btn.bind("<Enter>", lambda e: import_btn.config(bg="#66bb6a"))
+        import_btn.bind("<Leave>", lambda e: import_btn.config(bg=self.success_color))
+
+    def stock_update(self):
+        if self.pool is None:
+            # Batch jobs load files straight into MySQL; they are not offered by the service
+            messagebox.showerror("Stock Update", "Stock Update needs a direct database connection. Run stock_update.py where the service runs.")
+            return
+        
+        # Create a popup window for choosing the pharmacy and price list file
+        popup = self.create_styled_popup("Stock Update", "560x180")
+        
+        tk.Label(popup, text="Pharmacy Address:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        ph_address = tk.Entry(popup, width=35, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        ph_address.grid(row=0, column=1, padx=10, pady=10)
+        
+        tk.Label(popup, text="Price list (CSV or JSONL):", bg=self.bg_color, fg=self.fg_color).grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        file_path = tk.Entry(popup, width=35, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        file_path.grid(row=1, column=1, padx=10, pady=10)
+        
+        def browse():
+            path = filedialog.askopenfilename(
+                parent=popup,
+                filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("All files", "*.*")]
+            )
+            if path:
+                file_path.delete(0, tk.END)
+                file_path.insert(0, path)
+        
+        tk.Button(popup, text="Browse...", command=browse, bg=self.entry_bg, fg=self.fg_color, relief=tk.FLAT).grid(row=1, column=2, padx=5)
+        
+        def submit():
+            address = ph_address.get().strip()
+            path = file_path.get().strip()
+            if not address or not path:
+                messagebox.showerror("Error", "Pharmacy address and price list file are required!")
+                return
+            
+            def work(task):
+                with self.monitor.track("stock update", [address, path]) as timer:
+                    result = stock_update.update_stock_file(
+                        self.pool,
+                        address,
+                        path,
+                        progress=lambda processed: task.report_progress(f"{processed} rows"),
+                        should_stop=task.check_cancelled
+                    )
+                    timer.add_rows(len(result["outcomes"]))
+                    return result
+            
+            def on_success(result):
+                self.cache.invalidate_write("Sells")
+                messagebox.showinfo(
+                    "Stock Update",
+                    f"{result['inserted']} drugs added, {result['updated']} updated, "
+                    f"{result['unchanged']} unchanged.\n"
+                    f"Rejected {result['rejected']} rows (see {result['outcome_report']})."
+                )
+            
+            def on_error(err):
+                # Chunks committed before the failure stay applied
+                self.cache.invalidate_write("Sells")
+                self.show_query_error(err)
+            
+            self.executor.submit("Stock update", work, on_success=on_success, on_error=on_error)
+            popup.destroy()
+        
+        update_btn = tk.Button(
+            popup,
+            text="Apply Price List",
+            command=submit,
+            bg=self.success_color,
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        update_btn.grid(row=2, column=0, columnspan=3, pady=20)
+        update_btn.bind("<Enter>", lambda e: update_btn.config(bg="#66bb6a"))
+        update_btn.bind("<Leave>", lambda e: update_btn.config(bg=self.success_color))
 
     def create_styled_popup(self, title, geometry):
         popup = tk.Toplevel(self.root)
@@ -716,15 +1404,7 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "All fields are required!")
                     return
                 
-                self.cursor.callproc('prescription_report', [p_id, s_date, e_date])
-                
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
-                
-                popup.destroy()
+                self.run_report('prescription_report', [p_id, s_date, e_date], popup, paged=True)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -741,6 +1421,228 @@ class NovaPharmacyApp:
         report_btn.bind("<Enter>", lambda e: report_btn.config(bg="#66bb6a"))
         report_btn.bind("<Leave>", lambda e: report_btn.config(bg=self.success_color))
 
+    def drug_availability(self):
+        # Create a popup window for input
+        popup = self.create_styled_popup("Drug Availability", "420x170")
+        
+        tk.Label(popup, text="Trade Name Prefix:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10)
+        name_prefix = tk.Entry(popup, width=20, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        name_prefix.grid(row=0, column=1, padx=10, pady=10)
+        
+        tk.Label(popup, text="Stock Greater Than:", bg=self.bg_color, fg=self.fg_color).grid(row=1, column=0, padx=10, pady=10)
+        stock_above = tk.Entry(popup, width=20, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        stock_above.insert(0, "0")
+        stock_above.grid(row=1, column=1, padx=10, pady=10)
+        
+        def submit():
+            try:
+                prefix = name_prefix.get().strip()
+                
+                if not prefix:
+                    messagebox.showerror("Error", "Trade name prefix is required!")
+                    return
+                
+                if len(prefix) < MIN_PREFIX_LENGTH:
+                    messagebox.showerror("Error", f"Trade name prefix must be at least {MIN_PREFIX_LENGTH} characters!")
+                    return
+                
+                # Cheapest pharmacies first, a page at a time
+                self.run_report('drug_availability', [prefix, int(stock_above.get().strip() or 0)], popup, paged=True)
+            except ValueError:
+                messagebox.showerror("Error", "Stock must be a whole number!")
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {e}")
+        
+        search_btn = tk.Button(
+            popup, 
+            text="Search", 
+            command=submit, 
+            bg=self.success_color, 
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        search_btn.grid(row=2, column=0, columnspan=2, pady=20)
+        search_btn.bind("<Enter>", lambda e: search_btn.config(bg="#66bb6a"))
+        search_btn.bind("<Leave>", lambda e: search_btn.config(bg=self.success_color))
+
+    def inventory_summary(self):
+        # Create a popup window for choosing the summary
+        popup = self.create_styled_popup("Inventory Summary", "400x120")
+        
+        tk.Label(popup, text="Summary By:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10)
+        summary_var = tk.StringVar()
+        summary_dropdown = ttk.Combobox(popup, textvariable=summary_var, values=["Pharmacy", "Company"], width=17, state="readonly")
+        summary_dropdown.grid(row=0, column=1, padx=10, pady=10)
+        summary_dropdown.current(0)
+        
+        def submit():
+            try:
+                # Read from the trigger-maintained summary tables, so this is
+                # cheap however large Sells is
+                if summary_var.get() == "Pharmacy":
+                    self.run_report('print_pharmacy_inventory', [], popup)
+                else:
+                    self.run_report('print_company_inventory', [], popup)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {e}")
+        
+        summary_btn = tk.Button(
+            popup, 
+            text="Show Summary", 
+            command=submit, 
+            bg=self.success_color, 
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        summary_btn.grid(row=1, column=0, columnspan=2, pady=20)
+        summary_btn.bind("<Enter>", lambda e: summary_btn.config(bg="#66bb6a"))
+        summary_btn.bind("<Leave>", lambda e: summary_btn.config(bg=self.success_color))
+
+    def purge_jobs(self):
+        # Create a popup window for listing the purges and finishing any that stopped part way
+        popup = self.create_styled_popup("Purge Jobs", "400x120")
+        
+        def show():
+            self.run_report('print_purge_jobs', [], popup)
+        
+        def resume():
+            def work(task):
+                return purge.resume_jobs(
+                    self.backend,
+                    progress=lambda job: task.report_progress(
+                        f"job {job['Job_ID']} {job['Step']}: {job['Rows_Deleted']} rows deleted"),
+                    should_stop=task.check_cancelled
+                )
+            
+            def invalidate():
+                for entity in purge.PURGE_PROCEDURES:
+                    self.cache.invalidate_write(entity)
+                    self.key_index.invalidate_write(entity)
+            
+            def on_success(jobs):
+                invalidate()
+                messagebox.showinfo("Purge Jobs", f"Finished {len(jobs)} purge job(s).")
+            
+            def on_error(err):
+                invalidate()
+                self.show_query_error(err)
+            
+            self.executor.submit("Resume purges", work, on_success=on_success, on_error=on_error)
+            popup.destroy()
+        
+        for column, (text, command) in enumerate([("Show Jobs", show), ("Resume Unfinished", resume)]):
+            btn = tk.Button(
+                popup,
+                text=text,
+                command=command,
+                bg=self.success_color,
+                fg=self.fg_color,
+                relief=tk.FLAT,
+                cursor="hand2"
+            )
+            btn.grid(row=0, column=column, padx=20, pady=30)
+            btn.bind("<Enter>", lambda e, b=btn: b.config(bg="#66bb6a"))
+            btn.bind("<Leave>", lambda e, b=btn: b.config(bg=self.success_color))
+
+    def export_report(self):
+        # Create a popup window for choosing the report, its arguments and the output file
+        popup = self.create_styled_popup("Export Report", "520x320")
+        
+        tk.Label(popup, text="Report:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        report_var = tk.StringVar()
+        report_dropdown = ttk.Combobox(popup, textvariable=report_var, values=list(EXPORT_REPORTS), width=25, state="readonly")
+        report_dropdown.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+        report_dropdown.current(0)
+        
+        args_frame = tk.Frame(popup, bg=self.bg_color)
+        args_frame.grid(row=1, column=0, columnspan=3, sticky="w")
+        arg_entries = []
+        
+        def show_args(event=None):
+            for widget in args_frame.winfo_children():
+                widget.destroy()
+            arg_entries.clear()
+            procedure, labels = EXPORT_REPORTS[report_var.get()]
+            for i, label in enumerate(labels):
+                tk.Label(args_frame, text=label, bg=self.bg_color, fg=self.fg_color).grid(row=i, column=0, padx=10, pady=5, sticky="w")
+                entry = tk.Entry(args_frame, width=30, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+                entry.grid(row=i, column=1, padx=10, pady=5)
+                arg_entries.append(entry)
+        
+        report_dropdown.bind("<<ComboboxSelected>>", show_args)
+        show_args()
+        
+        tk.Label(popup, text="Save to:", bg=self.bg_color, fg=self.fg_color).grid(row=2, column=0, padx=10, pady=10, sticky="w")
+        file_path = tk.Entry(popup, width=35, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        file_path.grid(row=2, column=1, padx=10, pady=10)
+        
+        def browse():
+            path = filedialog.asksaveasfilename(
+                parent=popup,
+                defaultextension=".csv",
+                filetypes=[
+                    ("CSV", "*.csv"),
+                    ("CSV (gzip)", "*.csv.gz"),
+                    ("JSON Lines", "*.jsonl"),
+                    ("JSON Lines (gzip)", "*.jsonl.gz"),
+                    ("Parquet", "*.parquet")
+                ]
+            )
+            if path:
+                file_path.delete(0, tk.END)
+                file_path.insert(0, path)
+        
+        tk.Button(popup, text="Browse...", command=browse, bg=self.entry_bg, fg=self.fg_color, relief=tk.FLAT).grid(row=2, column=2, padx=5)
+        
+        def submit():
+            procedure, labels = EXPORT_REPORTS[report_var.get()]
+            args = [entry.get().strip() for entry in arg_entries]
+            path = file_path.get().strip()
+            if not all(args) or not path:
+                messagebox.showerror("Error", "All fields are required!")
+                return
+            try:
+                report_export.format_for_path(path)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            
+            def work(task):
+                # Rows go straight from the server to the file in batches;
+                # nothing is collected in memory
+                with self.monitor.track(f"export {procedure}", args) as timer:
+                    written = report_export.export_procedure(
+                        self.backend,
+                        procedure,
+                        args,
+                        path,
+                        task=task,
+                        progress=lambda written: task.report_progress(f"{written} rows exported")
+                    )
+                    timer.add_rows(written)
+                    return written
+            
+            def on_success(written):
+                messagebox.showinfo("Export Report", f"Exported {written} rows to {path}")
+            
+            self.executor.submit(f"Export {procedure}", work, on_success=on_success, on_error=self.show_query_error)
+            popup.destroy()
+        
+        export_btn = tk.Button(
+            popup,
+            text="Export",
+            command=submit,
+            bg=self.success_color,
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        export_btn.grid(row=3, column=0, columnspan=3, pady=20)
+        export_btn.bind("<Enter>", lambda e: export_btn.config(bg="#66bb6a"))
+        export_btn.bind("<Leave>", lambda e: export_btn.config(bg=self.success_color))
+
     def display_contract(self):
         # Create a popup window for input
         popup = self.create_styled_popup("Display Contract", "450x180")
@@ -767,45 +1669,17 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "All fields are required!")
                     return
                 
-                # Create a query to get contract information
-                query = """
-                SELECT 
-                    c.company_name AS 'Company Name',
-                    pc.phone_number AS 'Company Phone',
-                    p.pname AS 'Pharmacy Name',
-                    p.address AS 'Pharmacy Address',
-                    p.phone AS 'Pharmacy Phone',
-                    c.start_date AS 'Contract Start Date',
-                    c.end_date AS 'Contract End Date',
-                    c.supervisor AS 'Contract Supervisor',
-                    c.content AS 'Contract Content',
-                    CASE 
-                        WHEN c.end_date < CURDATE() THEN 'Expired'
-                        WHEN c.start_date > CURDATE() THEN 'Future'
-                        ELSE 'Active'
-                    END AS 'Contract Status',
-                    DATEDIFF(c.end_date, CURDATE()) AS 'Days Remaining'
-                FROM Contract c
-                JOIN Pharmacy p ON c.ph_address = p.address
-                JOIN PharmaceuticalCompany pc ON c.company_name = pc.company_name
-                WHERE c.ph_address = %s
-                AND p.pname = %s
-                AND c.company_name = %s
-                """
-                
-                self.cursor.execute(query, (ph_address, ph_name, comp_name))
-                
-                # Get results
-                data = self.cursor.fetchall()
-                
-                if not data:
+                def no_contract():
                     messagebox.showinfo("Information", "No contract exists between this pharmacy and pharmaceutical company")
-                    return
-                    
-                headers = [i[0] for i in self.cursor.description]
-                self.display_results(headers, data)
                 
-                popup.destroy()
+                params = (ph_address, ph_name, comp_name)
+                self.stream_results(
+                    "display_contract",
+                    lambda task, timer: self.repos.contracts.details(*params, task=task, timer=timer),
+                    popup,
+                    on_empty=no_contract,
+                    args=params
+                )
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -843,15 +1717,7 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "All fields are required!")
                     return
                 
-                self.cursor.callproc('print_pres_details', [p_id, date])
-                
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
-                
-                popup.destroy()
+                self.run_report('print_pres_details', [p_id, date], popup)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -884,15 +1750,7 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "Company name is required!")
                     return
                 
-                self.cursor.callproc('drug_details', [name])
-                
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
-                
-                popup.destroy()
+                self.run_report('drug_details', [name], popup, paged=True)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -925,15 +1783,7 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "Pharmacy address is required!")
                     return
                 
-                self.cursor.callproc('print_stock_position', [address])
-                
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
-                
-                popup.destroy()
+                self.run_report('print_stock_position', [address], popup, paged=True)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -966,15 +1816,40 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "Pharmacy address is required!")
                     return
                 
-                self.cursor.callproc('print_pharmacy_contact', [address])
+                self.run_report('print_pharmacy_contact', [address], popup)
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {e}")
+        
+        contact_btn = tk.Button(
+            popup, 
+            text="Get Contact", 
+            command=submit, 
+            bg=self.success_color, 
+            fg=self.fg_color,
+            relief=tk.FLAT,
+            cursor="hand2"
+        )
+        contact_btn.grid(row=1, column=0, columnspan=2, pady=20)
+        contact_btn.bind("<Enter>", lambda e: contact_btn.config(bg="#66bb6a"))
+        contact_btn.bind("<Leave>", lambda e: contact_btn.config(bg=self.success_color))
+
+    def company_contact(self):
+        # Create a popup window for input
+        popup = self.create_styled_popup("Company Contact", "400x120")
+        
+        tk.Label(popup, text="Company Name:", bg=self.bg_color, fg=self.fg_color).grid(row=0, column=0, padx=10, pady=10)
+        company_name = tk.Entry(popup, width=20, bg=self.entry_bg, fg=self.fg_color, insertbackground=self.fg_color)
+        company_name.grid(row=0, column=1, padx=10, pady=10)
+        
+        def submit():
+            try:
+                name = company_name.get().strip()
                 
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
+                if not name:
+                    messagebox.showerror("Error", "Company name is required!")
+                    return
                 
-                popup.destroy()
+                self.run_report('print_company_contact', [name], popup)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
@@ -1007,15 +1882,7 @@ class NovaPharmacyApp:
                     messagebox.showerror("Error", "Doctor ID is required!")
                     return
                 
-                self.cursor.callproc('print_patients_for_doctor', [d_id])
-                
-                # Get results from the stored procedure
-                for result in self.cursor.stored_results():
-                    data = result.fetchall()
-                    headers = [i[0] for i in result.description]
-                    self.display_results(headers, data)
-                
-                popup.destroy()
+                self.run_report('print_patients_for_doctor', [d_id], popup, paged=True)
             except Exception as e:
                 messagebox.showerror("Error", f"An error occurred: {e}")
         
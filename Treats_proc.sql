@@ -5,7 +5,7 @@ CREATE PROCEDURE add_treats_entry(
 )
 BEGIN
     -- Check that doctor exists
-    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_doctor_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_doctor_id AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor does not exist.';
     END IF;
     
@@ -0,0 +1,74 @@
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+import mysql.connector
+
+from backend import MySQLBackend
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Runs the prescription archival of prescription_archive.sql: moves the
+# prescriptions dated before a cutoff from the hot tables to
+# PrescriptionArchive with one archive_prescriptions call per batch, each a
+# short transaction. The reports read both tiers, so this only changes where
+# a prescription is kept. Safe to stop and run again at any point. Works on
+# any backend: MySQLBackend, service_client.ServiceClient or
+# sqlite_backend.SQLiteBackend.
+
+# Prescriptions moved per call
+ARCHIVE_BATCH = 1000
+# Seconds to wait between batches, leaving the tables to other sessions
+ARCHIVE_PAUSE = 0.05
+# Prescriptions older than this many days are archived by default
+ARCHIVE_AFTER_DAYS = 365
+
+
+def archive(backend, before, batch_size=ARCHIVE_BATCH, pause=ARCHIVE_PAUSE, progress=None, should_stop=None):
+    # Archives everything dated before the given date and returns the
+    # number of (prescriptions, drug rows) moved. progress is called with
+    # the running totals after every batch.
+    prescriptions = rows = 0
+    while True:
+        if should_stop:
+            should_stop()
+        headers, result = backend.call("archive_prescriptions", [before, batch_size], write=True)[-1]
+        batch = dict(zip(headers, result[0]))
+        if batch["Prescriptions"] == 0:
+            return prescriptions, rows
+        prescriptions += batch["Prescriptions"]
+        rows += batch["Rows_Archived"]
+        if progress:
+            progress(prescriptions, rows)
+        if pause:
+            time.sleep(pause)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old prescriptions to the archive tier")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archive prescriptions older than this many days")
+    parser.add_argument("--before", type=date.fromisoformat,
+                        help="Archive prescriptions dated before this day (YYYY-MM-DD); overrides --days")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument("--pause", type=float, default=ARCHIVE_PAUSE, help="Seconds between batches")
+    args = parser.parse_args(argv)
+    before = args.before or date.today() - timedelta(days=args.days)
+
+    backend = MySQLBackend(ConnectionPool(DB_CONFIG, pool_size=1))
+
+    def progress(prescriptions, rows):
+        print(f"{prescriptions} prescriptions ({rows} rows) archived", file=sys.stderr)
+
+    try:
+        prescriptions, rows = archive(backend, before, args.batch_size, args.pause, progress)
+    except mysql.connector.Error as e:
+        # Batches committed before the error stay archived; running again goes on from there
+        print(e.msg, file=sys.stderr)
+        return 1
+    print(f"Archived {prescriptions} prescriptions ({rows} rows) dated before {before}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+-- Index for drug_availability / drug_availability_page in specific_procs.sql.
+-- Run once against an existing nova database; tables_def.sql already creates
+-- it for new installs. Verify the plan afterwards with explain_check.py.
+USE nova;
+
+-- For each drug matched by the trade name prefix, the pharmacies that sell
+-- it come out of the index cheapest first. The order holds within one drug
+-- only, so ranking several drugs' pharmacies together is still a sort;
+-- drug_availability_page keeps it to one page by starting each page at a
+-- price range on this index. stock follows price because the stock filter
+-- is itself a range; it is still checked from the index without a row
+-- lookup.
+CREATE INDEX idx_sells_drug_price ON Sells (drug_id, price, stock);
+
+ANALYZE TABLE Sells;
@@ -0,0 +1,413 @@
+import json
+import threading
+import weakref
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from db_pool import is_connection_error
+from streaming import FETCH_BATCH, stream_procedure, stream_statement
+
+# Every stored procedure a client may call, with its parameters and their
+# types. Keep these in step with the CREATE PROCEDURE statements.
+PROCEDURES = {
+    # Writes
+    "add_patient": [("p_id", "str"), ("p_name", "str"), ("p_age", "int"), ("p_address", "str"),
+                    ("p_primary_physician_id", "str"), ("p_additional_doctor_id", "str")],
+    "update_patient": [("p_patient_id", "str"), ("p_patient_name", "str"), ("p_age", "int"), ("p_address", "str"),
+                       ("p_primary_physician_id", "str"), ("p_additional_doctor_id", "str")],
+    "delete_patient": [("p_patient_id", "str")],
+    "add_doctor": [("p_id", "str"), ("p_name", "str"), ("p_speciality", "str"), ("p_years_exp", "int")],
+    "update_doctor": [("d_id", "str"), ("new_name", "str"), ("new_spec", "str"), ("new_exp", "int"),
+                      ("new_pid", "str")],
+    "delete_doctor": [("p_doctor_id", "str")],
+    "add_treats_entry": [("p_doctor_id", "str"), ("p_patient_id", "str")],
+    "delete_treats_entry": [("p_doctor_id", "str"), ("p_patient_id", "str")],
+    "add_company": [("p_company_name", "str"), ("p_phone_number", "str")],
+    "update_company": [("p_old_name", "str"), ("p_new_name", "str"), ("p_new_phone", "str")],
+    "delete_company": [("p_company_name", "str")],
+    "add_drug": [("p_trade_name", "str"), ("p_formula", "str"), ("p_company_name", "str")],
+    "update_drug": [("p_old_trade_name", "str"), ("p_company_name", "str"), ("p_new_trade_name", "str"),
+                    ("p_new_formula", "str")],
+    "delete_drug": [("p_trade_name", "str"), ("p_company_name", "str")],
+    "add_pharmacy": [("p_name", "str"), ("p_address", "str"), ("p_phone", "str")],
+    "update_pharmacy": [("p_address", "str"), ("p_name", "str"), ("p_phone", "str")],
+    "delete_pharmacy": [("p_address", "str")],
+    "add_drug_to_pharmacy": [("p_pharmacy_address", "str"), ("p_drug_id", "int"), ("p_stock", "int"),
+                             ("p_price", "decimal")],
+    "update_drug_quantity": [("p_pharmacy_address", "str"), ("p_drug_id", "int"), ("p_new_stock", "int"),
+                             ("p_new_price", "decimal")],
+    "delete_drug_from_pharmacy": [("p_pharmacy_address", "str"), ("p_drug_id", "int")],
+    "add_sells_entry": [("p_pharmacy_address", "str"), ("p_drug_id", "int"), ("p_stock", "int"),
+                        ("p_price", "decimal")],
+    "update_sells_entry": [("p_pharmacy_address", "str"), ("p_drug_id", "int"), ("p_stock", "int"),
+                           ("p_price", "decimal")],
+    "delete_sells_entry": [("p_pharmacy_address", "str"), ("p_drug_id", "int")],
+    "add_prescription": [("p_pid", "str"), ("p_did", "str"), ("p_pres_date", "date"), ("p_drug_id", "int"),
+                         ("p_quantity", "int")],
+    "add_prescription_multi": [("p_pid", "str"), ("p_did", "str"), ("p_pres_date", "date"), ("p_items", "json")],
+    "update_prescription": [("p_old_pid", "str"), ("p_old_did", "str"), ("p_old_pres_date", "date"),
+                            ("p_new_pid", "str"), ("p_new_did", "str"), ("p_new_pres_date", "date"),
+                            ("p_new_drug_id", "int"), ("p_new_quantity", "int")],
+    "delete_prescription": [("p_pid", "str"), ("p_did", "str"), ("p_pres_date", "date")],
+    "add_contract": [("p_company_name", "str"), ("p_pharmacy_address", "str"), ("p_content", "str"),
+                     ("p_start_date", "date"), ("p_end_date", "date"), ("p_supervisor", "str")],
+    "update_contract": [("p_company_name", "str"), ("p_pharmacy_address", "str"), ("p_content", "str"),
+                        ("p_start_date", "date"), ("p_end_date", "date"), ("p_supervisor", "str")],
+    "update_contract_supervisor": [("p_company_name", "str"), ("p_pharmacy_address", "str"),
+                                   ("p_new_supervisor", "str")],
+    "delete_contract": [("p_company_name", "str"), ("p_pharmacy_address", "str")],
+    "purge_doctor": [("p_doctor_id", "str")],
+    "purge_pharmacy": [("p_address", "str")],
+    "purge_company": [("p_company_name", "str")],
+    "purge_step": [("p_job_id", "int"), ("p_batch_size", "int")],
+    "archive_prescriptions": [("p_before", "date"), ("p_batch_size", "int")],
+    "dispense_prescription": [("p_pid", "str"), ("p_did", "str"), ("p_pres_date", "date"),
+                              ("p_pharmacy_address", "str")],
+
+    # Reports
+    "prescription_report": [("p_patient_id", "str"), ("p_start_date", "date"), ("p_end_date", "date")],
+    "print_pres_details": [("p_patient_id", "str"), ("p_pres_date", "date")],
+    "drug_details": [("p_company_name", "str")],
+    "print_stock_position": [("p_pharmacy_address", "str")],
+    "print_pharmacy_contact": [("p_pharmacy_address", "str")],
+    "print_company_contact": [("p_company_name", "str")],
+    "print_patients_for_doctor": [("p_doctor_id", "str")],
+    "display_contract": [("p_pharmacy_address", "str"), ("p_pharmacy_name", "str"), ("p_company_name", "str")],
+    "print_chain_stock": [],
+    "drug_availability": [("p_name_prefix", "str"), ("p_stock_above", "int")],
+    "print_pharmacy_inventory": [],
+    "print_company_inventory": [],
+    "print_purge_jobs": [],
+}
+
+# Paged variants take the report's arguments plus sort column, direction and window
+PAGE_ARGS = [("p_sort_column", "str"), ("p_sort_desc", "bool"), ("p_limit", "int"), ("p_offset", "int")]
+for _report in ["prescription_report", "drug_details", "print_stock_position", "print_patients_for_doctor",
+                "drug_availability"]:
+    PROCEDURES[f"{_report}_page"] = PROCEDURES[_report] + PAGE_ARGS
+
+# Paged variants that also take the previous page's last row, by the columns
+# of the report's own order. In that order a page starts after the row
+# rather than at the offset (keyset pagination), so later pages do not read
+# and discard every row before them.
+KEYSET_ORDERS = {
+    "drug_availability": ["Price", "Stock", "Pharmacy_Address", "Drug_ID"],
+}
+PROCEDURES["drug_availability_page"] += [("p_after_price", "decimal"), ("p_after_stock", "int"),
+                                         ("p_after_address", "str"), ("p_after_drug_id", "int")]
+
+# Shortest trade name prefix drug_availability accepts; a shorter one matches
+# so many drugs that their pharmacies cannot be ranked cheaply
+MIN_PREFIX_LENGTH = 3
+
+# Ad hoc queries run by name, for reports that have no procedure of their own
+STATEMENTS = {
+    "contract_details": (
+        [("ph_address", "str"), ("ph_name", "str"), ("company_name", "str")],
+        """
+        SELECT
+            pc.company_name AS 'Company Name',
+            pc.phone_number AS 'Company Phone',
+            p.pname AS 'Pharmacy Name',
+            p.address AS 'Pharmacy Address',
+            p.phone AS 'Pharmacy Phone',
+            c.start_date AS 'Contract Start Date',
+            c.end_date AS 'Contract End Date',
+            c.supervisor AS 'Contract Supervisor',
+            c.content AS 'Contract Content',
+            CASE
+                WHEN c.end_date < CURDATE() THEN 'Expired'
+                WHEN c.start_date > CURDATE() THEN 'Future'
+                ELSE 'Active'
+            END AS 'Contract Status',
+            DATEDIFF(c.end_date, CURDATE()) AS 'Days Remaining'
+        FROM Contract c
+        JOIN Pharmacy p ON c.ph_id = p.ph_id
+        JOIN PharmaceuticalCompany pc ON c.company_id = pc.company_id
+        WHERE p.address = %s
+        AND p.pname = %s
+        AND pc.company_name = %s
+        AND p.is_active
+        AND pc.is_active
+        """
+    ),
+    # Every key and display name of an entity, for the form pickers
+    # (key_index.py); entities being purged are left out
+    "doctor_keys": ([], "SELECT daadharid AS Doctor_ID, d_name AS Doctor_Name FROM Doctor WHERE is_active"),
+    "patient_keys": ([], "SELECT paadharid AS Patient_ID, p_name AS Patient_Name FROM Patient"),
+    "drug_keys": (
+        [],
+        "SELECT d.drug_id AS Drug_ID, CONCAT(d.trade_name, ' (', pc.company_name, ')') AS Drug_Name "
+        "FROM Drug d JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id WHERE pc.is_active"
+    ),
+    "pharmacy_keys": ([], "SELECT address AS Pharmacy_Address, pname AS Pharmacy_Name FROM Pharmacy WHERE is_active"),
+}
+
+# The hot lookups, as plain queries returning what their procedure returns.
+# In prepared mode MySQLBackend runs these as server-side prepared
+# statements, prepared once per connection and then only executed, instead
+# of sending and parsing the CALL text on every click. Keep them in step
+# with the procedures in specific_procs.sql.
+PREPARED = {
+    "print_pharmacy_contact": """
+        SELECT
+            p.pname AS Pharmacy_Name,
+            p.address AS Pharmacy_Address,
+            p.phone AS Pharmacy_Contact
+        FROM Pharmacy p
+        WHERE p.address = %s
+        AND p.is_active
+        """,
+    "print_company_contact": """
+        SELECT
+            c.company_name AS Company_Name,
+            c.phone_number AS Company_Contact
+        FROM PharmaceuticalCompany c
+        WHERE c.company_name = %s
+        AND c.is_active
+        """,
+    "drug_details": """
+        SELECT
+            d.drug_id AS Drug_ID,
+            d.trade_name AS Drug_Name,
+            d.formula AS Formula,
+            pc.company_name AS Manufacturer,
+            pc.phone_number AS Contact_Number
+        FROM Drug d
+        JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id
+        WHERE pc.company_name = %s
+        AND pc.is_active
+        ORDER BY d.trade_name
+        """,
+    "contract_details": STATEMENTS["contract_details"][1],
+}
+
+
+KIND_NAMES = {
+    "str": "text",
+    "int": "a whole number",
+    "decimal": "a number",
+    "date": "a date (YYYY-MM-DD)",
+    "bool": "true or false",
+    "json": "JSON",
+}
+
+
+def is_write(procedure):
+    return procedure.startswith(("add_", "update_", "delete_", "purge_", "archive_", "dispense_"))
+
+
+def signature(name):
+    if name in PROCEDURES:
+        return PROCEDURES[name]
+    if name in STATEMENTS:
+        return STATEMENTS[name][0]
+    raise KeyError(name)
+
+
+def coerce(value, kind, name):
+    # Converts a JSON argument to the Python type the driver expects for a
+    # parameter; NULL is allowed everywhere and left to the procedure to reject
+    if value is None:
+        return None
+    try:
+        if kind == "str":
+            if isinstance(value, (dict, list, bool)):
+                raise ValueError
+            return str(value)
+        if kind == "int":
+            if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+                raise ValueError
+            return int(str(value).strip()) if isinstance(value, str) else int(value)
+        if kind == "decimal":
+            if isinstance(value, (bool, dict, list)):
+                raise ValueError
+            return Decimal(str(value).strip())
+        if kind == "date":
+            return value if isinstance(value, date) else date.fromisoformat(str(value).strip())
+        if kind == "bool":
+            if isinstance(value, str):
+                if value.strip().lower() not in ("true", "false", "1", "0"):
+                    raise ValueError
+                return value.strip().lower() in ("true", "1")
+            return bool(value)
+        if kind == "json":
+            return value if isinstance(value, str) else json.dumps(value)
+    except (ValueError, TypeError, InvalidOperation):
+        pass
+    raise ValueError(f"{name} must be {KIND_NAMES[kind]}, got {value!r}")
+
+
+def coerce_args(name, args):
+    # args is a list in parameter order or a dict keyed by parameter name
+    params = signature(name)
+    if isinstance(args, dict):
+        unknown = set(args) - {param for param, kind in params}
+        if unknown:
+            raise ValueError(f"Unknown arguments for {name}: {', '.join(sorted(unknown))}")
+        args = [args.get(param) for param, kind in params]
+    if len(args) != len(params):
+        raise ValueError(f"{name} takes {len(params)} arguments, got {len(args)}")
+    return [coerce(value, kind, param) for value, (param, kind) in zip(args, params)]
+
+
+def run_call(conn, procedure, args, write=False, task=None, timer=None):
+    if task is not None:
+        task.connection_id = conn.connection_id
+    cursor = conn.cursor(buffered=True)
+    try:
+        cursor.callproc(procedure, list(args))
+        if timer is not None:
+            timer.server_done()
+        results = []
+        for result in cursor.stored_results():
+            rows = result.fetchall()
+            results.append(([i[0] for i in result.description], rows))
+            if timer is not None:
+                timer.add_rows(len(rows))
+        if write:
+            conn.commit()
+        if timer is not None:
+            timer.fetch_done()
+        return results
+    finally:
+        cursor.close()
+        if task is not None:
+            task.connection_id = None
+
+
+class MySQLBackend:
+    # Runs procedures and named statements straight against MySQL through a
+    # connection pool. service_client.ServiceClient offers the same methods
+    # over HTTP, so callers can use either.
+    #
+    # With prepared=True the lookups in PREPARED use the binary protocol: each
+    # connection keeps one prepared cursor per lookup, and the cursor only
+    # re-prepares when given a different statement, which these never are.
+    # The pool must be created with reset_session=False, as a session reset
+    # drops prepared statements.
+
+    def __init__(self, pool, prepared=False):
+        if prepared and pool.reset_session:
+            raise ValueError("Prepared mode needs a ConnectionPool with reset_session=False")
+        self.pool = pool
+        self.prepared = prepared
+        # underlying connection -> (its session's connection_id, {lookup:
+        # prepared cursor}). Weak keys let a connection the pool has thrown
+        # away take its cursors with it.
+        self.statements = weakref.WeakKeyDictionary()
+        self.statements_lock = threading.Lock()
+
+    def prepared_cursor(self, conn, name):
+        with self.statements_lock:
+            session, cursors = self.statements.get(conn._cnx, (None, None))
+            if session != conn.connection_id:
+                # The pool or a health check reopened the connection since
+                # these were prepared. Their statements died with the old
+                # session, and the new one reuses its statement ids, so drop
+                # the cursors without closing them on the server.
+                cursors = {}
+                self.statements[conn._cnx] = (conn.connection_id, cursors)
+        cursor = cursors.get(name)
+        if cursor is None:
+            cursor = cursors[name] = conn.cursor(prepared=True)
+        return cursor
+
+    def forget_statement(self, conn, name):
+        with self.statements_lock:
+            cursor = self.statements.get(conn._cnx, (None, {}))[1].pop(name, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+
+    def run_prepared(self, conn, name, args, task=None, timer=None):
+        if task is not None:
+            task.connection_id = conn.connection_id
+        try:
+            for attempt in range(2):
+                cursor = self.prepared_cursor(conn, name)
+                try:
+                    # The statement text is the same object every time, which
+                    # is what lets the cursor skip the prepare step
+                    cursor.execute(PREPARED[name], list(args))
+                    if timer is not None:
+                        timer.server_done()
+                    rows = cursor.fetchall()
+                    break
+                except mysql.connector.Error as err:
+                    self.forget_statement(conn, name)
+                    # A reconnect loses the session's statements; prepare again
+                    if attempt or err.errno != errorcode.ER_UNKNOWN_STMT_HANDLER:
+                        raise
+            if timer is not None:
+                timer.add_rows(len(rows))
+                timer.fetch_done()
+            return [([i[0] for i in cursor.description], rows)]
+        finally:
+            if task is not None:
+                task.connection_id = None
+
+    def ping(self):
+        with self.pool.connection() as conn:
+            conn.ping()
+
+    def call(self, procedure, args, write=False, task=None, timer=None):
+        # Returns every result set as (headers, rows); writes are committed.
+        # Writes are not retried: a lost connection leaves the outcome unknown
+        if self.prepared and procedure in PREPARED:
+            return self.pool.run(lambda conn: self.run_prepared(conn, procedure, args, task, timer))
+        return self.pool.run(lambda conn: run_call(conn, procedure, args, write, task, timer), retry=not write)
+
+    def call_batch(self, calls, task=None):
+        # Runs [(procedure, args, write)] one after another on a single pooled
+        # connection. Returns a list holding each call's results, or the
+        # exception it raised; a failed call does not stop the ones after it.
+        def run(conn):
+            outcomes = []
+            for procedure, args, write in calls:
+                if task is not None:
+                    task.check_cancelled()
+                try:
+                    outcomes.append(run_call(conn, procedure, args, write, task))
+                except mysql.connector.Error as err:
+                    if is_connection_error(err):
+                        raise
+                    conn.rollback()
+                    outcomes.append(err)
+            return outcomes
+
+        return self.pool.run(run, retry=False)
+
+    def stream(self, name, args, batch_size=FETCH_BATCH, task=None, timer=None):
+        # A generator of (headers, rows) batches, as streaming.py yields them
+        if self.prepared and name in PREPARED:
+            # Lookups return a handful of rows, so they are read in one go
+            return self.stream_prepared(name, args, batch_size, task, timer)
+        if name in STATEMENTS:
+            return stream_statement(self.pool, STATEMENTS[name][1], list(args), batch_size, task, timer)
+        return stream_procedure(self.pool, name, args, batch_size, task, timer)
+
+    def stream_prepared(self, name, args, batch_size, task, timer):
+        results = self.pool.run(lambda conn: self.run_prepared(conn, name, args, task, timer))
+        for headers, rows in results:
+            for start in range(0, len(rows), batch_size):
+                yield headers, rows[start:start + batch_size]
+
+    def kill_query(self, connection_id):
+        self.pool.kill_query(connection_id)
+
+    def close(self):
+        with self.statements_lock:
+            sessions = list(self.statements.values())
+            self.statements.clear()
+        for _, cursors in sessions:
+            for cursor in cursors.values():
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
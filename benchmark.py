@@ -0,0 +1,668 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import dispense
+from backend import MySQLBackend
+from datagen import has_surrogate_keys
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Keys sampled from the database for the operations to work on
+SAMPLE_SIZE = 1000
+
+# Tables whose sizes --sizes reports: the ones holding company and pharmacy keys
+SIZE_TABLES = ["PharmaceuticalCompany", "Drug", "Pharmacy", "Sells", "Contract"]
+
+
+def load_samples(pool, rng, size=SAMPLE_SIZE):
+    # Random keys spread over the whole table, picked by auto-increment id so
+    # sampling stays cheap on large tables. After surrogate_keys.sql the keys
+    # are read through its views, which keep the old columns, so the same
+    # run can be compared before and after the migration.
+    with pool.cursor() as cursor:
+        if has_surrogate_keys(cursor):
+            drug_table, sells_table, contract_table = "DrugView", "SellsView", "ContractView"
+        else:
+            drug_table, sells_table, contract_table = "Drug", "Sells", "Contract"
+
+        cursor.execute("SELECT (SELECT MAX(pres_id) FROM Prescription), (SELECT MAX(drug_id) FROM Drug)")
+        max_pres_id, max_drug_id = cursor.fetchone()
+        if not max_pres_id or not max_drug_id:
+            raise ValueError("No data to benchmark; run datagen.py first")
+
+        pres_ids = [rng.randint(1, max_pres_id) for _ in range(size)]
+        cursor.execute(
+            "SELECT pid, did, pres_date FROM Prescription WHERE pres_id IN "
+            f"({', '.join(['%s'] * len(pres_ids))})", pres_ids
+        )
+        prescriptions = cursor.fetchall()
+
+        drug_ids = [rng.randint(1, max_drug_id) for _ in range(size)]
+        cursor.execute(
+            f"SELECT ph_address, drug_id FROM {sells_table} WHERE drug_id IN "
+            f"({', '.join(['%s'] * len(drug_ids))})", drug_ids
+        )
+        sells = cursor.fetchall()
+
+        cursor.execute(
+            f"SELECT company_name FROM {drug_table} WHERE drug_id IN "
+            f"({', '.join(['%s'] * len(drug_ids))})", drug_ids
+        )
+        companies = sorted({row[0] for row in cursor.fetchall()})
+
+        pharmacies = sorted({row[0] for row in sells})
+        contracts = []
+        if pharmacies:
+            cursor.execute(
+                f"SELECT c.company_name, c.ph_address, p.pname FROM {contract_table} c "
+                "JOIN Pharmacy p ON p.address = c.ph_address WHERE c.ph_address IN "
+                f"({', '.join(['%s'] * len(pharmacies))})", pharmacies
+            )
+            contracts = cursor.fetchall()
+
+    if not prescriptions or not sells:
+        raise ValueError("Sampling found no prescriptions or stock; run datagen.py first")
+    return {
+        "prescriptions": prescriptions,
+        "sells": sells,
+        "pharmacies": pharmacies,
+        "companies": companies,
+        "contracts": contracts,
+    }
+
+
+# Each operation picks its arguments from the samples and returns
+# (procedure, args, is_write)
+
+def op_prescription_report(rng, samples):
+    pid, _, pres_date = rng.choice(samples["prescriptions"])
+    return "prescription_report", [pid, pres_date - timedelta(days=365), pres_date], False
+
+
+def op_print_pres_details(rng, samples):
+    pid, _, pres_date = rng.choice(samples["prescriptions"])
+    return "print_pres_details", [pid, pres_date], False
+
+
+def op_print_stock_position(rng, samples):
+    return "print_stock_position", [rng.choice(samples["pharmacies"])], False
+
+
+def op_print_patients_for_doctor(rng, samples):
+    _, did, _ = rng.choice(samples["prescriptions"])
+    return "print_patients_for_doctor", [did], False
+
+
+def op_drug_details(rng, samples):
+    return "drug_details", [rng.choice(samples["companies"])], False
+
+
+def op_print_pharmacy_contact(rng, samples):
+    return "print_pharmacy_contact", [rng.choice(samples["pharmacies"])], False
+
+
+def op_update_sells_entry(rng, samples):
+    ph_address, drug_id = rng.choice(samples["sells"])
+    return "update_sells_entry", [ph_address, drug_id, rng.randrange(1000), round(rng.uniform(1, 500), 2)], True
+
+
+def op_display_contract(rng, samples):
+    company, ph_address, pharmacy_name = rng.choice(samples["contracts"])
+    return "display_contract", [ph_address, pharmacy_name, company], False
+
+
+def op_update_contract_supervisor(rng, samples):
+    company, ph_address, _ = rng.choice(samples["contracts"])
+    return "update_contract_supervisor", [company, ph_address, f"Supervisor {rng.randrange(1000)}"], True
+
+
+# Name -> (operation, weight). Writes only change values, never row counts,
+# so repeated runs see the same data shape.
+OPERATIONS = {
+    "prescription_report": (op_prescription_report, 20),
+    "print_pres_details": (op_print_pres_details, 10),
+    "print_stock_position": (op_print_stock_position, 20),
+    "print_patients_for_doctor": (op_print_patients_for_doctor, 10),
+    "drug_details": (op_drug_details, 10),
+    "print_pharmacy_contact": (op_print_pharmacy_contact, 10),
+    "display_contract": (op_display_contract, 5),
+    "update_sells_entry": (op_update_sells_entry, 15),
+    "update_contract_supervisor": (op_update_contract_supervisor, 5),
+}
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def call_procedure(conn, procedure, args, is_write):
+    cursor = conn.cursor()
+    try:
+        cursor.callproc(procedure, args)
+        # Read every result set, as the GUI does
+        for result in cursor.stored_results():
+            result.fetchall()
+        if is_write:
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+class Benchmark:
+    def __init__(self, pool, samples, operations, threads=4, duration=30.0, warmup=5.0, seed=0):
+        self.pool = pool
+        self.samples = samples
+        self.operations = operations
+        self.threads = threads
+        self.duration = duration
+        self.warmup = warmup
+        self.seed = seed
+        self.latencies = {name: [] for name in operations}
+        self.errors = {name: 0 for name in operations}
+        self.lock = threading.Lock()
+
+    def worker(self, index, measure_from, stop_at):
+        rng = random.Random(f"{self.seed}:{index}")
+        names = list(self.operations)
+        weights = [self.operations[name][1] for name in names]
+        latencies = {name: [] for name in names}
+        errors = {name: 0 for name in names}
+
+        with self.pool.connection() as conn:
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    break
+                name = rng.choices(names, weights)[0]
+                procedure, args, is_write = self.operations[name][0](rng, self.samples)
+                began = time.perf_counter()
+                try:
+                    call_procedure(conn, procedure, args, is_write)
+                    failed = False
+                except Exception:
+                    conn.rollback()
+                    failed = True
+                elapsed = time.perf_counter() - began
+                if began >= measure_from:
+                    if failed:
+                        errors[name] += 1
+                    else:
+                        latencies[name].append(elapsed)
+
+        with self.lock:
+            for name in names:
+                self.latencies[name].extend(latencies[name])
+                self.errors[name] += errors[name]
+
+    def run(self):
+        measure_from = time.perf_counter() + self.warmup
+        stop_at = measure_from + self.duration
+        workers = [
+            threading.Thread(target=self.worker, args=(i, measure_from, stop_at))
+            for i in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return self.summary()
+
+    def summary(self):
+        operations = {}
+        total = 0
+        for name, values in self.latencies.items():
+            values.sort()
+            total += len(values)
+            operations[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "p50_ms": self.ms(percentile(values, 0.50)),
+                "p95_ms": self.ms(percentile(values, 0.95)),
+                "p99_ms": self.ms(percentile(values, 0.99)),
+                "ops_per_sec": len(values) / self.duration,
+            }
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        return {
+            "threads": self.threads,
+            "duration": self.duration,
+            "operations": operations,
+            "total": {
+                "count": total,
+                "errors": sum(self.errors.values()),
+                "p50_ms": self.ms(percentile(everything, 0.50)),
+                "p95_ms": self.ms(percentile(everything, 0.95)),
+                "p99_ms": self.ms(percentile(everything, 0.99)),
+                "ops_per_sec": total / self.duration,
+            },
+        }
+
+    @staticmethod
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 3)
+
+
+# The lookups compared by --compare-protocols, with their argument sample
+LOOKUPS = {
+    "print_pharmacy_contact": "pharmacies",
+    "print_company_contact": "companies",
+    "drug_details": "companies",
+}
+
+# CPU and elapsed time the server spent on this connection's statements, in
+# picoseconds. Statements run inside a procedure are left out, as the CALL
+# they belong to already includes them. CPU_TIME needs MySQL 8.0.28 or later.
+SERVER_TIME_QUERY = """
+    SELECT SUM(SUM_CPU_TIME), SUM(SUM_TIMER_WAIT)
+    FROM performance_schema.events_statements_summary_by_thread_by_event_name
+    WHERE THREAD_ID = PS_CURRENT_THREAD_ID()
+    AND EVENT_NAME NOT LIKE 'statement/sp/%'
+"""
+SERVER_WAIT_QUERY = SERVER_TIME_QUERY.replace("SUM(SUM_CPU_TIME)", "NULL")
+
+
+def server_time(conn):
+    # (cpu, elapsed) so far for this connection, or (None, None) without
+    # access to performance_schema
+    cursor = conn.cursor()
+    try:
+        for query in (SERVER_TIME_QUERY, SERVER_WAIT_QUERY):
+            try:
+                cursor.execute(query)
+                cpu, elapsed = cursor.fetchone()
+                return (None if cpu is None else int(cpu)), (None if elapsed is None else int(elapsed))
+            except mysql.connector.Error as err:
+                if err.errno != errorcode.ER_BAD_FIELD_ERROR:
+                    return None, None
+        return None, None
+    finally:
+        cursor.close()
+
+
+def compare_protocols(pool, samples, iterations=2000, seed=0):
+    # Runs the same sequence of hot lookups through callproc (text protocol)
+    # and as prepared statements, each on one connection, and returns the
+    # per-call cost of each: wall time, client CPU and server CPU/time
+    rng = random.Random(f"{seed}:protocols")
+    calls = []
+    for _ in range(iterations):
+        procedure = rng.choice(sorted(LOOKUPS))
+        calls.append((procedure, [rng.choice(samples[LOOKUPS[procedure]])]))
+
+    backend = MySQLBackend(pool, prepared=True)
+    modes = {
+        "text": lambda conn, procedure, args: call_procedure(conn, procedure, args, False),
+        "prepared": lambda conn, procedure, args: backend.run_prepared(conn, procedure, args),
+    }
+    results = {}
+    for mode, run in modes.items():
+        with pool.connection() as conn:
+            # Warm up: the prepared mode's one-off prepares are not measured
+            for procedure, sample in LOOKUPS.items():
+                run(conn, procedure, [rng.choice(samples[sample])])
+            conn.rollback()
+            server_cpu_before, server_wait_before = server_time(conn)
+            wall_before = time.perf_counter()
+            cpu_before = time.process_time()
+            for procedure, args in calls:
+                run(conn, procedure, args)
+            client_cpu = time.process_time() - cpu_before
+            wall = time.perf_counter() - wall_before
+            server_cpu_after, server_wait_after = server_time(conn)
+            conn.rollback()
+
+        def per_call_us(before, after, unit):
+            if before is None or after is None:
+                return None
+            return round((after - before) / unit / iterations * 1e6, 2)
+
+        results[mode] = {
+            "calls": iterations,
+            "calls_per_sec": round(iterations / wall, 1),
+            "wall_us": round(wall / iterations * 1e6, 2),
+            "client_cpu_us": round(client_cpu / iterations * 1e6, 2),
+            "server_cpu_us": per_call_us(server_cpu_before, server_cpu_after, 1e12),
+            "server_time_us": per_call_us(server_wait_before, server_wait_after, 1e12),
+        }
+    return results
+
+
+def print_comparison(results):
+    columns = ["calls_per_sec", "wall_us", "client_cpu_us", "server_cpu_us", "server_time_us"]
+    print(f"{'mode':<10} " + " ".join(f"{column:>15}" for column in columns))
+    for mode, stats in results.items():
+        print(f"{mode:<10} " + " ".join(
+            f"{'-' if stats[column] is None else stats[column]:>15}" for column in columns
+        ))
+    text, prepared = results["text"], results["prepared"]
+    for column in columns[1:]:
+        if text[column] and prepared[column] is not None:
+            print(f"prepared saves {100 * (1 - prepared[column] / text[column]):.1f}% of {column}")
+
+
+# --contention: pharmacies every thread dispenses at, busiest first; one puts
+# all the threads on the same Sells and PharmacyInventory rows
+CONTENTION_PHARMACIES = 1
+# Prescriptions sampled per pharmacy
+CONTENTION_PRESCRIPTIONS = 200
+# Stock the sampled pharmacies are raised to first, so no run is cut short by
+# running out. Only stock values change, never row counts.
+CONTENTION_STOCK = 1000000
+
+
+def load_contention_samples(pool, pharmacies=CONTENTION_PHARMACIES, size=CONTENTION_PRESCRIPTIONS,
+                            stock=CONTENTION_STOCK):
+    # (pres_id, pid, did, pres_date, address) of prescriptions every drug of
+    # which is sold at one of the pharmacies with the most drugs
+    samples = []
+    with pool.cursor(commit=True) as cursor:
+        cursor.execute(
+            "SELECT p.ph_id, p.address FROM Pharmacy p "
+            "JOIN PharmacyInventory pi ON pi.ph_id = p.ph_id "
+            "WHERE p.is_active ORDER BY pi.drug_count DESC LIMIT %s", (pharmacies,)
+        )
+        for ph_id, address in cursor.fetchall():
+            cursor.execute(
+                "SELECT pr.pres_id, pr.pid, pr.did, pr.pres_date FROM Prescription pr JOIN ("
+                "SELECT cd.pres_id FROM Sells s JOIN Contains_drug cd ON cd.drug_id = s.drug_id "
+                "WHERE s.ph_id = %s GROUP BY cd.pres_id "
+                "HAVING COUNT(*) = (SELECT COUNT(*) FROM Contains_drug c2 WHERE c2.pres_id = cd.pres_id) "
+                "LIMIT %s) covered ON covered.pres_id = pr.pres_id", (ph_id, size)
+            )
+            samples += [row + (address,) for row in cursor.fetchall()]
+            cursor.execute("UPDATE Sells SET stock = GREATEST(stock, %s) WHERE ph_id = %s", (stock, ph_id))
+    if not samples:
+        raise ValueError("No prescription can be filled at the busiest pharmacies; run datagen.py first")
+    return samples
+
+
+class Contention:
+    # Dispenses the sampled prescriptions from every thread at once through
+    # dispense.dispense, deadlock retries included, and counts the aborts.
+    # A prescription is filled only once, so each thread has its own share
+    # of the samples and clears a prescription's PrescriptionDispensed row
+    # before dispensing it again, outside the timed call.
+    def __init__(self, pool, samples, threads=4, duration=30.0, warmup=5.0, seed=0):
+        self.pool = pool
+        self.backend = MySQLBackend(pool)
+        self.samples = samples
+        self.threads = threads
+        self.duration = duration
+        self.warmup = warmup
+        self.seed = seed
+        self.latencies = []
+        # Calls rolled back by a deadlock or lock wait timeout, retried or not
+        self.aborts = 0
+        # Dispenses still aborted after the last retry
+        self.gave_up = 0
+        # Dispenses failed for any other reason, e.g. a signalled check
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def worker(self, index, measure_from, stop_at):
+        rng = random.Random(f"{self.seed}:contention:{index}")
+        own = self.samples[index::self.threads] or self.samples
+        latencies = []
+        aborts = gave_up = failed = 0
+
+        while True:
+            if time.perf_counter() >= stop_at:
+                break
+            pres_id, *args = rng.choice(own)
+            with self.pool.cursor(commit=True) as cursor:
+                cursor.execute("DELETE FROM PrescriptionDispensed WHERE pres_id = %s", (pres_id,))
+            began = time.perf_counter()
+            retried = []
+            outcome = None
+            try:
+                dispense.dispense(self.backend, *args, on_retry=lambda err, attempt: retried.append(attempt))
+            except mysql.connector.Error as err:
+                outcome = err
+            if began < measure_from:
+                continue
+            if outcome is None:
+                latencies.append(time.perf_counter() - began)
+            elif dispense.is_retryable(outcome):
+                # The last attempt was aborted too
+                retried.append(None)
+                gave_up += 1
+            else:
+                failed += 1
+            aborts += len(retried)
+
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.aborts += aborts
+            self.gave_up += gave_up
+            self.failed += failed
+
+    def run(self):
+        measure_from = time.perf_counter() + self.warmup
+        stop_at = measure_from + self.duration
+        workers = [
+            threading.Thread(target=self.worker, args=(i, measure_from, stop_at))
+            for i in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return self.summary()
+
+    def summary(self):
+        self.latencies.sort()
+        dispensed = len(self.latencies)
+        attempts = dispensed + self.failed + self.aborts
+        return {
+            "threads": self.threads,
+            "duration": self.duration,
+            "pharmacies": len({sample[4] for sample in self.samples}),
+            "dispensed": dispensed,
+            "dispensed_per_sec": dispensed / self.duration,
+            "attempts": attempts,
+            "aborts": self.aborts,
+            "abort_rate": self.aborts / attempts if attempts else None,
+            "gave_up": self.gave_up,
+            "failed": self.failed,
+            "p50_ms": Benchmark.ms(percentile(self.latencies, 0.50)),
+            "p95_ms": Benchmark.ms(percentile(self.latencies, 0.95)),
+            "p99_ms": Benchmark.ms(percentile(self.latencies, 0.99)),
+        }
+
+
+def print_contention(summary):
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}"
+    print(f"{summary['threads']} threads dispensing at {summary['pharmacies']} pharmacies, "
+          f"{summary['duration']:.0f}s measured")
+    print(f"dispensed {summary['dispensed']} ({summary['dispensed_per_sec']:.1f}/s), "
+          f"p50 {fmt(summary['p50_ms'])} ms, p95 {fmt(summary['p95_ms'])} ms, p99 {fmt(summary['p99_ms'])} ms")
+    rate = "-" if summary["abort_rate"] is None else f"{100 * summary['abort_rate']:.2f}%"
+    print(f"{summary['attempts']} attempts, {summary['aborts']} aborted by deadlock or lock wait ({rate}), "
+          f"{summary['gave_up']} gave up after retrying, {summary['failed']} failed otherwise")
+
+
+def megabytes(size):
+    return None if size is None else round(int(size) / 2 ** 20, 2)
+
+
+def table_sizes(pool, tables=SIZE_TABLES):
+    # {table: {rows, data_mb, index_mb, indexes: {index: mb}}}. ANALYZE TABLE
+    # first refreshes the statistics, and the sizes information_schema caches.
+    # Per-index sizes come from mysql.innodb_index_stats and are left empty
+    # without read access to it.
+    names = ", ".join(["%s"] * len(tables))
+    sizes = {}
+    with pool.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({names})", tables
+        )
+        for table, rows, data, index in cursor.fetchall():
+            sizes[table] = {"rows": rows, "data_mb": megabytes(data), "index_mb": megabytes(index), "indexes": {}}
+        try:
+            cursor.execute(
+                "SELECT table_name, index_name, stat_value * @@innodb_page_size FROM mysql.innodb_index_stats "
+                f"WHERE database_name = DATABASE() AND stat_name = 'size' AND table_name IN ({names})", tables
+            )
+            for table, index, size in cursor.fetchall():
+                if table in sizes:
+                    sizes[table]["indexes"][index] = megabytes(size)
+        except mysql.connector.Error:
+            pass
+    return sizes
+
+
+def print_sizes(sizes):
+    print(f"{'table / index':<40} {'rows':>10} {'data MB':>10} {'index MB':>10}")
+    for table, stats in sizes.items():
+        print(f"{table:<40} {stats['rows']:>10} {stats['data_mb']:>10.2f} {stats['index_mb']:>10.2f}")
+        for index, size in sorted(stats["indexes"].items()):
+            print(f"  {index:<38} {'':>10} {size:>10.2f}")
+
+
+def change(before, after):
+    if before is None or after is None:
+        return "-"
+    if not before:
+        return "-" if not after else "new"
+    return f"{100 * (after / before - 1):+.1f}%"
+
+
+def print_runs_comparison(before, after):
+    # Side by side latencies and sizes of two --json results, e.g. taken
+    # before and after a schema change
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}"
+
+    print(f"{'operation':<28} {'p50 before':>11} {'p50 after':>10} {'change':>8} "
+          f"{'p95 before':>11} {'p95 after':>10} {'change':>8}")
+    names = list(before["operations"]) + [n for n in after["operations"] if n not in before["operations"]]
+    for name in names + ["TOTAL"]:
+        old = before["total"] if name == "TOTAL" else before["operations"].get(name, {})
+        new = after["total"] if name == "TOTAL" else after["operations"].get(name, {})
+        print(f"{name:<28} {fmt(old.get('p50_ms')):>11} {fmt(new.get('p50_ms')):>10} "
+              f"{change(old.get('p50_ms'), new.get('p50_ms')):>8} {fmt(old.get('p95_ms')):>11} "
+              f"{fmt(new.get('p95_ms')):>10} {change(old.get('p95_ms'), new.get('p95_ms')):>8}")
+
+    if "sizes" not in before or "sizes" not in after:
+        return
+    print()
+    print(f"{'table / index':<40} {'MB before':>10} {'MB after':>10} {'change':>8}")
+    for table in before["sizes"]:
+        old, new = before["sizes"][table], after["sizes"].get(table)
+        if new is None:
+            continue
+        for label, key in (("data", "data_mb"), ("indexes", "index_mb")):
+            print(f"{table + ' ' + label:<40} {fmt(old[key]):>10} {fmt(new[key]):>10} "
+                  f"{change(old[key], new[key]):>8}")
+        indexes = list(old["indexes"]) + [i for i in new["indexes"] if i not in old["indexes"]]
+        for index in indexes:
+            old_size, new_size = old["indexes"].get(index), new["indexes"].get(index)
+            print(f"  {index:<38} {fmt(old_size):>10} {fmt(new_size):>10} {change(old_size, new_size):>8}")
+
+
+def print_summary(summary):
+    print(f"{summary['threads']} threads, {summary['duration']:.0f}s measured")
+    print(f"{'operation':<28} {'count':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    rows = list(summary["operations"].items()) + [("TOTAL", summary["total"])]
+    for name, stats in rows:
+        def fmt(value):
+            return "-" if value is None else f"{value:.2f}"
+        print(f"{name:<28} {stats['count']:>8} {stats['errors']:>7} {fmt(stats['p50_ms']):>9} "
+              f"{fmt(stats['p95_ms']):>9} {fmt(stats['p99_ms']):>9} {stats['ops_per_sec']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a weighted mix of CRUD and report procedures and report latency percentiles"
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to measure")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds to run before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=sorted(OPERATIONS), help="Run only these operations")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--compare-protocols", type=int, metavar="CALLS",
+                        help="Instead of the mix, time CALLS hot lookups through callproc and as "
+                             "prepared statements")
+    parser.add_argument("--contention", action="store_true",
+                        help="Instead of the mix, dispense prescriptions at the same pharmacies from every "
+                             "thread and report throughput and the deadlock abort rate")
+    parser.add_argument("--hot-pharmacies", type=int, default=CONTENTION_PHARMACIES,
+                        help="Pharmacies --contention dispenses at")
+    parser.add_argument("--sizes", action="store_true",
+                        help="Also report the size of the tables holding company and pharmacy keys")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Instead of running, compare two results written by --json")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                runs.append(json.load(f))
+        print_runs_comparison(*runs)
+        return 0
+
+    operations = {name: OPERATIONS[name] for name in (args.only or OPERATIONS)}
+    comparing = args.compare_protocols is not None
+    # Sessions are kept, not reset, so the prepared mode keeps its statements
+    pool = ConnectionPool(DB_CONFIG, pool_size=min(args.threads + 1, 32), reset_session=not comparing)
+
+    if args.contention:
+        try:
+            samples = load_contention_samples(pool, args.hot_pharmacies)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        summary = Contention(pool, samples, args.threads, args.duration, args.warmup, args.seed).run()
+        print_contention(summary)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        return 0
+    try:
+        samples = load_samples(pool, random.Random(args.seed))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if comparing:
+        results = compare_protocols(pool, samples, args.compare_protocols, args.seed)
+        print_comparison(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 0
+    if not samples["contracts"]:
+        operations.pop("display_contract", None)
+        operations.pop("update_contract_supervisor", None)
+
+    summary = Benchmark(pool, samples, operations, args.threads, args.duration, args.warmup, args.seed).run()
+    print_summary(summary)
+    if args.sizes:
+        summary["sizes"] = table_sizes(pool)
+        print()
+        print_sizes(summary["sizes"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
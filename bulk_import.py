@@ -0,0 +1,364 @@
+import argparse
+import csv
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Rows validated and inserted per transaction
+CHUNK_SIZE = 1000
+
+IMPORT_TABLES = ["Drug", "Sells", "Patient"]
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path):
+    # Streams (line number, row dict, parse error) without loading the whole file
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_no, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_no, None, "Each line must be a JSON object"
+                    continue
+                yield line_no, row, None
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row, None
+
+
+def chunked(rows, size):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_text(row, field, max_length, required=True):
+    value = row.get(field)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"{field} is required")
+        return None
+    if len(value) > max_length:
+        raise RowError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def get_int(row, field):
+    value = get_text(row, field, 20)
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"{field} must be a whole number")
+
+
+def get_decimal(row, field):
+    value = get_text(row, field, 20)
+    try:
+        return Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"{field} must be a number")
+
+
+# Row cleaners mirror the checks done by add_drug, add_sells_entry and add_patient
+
+def clean_drug(row):
+    return (
+        get_text(row, "trade_name", 100),
+        get_text(row, "formula", 200),
+        get_text(row, "company_name", 100)
+    )
+
+
+def clean_sells(row):
+    ph_address = get_text(row, "ph_address", 200)
+    drug_id = get_int(row, "drug_id")
+    stock = get_int(row, "stock")
+    price = get_decimal(row, "price")
+    if stock < 0:
+        raise RowError("Stock cannot be negative")
+    if price <= 0:
+        raise RowError("Price must be positive")
+    return (ph_address, drug_id, stock, price)
+
+
+def clean_patient(row):
+    p_id = get_text(row, "paadharid", 12)
+    p_name = get_text(row, "p_name", 100)
+    age = get_int(row, "age")
+    address = get_text(row, "address", 100)
+    primary_id = get_text(row, "p_daadharid", 12)
+    additional_id = get_text(row, "additional_doctor_id", 12, required=False)
+    if age < 0:
+        raise RowError("Age cannot be negative")
+    return (p_id, p_name, age, address, primary_id, additional_id)
+
+
+def fold(value):
+    # The schema uses case-insensitive collations, so compare keys the same way
+    return value.casefold() if isinstance(value, str) else value
+
+
+def placeholders(count):
+    return ", ".join(["%s"] * count)
+
+
+def existing_values(cursor, table, column, values, condition="TRUE"):
+    # condition narrows the rows that count, e.g. to those not being purged
+    values = list(set(values))
+    if not values:
+        return set()
+    cursor.execute(
+        f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders(len(values))}) AND {condition}",
+        values
+    )
+    return {fold(row[0]) for row in cursor.fetchall()}
+
+
+def existing_ids(cursor, table, column, id_column, values):
+    # {folded key: surrogate id} for the keys in values that exist
+    values = list(set(values))
+    if not values:
+        return {}
+    cursor.execute(
+        f"SELECT {column}, {id_column} FROM {table} WHERE {column} IN ({placeholders(len(values))})",
+        values
+    )
+    return {fold(row[0]): row[1] for row in cursor.fetchall()}
+
+
+def existing_pairs(cursor, table, first, second, pairs):
+    pairs = list(set(pairs))
+    if not pairs:
+        return set()
+    tuples = ", ".join(["(%s, %s)"] * len(pairs))
+    params = [value for pair in pairs for value in pair]
+    cursor.execute(f"SELECT {first}, {second} FROM {table} WHERE ({first}, {second}) IN ({tuples})", params)
+    return {(fold(row[0]), fold(row[1])) for row in cursor.fetchall()}
+
+
+# Set-based checks: one query per rule per chunk instead of one probe per row.
+# Each returns {index: error} for the rows that fail. Like the procedures,
+# they treat a doctor, pharmacy or company being purged (and that company's
+# drugs) as not existing.
+def check_drugs(cursor, rows):
+    errors = {}
+    companies = existing_values(cursor, "PharmaceuticalCompany", "company_name", [r[2] for r in rows], "is_active")
+    duplicates = existing_pairs(cursor, "DrugView", "trade_name", "company_name", [(r[0], r[2]) for r in rows])
+    seen = set()
+    for i, (trade_name, formula, company_name) in enumerate(rows):
+        key = (fold(trade_name), fold(company_name))
+        if fold(company_name) not in companies:
+            errors[i] = "Pharmaceutical company does not exist."
+        elif key in duplicates or key in seen:
+            errors[i] = "This drug already exists for this company."
+        seen.add(key)
+    return errors
+
+
+def check_sells(cursor, rows):
+    errors = {}
+    pharmacies = existing_values(cursor, "Pharmacy", "address", [r[0] for r in rows], "is_active")
+    drugs = existing_values(cursor, "Drug d JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id",
+                            "d.drug_id", [r[1] for r in rows], "pc.is_active")
+    duplicates = existing_pairs(cursor, "SellsView", "ph_address", "drug_id", [(r[0], r[1]) for r in rows])
+    seen = set()
+    for i, (ph_address, drug_id, stock, price) in enumerate(rows):
+        key = (fold(ph_address), drug_id)
+        if fold(ph_address) not in pharmacies:
+            errors[i] = "Pharmacy does not exist"
+        elif drug_id not in drugs:
+            errors[i] = "Drug does not exist"
+        elif key in duplicates or key in seen:
+            errors[i] = "This drug is already being sold at this pharmacy."
+        seen.add(key)
+    return errors
+
+
+def check_patients(cursor, rows):
+    errors = {}
+    doctor_ids = [r[4] for r in rows] + [r[5] for r in rows if r[5]]
+    doctors = existing_values(cursor, "Doctor", "daadharid", doctor_ids, "is_active")
+    patients = existing_values(cursor, "Patient", "paadharid", [r[0] for r in rows])
+    seen = set()
+    for i, row in enumerate(rows):
+        p_id, primary_id, additional_id = fold(row[0]), fold(row[4]), fold(row[5])
+        if primary_id not in doctors:
+            errors[i] = "Primary physician does not exist."
+        elif additional_id and additional_id not in doctors:
+            errors[i] = "Additional doctor does not exist."
+        elif p_id in patients or p_id in seen:
+            errors[i] = "Patient already exists."
+        seen.add(p_id)
+    return errors
+
+
+# Rows name their company or pharmacy; the tables store its surrogate id. A
+# key removed since the check leaves a NULL id, which fails the insert.
+
+def insert_drugs(cursor, rows):
+    companies = existing_ids(cursor, "PharmaceuticalCompany", "company_name", "company_id", [r[2] for r in rows])
+    cursor.executemany(
+        "INSERT INTO Drug(trade_name, formula, company_id) VALUES (%s, %s, %s)",
+        [(trade_name, formula, companies.get(fold(company_name))) for trade_name, formula, company_name in rows]
+    )
+
+
+def insert_sells(cursor, rows):
+    pharmacies = existing_ids(cursor, "Pharmacy", "address", "ph_id", [r[0] for r in rows])
+    cursor.executemany(
+        "INSERT INTO Sells(ph_id, drug_id, stock, price) VALUES (%s, %s, %s, %s)",
+        [(pharmacies.get(fold(ph_address)), drug_id, stock, price) for ph_address, drug_id, stock, price in rows]
+    )
+
+
+def insert_patients(cursor, rows):
+    cursor.executemany(
+        "INSERT INTO Patient(paadharid, p_name, age, address, p_daadharid) VALUES (%s, %s, %s, %s, %s)",
+        [row[:5] for row in rows]
+    )
+    # add_patient relies on the ensure_primary_physician_treats trigger for the
+    # primary physician; IGNORE keeps this correct whether or not it is installed
+    treats = [(row[0], row[4]) for row in rows]
+    treats += [(row[0], row[5]) for row in rows if row[5] and row[5] != row[4]]
+    cursor.executemany("INSERT IGNORE INTO Treats(pid, did) VALUES (%s, %s)", treats)
+
+
+IMPORTERS = {
+    "Drug": (clean_drug, check_drugs, insert_drugs),
+    "Sells": (clean_sells, check_sells, insert_sells),
+    "Patient": (clean_patient, check_patients, insert_patients),
+}
+
+
+class ErrorReport:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["line", "error", "row"])
+        self.count = 0
+
+    def add(self, line_no, error, row):
+        self.writer.writerow([line_no, error, json.dumps(row, default=str) if row is not None else ""])
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def load_chunk(conn, table, chunk, report):
+    clean, check, insert = IMPORTERS[table]
+
+    valid = []
+    for line_no, row, error in chunk:
+        if error is None:
+            try:
+                valid.append((line_no, row, clean(row)))
+                continue
+            except RowError as e:
+                error = str(e)
+        report.add(line_no, error, row)
+
+    if not valid:
+        return 0
+
+    cursor = conn.cursor()
+    try:
+        errors = check(cursor, [values for _, _, values in valid])
+        rows = []
+        for i, (line_no, row, values) in enumerate(valid):
+            if i in errors:
+                report.add(line_no, errors[i], row)
+            else:
+                rows.append((line_no, row, values))
+
+        if not rows:
+            conn.rollback()
+            return 0
+
+        try:
+            insert(cursor, [values for _, _, values in rows])
+            conn.commit()
+            return len(rows)
+        except mysql.connector.Error:
+            conn.rollback()
+
+        # Something changed between the check and the insert (or a constraint we
+        # do not pre-check fired); fall back to one transaction per row so the
+        # error report can name the offending lines
+        loaded = 0
+        for line_no, row, values in rows:
+            try:
+                insert(cursor, [values])
+                conn.commit()
+                loaded += 1
+            except mysql.connector.Error as err:
+                conn.rollback()
+                report.add(line_no, str(err), row)
+        return loaded
+    finally:
+        cursor.close()
+
+
+def import_file(pool, table, path, error_path=None, chunk_size=CHUNK_SIZE, progress=None, should_stop=None):
+    if table not in IMPORTERS:
+        raise ValueError(f"Bulk import is not supported for {table}")
+
+    report = ErrorReport(error_path or f"{path}.errors.csv")
+    loaded = 0
+    try:
+        for chunk in chunked(read_rows(path), chunk_size):
+            if should_stop:
+                should_stop()
+            with pool.connection() as conn:
+                loaded += load_chunk(conn, table, chunk, report)
+            if progress:
+                progress(loaded, report.count)
+    finally:
+        report.close()
+
+    return {"loaded": loaded, "rejected": report.count, "error_report": report.path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load Drug, Sells or Patient rows from CSV or JSONL")
+    parser.add_argument("table", choices=IMPORT_TABLES)
+    parser.add_argument("path", help="CSV file with a header row, or JSONL with one object per line")
+    parser.add_argument("--errors", help="Where to write the per-row error report (default: <path>.errors.csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(DB_CONFIG, pool_size=1)
+
+    def progress(loaded, rejected):
+        print(f"Loaded {loaded} rows, rejected {rejected}", file=sys.stderr)
+
+    result = import_file(pool, args.table, args.path, args.errors, args.chunk_size, progress)
+    print(f"Loaded {result['loaded']} rows into {args.table}; "
+          f"{result['rejected']} rejected (see {result['error_report']})")
+    return 1 if result["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
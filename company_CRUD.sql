@@ -32,7 +32,14 @@ BEGIN
     ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Company does not exist';
     END IF;
-    
+
+    -- A purge job (purge.sql) finds the company by its name until it is gone
+    IF EXISTS (
+        SELECT 1 FROM PharmaceuticalCompany WHERE company_name = p_old_name AND NOT is_active
+    ) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Company is being purged';
+    END IF;
+
     -- If new name is different, check it doesn't already exist
     IF p_old_name != p_new_name AND EXISTS (
         SELECT 1 FROM PharmaceuticalCompany WHERE company_name = p_new_name
@@ -48,18 +55,8 @@ BEGIN
         phone_number = p_new_phone
     WHERE company_name = p_old_name;
     
-    -- If name changed, update related tables
-    IF p_old_name != p_new_name THEN
-        -- Update Drug table
-        UPDATE Drug
-        SET company_name = p_new_name
-        WHERE company_name = p_old_name;
-        
-        -- Update Contract table
-        UPDATE Contract
-        SET company_name = p_new_name
-        WHERE company_name = p_old_name;
-    END IF;
+    -- Drug and Contract refer to the company by company_id, so a rename
+    -- touches only this row
     
     COMMIT;
     
@@ -81,8 +78,9 @@ BEGIN
     START TRANSACTION;
     
     -- Delete from Contract
-    DELETE FROM Contract
-    WHERE company_name = p_company_name;
+    DELETE c FROM Contract c
+    JOIN PharmaceuticalCompany pc ON pc.company_id = c.company_id
+    WHERE pc.company_name = p_company_name;
     
     -- Delete the company (will cascade to Drug and then to Contains_drug and Sells)
     DELETE FROM PharmaceuticalCompany
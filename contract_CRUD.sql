@@ -8,13 +8,20 @@ CREATE PROCEDURE add_contract(
     IN p_supervisor VARCHAR(100)
 )
 BEGIN
+    DECLARE v_company_id INT;
+    DECLARE v_ph_id INT;
+    
     -- Check that company exists
-    IF NOT EXISTS (SELECT 1 FROM PharmaceuticalCompany WHERE company_name = p_company_name) THEN
+    SELECT company_id INTO v_company_id FROM PharmaceuticalCompany WHERE company_name = p_company_name AND is_active;
+    
+    IF v_company_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmaceutical company does not exist.';
     END IF;
     
     -- Check that pharmacy exists
-    IF NOT EXISTS (SELECT 1 FROM Pharmacy WHERE address = p_pharmacy_address) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address AND is_active;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist.';
     END IF;
     
@@ -24,13 +31,13 @@ BEGIN
     END IF;
     
     -- Check if contract already exists
-    IF EXISTS (SELECT 1 FROM Contract WHERE company_name = p_company_name AND ph_address = p_pharmacy_address) THEN
+    IF EXISTS (SELECT 1 FROM Contract WHERE company_id = v_company_id AND ph_id = v_ph_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'A contract already exists between this company and pharmacy.';
     END IF;
     
     -- Insert contract
-    INSERT INTO Contract(company_name, ph_address, content, start_date, end_date, supervisor)
-    VALUES (p_company_name, p_pharmacy_address, p_content, p_start_date, p_end_date, p_supervisor);
+    INSERT INTO Contract(company_id, ph_id, content, start_date, end_date, supervisor)
+    VALUES (v_company_id, v_ph_id, p_content, p_start_date, p_end_date, p_supervisor);
     
     SELECT CONCAT('Contract between ', p_company_name, ' and pharmacy at ', p_pharmacy_address, ' added successfully') AS result;
 END$$
@@ -47,9 +54,15 @@ CREATE PROCEDURE update_contract(
     IN p_supervisor VARCHAR(100)
 )
 BEGIN
+    DECLARE v_company_id INT;
+    DECLARE v_ph_id INT;
+    
+    SELECT company_id INTO v_company_id FROM PharmaceuticalCompany WHERE company_name = p_company_name;
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
     IF NOT EXISTS (
         SELECT 1 FROM Contract
-        WHERE company_name = p_company_name AND ph_address = p_pharmacy_address
+        WHERE company_id = v_company_id AND ph_id = v_ph_id
     ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Contract not found.';
     END IF;
@@ -63,7 +76,7 @@ BEGIN
         start_date = p_start_date,
         end_date = p_end_date,
         supervisor = p_supervisor
-    WHERE company_name = p_company_name AND ph_address = p_pharmacy_address;
+    WHERE company_id = v_company_id AND ph_id = v_ph_id;
     
     SELECT CONCAT('Contract between ', p_company_name, ' and pharmacy at ', p_pharmacy_address, ' updated successfully') AS result;
 END$$
@@ -77,16 +90,22 @@ CREATE PROCEDURE update_contract_supervisor(
     IN p_new_supervisor VARCHAR(100)
 )
 BEGIN
+    DECLARE v_company_id INT;
+    DECLARE v_ph_id INT;
+    
+    SELECT company_id INTO v_company_id FROM PharmaceuticalCompany WHERE company_name = p_company_name;
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
     -- Check if contract exists
     IF NOT EXISTS (SELECT 1 FROM Contract
-    WHERE company_name = p_company_name AND ph_address = p_pharmacy_address) THEN
+    WHERE company_id = v_company_id AND ph_id = v_ph_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Contract does not exist.';
     END IF;
     
     -- Update supervisor
     UPDATE Contract
     SET supervisor = p_new_supervisor
-    WHERE company_name = p_company_name AND ph_address = p_pharmacy_address;
+    WHERE company_id = v_company_id AND ph_id = v_ph_id;
     
     SELECT CONCAT('Supervisor for contract between ', p_company_name, ' and pharmacy at ', p_pharmacy_address, ' updated to ', p_new_supervisor) AS result;
 END$$
@@ -99,14 +118,20 @@ CREATE PROCEDURE delete_contract(
     IN p_pharmacy_address VARCHAR(200)
 )
 BEGIN
+    DECLARE v_company_id INT;
+    DECLARE v_ph_id INT;
+    
+    SELECT company_id INTO v_company_id FROM PharmaceuticalCompany WHERE company_name = p_company_name;
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
     IF NOT EXISTS (SELECT 1 FROM Contract 
-    WHERE company_name = p_company_name AND ph_address = p_pharmacy_address) THEN
+    WHERE company_id = v_company_id AND ph_id = v_ph_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Contract does not exist.';
     END IF;
     
     -- Delete the contract
     DELETE FROM Contract
-    WHERE company_name = p_company_name AND ph_address = p_pharmacy_address;
+    WHERE company_id = v_company_id AND ph_id = v_ph_id;
     
     SELECT CONCAT('Contract between ', p_company_name, ' and pharmacy at ', p_pharmacy_address, ' deleted successfully') AS result;
 END$$
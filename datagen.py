@@ -0,0 +1,332 @@
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+
+from bulk_import import CHUNK_SIZE, chunked, placeholders
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Row counts at --scale 1.0; every other table is sized from these
+FULL_SCALE = {
+    "patients": 1_000_000,
+    "pharmacies": 10_000,
+    "drugs": 100_000,
+}
+PATIENTS_PER_DOCTOR = 200
+DRUGS_PER_COMPANY = 50
+# A pharmacy must sell at least 10 drugs (delete_sells_entry enforces this)
+MIN_DRUGS_PER_PHARMACY = 10
+MAX_DRUGS_PER_PHARMACY = 40
+MAX_CONTRACTS_PER_PHARMACY = 3
+MAX_DRUGS_PER_PRESCRIPTION = 4
+
+# Tables in the order they are loaded, so every foreign key already has its target
+LOAD_ORDER = [
+    "Doctor", "Patient", "Treats", "PharmaceuticalCompany", "Drug",
+    "Pharmacy", "Sells", "Prescription", "Contains_drug", "Contract",
+]
+
+COLUMNS = {
+    "Doctor": ["daadharid", "d_name", "speciality", "years_of_experience"],
+    "Patient": ["paadharid", "p_name", "age", "address", "p_daadharid"],
+    "Treats": ["pid", "did"],
+    "PharmaceuticalCompany": ["company_id", "company_name", "phone_number"],
+    "Drug": ["drug_id", "trade_name", "formula", "company_id"],
+    "Pharmacy": ["ph_id", "address", "pname", "phone"],
+    "Sells": ["ph_id", "drug_id", "stock", "price"],
+    "Prescription": ["pres_id", "pid", "did", "pres_date"],
+    "Contains_drug": ["pres_id", "drug_id", "quantity"],
+    "Contract": ["company_id", "ph_id", "content", "start_date", "end_date", "supervisor"],
+}
+
+# The tables as they were before surrogate_keys.sql, keyed by company name and
+# pharmacy address, as (columns, row map) for the rows of COLUMNS. Ids are row
+# number + 1, so they map back to the name or address.
+NATURAL_KEY_ROWS = {
+    "PharmaceuticalCompany": (["company_name", "phone_number"], lambda row: row[1:]),
+    "Drug": (
+        ["drug_id", "trade_name", "formula", "company_name"],
+        lambda row: (*row[:3], company_name(row[3] - 1))
+    ),
+    "Pharmacy": (["address", "pname", "phone"], lambda row: row[1:]),
+    "Sells": (["ph_address", "drug_id", "stock", "price"], lambda row: (pharmacy_address(row[0] - 1), *row[1:])),
+    "Contract": (
+        ["company_name", "ph_address", "content", "start_date", "end_date", "supervisor"],
+        lambda row: (company_name(row[0] - 1), pharmacy_address(row[1] - 1), *row[2:])
+    ),
+}
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Ananya", "Kabir", "Meera", "Rohan", "Saanvi",
+               "Vihaan", "Priya", "Arjun", "Kavya", "Aditya", "Nisha", "Rahul", "Pooja"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Iyer", "Gupta", "Khan", "Singh", "Das",
+              "Nair", "Mehta", "Rao", "Joshi", "Verma", "Bose", "Kapoor", "Pillai"]
+SPECIALITIES = ["Cardiology", "Dermatology", "General Medicine", "Neurology", "Orthopedics",
+                "Pediatrics", "Psychiatry", "Oncology", None]
+CITIES = ["Hyderabad", "Mumbai", "Delhi", "Chennai", "Bengaluru", "Kolkata", "Pune", "Jaipur"]
+COMPOUNDS = ["Paracetamol", "Ibuprofen", "Amoxicillin", "Metformin", "Atorvastatin",
+             "Omeprazole", "Cetirizine", "Azithromycin", "Losartan", "Salbutamol"]
+
+TODAY = date(2025, 1, 1)
+
+
+# Keys are derived from the row number so related tables can refer to them
+# without keeping the parent rows in memory
+
+def doctor_id(i):
+    return f"{100000000000 + i}"
+
+
+def patient_id(i):
+    return f"{200000000000 + i}"
+
+
+def company_id(i):
+    return i + 1
+
+
+def company_name(i):
+    return f"Company {i:05d}"
+
+
+def pharmacy_id(i):
+    return i + 1
+
+
+def pharmacy_address(i):
+    return f"{i} Market Road, {CITIES[i % len(CITIES)]}"
+
+
+def phone(rng):
+    return f"9{rng.randrange(10 ** 9):09d}"
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def scaled_counts(scale):
+    patients = max(1, int(FULL_SCALE["patients"] * scale))
+    drugs = max(MAX_DRUGS_PER_PHARMACY, int(FULL_SCALE["drugs"] * scale))
+    return {
+        "patients": patients,
+        # Every doctor needs at least one patient
+        "doctors": max(1, min(patients, patients // PATIENTS_PER_DOCTOR)),
+        "pharmacies": max(1, int(FULL_SCALE["pharmacies"] * scale)),
+        "drugs": drugs,
+        "companies": max(1, drugs // DRUGS_PER_COMPANY),
+    }
+
+
+class DataGenerator:
+    # Produces rows for each table lazily. All randomness comes from one seeded
+    # generator per table, so the same seed and scale always give the same data
+    # no matter which tables are generated.
+
+    def __init__(self, counts, seed=0):
+        self.counts = counts
+        self.seed = seed
+
+    def rng(self, table):
+        return random.Random(f"{self.seed}:{table}")
+
+    def primary_doctor(self, i):
+        # The first patients are spread over every doctor so none is left
+        # without a patient; the rest are assigned at random (but repeatably)
+        doctors = self.counts["doctors"]
+        if i < doctors:
+            return i
+        return random.Random(f"{self.seed}:primary:{i}").randrange(doctors)
+
+    def additional_doctor(self, i):
+        doctors = self.counts["doctors"]
+        rng = random.Random(f"{self.seed}:additional:{i}")
+        if doctors < 2 or rng.random() >= 0.3:
+            return None
+        other = rng.randrange(doctors - 1)
+        primary = self.primary_doctor(i)
+        return other if other < primary else other + 1
+
+    def doctors(self):
+        rng = self.rng("Doctor")
+        for i in range(self.counts["doctors"]):
+            yield (doctor_id(i), "Dr. " + person_name(rng), rng.choice(SPECIALITIES), rng.randrange(41))
+
+    def patients(self):
+        rng = self.rng("Patient")
+        for i in range(self.counts["patients"]):
+            address = f"{rng.randrange(1, 500)} Lane {rng.randrange(1, 100)}, {rng.choice(CITIES)}"
+            yield (patient_id(i), person_name(rng), rng.randrange(1, 100), address,
+                   doctor_id(self.primary_doctor(i)))
+
+    def treats(self):
+        # Includes the primary physician, as the ensure_primary_physician_treats
+        # trigger would
+        for i in range(self.counts["patients"]):
+            yield (patient_id(i), doctor_id(self.primary_doctor(i)))
+            additional = self.additional_doctor(i)
+            if additional is not None:
+                yield (patient_id(i), doctor_id(additional))
+
+    def companies(self):
+        rng = self.rng("PharmaceuticalCompany")
+        for i in range(self.counts["companies"]):
+            yield (company_id(i), company_name(i), phone(rng))
+
+    def drugs(self):
+        rng = self.rng("Drug")
+        companies = self.counts["companies"]
+        for i in range(self.counts["drugs"]):
+            compound = rng.choice(COMPOUNDS)
+            # drug_id is set explicitly so Sells and Contains_drug can refer to it
+            yield (i + 1, f"{compound[:4]}-{i:06d}", f"{compound} {rng.choice([100, 250, 500])}mg",
+                   company_id(i % companies))
+
+    def pharmacies(self):
+        rng = self.rng("Pharmacy")
+        for i in range(self.counts["pharmacies"]):
+            yield (pharmacy_id(i), pharmacy_address(i), f"{rng.choice(LAST_NAMES)} Pharmacy", phone(rng))
+
+    def sells(self):
+        rng = self.rng("Sells")
+        drugs = self.counts["drugs"]
+        for i in range(self.counts["pharmacies"]):
+            count = rng.randint(MIN_DRUGS_PER_PHARMACY, min(MAX_DRUGS_PER_PHARMACY, drugs))
+            for drug_id in rng.sample(range(1, drugs + 1), count):
+                yield (pharmacy_id(i), drug_id, rng.randrange(0, 1000),
+                       f"{rng.uniform(1, 500):.2f}")
+
+    def prescriptions(self):
+        # At most one prescription per (patient, doctor), as add_prescription keeps it
+        rng = self.rng("Prescription")
+        pres_id = 0
+        for i in range(self.counts["patients"]):
+            for doctor in (self.primary_doctor(i), self.additional_doctor(i)):
+                if doctor is None or rng.random() >= 0.8:
+                    continue
+                pres_id += 1
+                pres_date = TODAY - timedelta(days=rng.randrange(3 * 365))
+                yield (pres_id, patient_id(i), doctor_id(doctor), pres_date)
+
+    def contains_drug(self):
+        rng = self.rng("Contains_drug")
+        drugs = self.counts["drugs"]
+        for pres_id, _, _, _ in self.prescriptions():
+            count = rng.randint(1, MAX_DRUGS_PER_PRESCRIPTION)
+            for drug_id in rng.sample(range(1, drugs + 1), count):
+                yield (pres_id, drug_id, rng.randint(1, 30))
+
+    def contracts(self):
+        rng = self.rng("Contract")
+        companies = self.counts["companies"]
+        for i in range(self.counts["pharmacies"]):
+            count = rng.randint(1, min(MAX_CONTRACTS_PER_PHARMACY, companies))
+            for company in rng.sample(range(companies), count):
+                start = TODAY - timedelta(days=rng.randrange(5 * 365))
+                end = start + timedelta(days=rng.randrange(30, 3 * 365))
+                yield (company_id(company), pharmacy_id(i),
+                       f"Supply agreement {i}-{company}", start, end, person_name(rng))
+
+    def rows(self, table):
+        return {
+            "Doctor": self.doctors,
+            "Patient": self.patients,
+            "Treats": self.treats,
+            "PharmaceuticalCompany": self.companies,
+            "Drug": self.drugs,
+            "Pharmacy": self.pharmacies,
+            "Sells": self.sells,
+            "Prescription": self.prescriptions,
+            "Contains_drug": self.contains_drug,
+            "Contract": self.contracts,
+        }[table]()
+
+
+def has_surrogate_keys(cursor):
+    # Whether surrogate_keys.sql has been applied to the database
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Pharmacy' AND COLUMN_NAME = 'ph_id'"
+    )
+    return cursor.fetchone() is not None
+
+
+def table_is_empty(pool, table):
+    with pool.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+        return cursor.fetchone() is None
+
+
+def clear_tables(pool):
+    with pool.cursor(commit=True) as cursor:
+        for table in reversed(LOAD_ORDER):
+            cursor.execute(f"DELETE FROM {table}")
+
+
+def load_table(pool, table, rows, chunk_size=CHUNK_SIZE, progress=None, columns=None):
+    columns = columns or COLUMNS[table]
+    # IGNORE on Treats because a patient insert may already have added the
+    # primary physician through the trigger
+    verb = "INSERT IGNORE" if table == "Treats" else "INSERT"
+    statement = f"{verb} INTO {table}({', '.join(columns)}) VALUES ({placeholders(len(columns))})"
+    loaded = 0
+    for chunk in chunked(rows, chunk_size):
+        with pool.cursor(commit=True) as cursor:
+            cursor.executemany(statement, chunk)
+        loaded += len(chunk)
+        if progress:
+            progress(table, loaded)
+    return loaded
+
+
+def generate(pool, scale=0.01, seed=0, chunk_size=CHUNK_SIZE, reset=False, progress=None):
+    counts = scaled_counts(scale)
+    if reset:
+        clear_tables(pool)
+    else:
+        for table in LOAD_ORDER:
+            if not table_is_empty(pool, table):
+                raise ValueError(f"{table} already has rows; use reset to replace them")
+
+    # A database not yet migrated by surrogate_keys.sql is seeded too, so the
+    # migration can be measured on the same data
+    with pool.cursor() as cursor:
+        natural_keys = not has_surrogate_keys(cursor)
+
+    generator = DataGenerator(counts, seed)
+    loaded = {}
+    for table in LOAD_ORDER:
+        rows, columns = generator.rows(table), None
+        if natural_keys and table in NATURAL_KEY_ROWS:
+            columns, natural = NATURAL_KEY_ROWS[table]
+            rows = map(natural, rows)
+        loaded[table] = load_table(pool, table, rows, chunk_size, progress, columns)
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the nova schema with repeatable synthetic data")
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="1.0 gives about 1M patients, 10k pharmacies and 100k drugs (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--reset", action="store_true", help="Delete all existing rows first")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(DB_CONFIG, pool_size=1)
+
+    def progress(table, loaded):
+        print(f"{table}: {loaded} rows", file=sys.stderr)
+
+    try:
+        loaded = generate(pool, args.scale, args.seed, args.chunk_size, args.reset, progress)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    for table, count in loaded.items():
+        print(f"{table:<22} {count:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
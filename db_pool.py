@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errorcode, pooling
+
+DB_CONFIG = {
+    "host": "",
+    "port": 3306,
+    "user": "",
+    "password": "",  # Replace with your MySQL password
+    "database": "nova"
+}
+
+# mysql.connector caps a pool at 32 connections
+POOL_SIZE = 5
+
+# Errors that mean the connection itself is gone and the operation can be retried
+RECONNECT_ERRORS = {
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_CONNECTION_ERROR,
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+    errorcode.ER_CON_COUNT_ERROR,
+}
+
+
+def is_connection_error(err):
+    if isinstance(err, (mysql.connector.InterfaceError, mysql.connector.OperationalError)):
+        return err.errno is None or err.errno in RECONNECT_ERRORS
+    return False
+
+
+class ConnectionPool:
+    def __init__(self, config=None, pool_size=POOL_SIZE, pool_name="nova_pool",
+                 checkout_timeout=10.0, retries=3, retry_delay=0.5, health_check_after=30.0,
+                 reset_session=True):
+        self.config = dict(config or DB_CONFIG)
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        # Resetting a session on release also drops its prepared statements;
+        # pools for backend.MySQLBackend(prepared=True) keep sessions instead
+        self.reset_session = reset_session
+        self.checkout_timeout = checkout_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # Connections idle for longer than this are pinged before being handed out
+        self.health_check_after = health_check_after
+
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # mysql.connector fails immediately when the pool is empty; the semaphore
+        # makes callers wait for a free connection instead
+        self.slots = threading.BoundedSemaphore(pool_size)
+        self.last_used = {}
+
+    def get_pool(self):
+        # The pool opens all of its connections up front, so create it lazily and
+        # only from one thread at a time to avoid reconnect storms
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name=self.pool_name,
+                    pool_size=self.pool_size,
+                    pool_reset_session=self.reset_session,
+                    **self.config
+                )
+            return self.pool
+
+    def backoff(self, attempt):
+        # Exponential backoff with jitter so threads do not reconnect in lockstep
+        delay = self.retry_delay * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, delay))
+
+    def check_health(self, conn):
+        key = id(conn._cnx)
+        idle = time.monotonic() - self.last_used.get(key, 0)
+        if idle > self.health_check_after:
+            # ping(reconnect=True) transparently reopens a connection the server dropped
+            conn.ping(reconnect=True, attempts=1, delay=0)
+
+    def checkout(self):
+        if not self.slots.acquire(timeout=self.checkout_timeout):
+            raise mysql.connector.PoolError("Timed out waiting for a free database connection")
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            conn = None
+            try:
+                conn = self.get_pool().get_connection()
+                self.check_health(conn)
+                return conn
+            except mysql.connector.Error as err:
+                last_error = err
+                if conn is not None:
+                    self.return_to_pool(conn)
+                if not is_connection_error(err):
+                    break
+                if attempt < self.retries:
+                    self.backoff(attempt)
+
+        self.slots.release()
+        raise last_error
+
+    def return_to_pool(self, conn):
+        try:
+            # Without a session reset, a read would leave its transaction (and
+            # snapshot) open for the next user of the connection
+            if not self.reset_session and conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            pass
+        try:
+            # Returns the connection to the pool rather than closing it; a broken
+            # connection is reopened by the pool on its next checkout
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    def release(self, conn):
+        try:
+            self.last_used[id(conn._cnx)] = time.monotonic()
+            self.return_to_pool(conn)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def cursor(self, commit=False, **cursor_args):
+        # One cursor per operation; the connection goes back to the pool afterwards
+        with self.connection() as conn:
+            cursor = conn.cursor(**cursor_args)
+            try:
+                yield cursor
+                if commit:
+                    conn.commit()
+            finally:
+                cursor.close()
+
+    def run(self, operation, retry=True):
+        # Run operation(conn) on a pooled connection. Read-only operations are
+        # retried when the connection is lost mid-flight; writes pass retry=False
+        # because a lost connection leaves the outcome unknown.
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return operation(conn)
+            except mysql.connector.Error as err:
+                if not retry or not is_connection_error(err) or attempt >= self.retries:
+                    raise
+                self.backoff(attempt)
+                attempt += 1
+
+    def kill_query(self, connection_id):
+        # Uses a dedicated connection so cancelling works even when the pool is exhausted
+        conn = mysql.connector.connect(**self.config)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        finally:
+            conn.close()
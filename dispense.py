@@ -0,0 +1,43 @@
+import random
+import time
+
+from mysql.connector import errorcode
+
+# Dispensing through dispense_prescription (dispense.sql), with the retries
+# its conditional decrement needs under load. The procedure is one
+# transaction; a deadlock or lock wait timeout rolls it back in full, so
+# calling it again is safe. Works on any backend: backend.MySQLBackend,
+# service_client.ServiceClient or sqlite_backend.SQLiteBackend.
+
+# Errors after which the whole dispense was rolled back and can run again
+RETRY_ERRORS = {errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT}
+# Attempts after the first before the error is passed on
+DEADLOCK_RETRIES = 5
+# Seconds before the first retry; doubled for each one after, with jitter so
+# the sessions that deadlocked do not collide again
+RETRY_DELAY = 0.01
+
+
+def is_retryable(err):
+    return getattr(err, "errno", None) in RETRY_ERRORS
+
+
+def dispense(backend, pid, did, pres_date, pharmacy_address, retries=DEADLOCK_RETRIES, on_retry=None,
+             task=None, timer=None):
+    # Returns the procedure's result sets: the message, then each dispensed
+    # drug with the stock left. on_retry is called with the error and the
+    # attempt number before every retry.
+    args = [pid, did, pres_date, pharmacy_address]
+    attempt = 0
+    while True:
+        try:
+            return backend.call("dispense_prescription", args, write=True, task=task, timer=timer)
+        except Exception as err:
+            if not is_retryable(err) or attempt >= retries:
+                raise
+            attempt += 1
+            if on_retry:
+                on_retry(err, attempt)
+            if task is not None:
+                task.check_cancelled()
+            time.sleep(RETRY_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
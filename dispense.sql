@@ -0,0 +1,144 @@
+-- Dispensing a prescription at a pharmacy. update_sells_entry and
+-- update_drug_quantity overwrite stock with an absolute value, so two
+-- counters selling the same drug at once each write their own result and
+-- one sale is lost. dispense_prescription instead takes every drug of the
+-- prescription off the pharmacy's stock with one conditional decrement
+-- (stock >= quantity), all lines in one transaction: either the whole
+-- prescription is filled or nothing changes. A prescription is filled once;
+-- PrescriptionDispensed records where and when. A deadlock or lock wait
+-- timeout rolls the transaction back; dispense.py retries it.
+--
+-- Apply after tables_def.sql and inventory_summary.sql, on a new install or
+-- an existing nova database.
+USE nova;
+
+DROP PROCEDURE IF EXISTS dispense_prescription;
+
+-- One row per filled prescription. ph_id has no foreign key, so deleting
+-- the pharmacy does not make the prescription fillable again; the row goes
+-- with the prescription (and so when it is archived).
+CREATE TABLE IF NOT EXISTS PrescriptionDispensed (
+    pres_id INT PRIMARY KEY,
+    ph_id INT NOT NULL,
+    dispensed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (pres_id) REFERENCES Prescription(pres_id) ON DELETE CASCADE
+);
+
+DELIMITER $$
+CREATE PROCEDURE dispense_prescription(
+    IN p_pid VARCHAR(12),
+    IN p_did VARCHAR(12),
+    IN p_pres_date DATE,
+    IN p_pharmacy_address VARCHAR(200)
+)
+BEGIN
+    DECLARE v_ph_id INT;
+    DECLARE v_pres_id INT;
+    DECLARE v_lines INT;
+    DECLARE v_locked INT;
+    DECLARE v_dispensed INT;
+    DECLARE v_short_drug INT;
+    DECLARE v_message VARCHAR(255);
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address AND is_active;
+
+    IF v_ph_id IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist';
+    END IF;
+
+    START TRANSACTION;
+
+    -- Locks are taken in one order by every dispense: the prescription,
+    -- then its Sells rows by drug_id, then (through the Sells triggers) the
+    -- pharmacy's PharmacyInventory row and its CompanyPharmacyInventory
+    -- rows. Nothing here is shared between pharmacies. Dispenses at one
+    -- pharmacy share its PharmacyInventory row, from their first decrement
+    -- to the commit only.
+
+    -- Locking the prescription makes a second dispense of it wait for this
+    -- one and then find it filled
+    SELECT pres_id INTO v_pres_id FROM Prescription
+    WHERE pid = p_pid AND did = p_did AND pres_date = p_pres_date
+    FOR UPDATE;
+
+    IF v_pres_id IS NULL THEN
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Prescription not found.';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM PrescriptionDispensed WHERE pres_id = v_pres_id) THEN
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Prescription has already been dispensed';
+    END IF;
+
+    SELECT COUNT(*) INTO v_lines FROM Contains_drug WHERE pres_id = v_pres_id;
+
+    IF v_lines = 0 THEN
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Prescription has no drugs to dispense';
+    END IF;
+
+    -- Contains_drug is read first, by its primary key (pres_id, drug_id),
+    -- so the Sells rows are locked in drug_id order. Once they are held,
+    -- the order the UPDATE below visits them in no longer matters.
+    SELECT COUNT(*) INTO v_locked
+    FROM Contains_drug cd
+    STRAIGHT_JOIN Sells s ON s.drug_id = cd.drug_id AND s.ph_id = v_ph_id
+    WHERE cd.pres_id = v_pres_id
+    FOR UPDATE OF s;
+
+    -- A line is taken off only if its stock covers it, checked and changed
+    -- in the same row update, so no other sale can come in between
+    UPDATE Sells s
+    JOIN Contains_drug cd ON cd.drug_id = s.drug_id
+    SET s.stock = s.stock - cd.quantity
+    WHERE cd.pres_id = v_pres_id
+    AND s.ph_id = v_ph_id
+    AND s.stock >= cd.quantity;
+
+    SET v_dispensed = ROW_COUNT();
+
+    IF v_dispensed < v_lines THEN
+        ROLLBACK;
+
+        -- Read after the rollback, so the lines taken off above count with
+        -- their stock restored
+        SELECT cd.drug_id INTO v_short_drug
+        FROM Contains_drug cd
+        LEFT JOIN Sells s ON s.drug_id = cd.drug_id AND s.ph_id = v_ph_id
+        WHERE cd.pres_id = v_pres_id
+        AND (s.stock IS NULL OR s.stock < cd.quantity)
+        ORDER BY cd.drug_id
+        LIMIT 1;
+
+        SET v_message = CONCAT('Insufficient stock to dispense drug ', IFNULL(v_short_drug, '(unknown)'),
+                               ' at this pharmacy');
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = v_message;
+    END IF;
+
+    INSERT INTO PrescriptionDispensed(pres_id, ph_id) VALUES (v_pres_id, v_ph_id);
+
+    COMMIT;
+
+    SELECT CONCAT('Prescription for patient ', p_pid, ' from doctor ', p_did, ' on date ', p_pres_date,
+                  ' dispensed at pharmacy at address ', p_pharmacy_address) AS result;
+
+    -- What is left of each dispensed drug
+    SELECT
+        cd.drug_id AS Drug_ID,
+        d.trade_name AS Drug_Name,
+        cd.quantity AS Dispensed,
+        s.stock AS Stock_Left
+    FROM Contains_drug cd
+    JOIN Drug d ON d.drug_id = cd.drug_id
+    JOIN Sells s ON s.drug_id = cd.drug_id AND s.ph_id = v_ph_id
+    WHERE cd.pres_id = v_pres_id
+    ORDER BY cd.drug_id;
+END$$
+DELIMITER ;
@@ -5,19 +5,26 @@ CREATE PROCEDURE add_drug(
     IN p_company_name VARCHAR(100)
 )
 BEGIN
+    DECLARE company_id_var INT;
+    
     -- Check that company exists
-    IF NOT EXISTS (SELECT 1 FROM PharmaceuticalCompany WHERE company_name = p_company_name) THEN
+    SELECT company_id INTO company_id_var
+    FROM PharmaceuticalCompany
+    WHERE company_name = p_company_name
+    AND is_active;
+    
+    IF company_id_var IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmaceutical company does not exist.';
     END IF;
     
     -- Check if drug already exists for this company
-    IF EXISTS (SELECT 1 FROM Drug WHERE trade_name = p_trade_name AND company_name = p_company_name) THEN
+    IF EXISTS (SELECT 1 FROM Drug WHERE trade_name = p_trade_name AND company_id = company_id_var) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug already exists for this company.';
     END IF;
     
     -- Insert drug
-    INSERT INTO Drug(trade_name, formula, company_name)
-    VALUES (p_trade_name, p_formula, p_company_name);
+    INSERT INTO Drug(trade_name, formula, company_id)
+    VALUES (p_trade_name, p_formula, company_id_var);
     
     SELECT CONCAT('Drug ', p_trade_name, ' added successfully for company ', p_company_name) AS result;
 END$$
@@ -33,9 +40,10 @@ BEGIN
     DECLARE drug_id_var INT;
     
     -- Check if drug exists
-    SELECT drug_id INTO drug_id_var
-    FROM Drug 
-    WHERE trade_name = p_trade_name AND company_name = p_company_name;
+    SELECT d.drug_id INTO drug_id_var
+    FROM Drug d
+    JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+    WHERE d.trade_name = p_trade_name AND pc.company_name = p_company_name;
     
     IF drug_id_var IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Drug does not exist.';
@@ -66,16 +74,21 @@ CREATE PROCEDURE update_drug(
 )
 BEGIN
     DECLARE drug_id_var INT;
+    DECLARE company_id_var INT;
     
     -- Check if company exists
-    IF NOT EXISTS (SELECT 1 FROM PharmaceuticalCompany WHERE company_name = p_company_name) THEN
+    SELECT company_id INTO company_id_var
+    FROM PharmaceuticalCompany
+    WHERE company_name = p_company_name;
+    
+    IF company_id_var IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmaceutical company does not exist.';
     END IF;
     
     -- Check if original drug exists
     SELECT drug_id INTO drug_id_var
     FROM Drug 
-    WHERE trade_name = p_old_trade_name AND company_name = p_company_name;
+    WHERE trade_name = p_old_trade_name AND company_id = company_id_var;
     
     IF drug_id_var IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Drug does not exist.';
@@ -83,7 +96,7 @@ BEGIN
     
     -- Check if new trade name already exists for this company (if changing the name)
     IF p_old_trade_name != p_new_trade_name AND 
-       EXISTS (SELECT 1 FROM Drug WHERE trade_name = p_new_trade_name AND company_name = p_company_name) THEN
+       EXISTS (SELECT 1 FROM Drug WHERE trade_name = p_new_trade_name AND company_id = company_id_var) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'A drug with the new trade name already exists for this company.';
     END IF;
     
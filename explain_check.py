@@ -0,0 +1,197 @@
+import argparse
+import sys
+
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Access types that read a whole table or a whole index
+FULL_SCANS = {"ALL", "index"}
+
+# The SELECTs run by the report procedures in specific_procs.sql, with the
+# procedure parameters as placeholders. Keep these in step with the procedures.
+# Each entry is (procedure, sample argument query, report query).
+REPORT_QUERIES = [
+    (
+        "prescription_report",
+        "SELECT pid, MIN(pres_date), MAX(pres_date), pid, MIN(pres_date), MAX(pres_date) FROM Prescription "
+        "WHERE pid = (SELECT pid FROM Prescription LIMIT 1) GROUP BY pid",
+        "(SELECT h.pres_date, h.patient_name, h.doctor_name, h.trade_name, h.quantity "
+        "FROM PrescriptionHistory h "
+        "JOIN Doctor d ON d.daadharid = h.did "
+        "JOIN PharmaceuticalCompany pc ON pc.company_name = h.company_name "
+        "WHERE h.pid = %s AND h.pres_date BETWEEN %s AND %s AND d.is_active AND pc.is_active) "
+        "UNION ALL "
+        "(SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.quantity "
+        "FROM PrescriptionArchive a "
+        "JOIN Doctor d ON d.daadharid = a.did "
+        "JOIN PharmaceuticalCompany pc ON pc.company_name = a.company_name "
+        "WHERE a.pid = %s AND a.pres_date BETWEEN %s AND %s AND d.is_active AND pc.is_active) "
+        "ORDER BY 1 DESC"
+    ),
+    (
+        "print_pres_details",
+        "SELECT pid, pres_date, pid, pres_date FROM Prescription LIMIT 1",
+        "SELECT h.pres_date, h.patient_name, h.doctor_name, h.trade_name, h.formula, h.quantity, h.company_name "
+        "FROM PrescriptionHistory h "
+        "JOIN Doctor d ON d.daadharid = h.did "
+        "JOIN PharmaceuticalCompany pc ON pc.company_name = h.company_name "
+        "WHERE h.pid = %s AND h.pres_date = %s AND d.is_active AND pc.is_active "
+        "UNION ALL "
+        "SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.formula, a.quantity, a.company_name "
+        "FROM PrescriptionArchive a "
+        "JOIN Doctor d ON d.daadharid = a.did "
+        "JOIN PharmaceuticalCompany pc ON pc.company_name = a.company_name "
+        "WHERE a.pid = %s AND a.pres_date = %s AND d.is_active AND pc.is_active"
+    ),
+    (
+        "drug_details",
+        "SELECT pc.company_name FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id LIMIT 1",
+        "SELECT d.drug_id, d.trade_name, d.formula, pc.company_name, pc.phone_number "
+        "FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id "
+        "WHERE pc.company_name = %s AND pc.is_active "
+        "ORDER BY d.trade_name"
+    ),
+    (
+        "print_stock_position",
+        "SELECT p.address FROM Sells s JOIN Pharmacy p ON s.ph_id = p.ph_id LIMIT 1",
+        "SELECT p.pname, p.address, d.trade_name, pc.company_name, s.stock, s.price "
+        "FROM Pharmacy p "
+        "JOIN Sells s ON p.ph_id = s.ph_id "
+        "JOIN Drug d ON s.drug_id = d.drug_id "
+        "JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id "
+        "WHERE p.address = %s AND p.is_active AND pc.is_active "
+        "ORDER BY d.trade_name"
+    ),
+    (
+        "print_pharmacy_contact",
+        "SELECT address FROM Pharmacy LIMIT 1",
+        "SELECT p.pname, p.address, p.phone FROM Pharmacy p WHERE p.address = %s AND p.is_active"
+    ),
+    (
+        "print_company_contact",
+        "SELECT company_name FROM PharmaceuticalCompany LIMIT 1",
+        "SELECT c.company_name, c.phone_number FROM PharmaceuticalCompany c "
+        "WHERE c.company_name = %s AND c.is_active"
+    ),
+    (
+        "print_patients_for_doctor",
+        "SELECT did FROM Treats LIMIT 1",
+        "SELECT pt.paadharid, pt.p_name, pt.age, pt.address "
+        "FROM Patient pt "
+        "JOIN Treats t ON pt.paadharid = t.pid "
+        "JOIN Doctor d ON d.daadharid = t.did "
+        "WHERE t.did = %s AND d.is_active "
+        "ORDER BY pt.p_name"
+    ),
+    (
+        "drug_availability",
+        "SELECT LEFT(trade_name, 3), 0 FROM Drug LIMIT 1",
+        "SELECT d.drug_id, d.trade_name, pc.company_name, p.pname, p.address, p.phone, s.stock, s.price "
+        "FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id "
+        "JOIN Sells s ON s.drug_id = d.drug_id "
+        "JOIN Pharmacy p ON s.ph_id = p.ph_id "
+        "WHERE d.trade_name LIKE CONCAT(%s, '%%') AND s.stock > %s AND p.is_active AND pc.is_active "
+        "ORDER BY s.price ASC, s.stock DESC, p.address, d.drug_id"
+    ),
+    (
+        # A later page of the ranked order, read after the previous page's last row
+        "drug_availability_page",
+        "SELECT LEFT(d.trade_name, 3), 0, s.price, s.price, s.stock, s.stock, p.address, p.address, s.drug_id "
+        "FROM Sells s JOIN Drug d ON d.drug_id = s.drug_id JOIN Pharmacy p ON p.ph_id = s.ph_id LIMIT 1",
+        "SELECT d.drug_id, d.trade_name, pc.company_name, p.pname, p.address, p.phone, s.stock, s.price "
+        "FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id "
+        "JOIN Sells s ON s.drug_id = d.drug_id "
+        "JOIN Pharmacy p ON s.ph_id = p.ph_id "
+        "WHERE d.trade_name LIKE CONCAT(%s, '%%') AND s.stock > %s AND p.is_active AND pc.is_active "
+        "AND (s.price > %s OR s.price = %s AND (s.stock < %s OR s.stock = %s "
+        "AND (p.address > %s OR p.address = %s AND d.drug_id > %s))) "
+        "ORDER BY s.price ASC, s.stock DESC, p.address, d.drug_id LIMIT 200"
+    ),
+    (
+        "display_contract",
+        "SELECT p.address, p.pname, pc.company_name FROM Contract c "
+        "JOIN Pharmacy p ON c.ph_id = p.ph_id "
+        "JOIN PharmaceuticalCompany pc ON c.company_id = pc.company_id LIMIT 1",
+        "SELECT pc.company_name, pc.phone_number, p.pname, p.address, p.phone, "
+        "c.start_date, c.end_date, c.supervisor, c.content "
+        "FROM Contract c "
+        "JOIN Pharmacy p ON c.ph_id = p.ph_id "
+        "JOIN PharmaceuticalCompany pc ON c.company_id = pc.company_id "
+        "WHERE p.address = %s AND p.pname = %s AND pc.company_name = %s AND p.is_active AND pc.is_active"
+    ),
+]
+
+
+def explain(cursor, query, args):
+    cursor.execute("EXPLAIN " + query, args)
+    headers = [i[0] for i in cursor.description]
+    return [dict(zip(headers, row)) for row in cursor.fetchall()]
+
+
+def check_plans(pool, procedures=None):
+    # Returns {procedure: (plan rows, problems)}; a procedure with no data to
+    # sample from gets plan rows of None
+    results = {}
+    with pool.cursor() as cursor:
+        for procedure, sample_query, query in REPORT_QUERIES:
+            if procedures and procedure not in procedures:
+                continue
+            cursor.execute(sample_query)
+            sample = cursor.fetchone()
+            cursor.fetchall()
+            if sample is None:
+                results[procedure] = (None, [])
+                continue
+
+            plan = explain(cursor, query, list(sample))
+            # <union...> and <derived...> rows read a temporary table of
+            # rows already picked by the rows before them
+            problems = [
+                f"{row['table']}: full {'table' if row['type'] == 'ALL' else 'index'} scan"
+                for row in plan if row["type"] in FULL_SCANS and not str(row["table"]).startswith("<")
+            ]
+            results[procedure] = (plan, problems)
+    return results
+
+
+def print_plan(procedure, plan, problems):
+    status = "FAIL" if problems else "ok"
+    print(f"{procedure}: {status}")
+    for row in plan:
+        # partitions lists the archive partitions a query reads
+        print(f"    {row['table']:<12} type={row['type']:<8} key={row['key']} "
+              f"partitions={row.get('partitions')} rows={row['rows']} {row['Extra'] or ''}")
+    for problem in problems:
+        print(f"    ! {problem}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN the report queries and fail if any of them scans a whole table"
+    )
+    parser.add_argument("procedures", nargs="*", help="Only check these procedures (default: all)")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(DB_CONFIG, pool_size=1)
+    results = check_plans(pool, set(args.procedures))
+
+    failed = False
+    for procedure, (plan, problems) in results.items():
+        if plan is None:
+            print(f"{procedure}: skipped, no sample data")
+            continue
+        print_plan(procedure, plan, problems)
+        failed = failed or bool(problems)
+
+    if failed:
+        # Both index files assume the surrogate keys are in place
+        print("Full scans found; apply surrogate_keys.sql if not yet applied, then report_indexes.sql and "
+              "availability_indexes.sql, and re-run", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
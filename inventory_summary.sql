@@ -0,0 +1,329 @@
+-- Inventory summary tables, kept up to date by triggers so the dashboards and
+-- the 10-drug rule read one row instead of aggregating Sells.
+-- A Sells write only touches rows of its own pharmacy: the company totals
+-- are kept per company and pharmacy (CompanyPharmacyInventory) and summed
+-- by print_company_inventory, so stock writes at different pharmacies never
+-- wait on a chain-wide row. CompanyInventory keeps the company's drug
+-- count, which only Drug writes change.
+-- Apply after tables_def.sql (and surrogate_keys.sql on a database created
+-- before it), on a new install or an existing nova database; the last
+-- statement backfills the summaries from the current data. Running it again
+-- rebuilds them.
+USE nova;
+
+DROP PROCEDURE IF EXISTS adjust_pharmacy_inventory;
+DROP PROCEDURE IF EXISTS adjust_company_inventory;
+DROP PROCEDURE IF EXISTS adjust_company_pharmacy_inventory;
+DROP PROCEDURE IF EXISTS rebuild_inventory_summary;
+
+DROP TRIGGER IF EXISTS sells_after_insert;
+DROP TRIGGER IF EXISTS sells_after_update;
+DROP TRIGGER IF EXISTS sells_after_delete;
+DROP TRIGGER IF EXISTS pharmacy_after_insert;
+DROP TRIGGER IF EXISTS pharmacy_before_delete;
+DROP TRIGGER IF EXISTS drug_after_insert;
+DROP TRIGGER IF EXISTS drug_after_update;
+DROP TRIGGER IF EXISTS drug_before_delete;
+DROP TRIGGER IF EXISTS company_after_insert;
+DROP TRIGGER IF EXISTS company_before_delete;
+
+-- CompanyInventory used to hold the chain-wide stock totals as well; the
+-- rebuild below refills it in its new shape
+DELIMITER $$
+CREATE PROCEDURE drop_chain_wide_company_inventory()
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'CompanyInventory'
+        AND COLUMN_NAME = 'pharmacy_listings'
+    ) THEN
+        DROP TABLE CompanyInventory;
+    END IF;
+END$$
+DELIMITER ;
+
+CALL drop_chain_wide_company_inventory();
+
+DROP PROCEDURE drop_chain_wide_company_inventory;
+
+CREATE TABLE IF NOT EXISTS PharmacyInventory (
+    ph_id INT PRIMARY KEY,
+    drug_count INT NOT NULL DEFAULT 0,
+    total_stock BIGINT NOT NULL DEFAULT 0,
+    stock_value DECIMAL(20,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS CompanyInventory (
+    company_id INT PRIMARY KEY,
+    drug_count INT NOT NULL DEFAULT 0
+);
+
+-- One row per company and pharmacy that sells its drugs
+CREATE TABLE IF NOT EXISTS CompanyPharmacyInventory (
+    company_id INT NOT NULL,
+    ph_id INT NOT NULL,
+    pharmacy_listings INT NOT NULL DEFAULT 0,
+    total_stock BIGINT NOT NULL DEFAULT 0,
+    stock_value DECIMAL(20,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, ph_id),
+    -- Used when a pharmacy is deleted
+    INDEX idx_company_pharmacy_inventory_pharmacy (ph_id)
+);
+
+-- Helpers called by the triggers below; they add the given deltas, creating
+-- the summary row if it is missing
+DELIMITER $$
+CREATE PROCEDURE adjust_pharmacy_inventory(
+    IN p_ph_id INT,
+    IN p_drugs INT,
+    IN p_stock BIGINT,
+    IN p_value DECIMAL(20,2)
+)
+BEGIN
+    INSERT INTO PharmacyInventory(ph_id, drug_count, total_stock, stock_value)
+    VALUES (p_ph_id, p_drugs, p_stock, p_value)
+    ON DUPLICATE KEY UPDATE
+        drug_count = drug_count + p_drugs,
+        total_stock = total_stock + p_stock,
+        stock_value = stock_value + p_value;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE adjust_company_inventory(
+    IN p_company_id INT,
+    IN p_drugs INT
+)
+BEGIN
+    INSERT INTO CompanyInventory(company_id, drug_count)
+    VALUES (p_company_id, p_drugs)
+    ON DUPLICATE KEY UPDATE
+        drug_count = drug_count + p_drugs;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE adjust_company_pharmacy_inventory(
+    IN p_company_id INT,
+    IN p_ph_id INT,
+    IN p_listings INT,
+    IN p_stock BIGINT,
+    IN p_value DECIMAL(20,2)
+)
+BEGIN
+    INSERT INTO CompanyPharmacyInventory(company_id, ph_id, pharmacy_listings, total_stock, stock_value)
+    VALUES (p_company_id, p_ph_id, p_listings, p_stock, p_value)
+    ON DUPLICATE KEY UPDATE
+        pharmacy_listings = pharmacy_listings + p_listings,
+        total_stock = total_stock + p_stock,
+        stock_value = stock_value + p_value;
+END$$
+DELIMITER ;
+
+-- Sells changes: every insert, update and delete adjusts the pharmacy's
+-- row, then the company's row for that pharmacy
+DELIMITER $$
+CREATE TRIGGER sells_after_insert AFTER INSERT ON Sells
+FOR EACH ROW
+BEGIN
+    DECLARE v_company INT;
+    SELECT company_id INTO v_company FROM Drug WHERE drug_id = NEW.drug_id;
+
+    CALL adjust_pharmacy_inventory(NEW.ph_id, 1, NEW.stock, NEW.stock * NEW.price);
+    CALL adjust_company_pharmacy_inventory(v_company, NEW.ph_id, 1, NEW.stock, NEW.stock * NEW.price);
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER sells_after_update AFTER UPDATE ON Sells
+FOR EACH ROW
+BEGIN
+    DECLARE v_old_company INT;
+    DECLARE v_new_company INT;
+    SELECT company_id INTO v_old_company FROM Drug WHERE drug_id = OLD.drug_id;
+    SELECT company_id INTO v_new_company FROM Drug WHERE drug_id = NEW.drug_id;
+
+    IF OLD.ph_id = NEW.ph_id THEN
+        -- The usual case, a stock or price change: one adjustment
+        CALL adjust_pharmacy_inventory(NEW.ph_id, 0, NEW.stock - OLD.stock,
+                                       NEW.stock * NEW.price - OLD.stock * OLD.price);
+    ELSE
+        CALL adjust_pharmacy_inventory(OLD.ph_id, -1, -OLD.stock, -(OLD.stock * OLD.price));
+        CALL adjust_pharmacy_inventory(NEW.ph_id, 1, NEW.stock, NEW.stock * NEW.price);
+    END IF;
+
+    IF v_old_company = v_new_company AND OLD.ph_id = NEW.ph_id THEN
+        CALL adjust_company_pharmacy_inventory(v_new_company, NEW.ph_id, 0, NEW.stock - OLD.stock,
+                                               NEW.stock * NEW.price - OLD.stock * OLD.price);
+    ELSE
+        CALL adjust_company_pharmacy_inventory(v_old_company, OLD.ph_id, -1, -OLD.stock,
+                                               -(OLD.stock * OLD.price));
+        CALL adjust_company_pharmacy_inventory(v_new_company, NEW.ph_id, 1, NEW.stock, NEW.stock * NEW.price);
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER sells_after_delete AFTER DELETE ON Sells
+FOR EACH ROW
+BEGIN
+    DECLARE v_company INT;
+    SELECT company_id INTO v_company FROM Drug WHERE drug_id = OLD.drug_id;
+
+    CALL adjust_pharmacy_inventory(OLD.ph_id, -1, -OLD.stock, -(OLD.stock * OLD.price));
+    CALL adjust_company_pharmacy_inventory(v_company, OLD.ph_id, -1, -OLD.stock, -(OLD.stock * OLD.price));
+END$$
+DELIMITER ;
+
+-- Rows removed by ON DELETE CASCADE do not fire triggers, so deleting a
+-- pharmacy, drug or company takes its Sells rows out of the summaries
+-- before the cascade removes them
+DELIMITER $$
+CREATE TRIGGER pharmacy_after_insert AFTER INSERT ON Pharmacy
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO PharmacyInventory(ph_id) VALUES (NEW.ph_id);
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER pharmacy_before_delete BEFORE DELETE ON Pharmacy
+FOR EACH ROW
+BEGIN
+    -- The pharmacy's row first, as the Sells triggers take them
+    DELETE FROM PharmacyInventory WHERE ph_id = OLD.ph_id;
+    DELETE FROM CompanyPharmacyInventory WHERE ph_id = OLD.ph_id;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_after_insert AFTER INSERT ON Drug
+FOR EACH ROW
+BEGIN
+    CALL adjust_company_inventory(NEW.company_id, 1);
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_after_update AFTER UPDATE ON Drug
+FOR EACH ROW
+BEGIN
+    -- Moving a drug to another company moves its stock with it, pharmacy
+    -- by pharmacy
+    IF OLD.company_id != NEW.company_id THEN
+        UPDATE CompanyPharmacyInventory cpi
+        JOIN Sells s ON s.ph_id = cpi.ph_id
+        SET cpi.pharmacy_listings = cpi.pharmacy_listings - 1,
+            cpi.total_stock = cpi.total_stock - s.stock,
+            cpi.stock_value = cpi.stock_value - s.stock * s.price
+        WHERE s.drug_id = NEW.drug_id AND cpi.company_id = OLD.company_id;
+
+        INSERT INTO CompanyPharmacyInventory(company_id, ph_id, pharmacy_listings, total_stock, stock_value)
+        SELECT NEW.company_id, s.ph_id, 1, s.stock, s.stock * s.price
+        FROM Sells s WHERE s.drug_id = NEW.drug_id
+        ON DUPLICATE KEY UPDATE
+            pharmacy_listings = pharmacy_listings + 1,
+            total_stock = total_stock + VALUES(total_stock),
+            stock_value = stock_value + VALUES(stock_value);
+
+        CALL adjust_company_inventory(OLD.company_id, -1);
+        CALL adjust_company_inventory(NEW.company_id, 1);
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_before_delete BEFORE DELETE ON Drug
+FOR EACH ROW
+BEGIN
+    -- A drug is sold at most once per pharmacy
+    UPDATE PharmacyInventory pi
+    JOIN Sells s ON s.ph_id = pi.ph_id
+    SET pi.drug_count = pi.drug_count - 1,
+        pi.total_stock = pi.total_stock - s.stock,
+        pi.stock_value = pi.stock_value - s.stock * s.price
+    WHERE s.drug_id = OLD.drug_id;
+
+    UPDATE CompanyPharmacyInventory cpi
+    JOIN Sells s ON s.ph_id = cpi.ph_id
+    SET cpi.pharmacy_listings = cpi.pharmacy_listings - 1,
+        cpi.total_stock = cpi.total_stock - s.stock,
+        cpi.stock_value = cpi.stock_value - s.stock * s.price
+    WHERE s.drug_id = OLD.drug_id AND cpi.company_id = OLD.company_id;
+
+    CALL adjust_company_inventory(OLD.company_id, -1);
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER company_after_insert AFTER INSERT ON PharmaceuticalCompany
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO CompanyInventory(company_id) VALUES (NEW.company_id);
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER company_before_delete BEFORE DELETE ON PharmaceuticalCompany
+FOR EACH ROW
+BEGIN
+    -- The cascade removes the company's drugs without firing drug_before_delete
+    UPDATE PharmacyInventory pi
+    JOIN (
+        SELECT s.ph_id, COUNT(*) AS drugs, SUM(s.stock) AS stock, SUM(s.stock * s.price) AS value
+        FROM Sells s
+        JOIN Drug d ON s.drug_id = d.drug_id
+        WHERE d.company_id = OLD.company_id
+        GROUP BY s.ph_id
+    ) removed ON pi.ph_id = removed.ph_id
+    SET pi.drug_count = pi.drug_count - removed.drugs,
+        pi.total_stock = pi.total_stock - removed.stock,
+        pi.stock_value = pi.stock_value - removed.value;
+
+    DELETE FROM CompanyPharmacyInventory WHERE company_id = OLD.company_id;
+    DELETE FROM CompanyInventory WHERE company_id = OLD.company_id;
+END$$
+DELIMITER ;
+
+-- Recomputes the summaries from the base tables. Used to backfill them and
+-- to repair drift, e.g. after loading data with triggers disabled or with
+-- FOREIGN_KEY_CHECKS = 0. Locks Sells, so run it when the chain is quiet.
+DELIMITER $$
+CREATE PROCEDURE rebuild_inventory_summary()
+BEGIN
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+
+    DELETE FROM PharmacyInventory;
+    INSERT INTO PharmacyInventory(ph_id, drug_count, total_stock, stock_value)
+    SELECT p.ph_id, COUNT(s.drug_id), IFNULL(SUM(s.stock), 0), IFNULL(SUM(s.stock * s.price), 0)
+    FROM Pharmacy p
+    LEFT JOIN Sells s ON s.ph_id = p.ph_id
+    GROUP BY p.ph_id;
+
+    DELETE FROM CompanyInventory;
+    INSERT INTO CompanyInventory(company_id, drug_count)
+    SELECT pc.company_id, COUNT(d.drug_id)
+    FROM PharmaceuticalCompany pc
+    LEFT JOIN Drug d ON d.company_id = pc.company_id
+    GROUP BY pc.company_id;
+
+    DELETE FROM CompanyPharmacyInventory;
+    INSERT INTO CompanyPharmacyInventory(company_id, ph_id, pharmacy_listings, total_stock, stock_value)
+    SELECT d.company_id, s.ph_id, COUNT(*), SUM(s.stock), SUM(s.stock * s.price)
+    FROM Sells s
+    JOIN Drug d ON s.drug_id = d.drug_id
+    GROUP BY d.company_id, s.ph_id;
+
+    COMMIT;
+
+    SELECT 'Inventory summary rebuilt' AS result;
+END$$
+DELIMITER ;
+
+CALL rebuild_inventory_summary();
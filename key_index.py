@@ -0,0 +1,305 @@
+import bisect
+import time
+import tkinter as tk
+
+from query_cache import WRITE_EFFECTS
+from streaming import FETCH_BATCH
+
+# Seconds an entity's index is used before it is reloaded in the background,
+# to pick up keys added or removed by other clients
+INDEX_TTL = 300.0
+# Most suggestions listed for one prefix
+MAX_SUGGESTIONS = 12
+# Milliseconds of typing pause before a picker looks its text up
+DEBOUNCE_MS = 150
+
+# Entity -> named statement (backend.STATEMENTS) listing its (key, name) pairs
+KEY_STATEMENTS = {
+    "Doctor": "doctor_keys",
+    "Patient": "patient_keys",
+    "Drug": "drug_keys",
+    "Pharmacy": "pharmacy_keys",
+}
+
+# Form fields that take an existing key, and the entity whose keys they hold
+FIELD_ENTITIES = {
+    "p_id": "Patient", "old_p_id": "Patient", "new_p_id": "Patient", "d_patient_id": "Patient",
+    "d_id": "Doctor", "old_d_id": "Doctor", "new_d_id": "Doctor",
+    "p_primary_physician_id": "Doctor", "p_additional_doctor_id": "Doctor",
+    "drug_id": "Drug", "new_drug_id": "Drug",
+    "ph_address": "Pharmacy",
+}
+# Forms where the field is instead the new row's key
+NEW_KEY_FIELDS = {("Patient", "Add"): "p_id", ("Doctor", "Add"): "d_id", ("Pharmacy", "Add"): "ph_address"}
+
+
+class PrefixIndex:
+    # One entity's keys and names in sorted arrays, searched by bisection:
+    # keys and their names in parallel lists ordered by key, and
+    # (lowercased name, key) pairs ordered by name. Built on a worker thread,
+    # then only read and changed on the Tk thread.
+
+    def __init__(self, entries=()):
+        entries = sorted({str(key): name or "" for key, name in entries}.items())
+        self.keys = [key for key, name in entries]
+        self.names = [name for key, name in entries]
+        self.by_name = sorted((name.lower(), key) for key, name in entries if name)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def upsert(self, key, name):
+        key, name = str(key), name or ""
+        i = self.find(key)
+        if i is None:
+            i = bisect.bisect_left(self.keys, key)
+            self.keys.insert(i, key)
+            self.names.insert(i, name)
+        else:
+            self.drop_name(self.names[i], key)
+            self.names[i] = name
+        if name:
+            bisect.insort(self.by_name, (name.lower(), key))
+
+    def remove(self, key):
+        i = self.find(str(key))
+        if i is not None:
+            self.drop_name(self.names[i], self.keys[i])
+            del self.keys[i]
+            del self.names[i]
+
+    def drop_name(self, name, key):
+        if name:
+            j = bisect.bisect_left(self.by_name, (name.lower(), key))
+            if j < len(self.by_name) and self.by_name[j] == (name.lower(), key):
+                del self.by_name[j]
+
+    def search(self, prefix, limit=MAX_SUGGESTIONS):
+        # [(key, name)] whose key starts with prefix, then those whose name
+        # does (ignoring case), at most limit in all
+        matches = []
+        seen = set()
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(matches) < limit and self.keys[i].startswith(prefix):
+            matches.append((self.keys[i], self.names[i]))
+            seen.add(self.keys[i])
+            i += 1
+
+        lowered = prefix.lower()
+        j = bisect.bisect_left(self.by_name, (lowered,))
+        while j < len(self.by_name) and len(matches) < limit and self.by_name[j][0].startswith(lowered):
+            key = self.by_name[j][1]
+            if key not in seen:
+                matches.append((key, self.names[self.find(key)]))
+                seen.add(key)
+            j += 1
+        return matches
+
+
+class KeyIndex:
+    # The pickers' prefix indexes, one per entity, each loaded the first time
+    # a picker needs it. Loads run on the executor; lookups and changes are
+    # made on the Tk thread. After a write the form's key is added to or
+    # removed from the index in place; writes whose effect on the keys is not
+    # known mark the index stale, and a stale or expired index keeps answering
+    # lookups while a fresh one loads.
+
+    def __init__(self, backend, executor, monitor=None, ttl=INDEX_TTL):
+        self.backend = backend
+        self.executor = executor
+        # Optional perf_monitor.PerfMonitor timing each load
+        self.monitor = monitor
+        self.ttl = ttl
+        self.indexes = {}
+        self.expires = {}
+        # Entity -> changes made while its load is running, replayed on the
+        # loaded index so they are not lost
+        self.loading = {}
+        # Entity -> callbacks waiting for its first load
+        self.waiters = {}
+
+    def lookup(self, entity, prefix, callback):
+        # Calls callback with the matches, now if the index is loaded or
+        # else once it is
+        index = self.indexes.get(entity)
+        if index is not None:
+            callback(index.search(prefix))
+        else:
+            self.waiters.setdefault(entity, []).append(lambda index: callback(index.search(prefix)))
+        if index is None or self.expires[entity] <= time.monotonic():
+            self.load(entity)
+
+    def contains(self, entity, key):
+        # Whether key is in the loaded index; None when it is not loaded yet,
+        # in which case a load is started for next time
+        index = self.indexes.get(entity)
+        if index is None:
+            self.load(entity)
+            return None
+        return index.find(str(key)) is not None
+
+    def load(self, entity):
+        if entity in self.loading:
+            return
+        self.loading[entity] = []
+        statement = KEY_STATEMENTS[entity]
+        timer = self.monitor.start(statement) if self.monitor is not None else None
+
+        def work(task):
+            entries = []
+            for headers, rows in self.backend.stream(statement, [], FETCH_BATCH, task, timer):
+                entries.extend(rows)
+            return PrefixIndex(entries)
+
+        def on_success(index):
+            if timer is not None:
+                timer.finish()
+            for change in self.loading.pop(entity):
+                change(index)
+            self.indexes[entity] = index
+            self.expires[entity] = time.monotonic() + self.ttl
+            for callback in self.waiters.pop(entity, []):
+                callback(index)
+
+        def on_error(err):
+            if timer is not None:
+                timer.finish(err)
+            # Pickers fall back to plain entry; the next lookup tries again
+            del self.loading[entity]
+            self.waiters.pop(entity, None)
+            print(f"Failed to load {entity} keys: {err}")
+
+        self.executor.submit(f"load {entity} keys", work, on_success=on_success, on_error=on_error)
+
+    def change(self, entity, apply):
+        index = self.indexes.get(entity)
+        if index is not None:
+            apply(index)
+        if entity in self.loading:
+            self.loading[entity].append(apply)
+
+    def upsert(self, entity, key, name):
+        if entity in KEY_STATEMENTS and key:
+            self.change(entity, lambda index: index.upsert(key, name))
+
+    def remove(self, entity, key):
+        if entity in KEY_STATEMENTS and key:
+            self.change(entity, lambda index: index.remove(key))
+
+    def invalidate_write(self, table):
+        # A write to table changed keys in ways not known here: reload the
+        # affected indexes the next time they are used
+        for entity in WRITE_EFFECTS.get(table, {table}):
+            self.invalidate(entity)
+
+    def invalidate(self, entity):
+        if entity in self.indexes:
+            self.expires[entity] = 0.0
+
+
+class KeyPicker(tk.Entry):
+    # An Entry suggesting the keys of one entity as the user types: keys or
+    # names starting with the text are listed under the entry, and choosing
+    # one fills in its key. Lookups wait for a pause in typing and only read
+    # the in-memory index, so the UI never waits on the database.
+
+    def __init__(self, parent, key_index, entity, bg="#333333", fg="#ffffff", select_bg="#3f51b5", **options):
+        super().__init__(parent, bg=bg, fg=fg, insertbackground=fg, **options)
+        self.key_index = key_index
+        self.entity = entity
+        self.after_id = None
+        # Bumped on every keystroke so answers for older text are ignored
+        self.generation = 0
+
+        self.popup = tk.Toplevel(self)
+        self.popup.overrideredirect(True)
+        self.popup.withdraw()
+        self.listbox = tk.Listbox(
+            self.popup, height=MAX_SUGGESTIONS // 2, bg=bg, fg=fg, selectbackground=select_bg,
+            font=options.get("font"), relief=tk.FLAT, borderwidth=1, activestyle="none"
+        )
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self.matches = []
+
+        self.bind("<KeyRelease>", self.on_key)
+        self.bind("<Down>", self.focus_list)
+        self.bind("<Escape>", lambda e: self.hide())
+        self.bind("<FocusOut>", self.on_focus_out)
+        self.listbox.bind("<Return>", self.choose)
+        self.listbox.bind("<ButtonRelease-1>", self.choose)
+        self.listbox.bind("<Escape>", lambda e: (self.hide(), self.focus_set()))
+        self.listbox.bind("<FocusOut>", self.on_focus_out)
+
+    def on_key(self, event):
+        if event.keysym in ("Down", "Up", "Escape", "Return", "Tab"):
+            return
+        self.generation += 1
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+        self.after_id = self.after(DEBOUNCE_MS, self.lookup)
+
+    def lookup(self):
+        self.after_id = None
+        prefix = self.get().strip()
+        if not prefix:
+            self.hide()
+            return
+        generation = self.generation
+        self.key_index.lookup(self.entity, prefix, lambda matches: self.show(matches, generation))
+
+    def show(self, matches, generation):
+        if generation != self.generation or not self.winfo_exists():
+            return
+        self.matches = matches
+        if not matches or self.focus_get() is not self:
+            self.hide()
+            return
+        self.listbox.delete(0, tk.END)
+        for key, name in matches:
+            self.listbox.insert(tk.END, f"{key}  {name}" if name else key)
+        self.listbox.config(height=min(len(matches), MAX_SUGGESTIONS // 2))
+        self.popup.geometry(f"+{self.winfo_rootx()}+{self.winfo_rooty() + self.winfo_height()}")
+        self.popup.deiconify()
+        self.popup.lift()
+
+    def hide(self):
+        if self.popup.winfo_exists():
+            self.popup.withdraw()
+
+    def focus_list(self, event):
+        if self.matches and self.popup.winfo_viewable():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+        return "break"
+
+    def choose(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.delete(0, tk.END)
+            self.insert(0, self.matches[selection[0]][0])
+        self.hide()
+        self.focus_set()
+        self.icursor(tk.END)
+
+    def on_focus_out(self, event):
+        # Wait for focus to land, so a click on the list still chooses
+        self.after(100, self.hide_unless_focused)
+
+    def hide_unless_focused(self):
+        if not self.winfo_exists():
+            return
+        focus = self.focus_get()
+        if focus is not self and focus is not self.listbox:
+            self.hide()
+
+    def destroy(self):
+        if self.after_id is not None:
+            self.after_cancel(self.after_id)
+            self.after_id = None
+        super().destroy()
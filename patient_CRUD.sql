@@ -14,12 +14,12 @@ BEGIN
     END IF;
     
     -- Check that primary physician exists
-    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_primary_physician_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_primary_physician_id AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Primary physician does not exist.';
     END IF;
     
     -- Check that additional doctor exists if provided
-    IF p_additional_doctor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_additional_doctor_id) THEN
+    IF p_additional_doctor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_additional_doctor_id AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Additional doctor does not exist.';
     END IF;
     
@@ -71,11 +71,11 @@ BEGIN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Patient does not exist';
     END IF;
     
-    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_primary_physician_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_primary_physician_id AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Primary physician does not exist';
     END IF;
     
-    IF p_additional_doctor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_additional_doctor_id) THEN
+    IF p_additional_doctor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_additional_doctor_id AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Additional doctor does not exist';
     END IF;
     
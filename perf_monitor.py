@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+LOG_PATH = "nova_perf.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+# Operations taking longer than this end to end are flagged as slow
+SLOW_THRESHOLD_MS = 500.0
+# Operations kept in memory for the Performance panel
+HISTORY_SIZE = 1000
+
+
+def args_hash(args):
+    # Arguments carry patient and doctor IDs, so only a hash is logged; it is
+    # still enough to tell repeated calls with the same arguments apart
+    return hashlib.sha1(repr(list(args)).encode("utf-8")).hexdigest()[:12]
+
+
+def elapsed_ms(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 3)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class OperationTimer:
+    # Timings for one database operation. The worker thread marks when the
+    # server answered and when the last row was fetched; the main thread adds
+    # the time spent putting rows on screen and finishes the timer.
+
+    def __init__(self, monitor, name, args):
+        self.monitor = monitor
+        self.name = name
+        self.args_hash = args_hash(args)
+        self.started = time.perf_counter()
+        self.server_done_at = None
+        self.fetch_done_at = None
+        self.render_seconds = 0.0
+        self.rows = 0
+        # Set when the result came from the query cache instead of the server
+        self.cached = False
+        self.finished = False
+
+    def server_done(self):
+        # execute() or callproc() returned: the server has started answering
+        if self.server_done_at is None:
+            self.server_done_at = time.perf_counter()
+
+    def add_rows(self, count):
+        self.rows += count
+
+    def fetch_done(self):
+        self.server_done()
+        self.fetch_done_at = time.perf_counter()
+
+    @contextmanager
+    def rendering(self):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.render_seconds += time.perf_counter() - began
+
+    def finish(self, error=None):
+        if self.finished:
+            return None
+        self.finished = True
+
+        total_ms = elapsed_ms(self.started, time.perf_counter())
+        record = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "name": self.name,
+            "args_hash": self.args_hash,
+            "server_ms": elapsed_ms(self.started, self.server_done_at),
+            "fetch_ms": elapsed_ms(self.server_done_at, self.fetch_done_at),
+            "render_ms": round(self.render_seconds * 1000, 3),
+            "total_ms": total_ms,
+            "rows": self.rows,
+            "cached": self.cached,
+            "slow": total_ms > self.monitor.slow_threshold_ms,
+            "error": None if error is None else str(error),
+        }
+        self.monitor.record(record)
+        return record
+
+
+class PerfMonitor:
+    def __init__(self, log_path=LOG_PATH, slow_threshold_ms=SLOW_THRESHOLD_MS,
+                 max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUPS, history=HISTORY_SIZE):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.records = deque(maxlen=history)
+        self.lock = threading.Lock()
+
+        # One JSON object per line, so the log can be loaded with any JSONL tool
+        self.logger = logging.getLogger(f"nova.perf.{id(self)}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.handler = None
+        if log_path:
+            self.handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                               encoding="utf-8", delay=True)
+            self.handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(self.handler)
+
+    def start(self, name, args=()):
+        return OperationTimer(self, name, args)
+
+    @contextmanager
+    def track(self, name, args=()):
+        # For operations with nothing to render: times the block and records
+        # it, including the error if it raises
+        timer = self.start(name, args)
+        try:
+            yield timer
+        except Exception as e:
+            timer.finish(e)
+            raise
+        timer.finish()
+
+    def record(self, record):
+        with self.lock:
+            self.records.append(record)
+        level = logging.WARNING if record["slow"] or record["error"] else logging.INFO
+        self.logger.log(level, json.dumps(record))
+
+    def set_threshold(self, slow_threshold_ms):
+        # Applies to operations finished from now on
+        self.slow_threshold_ms = slow_threshold_ms
+
+    def recent(self, limit=100):
+        with self.lock:
+            return list(self.records)[-limit:][::-1]
+
+    def summary(self):
+        # Per operation name, slowest first by p95
+        with self.lock:
+            records = list(self.records)
+
+        by_name = {}
+        for record in records:
+            by_name.setdefault(record["name"], []).append(record)
+
+        summary = []
+        for name, group in by_name.items():
+            totals = sorted(r["total_ms"] for r in group)
+            summary.append({
+                "name": name,
+                "calls": len(group),
+                "slow": sum(1 for r in group if r["slow"]),
+                "errors": sum(1 for r in group if r["error"]),
+                "avg_ms": round(sum(totals) / len(totals), 3),
+                "p95_ms": percentile(totals, 0.95),
+                "max_ms": totals[-1],
+                "avg_rows": round(sum(r["rows"] for r in group) / len(group), 1),
+            })
+        summary.sort(key=lambda s: s["p95_ms"], reverse=True)
+        return summary
+
+    def close(self):
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+            self.handler.close()
+            self.handler = None
@@ -49,12 +49,14 @@ BEGIN
     START TRANSACTION;
     
     -- Delete from Sells (will cascade due to foreign key constraints)
-    DELETE FROM Sells
-    WHERE ph_address = p_address;
+    DELETE s FROM Sells s
+    JOIN Pharmacy p ON p.ph_id = s.ph_id
+    WHERE p.address = p_address;
     
     -- Delete from Contract
-    DELETE FROM Contract
-    WHERE ph_address = p_address;
+    DELETE c FROM Contract c
+    JOIN Pharmacy p ON p.ph_id = c.ph_id
+    WHERE p.address = p_address;
     
     -- Delete the pharmacy
     DELETE FROM Pharmacy
@@ -74,6 +76,8 @@ CREATE PROCEDURE add_drug_to_pharmacy(
     IN p_price DECIMAL(10,2)
 )
 BEGIN
+    DECLARE v_ph_id INT;
+    
     -- Input validation
     IF p_stock < 0 THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Stock cannot be negative';
@@ -84,23 +88,29 @@ BEGIN
     END IF;
     
     -- Check that pharmacy exists
-    IF NOT EXISTS (SELECT 1 FROM Pharmacy WHERE address = p_pharmacy_address) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address AND is_active;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist';
     END IF;
     
-    -- Check that drug exists
-    IF NOT EXISTS (SELECT 1 FROM Drug WHERE drug_id = p_drug_id) THEN
+    -- Check that drug exists; one from a company being purged is gone
+    IF NOT EXISTS (
+        SELECT 1 FROM Drug d
+        JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+        WHERE d.drug_id = p_drug_id AND pc.is_active
+    ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Drug does not exist';
     END IF;
     
     -- Check if entry already exists
-    IF EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is already being sold at this pharmacy. Use update_drug_quantity instead.';
     END IF;
     
     -- Insert the new sells relationship
-    INSERT INTO Sells(ph_address, drug_id, stock, price)
-    VALUES (p_pharmacy_address, p_drug_id, p_stock, p_price);
+    INSERT INTO Sells(ph_id, drug_id, stock, price)
+    VALUES (v_ph_id, p_drug_id, p_stock, p_price);
     
     SELECT CONCAT('Drug with ID ', p_drug_id, ' is now being sold at pharmacy at address ', p_pharmacy_address, 
                  ' with initial stock of ', p_stock, ' units at $', p_price, ' per unit') AS result;
@@ -114,27 +124,35 @@ CREATE PROCEDURE delete_drug_from_pharmacy(
     IN p_drug_id INT
 )
 BEGIN
-    DECLARE drug_count INT;
+    DECLARE v_ph_id INT;
+    DECLARE v_drug_count INT;
+    
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
     
     -- Check if relationship exists
-    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is not being sold at this pharmacy';
     END IF;
     
-    -- Check if this would reduce the pharmacy's drug count below 10
-    SELECT COUNT(*) INTO drug_count FROM Sells WHERE ph_address = p_pharmacy_address;
+    -- Start transaction for consistency
+    START TRANSACTION;
+    
+    -- Check if this would reduce the pharmacy's drug count below 10. The
+    -- counter is kept by the Sells triggers (inventory_summary.sql); locking
+    -- it stops two concurrent deletes from both passing the check.
+    SELECT drug_count INTO v_drug_count FROM PharmacyInventory
+    WHERE ph_id = v_ph_id FOR UPDATE;
     
-    IF drug_count <= 10 THEN
+    -- A missing summary row counts as no drugs rather than skipping the check
+    IF COALESCE(v_drug_count, 0) <= 10 THEN
+        ROLLBACK;
         SIGNAL SQLSTATE '45000' 
         SET MESSAGE_TEXT = 'Cannot remove drug from pharmacy. Each pharmacy must sell at least 10 drugs.';
     END IF;
     
-    -- Start transaction for consistency
-    START TRANSACTION;
-    
     -- Delete the sells relationship
     DELETE FROM Sells
-    WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id;
+    WHERE ph_id = v_ph_id AND drug_id = p_drug_id;
     
     -- Commit the transaction
     COMMIT;
@@ -152,6 +170,8 @@ CREATE PROCEDURE update_drug_quantity(
     IN p_new_price DECIMAL(10,2)
 )
 BEGIN
+    DECLARE v_ph_id INT;
+    
     -- Input validation
     IF p_new_stock < 0 THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Stock cannot be negative';
@@ -162,7 +182,9 @@ BEGIN
     END IF;
     
     -- Check that pharmacy exists
-    IF NOT EXISTS (SELECT 1 FROM Pharmacy WHERE address = p_pharmacy_address) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist';
     END IF;
     
@@ -172,7 +194,7 @@ BEGIN
     END IF;
     
     -- Check if entry exists
-    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is not being sold at this pharmacy. Use add_drug_to_pharmacy instead.';
     END IF;
     
@@ -183,7 +205,7 @@ BEGIN
     UPDATE Sells
     SET stock = p_new_stock,
         price = p_new_price
-    WHERE ph_address = p_pharmacy_address 
+    WHERE ph_id = v_ph_id 
     AND drug_id = p_drug_id;
     
     -- Commit the transaction
@@ -15,12 +15,16 @@ BEGIN
     END IF;
     
     -- Validate doctor
-    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_did) THEN
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_did AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor does not exist.';
     END IF;
     
-    -- Validate drug
-    IF NOT EXISTS (SELECT 1 FROM Drug WHERE drug_id = p_drug_id) THEN
+    -- Validate drug; one from a company being purged is gone
+    IF NOT EXISTS (
+        SELECT 1 FROM Drug d
+        JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+        WHERE d.drug_id = p_drug_id AND pc.is_active
+    ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Drug does not exist.';
     END IF;
     
@@ -121,12 +125,16 @@ BEGIN
     END IF;
     
     -- Check that the new doctor exists
-    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_new_did) THEN
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_new_did AND is_active) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'New doctor does not exist.';
     END IF;
     
-    -- Check that the new drug exists
-    IF NOT EXISTS (SELECT 1 FROM Drug WHERE drug_id = p_new_drug_id) THEN
+    -- Check that the new drug exists; one from a company being purged is gone
+    IF NOT EXISTS (
+        SELECT 1 FROM Drug d
+        JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+        WHERE d.drug_id = p_new_drug_id AND pc.is_active
+    ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'New drug does not exist.';
     END IF;
     
@@ -163,4 +171,94 @@ BEGIN
     
     SELECT CONCAT('Prescription updated successfully') AS result;
 END$$
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+-- Procedure to add a prescription with several drugs in one call.
+-- p_items is a JSON array of {"drug_id": ..., "quantity": ...} objects.
+DELIMITER $$
+CREATE PROCEDURE add_prescription_multi(
+    IN p_pid VARCHAR(12),
+    IN p_did VARCHAR(12),
+    IN p_pres_date DATE,
+    IN p_items JSON
+)
+BEGIN
+    DECLARE new_pres_id INT;
+    DECLARE item_count INT;
+    DECLARE distinct_count INT;
+    DECLARE bad_quantities INT;
+    DECLARE missing_drugs TEXT;
+    DECLARE error_message VARCHAR(255);
+    
+    -- Validate patient
+    IF NOT EXISTS (SELECT 1 FROM Patient WHERE paadharid = p_pid) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Patient does not exist.';
+    END IF;
+    
+    -- Validate doctor
+    IF NOT EXISTS (SELECT 1 FROM Doctor WHERE daadharid = p_did AND is_active) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor does not exist.';
+    END IF;
+    
+    -- Validate doctor-patient relationship
+    IF NOT EXISTS (SELECT 1 FROM Treats WHERE did = p_did AND pid = p_pid) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This doctor does not treat this patient.';
+    END IF;
+    
+    IF p_items IS NULL OR JSON_TYPE(p_items) <> 'ARRAY' OR JSON_LENGTH(p_items) = 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'A prescription needs at least one drug.';
+    END IF;
+    
+    -- Validate every drug and quantity in one pass instead of one lookup per drug
+    SELECT
+        COUNT(*),
+        COUNT(DISTINCT i.drug_id),
+        SUM(i.quantity IS NULL OR i.quantity <= 0),
+        GROUP_CONCAT(CASE WHEN d.drug_id IS NULL THEN COALESCE(i.drug_id, 'NULL') END)
+    INTO item_count, distinct_count, bad_quantities, missing_drugs
+    FROM JSON_TABLE(p_items, '$[*]' COLUMNS (
+        drug_id INT PATH '$.drug_id',
+        quantity INT PATH '$.quantity'
+    )) AS i
+    -- A drug from a company being purged counts as missing
+    LEFT JOIN (Drug d JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id AND pc.is_active)
+        ON d.drug_id = i.drug_id;
+    
+    IF missing_drugs IS NOT NULL THEN
+        SET error_message = LEFT(CONCAT('Drug does not exist: ', missing_drugs), 255);
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = error_message;
+    END IF;
+    
+    IF bad_quantities > 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Quantity must be positive.';
+    END IF;
+    
+    IF distinct_count < item_count THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'A drug is listed more than once in this prescription.';
+    END IF;
+    
+    -- Start transaction
+    START TRANSACTION;
+    
+    -- Delete older prescriptions for this doctor-patient pair
+    DELETE FROM Prescription
+    WHERE pid = p_pid AND did = p_did AND pres_date < p_pres_date;
+    
+    -- Insert new prescription
+    INSERT INTO Prescription(pid, did, pres_date)
+    VALUES (p_pid, p_did, p_pres_date);
+    
+    SET new_pres_id = LAST_INSERT_ID();
+    
+    -- Link every prescribed drug with a single multi-row insert
+    INSERT INTO Contains_drug(pres_id, drug_id, quantity)
+    SELECT new_pres_id, i.drug_id, i.quantity
+    FROM JSON_TABLE(p_items, '$[*]' COLUMNS (
+        drug_id INT PATH '$.drug_id',
+        quantity INT PATH '$.quantity'
+    )) AS i;
+    
+    COMMIT;
+    
+    SELECT CONCAT('Prescription with ', item_count, ' drug(s) added successfully for patient ', p_pid, ' from doctor ', p_did, ' on date ', p_pres_date) AS result;
+END$$
+DELIMITER ;
@@ -0,0 +1,295 @@
+-- Archive tier for prescriptions. Prescription, Contains_drug and
+-- PrescriptionHistory keep every prescription ever written, so the indexes
+-- the counters use keep growing with the history. archive_prescriptions
+-- moves prescriptions dated before a cutoff out of those tables into
+-- PrescriptionArchive, one bounded batch per call (archive.py runs it in a
+-- loop). The archive has the same rows as PrescriptionHistory and is RANGE
+-- partitioned by pres_date, one partition per year, so a report over a date
+-- range reads only the partitions that can hold it. The hot tables cannot be
+-- partitioned themselves: MySQL does not partition tables with foreign keys.
+--
+-- prescription_report, print_pres_details and prescription_report_page read
+-- both tiers. An archived prescription is read only; update_prescription
+-- and delete_prescription find hot prescriptions only. Renames reach the
+-- archive through the triggers below, as they reach the history, and
+-- deleting a patient, doctor, drug or company removes its archived rows as
+-- it does the hot ones; purge_step (purge.sql) removes them in batches
+-- before the entity. A new prescription replaces the older archived ones for
+-- the same patient and doctor, as it does the hot ones.
+--
+-- Apply after prescription_history.sql, on a new install or an existing nova
+-- database. The report procedures are dropped here, so reload
+-- specific_procs.sql afterwards.
+USE nova;
+
+DROP PROCEDURE IF EXISTS prescription_report;
+DROP PROCEDURE IF EXISTS print_pres_details;
+DROP PROCEDURE IF EXISTS prescription_report_page;
+
+DROP PROCEDURE IF EXISTS add_archive_partitions;
+DROP PROCEDURE IF EXISTS archive_prescriptions;
+
+-- Partitioned tables need the partitioning column in every unique key; the
+-- primary key has pres_date already. Only the catch-all partition exists at
+-- first; add_archive_partitions splits yearly partitions off it.
+CREATE TABLE IF NOT EXISTS PrescriptionArchive (
+    pid VARCHAR(12) NOT NULL,
+    pres_date DATE NOT NULL,
+    pres_id INT NOT NULL,
+    drug_id INT NOT NULL,
+    did VARCHAR(12) NOT NULL,
+    patient_name VARCHAR(100) NOT NULL,
+    doctor_name VARCHAR(100) NOT NULL,
+    trade_name VARCHAR(100) NOT NULL,
+    formula VARCHAR(200) NOT NULL,
+    company_name VARCHAR(100) NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (pid, pres_date, pres_id, drug_id),
+    -- Used by the rename and delete triggers below
+    INDEX idx_archive_doctor (did),
+    INDEX idx_archive_drug (drug_id)
+)
+PARTITION BY RANGE COLUMNS (pres_date) (
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- archive_prescriptions picks the oldest prescriptions first
+DELIMITER $$
+CREATE PROCEDURE add_prescription_date_index()
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Prescription'
+        AND INDEX_NAME = 'idx_prescription_date'
+    ) THEN
+        ALTER TABLE Prescription ADD INDEX idx_prescription_date (pres_date);
+    END IF;
+END$$
+DELIMITER ;
+
+CALL add_prescription_date_index();
+
+DROP PROCEDURE add_prescription_date_index;
+
+-- Splits yearly partitions p<year> off p_future up to the year of p_until.
+-- Archived rows are all older than the cutoff, so p_future is empty when
+-- it is split and the split copies nothing. On the first call the yearly
+-- partitions start at the year of p_from, the oldest prescription being
+-- archived; after that they continue from the newest one. The first
+-- partition also takes every earlier year, e.g. a backdated prescription
+-- archived later.
+DELIMITER $$
+CREATE PROCEDURE add_archive_partitions(
+    IN p_from DATE,
+    IN p_until DATE
+)
+BEGIN
+    DECLARE v_year INT;
+    DECLARE v_parts TEXT DEFAULT '';
+
+    SELECT MAX(CAST(SUBSTRING(PARTITION_NAME, 2) AS UNSIGNED)) INTO v_year
+    FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PrescriptionArchive'
+    AND PARTITION_NAME REGEXP '^p[0-9]{4}$';
+
+    IF v_year IS NULL THEN
+        SET v_year = YEAR(p_from) - 1;
+    END IF;
+
+    WHILE v_year < YEAR(p_until) DO
+        SET v_year = v_year + 1;
+        SET v_parts = CONCAT(v_parts, 'PARTITION p', v_year,
+                             ' VALUES LESS THAN (''', v_year + 1, '-01-01''), ');
+    END WHILE;
+
+    IF v_parts != '' THEN
+        SET @sql = CONCAT('ALTER TABLE PrescriptionArchive REORGANIZE PARTITION p_future INTO (',
+                          v_parts, 'PARTITION p_future VALUES LESS THAN (MAXVALUE))');
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Moves one batch of at most p_batch_size prescriptions dated before
+-- p_before, oldest first, to the archive. The copy and the delete commit
+-- together, so each prescription is in exactly one tier. Returns the number
+-- moved; 0 means nothing older than the cutoff is left.
+DELIMITER $$
+CREATE PROCEDURE archive_prescriptions(
+    IN p_before DATE,
+    IN p_batch_size INT
+)
+BEGIN
+    DECLARE v_prescriptions INT;
+    DECLARE v_rows INT;
+    DECLARE v_oldest DATE;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        DROP TEMPORARY TABLE IF EXISTS archive_batch;
+        RESIGNAL;
+    END;
+
+    IF p_before IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Archive cutoff date is required';
+    END IF;
+
+    IF p_before > CURDATE() THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Archive cutoff date cannot be in the future';
+    END IF;
+
+    IF p_batch_size IS NULL OR p_batch_size <= 0 THEN
+        SET p_batch_size = 1000;
+    END IF;
+
+    SELECT MIN(pres_date) INTO v_oldest FROM Prescription WHERE pres_date < p_before;
+
+    -- An ALTER commits, so this runs before the batch's transaction. With
+    -- nothing to archive no partitions are needed.
+    IF v_oldest IS NOT NULL THEN
+        CALL add_archive_partitions(v_oldest, p_before);
+    END IF;
+
+    DROP TEMPORARY TABLE IF EXISTS archive_batch;
+    CREATE TEMPORARY TABLE archive_batch (pres_id INT PRIMARY KEY);
+
+    START TRANSACTION;
+
+    -- Locked, so an update_prescription running alongside either finishes
+    -- first or finds the prescription gone
+    INSERT INTO archive_batch(pres_id)
+    SELECT pres_id FROM Prescription
+    WHERE pres_date < p_before
+    ORDER BY pres_date, pres_id
+    LIMIT p_batch_size
+    FOR UPDATE;
+
+    SET v_prescriptions = ROW_COUNT();
+
+    INSERT INTO PrescriptionArchive(pid, pres_date, pres_id, drug_id, did, patient_name, doctor_name,
+                                    trade_name, formula, company_name, quantity)
+    SELECT h.pid, h.pres_date, h.pres_id, h.drug_id, h.did, h.patient_name, h.doctor_name,
+           h.trade_name, h.formula, h.company_name, h.quantity
+    FROM PrescriptionHistory h
+    JOIN archive_batch b ON b.pres_id = h.pres_id;
+
+    SET v_rows = ROW_COUNT();
+
+    -- Cascades to Contains_drug and through it to PrescriptionHistory
+    DELETE pr FROM Prescription pr
+    JOIN archive_batch b ON b.pres_id = pr.pres_id;
+
+    COMMIT;
+
+    DROP TEMPORARY TABLE archive_batch;
+
+    SELECT CONCAT('Archived ', v_prescriptions, ' prescription(s) dated before ', p_before) AS result,
+           v_prescriptions AS Prescriptions, v_rows AS Rows_Archived;
+END$$
+DELIMITER ;
+
+-- Name changes are copied into the archive as into the history
+-- (prescription_history.sql)
+DELIMITER $$
+CREATE TRIGGER patient_after_update_archive AFTER UPDATE ON Patient
+FOR EACH ROW
+BEGIN
+    IF OLD.p_name != NEW.p_name THEN
+        UPDATE PrescriptionArchive SET patient_name = NEW.p_name
+        WHERE pid = NEW.paadharid;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER doctor_after_update_archive AFTER UPDATE ON Doctor
+FOR EACH ROW
+BEGIN
+    IF OLD.d_name != NEW.d_name THEN
+        UPDATE PrescriptionArchive SET doctor_name = NEW.d_name
+        WHERE did = NEW.daadharid;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_after_update_archive AFTER UPDATE ON Drug
+FOR EACH ROW
+BEGIN
+    IF OLD.trade_name != NEW.trade_name OR OLD.formula != NEW.formula
+       OR OLD.company_id != NEW.company_id THEN
+        UPDATE PrescriptionArchive a
+        JOIN PharmaceuticalCompany pc ON pc.company_id = NEW.company_id
+        SET a.trade_name = NEW.trade_name,
+            a.formula = NEW.formula,
+            a.company_name = pc.company_name
+        WHERE a.drug_id = NEW.drug_id;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER company_after_update_archive AFTER UPDATE ON PharmaceuticalCompany
+FOR EACH ROW
+BEGIN
+    IF OLD.company_name != NEW.company_name THEN
+        UPDATE PrescriptionArchive a
+        JOIN Drug dr ON dr.drug_id = a.drug_id
+        SET a.company_name = NEW.company_name
+        WHERE dr.company_id = NEW.company_id;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Deletes take the archived rows with them, as the foreign keys take the
+-- hot ones
+DELIMITER $$
+CREATE TRIGGER patient_after_delete_archive AFTER DELETE ON Patient
+FOR EACH ROW
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE pid = OLD.paadharid;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER doctor_after_delete_archive AFTER DELETE ON Doctor
+FOR EACH ROW
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE did = OLD.daadharid;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_after_delete_archive AFTER DELETE ON Drug
+FOR EACH ROW
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE drug_id = OLD.drug_id;
+END$$
+DELIMITER ;
+
+-- A company's drugs go by ON DELETE CASCADE, which fires no triggers, so
+-- their archived rows are removed before the company
+DELIMITER $$
+CREATE TRIGGER company_before_delete_archive BEFORE DELETE ON PharmaceuticalCompany
+FOR EACH ROW
+BEGIN
+    DELETE a FROM PrescriptionArchive a
+    JOIN Drug dr ON dr.drug_id = a.drug_id
+    WHERE dr.company_id = OLD.company_id;
+END$$
+DELIMITER ;
+
+-- A new prescription replaces the older ones for the same patient and
+-- doctor (add_prescription, add_prescription_multi), archived ones included.
+-- The primary key leads with pid, so this reads only the patient's rows.
+DELIMITER $$
+CREATE TRIGGER prescription_after_insert_archive AFTER INSERT ON Prescription
+FOR EACH ROW
+BEGIN
+    DELETE FROM PrescriptionArchive
+    WHERE pid = NEW.pid AND did = NEW.did AND pres_date < NEW.pres_date;
+END$$
+DELIMITER ;
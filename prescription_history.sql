@@ -0,0 +1,200 @@
+-- Denormalized prescription history: one row per prescribed drug with the
+-- patient, doctor, drug and manufacturer names already filled in, clustered
+-- by (pid, pres_date) so prescription_report and print_pres_details are a
+-- single primary key range read instead of a five-table join.
+-- Apply after tables_def.sql (and surrogate_keys.sql on a database created
+-- before it), on a new install or an existing nova database; the last
+-- statement fills the table from the current data.
+USE nova;
+
+CREATE TABLE IF NOT EXISTS PrescriptionHistory (
+    pid VARCHAR(12) NOT NULL,
+    pres_date DATE NOT NULL,
+    pres_id INT NOT NULL,
+    drug_id INT NOT NULL,
+    did VARCHAR(12) NOT NULL,
+    patient_name VARCHAR(100) NOT NULL,
+    doctor_name VARCHAR(100) NOT NULL,
+    trade_name VARCHAR(100) NOT NULL,
+    formula VARCHAR(200) NOT NULL,
+    company_name VARCHAR(100) NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (pid, pres_date, pres_id, drug_id),
+    -- Used by the triggers that copy doctor and drug changes across
+    INDEX idx_history_doctor (did),
+    INDEX idx_history_drug (drug_id),
+    -- Deleting a prescription, or the patient, doctor or drug behind it,
+    -- removes its Contains_drug rows and through them the history rows
+    FOREIGN KEY (pres_id, drug_id) REFERENCES Contains_drug(pres_id, drug_id)
+        ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Every way a drug is added to a prescription (add_prescription,
+-- add_prescription_multi, update_prescription or a direct insert) goes
+-- through Contains_drug, so the history is filled in from there
+DELIMITER $$
+CREATE TRIGGER contains_drug_after_insert AFTER INSERT ON Contains_drug
+FOR EACH ROW
+BEGIN
+    INSERT INTO PrescriptionHistory(pid, pres_date, pres_id, drug_id, did, patient_name, doctor_name,
+                                    trade_name, formula, company_name, quantity)
+    SELECT pr.pid, pr.pres_date, pr.pres_id, dr.drug_id, pr.did, pt.p_name, d.d_name,
+           dr.trade_name, dr.formula, pc.company_name, NEW.quantity
+    FROM Prescription pr
+    JOIN Patient pt ON pr.pid = pt.paadharid
+    JOIN Doctor d ON pr.did = d.daadharid
+    JOIN Drug dr ON dr.drug_id = NEW.drug_id
+    JOIN PharmaceuticalCompany pc ON pc.company_id = dr.company_id
+    WHERE pr.pres_id = NEW.pres_id;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER contains_drug_after_update AFTER UPDATE ON Contains_drug
+FOR EACH ROW
+BEGIN
+    -- A changed drug_id has already been carried over by ON UPDATE CASCADE
+    UPDATE PrescriptionHistory h
+    JOIN Drug dr ON dr.drug_id = NEW.drug_id
+    JOIN PharmaceuticalCompany pc ON pc.company_id = dr.company_id
+    SET h.quantity = NEW.quantity,
+        h.trade_name = dr.trade_name,
+        h.formula = dr.formula,
+        h.company_name = pc.company_name
+    WHERE h.pres_id = NEW.pres_id AND h.drug_id = NEW.drug_id;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER prescription_after_update AFTER UPDATE ON Prescription
+FOR EACH ROW
+BEGIN
+    IF OLD.pid != NEW.pid OR OLD.did != NEW.did OR OLD.pres_date != NEW.pres_date THEN
+        UPDATE PrescriptionHistory h
+        JOIN Patient pt ON pt.paadharid = NEW.pid
+        JOIN Doctor d ON d.daadharid = NEW.did
+        SET h.pid = NEW.pid,
+            h.did = NEW.did,
+            h.pres_date = NEW.pres_date,
+            h.patient_name = pt.p_name,
+            h.doctor_name = d.d_name
+        WHERE h.pres_id = NEW.pres_id;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Name changes made through update_patient, update_doctor, update_drug and
+-- update_company are copied into the history
+DELIMITER $$
+CREATE TRIGGER patient_after_update_history AFTER UPDATE ON Patient
+FOR EACH ROW
+BEGIN
+    IF OLD.p_name != NEW.p_name THEN
+        UPDATE PrescriptionHistory SET patient_name = NEW.p_name
+        WHERE pid = NEW.paadharid;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER doctor_after_update_history AFTER UPDATE ON Doctor
+FOR EACH ROW
+BEGIN
+    IF OLD.d_name != NEW.d_name THEN
+        UPDATE PrescriptionHistory SET doctor_name = NEW.d_name
+        WHERE did = NEW.daadharid;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE TRIGGER drug_after_update_history AFTER UPDATE ON Drug
+FOR EACH ROW
+BEGIN
+    IF OLD.trade_name != NEW.trade_name OR OLD.formula != NEW.formula
+       OR OLD.company_id != NEW.company_id THEN
+        UPDATE PrescriptionHistory h
+        JOIN PharmaceuticalCompany pc ON pc.company_id = NEW.company_id
+        SET h.trade_name = NEW.trade_name,
+            h.formula = NEW.formula,
+            h.company_name = pc.company_name
+        WHERE h.drug_id = NEW.drug_id;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Drug rows refer to the company by company_id, so a rename only reaches
+-- the history through this trigger
+DELIMITER $$
+CREATE TRIGGER company_after_update_history AFTER UPDATE ON PharmaceuticalCompany
+FOR EACH ROW
+BEGIN
+    IF OLD.company_name != NEW.company_name THEN
+        UPDATE PrescriptionHistory h
+        JOIN Drug dr ON dr.drug_id = h.drug_id
+        SET h.company_name = NEW.company_name
+        WHERE dr.company_id = NEW.company_id;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Regenerates the history from the base tables, p_batch_size prescriptions
+-- per transaction so a full rebuild does not hold locks on the whole table.
+-- Writes made while it runs are kept in step by the triggers above.
+DELIMITER $$
+CREATE PROCEDURE rebuild_prescription_history(
+    IN p_batch_size INT
+)
+BEGIN
+    DECLARE v_from INT DEFAULT 0;
+    DECLARE v_to INT;
+    DECLARE v_max INT;
+    DECLARE v_rows INT DEFAULT 0;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    IF p_batch_size IS NULL OR p_batch_size <= 0 THEN
+        SET p_batch_size = 10000;
+    END IF;
+
+    SELECT IFNULL(MAX(pres_id), 0) INTO v_max FROM Prescription;
+
+    -- History rows whose prescription is gone cannot exist (foreign key), so
+    -- only the rows above the current maximum need clearing up front
+    DELETE FROM PrescriptionHistory WHERE pres_id > v_max;
+
+    WHILE v_from < v_max DO
+        SET v_to = v_from + p_batch_size;
+
+        START TRANSACTION;
+
+        DELETE FROM PrescriptionHistory WHERE pres_id > v_from AND pres_id <= v_to;
+
+        INSERT INTO PrescriptionHistory(pid, pres_date, pres_id, drug_id, did, patient_name, doctor_name,
+                                        trade_name, formula, company_name, quantity)
+        SELECT pr.pid, pr.pres_date, pr.pres_id, dr.drug_id, pr.did, pt.p_name, d.d_name,
+               dr.trade_name, dr.formula, pc.company_name, cd.quantity
+        FROM Prescription pr
+        JOIN Patient pt ON pr.pid = pt.paadharid
+        JOIN Doctor d ON pr.did = d.daadharid
+        JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
+        JOIN Drug dr ON cd.drug_id = dr.drug_id
+        JOIN PharmaceuticalCompany pc ON dr.company_id = pc.company_id
+        WHERE pr.pres_id > v_from AND pr.pres_id <= v_to;
+
+        SET v_rows = v_rows + ROW_COUNT();
+
+        COMMIT;
+
+        SET v_from = v_to;
+    END WHILE;
+
+    SELECT CONCAT('Prescription history rebuilt: ', v_rows, ' rows') AS result;
+END$$
+DELIMITER ;
+
+CALL rebuild_prescription_history(10000);
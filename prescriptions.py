@@ -0,0 +1,36 @@
+import json
+
+
+def normalize_items(items):
+    # Turns (drug_id, quantity) pairs (as ints or strings from a form) into
+    # ints, rejecting what add_prescription_multi would reject anyway so the
+    # user gets the error without a round-trip
+    normalized = []
+    seen = set()
+    for drug_id, quantity in items:
+        try:
+            drug_id = int(str(drug_id).strip())
+        except ValueError:
+            raise ValueError(f"Drug ID must be a whole number: {drug_id!r}")
+        try:
+            quantity = int(str(quantity).strip())
+        except ValueError:
+            raise ValueError(f"Quantity for drug {drug_id} must be a whole number")
+        if quantity <= 0:
+            raise ValueError(f"Quantity for drug {drug_id} must be positive")
+        if drug_id in seen:
+            raise ValueError(f"Drug {drug_id} is listed more than once")
+        seen.add(drug_id)
+        normalized.append((drug_id, quantity))
+    if not normalized:
+        raise ValueError("A prescription needs at least one drug")
+    return normalized
+
+
+def items_json(items):
+    # The p_items argument of add_prescription_multi
+    return json.dumps([
+        {"drug_id": drug_id, "quantity": quantity}
+        for drug_id, quantity in normalize_items(items)
+    ])
+
@@ -0,0 +1,120 @@
+import argparse
+import sys
+import time
+
+import mysql.connector
+
+from backend import MySQLBackend
+from db_pool import ConnectionPool, DB_CONFIG
+
+# Runs the background purges of purge.sql. Starting one marks the doctor,
+# pharmacy or company inactive and records a job; the job then deletes its
+# dependents with one purge_step call per batch, each a short transaction,
+# so the counters keep working while a large manufacturer is removed. A job
+# stopped part way (a crash, a cancel, a lost connection) is picked up again
+# with resume_jobs or --resume. Works on any backend: MySQLBackend,
+# service_client.ServiceClient or sqlite_backend.SQLiteBackend.
+
+# Rows deleted per purge_step call
+PURGE_BATCH = 1000
+# Seconds to wait between batches, leaving the tables to other sessions
+PURGE_PAUSE = 0.05
+
+# Entity -> procedure starting its purge, which takes the entity's key
+PURGE_PROCEDURES = {
+    "Doctor": "purge_doctor",
+    "Pharmacy": "purge_pharmacy",
+    "PharmaceuticalCompany": "purge_company",
+}
+
+
+def rows_as_dicts(results):
+    headers, rows = results[-1]
+    return [dict(zip(headers, row)) for row in rows]
+
+
+def start_purge(backend, entity, key):
+    # Marks the entity inactive and returns the new job's id
+    results = backend.call(PURGE_PROCEDURES[entity], [key], write=True)
+    return rows_as_dicts(results)[0]["Job_ID"]
+
+
+def run_job(backend, job_id, batch_size=PURGE_BATCH, pause=PURGE_PAUSE, progress=None, should_stop=None):
+    # Calls purge_step until the job is done and returns the job's last
+    # state. progress is called with the state after every batch.
+    while True:
+        if should_stop:
+            should_stop()
+        job = rows_as_dicts(backend.call("purge_step", [job_id, batch_size], write=True))[0]
+        if progress:
+            progress(job)
+        if job["Status"] == "done":
+            return job
+        if pause:
+            time.sleep(pause)
+
+
+def purge(backend, entity, key, batch_size=PURGE_BATCH, pause=PURGE_PAUSE, progress=None, should_stop=None):
+    return run_job(backend, start_purge(backend, entity, key), batch_size, pause, progress, should_stop)
+
+
+def unfinished_jobs(backend):
+    jobs = rows_as_dicts(backend.call("print_purge_jobs", []))
+    return [job for job in jobs if job["Status"] != "done"]
+
+
+def resume_jobs(backend, batch_size=PURGE_BATCH, pause=PURGE_PAUSE, progress=None, should_stop=None):
+    # Runs every unfinished job to the end, oldest first
+    jobs = sorted(unfinished_jobs(backend), key=lambda job: job["Job_ID"])
+    return [run_job(backend, job["Job_ID"], batch_size, pause, progress, should_stop) for job in jobs]
+
+
+def describe(job):
+    return (f"Job {job['Job_ID']} ({job['Entity']} {job['Entity_Key']}): {job['Status']}, "
+            f"step {job['Step']}, {job['Rows_Deleted']} rows deleted")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Purge a doctor, pharmacy or company in small batches")
+    parser.add_argument("entity", nargs="?", choices=sorted(PURGE_PROCEDURES),
+                        help="What to purge; omit with --resume or --list")
+    parser.add_argument("key", nargs="?", help="Doctor ID, pharmacy address or company name")
+    parser.add_argument("--resume", action="store_true", help="Finish the purges that were stopped part way")
+    parser.add_argument("--list", action="store_true", help="List the purge jobs and exit")
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH)
+    parser.add_argument("--pause", type=float, default=PURGE_PAUSE, help="Seconds between batches")
+    args = parser.parse_args(argv)
+    if not args.resume and not args.list and (args.entity is None or args.key is None):
+        parser.error("give an entity and its key, or --resume or --list")
+
+    backend = MySQLBackend(ConnectionPool(DB_CONFIG, pool_size=1))
+
+    if args.list:
+        for job in rows_as_dicts(backend.call("print_purge_jobs", [])):
+            print(describe(job))
+        return 0
+
+    last_step = {}
+
+    def progress(job):
+        # One line per step, not per batch
+        if last_step.get(job["Job_ID"]) != job["Step"]:
+            last_step[job["Job_ID"]] = job["Step"]
+            print(describe(job), file=sys.stderr)
+
+    try:
+        if args.resume:
+            jobs = resume_jobs(backend, args.batch_size, args.pause, progress)
+        else:
+            jobs = [purge(backend, args.entity, args.key, args.batch_size, args.pause, progress)]
+    except mysql.connector.Error as e:
+        # Batches committed before the error stay done; --resume goes on from there
+        print(e.msg, file=sys.stderr)
+        return 1
+    for job in jobs:
+        print(describe(job))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
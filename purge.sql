@@ -0,0 +1,461 @@
+-- Background purge of a doctor, pharmacy or pharmaceutical company.
+-- delete_doctor, delete_pharmacy and delete_company remove the entity and
+-- everything that depends on it in one transaction, which for a large
+-- manufacturer holds row locks on Sells, Contract and Contains_drug for
+-- minutes. purge_doctor, purge_pharmacy and purge_company instead clear the
+-- entity's is_active flag, which hides it from the reports, the form pickers
+-- and the add procedures, and record a PurgeJob. purge_step then deletes the
+-- dependents a bounded batch at a time (purge.py runs it in a loop). Each
+-- batch commits together with the job's progress, so a job stopped by a
+-- crash or a cancel goes on from where it was when it is run again.
+--
+-- Apply after tables_def.sql, on a new install or an existing nova database.
+-- The is_active columns are added to a database created before them. The
+-- procedures that check the flag are dropped here, so reload afterwards, in
+-- order: patient_CRUD.sql, Treats_proc.sql, prescription_CRUD.sql,
+-- company_CRUD.sql, drug_CRUD.sql, pharmacy_CRUD.sql, sells_proc.sql,
+-- contract_CRUD.sql and specific_procs.sql.
+USE nova;
+
+DROP PROCEDURE IF EXISTS add_patient;
+DROP PROCEDURE IF EXISTS update_patient;
+DROP PROCEDURE IF EXISTS delete_patient;
+DROP PROCEDURE IF EXISTS add_treats_entry;
+DROP PROCEDURE IF EXISTS delete_treats_entry;
+DROP PROCEDURE IF EXISTS add_prescription;
+DROP PROCEDURE IF EXISTS delete_prescription;
+DROP PROCEDURE IF EXISTS update_prescription;
+DROP PROCEDURE IF EXISTS add_prescription_multi;
+DROP PROCEDURE IF EXISTS add_company;
+DROP PROCEDURE IF EXISTS update_company;
+DROP PROCEDURE IF EXISTS delete_company;
+DROP PROCEDURE IF EXISTS add_drug;
+DROP PROCEDURE IF EXISTS delete_drug;
+DROP PROCEDURE IF EXISTS update_drug;
+DROP PROCEDURE IF EXISTS add_pharmacy;
+DROP PROCEDURE IF EXISTS update_pharmacy;
+DROP PROCEDURE IF EXISTS delete_pharmacy;
+DROP PROCEDURE IF EXISTS add_drug_to_pharmacy;
+DROP PROCEDURE IF EXISTS delete_drug_from_pharmacy;
+DROP PROCEDURE IF EXISTS update_drug_quantity;
+DROP PROCEDURE IF EXISTS add_sells_entry;
+DROP PROCEDURE IF EXISTS delete_sells_entry;
+DROP PROCEDURE IF EXISTS update_sells_entry;
+DROP PROCEDURE IF EXISTS add_contract;
+DROP PROCEDURE IF EXISTS update_contract;
+DROP PROCEDURE IF EXISTS update_contract_supervisor;
+DROP PROCEDURE IF EXISTS delete_contract;
+DROP PROCEDURE IF EXISTS prescription_report;
+DROP PROCEDURE IF EXISTS print_pres_details;
+DROP PROCEDURE IF EXISTS drug_details;
+DROP PROCEDURE IF EXISTS print_stock_position;
+DROP PROCEDURE IF EXISTS print_pharmacy_contact;
+DROP PROCEDURE IF EXISTS print_company_contact;
+DROP PROCEDURE IF EXISTS print_patients_for_doctor;
+DROP PROCEDURE IF EXISTS display_contract;
+DROP PROCEDURE IF EXISTS prescription_report_page;
+DROP PROCEDURE IF EXISTS drug_details_page;
+DROP PROCEDURE IF EXISTS print_stock_position_page;
+DROP PROCEDURE IF EXISTS print_patients_for_doctor_page;
+DROP PROCEDURE IF EXISTS print_chain_stock;
+DROP PROCEDURE IF EXISTS drug_availability;
+DROP PROCEDURE IF EXISTS drug_availability_page;
+DROP PROCEDURE IF EXISTS print_pharmacy_inventory;
+DROP PROCEDURE IF EXISTS print_company_inventory;
+
+DROP PROCEDURE IF EXISTS purge_doctor;
+DROP PROCEDURE IF EXISTS purge_pharmacy;
+DROP PROCEDURE IF EXISTS purge_company;
+DROP PROCEDURE IF EXISTS purge_step;
+DROP PROCEDURE IF EXISTS print_purge_jobs;
+
+-- Adds is_active to p_table unless it is there already; a column with a
+-- default is added in place, without copying the table
+DELIMITER $$
+CREATE PROCEDURE add_is_active_column(
+    IN p_table VARCHAR(64)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_table AND COLUMN_NAME = 'is_active'
+    ) THEN
+        SET @sql = CONCAT('ALTER TABLE `', p_table, '` ADD COLUMN is_active BOOLEAN NOT NULL DEFAULT TRUE');
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+CALL add_is_active_column('Doctor');
+CALL add_is_active_column('Pharmacy');
+CALL add_is_active_column('PharmaceuticalCompany');
+
+DROP PROCEDURE add_is_active_column;
+
+-- One row per purge. entity is 'Doctor', 'Pharmacy' or
+-- 'PharmaceuticalCompany' and entity_key its key as the procedures take it.
+-- step names the rows purge_step is deleting; status is 'running' until the
+-- entity itself is gone, then 'done'.
+CREATE TABLE IF NOT EXISTS PurgeJob (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(30) NOT NULL,
+    entity_key VARCHAR(200) NOT NULL,
+    step VARCHAR(30) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'running',
+    rows_deleted BIGINT NOT NULL DEFAULT 0,
+    started_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL,
+    -- purge.py --resume looks for the unfinished jobs
+    INDEX idx_purge_job_status (status, job_id)
+);
+
+-- Procedure to start purging a doctor. Same rule as delete_doctor: a doctor
+-- who is still some patient's primary physician cannot be removed.
+DELIMITER $$
+CREATE PROCEDURE purge_doctor(
+    IN p_doctor_id VARCHAR(12)
+)
+BEGIN
+    DECLARE v_active BOOLEAN;
+    DECLARE v_job_id INT;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+
+    -- Locked, so no patient can take the doctor as primary physician
+    -- between the check and the mark
+    SELECT is_active INTO v_active FROM Doctor WHERE daadharid = p_doctor_id FOR UPDATE;
+
+    IF v_active IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor does not exist';
+    END IF;
+
+    IF NOT v_active THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor is already being purged';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM Patient WHERE p_daadharid = p_doctor_id) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete doctor: Doctor is the primary physician for one or more patients';
+    END IF;
+
+    UPDATE Doctor SET is_active = FALSE WHERE daadharid = p_doctor_id;
+
+    INSERT INTO PurgeJob(entity, entity_key, step) VALUES ('Doctor', p_doctor_id, 'treats');
+    SET v_job_id = LAST_INSERT_ID();
+
+    COMMIT;
+
+    SELECT CONCAT('Doctor ', p_doctor_id, ' is being purged (job ', v_job_id, ')') AS result, v_job_id AS Job_ID;
+END$$
+DELIMITER ;
+
+-- Procedure to start purging a pharmacy
+DELIMITER $$
+CREATE PROCEDURE purge_pharmacy(
+    IN p_address VARCHAR(200)
+)
+BEGIN
+    DECLARE v_active BOOLEAN;
+    DECLARE v_job_id INT;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+
+    SELECT is_active INTO v_active FROM Pharmacy WHERE address = p_address FOR UPDATE;
+
+    IF v_active IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy not found';
+    END IF;
+
+    IF NOT v_active THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy is already being purged';
+    END IF;
+
+    UPDATE Pharmacy SET is_active = FALSE WHERE address = p_address;
+
+    INSERT INTO PurgeJob(entity, entity_key, step) VALUES ('Pharmacy', p_address, 'contracts');
+    SET v_job_id = LAST_INSERT_ID();
+
+    COMMIT;
+
+    SELECT CONCAT('Pharmacy at address ', p_address, ' is being purged (job ', v_job_id, ')') AS result,
+           v_job_id AS Job_ID;
+END$$
+DELIMITER ;
+
+-- Procedure to start purging a pharmaceutical company and its drugs
+DELIMITER $$
+CREATE PROCEDURE purge_company(
+    IN p_company_name VARCHAR(100)
+)
+BEGIN
+    DECLARE v_active BOOLEAN;
+    DECLARE v_job_id INT;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    START TRANSACTION;
+
+    SELECT is_active INTO v_active FROM PharmaceuticalCompany WHERE company_name = p_company_name FOR UPDATE;
+
+    IF v_active IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Company does not exist';
+    END IF;
+
+    IF NOT v_active THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Company is already being purged';
+    END IF;
+
+    UPDATE PharmaceuticalCompany SET is_active = FALSE WHERE company_name = p_company_name;
+
+    INSERT INTO PurgeJob(entity, entity_key, step)
+    VALUES ('PharmaceuticalCompany', p_company_name, 'contracts');
+    SET v_job_id = LAST_INSERT_ID();
+
+    COMMIT;
+
+    SELECT CONCAT('Pharmaceutical company ', p_company_name, ' is being purged (job ', v_job_id, ')') AS result,
+           v_job_id AS Job_ID;
+END$$
+DELIMITER ;
+
+-- Deletes one batch of at most p_batch_size rows for a purge job and
+-- returns the job. The steps, in order:
+--   Doctor: treats, prescriptions (each takes its few Contains_drug rows
+--     with it), archive, entity
+--   Pharmacy: contracts, stock, entity
+--   PharmaceuticalCompany: contracts, stock, prescribed_drugs, archive,
+--     drugs, entity
+-- The archive step clears the entity's archived prescriptions
+-- (prescription_archive.sql), which the delete triggers there would
+-- otherwise remove in one statement with the entity; it is skipped on a
+-- database without the archive tier.
+-- A step with nothing left moves on to the next within the same call. Rows
+-- added after their step finished (by a call that read the flag before it
+-- was cleared) go with the entity through ON DELETE CASCADE. The job row is
+-- locked for the batch, so two workers running the same job take turns.
+DELIMITER $$
+CREATE PROCEDURE purge_step(
+    IN p_job_id INT,
+    IN p_batch_size INT
+)
+BEGIN
+    DECLARE v_entity VARCHAR(30);
+    DECLARE v_key VARCHAR(200);
+    DECLARE v_step VARCHAR(30);
+    DECLARE v_status VARCHAR(10);
+    DECLARE v_id INT;
+    DECLARE v_deleted INT DEFAULT 0;
+    DECLARE v_archive BOOLEAN;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    IF p_batch_size IS NULL OR p_batch_size <= 0 THEN
+        SET p_batch_size = 1000;
+    END IF;
+
+    SET v_archive = EXISTS (
+        SELECT 1 FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PrescriptionArchive'
+    );
+
+    START TRANSACTION;
+
+    SELECT entity, entity_key, step, status INTO v_entity, v_key, v_step, v_status
+    FROM PurgeJob
+    WHERE job_id = p_job_id
+    FOR UPDATE;
+
+    IF v_entity IS NULL THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Purge job not found';
+    END IF;
+
+    IF v_entity = 'Pharmacy' THEN
+        SELECT ph_id INTO v_id FROM Pharmacy WHERE address = v_key;
+    ELSEIF v_entity = 'PharmaceuticalCompany' THEN
+        SELECT company_id INTO v_id FROM PharmaceuticalCompany WHERE company_name = v_key;
+    ELSEIF EXISTS (SELECT 1 FROM Doctor WHERE daadharid = v_key) THEN
+        SET v_id = 0;
+    END IF;
+
+    -- Already removed, e.g. by delete_pharmacy while the job was stopped
+    IF v_id IS NULL THEN
+        SET v_status = 'done';
+    END IF;
+
+    purge: WHILE v_status = 'running' DO
+        IF v_entity = 'Doctor' THEN
+            IF v_step = 'treats' THEN
+                DELETE FROM Treats WHERE did = v_key LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'prescriptions';
+                END IF;
+            ELSEIF v_step = 'prescriptions' THEN
+                DELETE FROM Prescription WHERE did = v_key LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'archive';
+                END IF;
+            ELSEIF v_step = 'archive' THEN
+                SET v_deleted = 0;
+                IF v_archive THEN
+                    DELETE FROM PrescriptionArchive WHERE did = v_key LIMIT p_batch_size;
+                    SET v_deleted = ROW_COUNT();
+                END IF;
+                IF v_deleted = 0 THEN
+                    SET v_step = 'entity';
+                END IF;
+            ELSE
+                -- Fails, and is tried again on the next call, while a
+                -- patient still has the doctor as primary physician
+                DELETE FROM Doctor WHERE daadharid = v_key;
+                SET v_deleted = ROW_COUNT();
+                SET v_status = 'done';
+            END IF;
+
+        ELSEIF v_entity = 'Pharmacy' THEN
+            IF v_step = 'contracts' THEN
+                DELETE FROM Contract WHERE ph_id = v_id LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'stock';
+                END IF;
+            ELSEIF v_step = 'stock' THEN
+                DELETE FROM Sells WHERE ph_id = v_id LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'entity';
+                END IF;
+            ELSE
+                DELETE FROM Pharmacy WHERE ph_id = v_id;
+                SET v_deleted = ROW_COUNT();
+                SET v_status = 'done';
+            END IF;
+
+        ELSE
+            -- A multi-table DELETE takes no LIMIT, so the batch of a
+            -- company's Sells and Contains_drug rows is picked in a derived
+            -- table first
+            IF v_step = 'contracts' THEN
+                DELETE FROM Contract WHERE company_id = v_id LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'stock';
+                END IF;
+            ELSEIF v_step = 'stock' THEN
+                DELETE s FROM Sells s
+                JOIN (
+                    SELECT s2.drug_id, s2.ph_id
+                    FROM Drug d
+                    JOIN Sells s2 ON s2.drug_id = d.drug_id
+                    WHERE d.company_id = v_id
+                    LIMIT p_batch_size
+                ) b ON b.drug_id = s.drug_id AND b.ph_id = s.ph_id;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'prescribed_drugs';
+                END IF;
+            ELSEIF v_step = 'prescribed_drugs' THEN
+                DELETE cd FROM Contains_drug cd
+                JOIN (
+                    SELECT cd2.pres_id, cd2.drug_id
+                    FROM Drug d
+                    JOIN Contains_drug cd2 ON cd2.drug_id = d.drug_id
+                    WHERE d.company_id = v_id
+                    LIMIT p_batch_size
+                ) b ON b.pres_id = cd.pres_id AND b.drug_id = cd.drug_id;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'archive';
+                END IF;
+            ELSEIF v_step = 'archive' THEN
+                SET v_deleted = 0;
+                IF v_archive THEN
+                    DELETE FROM PrescriptionArchive
+                    WHERE drug_id IN (SELECT drug_id FROM Drug WHERE company_id = v_id)
+                    LIMIT p_batch_size;
+                    SET v_deleted = ROW_COUNT();
+                END IF;
+                IF v_deleted = 0 THEN
+                    SET v_step = 'drugs';
+                END IF;
+            ELSEIF v_step = 'drugs' THEN
+                DELETE FROM Drug WHERE company_id = v_id LIMIT p_batch_size;
+                SET v_deleted = ROW_COUNT();
+                IF v_deleted = 0 THEN
+                    SET v_step = 'entity';
+                END IF;
+            ELSE
+                DELETE FROM PharmaceuticalCompany WHERE company_id = v_id;
+                SET v_deleted = ROW_COUNT();
+                SET v_status = 'done';
+            END IF;
+        END IF;
+
+        IF v_deleted > 0 THEN
+            LEAVE purge;
+        END IF;
+    END WHILE;
+
+    UPDATE PurgeJob
+    SET step = v_step,
+        status = v_status,
+        rows_deleted = rows_deleted + v_deleted,
+        finished_at = IF(v_status = 'done', IFNULL(finished_at, NOW()), NULL)
+    WHERE job_id = p_job_id;
+
+    COMMIT;
+
+    SELECT
+        job_id AS Job_ID,
+        entity AS Entity,
+        entity_key AS Entity_Key,
+        step AS Step,
+        status AS Status,
+        rows_deleted AS Rows_Deleted
+    FROM PurgeJob
+    WHERE job_id = p_job_id;
+END$$
+DELIMITER ;
+
+-- Procedure to list the purge jobs, newest first
+DELIMITER $$
+CREATE PROCEDURE print_purge_jobs()
+BEGIN
+    SELECT
+        job_id AS Job_ID,
+        entity AS Entity,
+        entity_key AS Entity_Key,
+        step AS Step,
+        status AS Status,
+        rows_deleted AS Rows_Deleted,
+        started_at AS Started_At,
+        updated_at AS Updated_At,
+        finished_at AS Finished_At
+    FROM PurgeJob
+    ORDER BY job_id DESC;
+END$$
+DELIMITER ;
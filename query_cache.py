@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = 256
+# Seconds a cached result stays valid even without a write invalidating it,
+# to bound staleness from changes made by other clients
+CACHE_TTL = 300.0
+
+# Reference-data reports that are safe to cache, and the tables they read
+PROCEDURE_TABLES = {
+    "drug_details": {"Drug", "PharmaceuticalCompany"},
+    "drug_details_page": {"Drug", "PharmaceuticalCompany"},
+    "print_pharmacy_contact": {"Pharmacy"},
+    "print_company_contact": {"PharmaceuticalCompany"},
+}
+
+# Tables whose rows can change after a write to the given table, including
+# the rows removed or renamed through ON DELETE CASCADE and update_company
+WRITE_EFFECTS = {
+    "Patient": {"Patient", "Treats", "Prescription", "Contains_drug"},
+    "Doctor": {"Doctor", "Treats", "Prescription", "Contains_drug"},
+    "Pharmacy": {"Pharmacy", "Sells", "Contract"},
+    "PharmaceuticalCompany": {"PharmaceuticalCompany", "Drug", "Sells", "Contract", "Contains_drug"},
+    "Drug": {"Drug", "Sells", "Contains_drug"},
+    "Prescription": {"Prescription", "Contains_drug"},
+    "Contract": {"Contract"},
+    "Sells": {"Sells"},
+}
+
+
+def is_cacheable(procedure):
+    return procedure in PROCEDURE_TABLES
+
+
+class QueryCache:
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped on every invalidation of a table; a load that started before
+        # the bump must not store its (possibly stale) result
+        self.table_versions = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, procedure, args):
+        return (procedure, tuple(args))
+
+    def versions_for(self, procedure):
+        return tuple(self.table_versions.get(table, 0) for table in sorted(PROCEDURE_TABLES[procedure]))
+
+    def get(self, procedure, args):
+        key = self.make_key(procedure, args)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    # Most recently used entries live at the end
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, procedure, args, value, versions=None):
+        key = self.make_key(procedure, args)
+        with self.lock:
+            if versions is not None and versions != self.versions_for(procedure):
+                return
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def cached_call(self, procedure, args, loader):
+        # Read-through: return the cached result or load, store and return it
+        hit, value = self.get(procedure, args)
+        if hit:
+            return value
+        with self.lock:
+            versions = self.versions_for(procedure)
+        value = loader()
+        self.put(procedure, args, value, versions)
+        return value
+
+    def invalidate_tables(self, tables):
+        tables = set(tables)
+        with self.lock:
+            for table in tables:
+                self.table_versions[table] = self.table_versions.get(table, 0) + 1
+            stale = [key for key in self.entries if PROCEDURE_TABLES[key[0]] & tables]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def invalidate_write(self, table):
+        # Called after a successful add, update or delete on table
+        self.invalidate_tables(WRITE_EFFECTS.get(table, {table}))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,151 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryTask:
+    def __init__(self, executor, name, on_progress=None, on_data=None):
+        self.executor = executor
+        self.name = name
+        self.on_progress = on_progress
+        self.on_data = on_data
+        self.cancelled = False
+        # Set by the worker while a statement is running so it can be killed server side
+        self.connection_id = None
+        self.progress = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check_cancelled(self):
+        # Long-running work calls this between steps so a cancelled task stops early
+        if self.cancelled:
+            raise QueryCancelled(f"{self.name} was cancelled")
+
+    def report_progress(self, value):
+        # Safe to call from the worker thread; delivered on the Tk main thread
+        self.executor.events.put((self, "progress", value))
+
+    def deliver(self, value):
+        # Hands partial results (e.g. a batch of streamed rows) to on_data on the main thread
+        self.executor.events.put((self, "data", value))
+
+
+class QueryExecutor:
+    def __init__(self, root, max_workers=4, poll_interval=50, kill_query=None):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.kill_query = kill_query
+        self.workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nova-query")
+        self.events = queue.Queue()
+        self.tasks = []
+        self.listeners = []
+        self.closed = False
+
+        # Tk is not thread safe, so workers only touch the queue and the
+        # main loop drains it on a timer
+        self.root.after(self.poll_interval, self.process_events)
+
+    def add_listener(self, callback):
+        # callback(running_tasks) is invoked on the main thread whenever the
+        # set of running tasks or their progress changes
+        self.listeners.append(callback)
+
+    def submit(self, name, work, on_success=None, on_error=None, on_progress=None, on_data=None):
+        task = QueryTask(self, name, on_progress, on_data)
+        self.tasks.append(task)
+        self.workers.submit(self.run_task, task, work, on_success, on_error)
+        self.notify_listeners()
+        return task
+
+    def run_task(self, task, work, on_success, on_error):
+        try:
+            task.check_cancelled()
+            result = work(task)
+            task.check_cancelled()
+            self.events.put((task, "success", (on_success, result)))
+        except QueryCancelled:
+            self.events.put((task, "cancelled", None))
+        except Exception as err:
+            # A killed statement surfaces as a driver error; report it as a cancel
+            if task.cancelled:
+                self.events.put((task, "cancelled", None))
+            else:
+                self.events.put((task, "error", (on_error, err)))
+
+    def process_events(self):
+        if self.closed:
+            return
+
+        changed = False
+        while True:
+            try:
+                task, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                task.progress = payload
+                if task.on_progress and not task.cancelled:
+                    self.safe_call(task.on_progress, payload)
+                changed = True
+                continue
+
+            if kind == "data":
+                if task.on_data and not task.cancelled:
+                    self.safe_call(task.on_data, payload)
+                continue
+
+            if task in self.tasks:
+                self.tasks.remove(task)
+            changed = True
+
+            if kind == "success":
+                callback, result = payload
+                if callback:
+                    self.safe_call(callback, result)
+            elif kind == "error":
+                callback, err = payload
+                if callback:
+                    self.safe_call(callback, err)
+                else:
+                    print(f"Background query {task.name} failed: {err}")
+
+        if changed:
+            self.notify_listeners()
+
+        self.root.after(self.poll_interval, self.process_events)
+
+    def safe_call(self, callback, *args):
+        # A failing UI callback must not stop the polling loop
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in query callback: {e}")
+
+    def notify_listeners(self):
+        for listener in self.listeners:
+            self.safe_call(listener, list(self.tasks))
+
+    def cancel(self, task):
+        task.cancel()
+        connection_id = task.connection_id
+        if connection_id is not None and self.kill_query:
+            # KILL QUERY needs its own connection; never block the UI on it
+            threading.Thread(target=self.kill_query, args=(connection_id,), daemon=True).start()
+
+    def cancel_all(self):
+        for task in list(self.tasks):
+            self.cancel(task)
+
+    def is_busy(self):
+        return len(self.tasks) > 0
+
+    def shutdown(self):
+        self.cancel_all()
+        self.closed = True
+        self.workers.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,456 @@
+import argparse
+import sys
+import threading
+import time
+
+import mysql.connector
+
+from bulk_import import chunked
+from db_pool import ConnectionPool, DB_CONFIG, is_connection_error
+from sqlite_backend import SQLiteBackend
+from streaming import FETCH_BATCH
+
+# A branch's local read replica: a SQLite file with sqlite_backend.py's
+# schema, holding the companies, drugs and pharmacies of the nova database
+# and the Sells and Contract rows of one pharmacy, the branch's own. Mirror
+# keeps it up to date from the ChangeLog of replica.sql, re-reading only the
+# rows changed since its last pull. ReplicaBackend answers the branch's
+# lookups from it while it is fresh and sends everything else, and the
+# lookups when it is not, to MySQL. When MySQL cannot be reached the lookups
+# are answered from the copy however old it is, so the counter keeps working
+# offline.
+
+# Seconds between the background refresher's pulls
+REFRESH_INTERVAL = 10.0
+# Seconds after a pull during which the copy is used while MySQL is reachable
+MAX_AGE = 60.0
+# Changes are pulled again until they are this many seconds old: a change_id
+# is taken at insert, so a transaction can commit after one with a later id
+SETTLE_SECONDS = 30
+# Beyond this many changes since the last pull, reloading everything is cheaper
+FULL_LOAD_AFTER = 50000
+# Ids per IN list when re-reading changed rows
+READ_CHUNK = 500
+
+# Lookups the copy answers for any key
+REFERENCE_LOOKUPS = {"print_pharmacy_contact", "print_company_contact", "drug_details", "drug_details_page"}
+# Lookups the copy answers for the branch's own pharmacy, the address being
+# their first argument
+OWN_PHARMACY_LOOKUPS = {"print_stock_position", "print_stock_position_page", "display_contract", "contract_details"}
+
+MIRROR_SCHEMA = """
+-- The pull the copy is at; one row
+CREATE TABLE IF NOT EXISTS MirrorState (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pharmacy_address VARCHAR(200),
+    ph_id INT,
+    last_change_id INT NOT NULL,
+    pulled_at REAL NOT NULL
+);
+
+-- The natural key the copy has for each company_id and ph_id, so a change
+-- logged by id can be found after a rename or a delete
+CREATE TABLE IF NOT EXISTS MirrorKeys (
+    entity VARCHAR(30) NOT NULL,
+    row_id INT NOT NULL,
+    natural_key VARCHAR(200) NOT NULL,
+    PRIMARY KEY (entity, row_id)
+);
+"""
+
+# Logged table -> (query reading its rows as the copy stores them, id first;
+# column that picks the branch's rows, or None for a reference table; id column)
+SOURCES = {
+    "PharmaceuticalCompany": (
+        "SELECT company_id, company_name, phone_number, is_active FROM PharmaceuticalCompany",
+        None,
+        "company_id",
+    ),
+    "Pharmacy": ("SELECT ph_id, address, pname, phone, is_active FROM Pharmacy", None, "ph_id"),
+    "Drug": (
+        "SELECT d.drug_id, d.trade_name, d.formula, pc.company_name FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id",
+        None,
+        "d.drug_id",
+    ),
+    "Sells": ("SELECT s.drug_id, s.stock, s.price FROM Sells s", "s.ph_id", "s.drug_id"),
+    "Contract": (
+        "SELECT c.company_id, pc.company_name, c.content, c.start_date, c.end_date, c.supervisor FROM Contract c "
+        "JOIN PharmaceuticalCompany pc ON pc.company_id = c.company_id",
+        "c.ph_id",
+        "c.company_id",
+    ),
+}
+# Parents before children, so every row finds what it refers to
+APPLY_ORDER = ["PharmaceuticalCompany", "Pharmacy", "Drug", "Sells", "Contract"]
+
+
+class Pull:
+    # What one pull read from MySQL: for a full load every row, otherwise the
+    # ids logged as changed and the rows those ids still have
+    def __init__(self, full, ph_id, last_change_id):
+        self.full = full
+        self.ph_id = ph_id
+        self.last_change_id = last_change_id
+        self.ids = {table: set() for table in SOURCES}
+        self.rows = {table: [] for table in SOURCES}
+
+    @property
+    def changes(self):
+        return sum(len(ids) for ids in self.ids.values())
+
+
+def mirror_key(cur, entity, row_id):
+    row = cur.execute("SELECT natural_key FROM MirrorKeys WHERE entity = ? AND row_id = ?",
+                      (entity, row_id)).fetchone()
+    return row[0] if row else None
+
+
+def rename(cur, table, column, children, old, new):
+    # The copy's foreign keys are on the natural keys and have no ON UPDATE;
+    # they are checked at commit (defer_foreign_keys), once the children follow
+    cur.execute(f"UPDATE {table} SET {column} = ? WHERE {column} = ?", (new, old))
+    for child, child_column in children:
+        cur.execute(f"UPDATE {child} SET {child_column} = ? WHERE {child_column} = ?", (new, old))
+
+
+def apply_company(cur, company_id, row, address):
+    old = mirror_key(cur, "PharmaceuticalCompany", company_id)
+    if row is None:
+        # The company's drugs, stock and contracts go with it by cascade
+        if old is not None:
+            cur.execute("DELETE FROM PharmaceuticalCompany WHERE company_name = ?", (old,))
+            cur.execute("DELETE FROM MirrorKeys WHERE entity = 'PharmaceuticalCompany' AND row_id = ?", (company_id,))
+        return
+    _, name, phone, active = row
+    if old is not None and old != name:
+        rename(cur, "PharmaceuticalCompany", "company_name", [("Drug", "company_name"), ("Contract", "company_name")],
+               old, name)
+    cur.execute("INSERT INTO PharmaceuticalCompany(company_name, phone_number, is_active) VALUES (?, ?, ?) "
+                "ON CONFLICT(company_name) DO UPDATE SET phone_number = excluded.phone_number, "
+                "is_active = excluded.is_active", (name, phone, active))
+    cur.execute("INSERT OR REPLACE INTO MirrorKeys(entity, row_id, natural_key) VALUES ('PharmaceuticalCompany', ?, ?)",
+                (company_id, name))
+
+
+def apply_pharmacy(cur, ph_id, row, address):
+    old = mirror_key(cur, "Pharmacy", ph_id)
+    if row is None:
+        if old is not None:
+            cur.execute("DELETE FROM Pharmacy WHERE address = ?", (old,))
+            cur.execute("DELETE FROM MirrorKeys WHERE entity = 'Pharmacy' AND row_id = ?", (ph_id,))
+        return
+    _, ph_address, name, phone, active = row
+    if old is not None and old != ph_address:
+        rename(cur, "Pharmacy", "address", [("Sells", "ph_address"), ("Contract", "ph_address")], old, ph_address)
+    cur.execute("INSERT INTO Pharmacy(address, pname, phone, is_active) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(address) DO UPDATE SET pname = excluded.pname, phone = excluded.phone, "
+                "is_active = excluded.is_active", (ph_address, name, phone, active))
+    cur.execute("INSERT OR REPLACE INTO MirrorKeys(entity, row_id, natural_key) VALUES ('Pharmacy', ?, ?)",
+                (ph_id, ph_address))
+
+
+def apply_drug(cur, drug_id, row, address):
+    if row is None:
+        cur.execute("DELETE FROM Drug WHERE drug_id = ?", (drug_id,))
+        return
+    cur.execute("INSERT INTO Drug(drug_id, trade_name, formula, company_name) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(drug_id) DO UPDATE SET trade_name = excluded.trade_name, formula = excluded.formula, "
+                "company_name = excluded.company_name", row)
+
+
+def apply_sells(cur, drug_id, row, address):
+    if row is None:
+        cur.execute("DELETE FROM Sells WHERE ph_address = ? AND drug_id = ?", (address, drug_id))
+        return
+    _, stock, unit_price = row
+    cur.execute("INSERT INTO Sells(ph_address, drug_id, stock, price) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(drug_id, ph_address) DO UPDATE SET stock = excluded.stock, price = excluded.price",
+                (address, drug_id, stock, unit_price))
+
+
+def apply_contract(cur, company_id, row, address):
+    if row is None:
+        # Gone already if the company was deleted
+        name = mirror_key(cur, "PharmaceuticalCompany", company_id)
+        cur.execute("DELETE FROM Contract WHERE company_name = ? AND ph_address = ?", (name, address))
+        return
+    _, name, content, start_date, end_date, supervisor = row
+    cur.execute("INSERT INTO Contract(company_name, ph_address, content, start_date, end_date, supervisor) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(company_name, ph_address) DO UPDATE SET "
+                "content = excluded.content, start_date = excluded.start_date, end_date = excluded.end_date, "
+                "supervisor = excluded.supervisor", (name, address, content, start_date, end_date, supervisor))
+
+
+APPLY = {
+    "PharmaceuticalCompany": apply_company,
+    "Pharmacy": apply_pharmacy,
+    "Drug": apply_drug,
+    "Sells": apply_sells,
+    "Contract": apply_contract,
+}
+
+
+class Mirror:
+    # The copy in the SQLite file at path, pulled from MySQL through pool.
+    # pharmacy_address is the branch's own pharmacy; without one only the
+    # reference tables are kept. local is the copy as a SQLiteBackend.
+
+    def __init__(self, pool, path, pharmacy_address=None):
+        self.pool = pool
+        self.pharmacy_address = pharmacy_address
+        self.local = SQLiteBackend(path)
+        with self.local.lock:
+            self.local.conn.executescript(MIRROR_SCHEMA)
+            self.state = self.local.conn.execute(
+                "SELECT pharmacy_address, ph_id, last_change_id, pulled_at FROM MirrorState WHERE id = 1").fetchone()
+        if self.state is not None and self.state[0] != pharmacy_address:
+            # Kept for another pharmacy; reloaded on the first pull
+            self.state = None
+        # When the last pull began: the copy holds every change committed
+        # before then; None until the first pull
+        self.pulled_at = self.state[3] if self.state else None
+        self.refresh_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        # The refresher's last error, None after a successful pull
+        self.error = None
+
+    def age(self):
+        return None if self.pulled_at is None else time.time() - self.pulled_at
+
+    def refresh(self, full=False):
+        # Pulls the changes since the last pull, or everything, and applies
+        # them in one local transaction. Returns the Pull.
+        with self.refresh_lock:
+            while True:
+                pulled_at = time.time()
+                pull = self.pool.run(lambda conn: self.read(conn, full))
+                try:
+                    self.local.run(self.apply, [pull, pulled_at])
+                    break
+                except mysql.connector.Error:
+                    if pull.full:
+                        raise
+                    # E.g. a swap of two names the copy cannot follow one
+                    # row at a time; start over
+                    full = True
+            self.state = (self.pharmacy_address, pull.ph_id, pull.last_change_id, pulled_at)
+            self.pulled_at = pulled_at
+            return pull
+
+    def read(self, conn, full):
+        # One consistent snapshot, so every row read finds its parents
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MAX(change_id) FROM ChangeLog")
+            top = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT MAX(change_id) FROM ChangeLog WHERE changed_at < NOW() - INTERVAL %s SECOND",
+                           (SETTLE_SECONDS,))
+            settled = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT pruned_to FROM ChangeLogPruned WHERE id = 1")
+            row = cursor.fetchone()
+            pruned_to = row[0] if row else 0
+            ph_id = None
+            if self.pharmacy_address is not None:
+                cursor.execute("SELECT ph_id FROM Pharmacy WHERE address = %s", (self.pharmacy_address,))
+                row = cursor.fetchone()
+                ph_id = row[0] if row else None
+
+            last = self.state[2] if self.state else 0
+            # Never pulled, pulled before changes were pruned, or the
+            # pharmacy was deleted and added again under a new id
+            full = (full or self.state is None or last < pruned_to or self.state[1] != ph_id
+                    or top - last > FULL_LOAD_AFTER)
+            pull = Pull(full, ph_id, settled if full else max(last, settled))
+
+            if full:
+                for table, (query, own_column, id_column) in SOURCES.items():
+                    if own_column is None:
+                        cursor.execute(query)
+                    elif ph_id is not None:
+                        cursor.execute(f"{query} WHERE {own_column} = %s", (ph_id,))
+                    else:
+                        continue
+                    pull.rows[table] = cursor.fetchall()
+                    pull.ids[table] = {row[0] for row in pull.rows[table]}
+                return pull
+
+            # The branch's own Sells and Contract changes, and every reference change
+            cursor.execute("SELECT DISTINCT table_name, row_id FROM ChangeLog "
+                           "WHERE change_id > %s AND change_id <= %s AND (ph_id IS NULL OR ph_id = %s)",
+                           (last, top, ph_id))
+            for table, row_id in cursor.fetchall():
+                pull.ids[table].add(row_id)
+            for table, ids in pull.ids.items():
+                query, own_column, id_column = SOURCES[table]
+                for chunk in chunked(sorted(ids), READ_CHUNK):
+                    where = f"{id_column} IN ({', '.join(['%s'] * len(chunk))})"
+                    params = chunk
+                    if own_column is not None:
+                        where = f"{own_column} = %s AND {where}"
+                        params = [ph_id] + chunk
+                    cursor.execute(f"{query} WHERE {where}", params)
+                    pull.rows[table].extend(cursor.fetchall())
+            return pull
+        finally:
+            cursor.close()
+            conn.rollback()
+
+    def apply(self, cur, pull, pulled_at):
+        cur.execute("PRAGMA defer_foreign_keys = ON")
+        if pull.full:
+            # Removing the companies and pharmacies cascades to the rest
+            cur.execute("DELETE FROM PharmaceuticalCompany")
+            cur.execute("DELETE FROM Pharmacy")
+            cur.execute("DELETE FROM MirrorKeys")
+        for table in APPLY_ORDER:
+            # An id with no row left was deleted
+            rows = {row[0]: row for row in pull.rows[table]}
+            for row_id in sorted(pull.ids[table]):
+                APPLY[table](cur, row_id, rows.get(row_id), self.pharmacy_address)
+        cur.execute("INSERT OR REPLACE INTO MirrorState(id, pharmacy_address, ph_id, last_change_id, pulled_at) "
+                    "VALUES (1, ?, ?, ?, ?)", (self.pharmacy_address, pull.ph_id, pull.last_change_id, pulled_at))
+        return pull
+
+    def request_refresh(self):
+        # Makes the refresher pull now instead of at its next interval
+        self.wake.set()
+
+    def start(self, interval=REFRESH_INTERVAL):
+        self.thread = threading.Thread(target=self.refresh_loop, args=(interval,), name="nova-replica", daemon=True)
+        self.thread.start()
+
+    def refresh_loop(self, interval):
+        while not self.stopping.is_set():
+            try:
+                self.refresh()
+                self.error = None
+            except mysql.connector.Error as err:
+                # Offline, most likely; the copy stays as it is until a pull succeeds
+                self.error = err
+            self.wake.wait(interval)
+            self.wake.clear()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.local.close()
+
+
+class ReplicaBackend:
+    # Offers the same methods as backend.MySQLBackend, which it wraps. The
+    # lookups in REFERENCE_LOOKUPS and OWN_PHARMACY_LOOKUPS are answered by
+    # the mirror when its last pull is at most max_age seconds old and began
+    # after this client's last write, so a counter always sees its own
+    # changes. Otherwise they go to MySQL, and back to the mirror if MySQL
+    # cannot be reached.
+
+    def __init__(self, backend, mirror, max_age=MAX_AGE):
+        self.backend = backend
+        self.mirror = mirror
+        self.max_age = max_age
+        self.written_at = 0.0
+
+    def is_local(self, name, args):
+        if name in REFERENCE_LOOKUPS:
+            return True
+        return (name in OWN_PHARMACY_LOOKUPS and self.mirror.pharmacy_address is not None
+                and len(args) > 0 and args[0] == self.mirror.pharmacy_address)
+
+    def is_fresh(self):
+        pulled_at = self.mirror.pulled_at
+        return pulled_at is not None and pulled_at >= self.written_at and time.time() - pulled_at <= self.max_age
+
+    def can_fall_back(self, err):
+        return is_connection_error(err) and self.mirror.pulled_at is not None
+
+    def written(self):
+        # Reads go to MySQL until a pull that began after this write
+        self.written_at = time.time()
+        self.mirror.request_refresh()
+
+    def ping(self):
+        self.backend.ping()
+
+    def call(self, procedure, args, write=False, task=None, timer=None):
+        if write:
+            try:
+                return self.backend.call(procedure, args, write, task, timer)
+            finally:
+                self.written()
+        if not self.is_local(procedure, args):
+            return self.backend.call(procedure, args, write, task, timer)
+        if self.is_fresh():
+            return self.mirror.local.call(procedure, args, task=task, timer=timer)
+        try:
+            return self.backend.call(procedure, args, write, task, timer)
+        except mysql.connector.Error as err:
+            if not self.can_fall_back(err):
+                raise
+            return self.mirror.local.call(procedure, args, task=task, timer=timer)
+
+    def call_batch(self, calls, task=None):
+        try:
+            return self.backend.call_batch(calls, task)
+        finally:
+            if any(write for procedure, args, write in calls):
+                self.written()
+
+    def stream(self, name, args, batch_size=FETCH_BATCH, task=None, timer=None):
+        if not self.is_local(name, args):
+            return self.backend.stream(name, args, batch_size, task, timer)
+        if self.is_fresh():
+            return self.mirror.local.stream(name, args, batch_size, task, timer)
+        return self.stream_with_fallback(name, args, batch_size, task, timer)
+
+    def stream_with_fallback(self, name, args, batch_size, task, timer):
+        # Falls back only if MySQL failed before the first batch
+        started = False
+        try:
+            for batch in self.backend.stream(name, args, batch_size, task, timer):
+                started = True
+                yield batch
+        except mysql.connector.Error as err:
+            if started or not self.can_fall_back(err):
+                raise
+            yield from self.mirror.local.stream(name, args, batch_size, task)
+
+    def kill_query(self, connection_id):
+        self.backend.kill_query(connection_id)
+
+    def close(self):
+        self.mirror.close()
+        self.backend.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or bring up to date a branch's local read replica")
+    parser.add_argument("path", help="SQLite file holding the replica")
+    parser.add_argument("--pharmacy", help="Address of the branch's own pharmacy, whose stock and contracts are kept")
+    parser.add_argument("--full", action="store_true", help="Reload everything instead of pulling the changes")
+    args = parser.parse_args(argv)
+
+    mirror = Mirror(ConnectionPool(DB_CONFIG, pool_size=1), args.path, args.pharmacy)
+    try:
+        pull = mirror.refresh(args.full)
+    except mysql.connector.Error as e:
+        print(e.msg, file=sys.stderr)
+        return 1
+    finally:
+        mirror.close()
+    kind = "Loaded" if pull.full else "Pulled"
+    print(f"{kind} {pull.changes} rows; replica at change {pull.last_change_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
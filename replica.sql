@@ -0,0 +1,147 @@
+-- Change log for the branch replicas (replica.py). A branch keeps a local
+-- SQLite copy of the companies, drugs and pharmacies and of its own
+-- pharmacy's Sells and Contract rows, and serves its reports from it. To
+-- keep the copy fresh it reads the changes made since its last pull from
+-- ChangeLog, one row per inserted, updated or deleted row, and re-reads
+-- just those rows.
+--
+-- Rows removed by ON DELETE CASCADE fire no triggers and are not logged;
+-- the replica's own foreign keys cascade the same way when it applies the
+-- parent's delete.
+--
+-- Apply after tables_def.sql (and surrogate_keys.sql on a database created
+-- before it), on a new install or an existing nova database.
+USE nova;
+
+DROP PROCEDURE IF EXISTS prune_change_log;
+
+-- table_name is the changed table. row_id is its company_id, drug_id or
+-- ph_id; for Sells the drug_id and for Contract the company_id, with the
+-- row's pharmacy in ph_id so a branch reads only its own.
+CREATE TABLE IF NOT EXISTS ChangeLog (
+    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(30) NOT NULL,
+    row_id INT NOT NULL,
+    ph_id INT NULL,
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- prune_change_log removes the oldest entries
+    INDEX idx_change_log_time (changed_at)
+);
+
+-- The newest change_id pruned so far. A replica that last pulled before it
+-- may have missed changes and reloads everything instead.
+CREATE TABLE IF NOT EXISTS ChangeLogPruned (
+    id TINYINT PRIMARY KEY,
+    pruned_to BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO ChangeLogPruned(id, pruned_to) VALUES (1, 0);
+
+DROP TRIGGER IF EXISTS company_after_insert_log;
+DROP TRIGGER IF EXISTS company_after_update_log;
+DROP TRIGGER IF EXISTS company_after_delete_log;
+DROP TRIGGER IF EXISTS drug_after_insert_log;
+DROP TRIGGER IF EXISTS drug_after_update_log;
+DROP TRIGGER IF EXISTS drug_after_delete_log;
+DROP TRIGGER IF EXISTS pharmacy_after_insert_log;
+DROP TRIGGER IF EXISTS pharmacy_after_update_log;
+DROP TRIGGER IF EXISTS pharmacy_after_delete_log;
+DROP TRIGGER IF EXISTS sells_after_insert_log;
+DROP TRIGGER IF EXISTS sells_after_update_log;
+DROP TRIGGER IF EXISTS sells_after_delete_log;
+DROP TRIGGER IF EXISTS contract_after_insert_log;
+DROP TRIGGER IF EXISTS contract_after_update_log;
+DROP TRIGGER IF EXISTS contract_after_delete_log;
+
+CREATE TRIGGER company_after_insert_log AFTER INSERT ON PharmaceuticalCompany
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('PharmaceuticalCompany', NEW.company_id);
+
+CREATE TRIGGER company_after_update_log AFTER UPDATE ON PharmaceuticalCompany
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('PharmaceuticalCompany', NEW.company_id);
+
+CREATE TRIGGER company_after_delete_log AFTER DELETE ON PharmaceuticalCompany
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('PharmaceuticalCompany', OLD.company_id);
+
+CREATE TRIGGER drug_after_insert_log AFTER INSERT ON Drug
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Drug', NEW.drug_id);
+
+CREATE TRIGGER drug_after_update_log AFTER UPDATE ON Drug
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Drug', NEW.drug_id);
+
+CREATE TRIGGER drug_after_delete_log AFTER DELETE ON Drug
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Drug', OLD.drug_id);
+
+CREATE TRIGGER pharmacy_after_insert_log AFTER INSERT ON Pharmacy
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Pharmacy', NEW.ph_id);
+
+CREATE TRIGGER pharmacy_after_update_log AFTER UPDATE ON Pharmacy
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Pharmacy', NEW.ph_id);
+
+CREATE TRIGGER pharmacy_after_delete_log AFTER DELETE ON Pharmacy
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id) VALUES ('Pharmacy', OLD.ph_id);
+
+CREATE TRIGGER sells_after_insert_log AFTER INSERT ON Sells
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Sells', NEW.drug_id, NEW.ph_id);
+
+CREATE TRIGGER sells_after_update_log AFTER UPDATE ON Sells
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Sells', NEW.drug_id, NEW.ph_id);
+
+CREATE TRIGGER sells_after_delete_log AFTER DELETE ON Sells
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Sells', OLD.drug_id, OLD.ph_id);
+
+CREATE TRIGGER contract_after_insert_log AFTER INSERT ON Contract
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Contract', NEW.company_id, NEW.ph_id);
+
+CREATE TRIGGER contract_after_update_log AFTER UPDATE ON Contract
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Contract', NEW.company_id, NEW.ph_id);
+
+CREATE TRIGGER contract_after_delete_log AFTER DELETE ON Contract
+FOR EACH ROW INSERT INTO ChangeLog(table_name, row_id, ph_id) VALUES ('Contract', OLD.company_id, OLD.ph_id);
+
+-- Deletes log entries older than p_keep_days, p_batch_size per transaction.
+-- Replicas that pull more often than that never notice; one that has been
+-- away longer reloads in full.
+DELIMITER $$
+CREATE PROCEDURE prune_change_log(
+    IN p_keep_days INT,
+    IN p_batch_size INT
+)
+BEGIN
+    DECLARE v_to BIGINT;
+    DECLARE v_rows INT DEFAULT 0;
+    DECLARE v_deleted INT DEFAULT 1;
+
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    IF p_keep_days IS NULL OR p_keep_days < 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Days to keep cannot be negative';
+    END IF;
+
+    IF p_batch_size IS NULL OR p_batch_size <= 0 THEN
+        SET p_batch_size = 10000;
+    END IF;
+
+    SELECT MAX(change_id) INTO v_to FROM ChangeLog
+    WHERE changed_at < NOW() - INTERVAL p_keep_days DAY;
+
+    IF v_to IS NOT NULL THEN
+        -- Recorded first, so a replica never reads a log already cut short
+        -- without knowing
+        UPDATE ChangeLogPruned SET pruned_to = GREATEST(pruned_to, v_to) WHERE id = 1;
+
+        WHILE v_deleted > 0 DO
+            START TRANSACTION;
+            DELETE FROM ChangeLog WHERE change_id <= v_to ORDER BY change_id LIMIT p_batch_size;
+            SET v_deleted = ROW_COUNT();
+            SET v_rows = v_rows + v_deleted;
+            COMMIT;
+        END WHILE;
+    END IF;
+
+    SELECT CONCAT('Pruned ', v_rows, ' change log entries') AS result;
+END$$
+DELIMITER ;
@@ -0,0 +1,254 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from backend import MySQLBackend
+from db_pool import ConnectionPool, DB_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows fetched from the server per batch while exporting
+EXPORT_BATCH = 5000
+# Rows buffered per Parquet row group; bounds memory for columnar output
+ROW_GROUP_SIZE = 50000
+
+FORMATS = ["csv", "jsonl", "parquet"]
+
+
+def format_for_path(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for fmt, extensions in [("csv", (".csv",)), ("jsonl", (".jsonl", ".ndjson")), ("parquet", (".parquet",))]:
+        if name.endswith(extensions):
+            return fmt
+    raise ValueError(f"Cannot tell the export format from {path}; use .csv, .jsonl or .parquet")
+
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        # Keep money exact rather than going through float
+        return str(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def open_text(path, compress):
+    if compress:
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+class CsvExport:
+    def __init__(self, path, compress=False):
+        self.file = open_text(path, compress)
+        self.writer = csv.writer(self.file)
+
+    def write_header(self, headers):
+        self.writer.writerow(headers)
+
+    def write_rows(self, rows):
+        self.writer.writerows([[json_value(value) for value in row] for row in rows])
+
+    def finish(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+class JsonlExport:
+    def __init__(self, path, compress=False):
+        self.file = open_text(path, compress)
+        self.headers = []
+
+    def write_header(self, headers):
+        self.headers = headers
+
+    def write_rows(self, rows):
+        for row in rows:
+            record = {header: json_value(value) for header, value in zip(self.headers, row)}
+            self.file.write(json.dumps(record) + "\n")
+
+    def finish(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+def arrow_type(values):
+    # Arrow type for a column, from its first non-NULL value; a column that is
+    # NULL throughout the first batch is stored as text
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return pa.bool_()
+        if isinstance(value, int):
+            return pa.int64()
+        if isinstance(value, float):
+            return pa.float64()
+        if isinstance(value, Decimal):
+            return pa.decimal128(38, max(0, -value.as_tuple().exponent))
+        if isinstance(value, datetime):
+            return pa.timestamp("us")
+        if isinstance(value, date):
+            return pa.date32()
+        if isinstance(value, timedelta):
+            return pa.duration("us")
+        if isinstance(value, (bytes, bytearray)):
+            return pa.binary()
+        break
+    return pa.string()
+
+
+class ParquetExport:
+    # Columnar and zstd compressed. Rows are buffered into row groups of
+    # ROW_GROUP_SIZE, so memory stays bounded however large the export is.
+    # Compression is built into the format, so compress is ignored.
+
+    def __init__(self, path, compress=False, row_group_size=ROW_GROUP_SIZE):
+        if pa is None:
+            raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.headers = []
+        self.schema = None
+        self.writer = None
+        self.buffer = []
+
+    def write_header(self, headers):
+        self.headers = headers
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def open_writer(self, schema):
+        self.schema = schema
+        self.writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+
+    def flush(self):
+        if not self.buffer:
+            return
+        columns = list(zip(*self.buffer))
+        if self.writer is None:
+            # The schema is fixed by the first row group
+            self.open_writer(pa.schema([
+                (header, arrow_type(column)) for header, column in zip(self.headers, columns)
+            ]))
+        arrays = []
+        for field, column in zip(self.schema, columns):
+            if pa.types.is_string(field.type):
+                column = [None if value is None else str(json_value(value)) for value in column]
+            arrays.append(pa.array(column, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.buffer = []
+
+    def finish(self):
+        self.flush()
+        if self.writer is None:
+            # No rows at all: still write a file with the column names
+            self.open_writer(pa.schema([(header, pa.string()) for header in self.headers]))
+        self.writer.close()
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+EXPORTERS = {
+    "csv": CsvExport,
+    "jsonl": JsonlExport,
+    "parquet": ParquetExport,
+}
+
+
+def export_stream(stream, path, fmt=None, progress=None):
+    # Writes (headers, rows) batches from a streaming.py generator to path.
+    # Only the first result set is exported; any later ones (status messages
+    # from the procedure) are read and discarded. Output goes to a temporary
+    # file that replaces path only once the export is complete.
+    fmt = fmt or format_for_path(path)
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    part_path = path + ".part"
+    # A .gz suffix compresses CSV and JSONL output on the fly
+    exporter = EXPORTERS[fmt](part_path, compress=path.lower().endswith(".gz"))
+    headers = None
+    written = 0
+    try:
+        for batch_headers, rows in stream:
+            if headers is None:
+                headers = batch_headers
+                exporter.write_header(headers)
+            elif batch_headers != headers:
+                continue
+            exporter.write_rows(rows)
+            written += len(rows)
+            if progress:
+                progress(written)
+        exporter.finish()
+    except BaseException:
+        # Cancelled or failed: leave no half-written file behind
+        exporter.abort()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+    return written
+
+
+def export_procedure(backend, procedure, args, path, fmt=None, task=None, progress=None, batch_size=EXPORT_BATCH):
+    # backend is a backend.MySQLBackend or a service_client.ServiceClient
+    stream = backend.stream(procedure, args, batch_size, task)
+    try:
+        return export_stream(stream, path, fmt, progress)
+    finally:
+        # Returns the connection straight away if the export stopped early
+        stream.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a report procedure's results to a file")
+    parser.add_argument("procedure", help="e.g. print_chain_stock or print_stock_position")
+    parser.add_argument("path", help="Output file: .csv, .jsonl (optionally .gz) or .parquet")
+    parser.add_argument("args", nargs="*", help="Arguments for the procedure")
+    parser.add_argument("--format", choices=FORMATS, help="Override the format implied by the file name")
+    args = parser.parse_args(argv)
+
+    backend = MySQLBackend(ConnectionPool(DB_CONFIG, pool_size=1))
+
+    def progress(written):
+        if written % (EXPORT_BATCH * 20) == 0:
+            print(f"Exported {written} rows", file=sys.stderr)
+
+    try:
+        written = export_procedure(backend, args.procedure, args.args, args.path, args.format, progress=progress)
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Exported {written} rows to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
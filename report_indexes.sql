@@ -0,0 +1,49 @@
+-- Covering indexes for the access paths used by the reports in specific_procs.sql.
+-- tables_def.sql already creates these for new installs; this adds the ones
+-- an existing nova database is missing and skips the rest, so it is safe to
+-- run more than once. Apply after surrogate_keys.sql: the Sells and Drug
+-- indexes are on ph_id and company_id. Verify the plans afterwards with
+-- explain_check.py.
+USE nova;
+
+DELIMITER $$
+CREATE PROCEDURE add_report_index(
+    IN p_table VARCHAR(64),
+    IN p_index VARCHAR(64),
+    IN p_columns VARCHAR(200)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = p_table
+        AND INDEX_NAME = p_index
+    ) THEN
+        SET @sql = CONCAT('ALTER TABLE ', p_table, ' ADD INDEX ', p_index, ' (', p_columns, ')');
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+-- prescription_report and print_pres_details filter Prescription by pid and a
+-- pres_date range and sort by date. UNIQUE (pid, did) cannot serve the date
+-- range, so index (pid, pres_date); did and the primary key pres_id make it
+-- covering for the join to Doctor and Contains_drug.
+CALL add_report_index('Prescription', 'idx_prescription_patient_date', 'pid, pres_date, did');
+
+-- print_stock_position filters Sells by ph_id, but the primary key leads
+-- with drug_id. Carry stock and price so the index answers the report alone.
+-- This also replaces the implicit foreign key index on ph_id.
+CALL add_report_index('Sells', 'idx_sells_pharmacy', 'ph_id, drug_id, stock, price');
+
+-- print_patients_for_doctor filters Treats by did; the primary key leads with pid.
+CALL add_report_index('Treats', 'idx_treats_doctor', 'did, pid');
+
+-- drug_details filters Drug by company_id and sorts by trade_name; with the
+-- sort column in the index there is no filesort, and formula makes it covering.
+CALL add_report_index('Drug', 'idx_drug_company_trade_name', 'company_id, trade_name, formula');
+
+DROP PROCEDURE add_report_index;
+
+ANALYZE TABLE Prescription, Sells, Treats, Drug;
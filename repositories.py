@@ -0,0 +1,199 @@
+import dispense
+import prescriptions
+from streaming import FETCH_BATCH
+
+# Data access by entity. Each repository method names one stored procedure
+# (or named statement) and its arguments; the backend it is given runs it.
+# Any backend works: backend.MySQLBackend, service_client.ServiceClient or
+# sqlite_backend.SQLiteBackend. Write methods return the procedure's result
+# message; report methods return (headers, rows).
+
+
+class Repository:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def write(self, procedure, args, task=None, timer=None):
+        results = self.backend.call(procedure, args, write=True, task=task, timer=timer)
+        message = None
+        for headers, rows in results:
+            if rows:
+                message = rows[0][0]
+        return message
+
+    def read(self, procedure, args=(), task=None, timer=None):
+        # The last result set, which is the report for every procedure here
+        results = self.backend.call(procedure, list(args), task=task, timer=timer)
+        return results[-1] if results else ([], [])
+
+    def stream(self, name, args=(), batch_size=FETCH_BATCH, task=None, timer=None):
+        return self.backend.stream(name, list(args), batch_size, task, timer)
+
+
+class PatientRepository(Repository):
+    def add(self, patient_id, name, age, address, primary_physician_id, additional_doctor_id=None,
+            task=None, timer=None):
+        return self.write("add_patient", [patient_id, name, age, address, primary_physician_id,
+                                          additional_doctor_id], task, timer)
+
+    def update(self, patient_id, name, age, address, primary_physician_id, additional_doctor_id=None,
+               task=None, timer=None):
+        return self.write("update_patient", [patient_id, name, age, address, primary_physician_id,
+                                             additional_doctor_id], task, timer)
+
+    def delete(self, patient_id, task=None, timer=None):
+        return self.write("delete_patient", [patient_id], task, timer)
+
+    def prescriptions(self, patient_id, start_date, end_date, task=None, timer=None):
+        return self.read("prescription_report", [patient_id, start_date, end_date], task, timer)
+
+    def prescription_details(self, patient_id, pres_date, task=None, timer=None):
+        return self.read("print_pres_details", [patient_id, pres_date], task, timer)
+
+
+class DoctorRepository(Repository):
+    def add(self, doctor_id, name, speciality, years_of_experience, task=None, timer=None):
+        return self.write("add_doctor", [doctor_id, name, speciality, years_of_experience], task, timer)
+
+    def update(self, doctor_id, name, speciality, years_of_experience, patient_id=None, task=None, timer=None):
+        # patient_id, when given, is added to the doctor's patients
+        return self.write("update_doctor", [doctor_id, name, speciality, years_of_experience, patient_id],
+                          task, timer)
+
+    def delete(self, doctor_id, task=None, timer=None):
+        return self.write("delete_doctor", [doctor_id], task, timer)
+
+    def add_patient(self, doctor_id, patient_id, task=None, timer=None):
+        return self.write("add_treats_entry", [doctor_id, patient_id], task, timer)
+
+    def remove_patient(self, doctor_id, patient_id, task=None, timer=None):
+        return self.write("delete_treats_entry", [doctor_id, patient_id], task, timer)
+
+    def patients(self, doctor_id, task=None, timer=None):
+        return self.read("print_patients_for_doctor", [doctor_id], task, timer)
+
+
+class PharmacyRepository(Repository):
+    def add(self, name, address, phone, task=None, timer=None):
+        return self.write("add_pharmacy", [name, address, phone], task, timer)
+
+    def update(self, address, name, phone, task=None, timer=None):
+        return self.write("update_pharmacy", [address, name, phone], task, timer)
+
+    def delete(self, address, task=None, timer=None):
+        return self.write("delete_pharmacy", [address], task, timer)
+
+    def contact(self, address, task=None, timer=None):
+        return self.read("print_pharmacy_contact", [address], task, timer)
+
+    def stock_position(self, address, task=None, timer=None):
+        return self.read("print_stock_position", [address], task, timer)
+
+    def inventory(self, task=None, timer=None):
+        return self.read("print_pharmacy_inventory", [], task, timer)
+
+
+class CompanyRepository(Repository):
+    def add(self, name, phone, task=None, timer=None):
+        return self.write("add_company", [name, phone], task, timer)
+
+    def update(self, name, new_name, phone, task=None, timer=None):
+        return self.write("update_company", [name, new_name, phone], task, timer)
+
+    def delete(self, name, task=None, timer=None):
+        return self.write("delete_company", [name], task, timer)
+
+    def contact(self, name, task=None, timer=None):
+        return self.read("print_company_contact", [name], task, timer)
+
+    def drugs(self, name, task=None, timer=None):
+        return self.read("drug_details", [name], task, timer)
+
+    def inventory(self, task=None, timer=None):
+        return self.read("print_company_inventory", [], task, timer)
+
+
+class DrugRepository(Repository):
+    def add(self, trade_name, formula, company_name, task=None, timer=None):
+        return self.write("add_drug", [trade_name, formula, company_name], task, timer)
+
+    def update(self, trade_name, company_name, new_trade_name, new_formula=None, task=None, timer=None):
+        # An empty or missing formula keeps the current one
+        return self.write("update_drug", [trade_name, company_name, new_trade_name, new_formula], task, timer)
+
+    def delete(self, trade_name, company_name, task=None, timer=None):
+        return self.write("delete_drug", [trade_name, company_name], task, timer)
+
+    def availability(self, name_prefix, stock_above=0, task=None, timer=None):
+        return self.read("drug_availability", [name_prefix, stock_above], task, timer)
+
+
+class SellsRepository(Repository):
+    def add(self, address, drug_id, stock, price, task=None, timer=None):
+        return self.write("add_sells_entry", [address, drug_id, stock, price], task, timer)
+
+    def update(self, address, drug_id, stock, price, task=None, timer=None):
+        return self.write("update_sells_entry", [address, drug_id, stock, price], task, timer)
+
+    def delete(self, address, drug_id, task=None, timer=None):
+        return self.write("delete_sells_entry", [address, drug_id], task, timer)
+
+    def chain_stock(self, batch_size=FETCH_BATCH, task=None, timer=None):
+        # Every pharmacy's stock; streamed, as it can be very large
+        return self.stream("print_chain_stock", [], batch_size, task, timer)
+
+
+class PrescriptionRepository(Repository):
+    def add(self, patient_id, doctor_id, pres_date, items, task=None, timer=None):
+        # items is a list of (drug_id, quantity); all go in one call and one
+        # transaction
+        return self.write("add_prescription_multi",
+                          [patient_id, doctor_id, pres_date, prescriptions.items_json(items)], task, timer)
+
+    def update(self, patient_id, doctor_id, pres_date, new_patient_id, new_doctor_id, new_pres_date,
+               drug_id, quantity, task=None, timer=None):
+        return self.write("update_prescription", [patient_id, doctor_id, pres_date, new_patient_id,
+                                                  new_doctor_id, new_pres_date, drug_id, quantity],
+                          task, timer)
+
+    def delete(self, patient_id, doctor_id, pres_date, task=None, timer=None):
+        return self.write("delete_prescription", [patient_id, doctor_id, pres_date], task, timer)
+
+    def dispense(self, patient_id, doctor_id, pres_date, address, task=None, timer=None):
+        # Takes every drug off the pharmacy's stock in one transaction,
+        # retried on a deadlock
+        results = dispense.dispense(self.backend, patient_id, doctor_id, pres_date, address, task=task, timer=timer)
+        return results[0][1][0][0]
+
+
+class ContractRepository(Repository):
+    def add(self, company_name, address, content, start_date, end_date, supervisor, task=None, timer=None):
+        return self.write("add_contract", [company_name, address, content, start_date, end_date, supervisor],
+                          task, timer)
+
+    def update(self, company_name, address, content, start_date, end_date, supervisor, task=None, timer=None):
+        return self.write("update_contract", [company_name, address, content, start_date, end_date, supervisor],
+                          task, timer)
+
+    def update_supervisor(self, company_name, address, supervisor, task=None, timer=None):
+        return self.write("update_contract_supervisor", [company_name, address, supervisor], task, timer)
+
+    def delete(self, company_name, address, task=None, timer=None):
+        return self.write("delete_contract", [company_name, address], task, timer)
+
+    def details(self, address, pharmacy_name, company_name, batch_size=FETCH_BATCH, task=None, timer=None):
+        return self.stream("contract_details", [address, pharmacy_name, company_name], batch_size, task, timer)
+
+
+class Repositories:
+    # One of each repository over a shared backend
+    def __init__(self, backend):
+        self.backend = backend
+        self.patients = PatientRepository(backend)
+        self.doctors = DoctorRepository(backend)
+        self.pharmacies = PharmacyRepository(backend)
+        self.companies = CompanyRepository(backend)
+        self.drugs = DrugRepository(backend)
+        self.sells = SellsRepository(backend)
+        self.prescriptions = PrescriptionRepository(backend)
+        self.contracts = ContractRepository(backend)
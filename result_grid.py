@@ -0,0 +1,352 @@
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+from query_cache import is_cacheable
+
+# Rows fetched per page; the grid asks for the next page as the user scrolls
+PAGE_SIZE = 200
+
+# Rows of a streamed result kept in memory. The stream of a longer result is
+# closed there, and the rows after them are read again when the grid gets
+# to them.
+MAX_STREAM_ROWS = 20000
+
+
+def sort_key(value):
+    # NULLs sort first, like MySQL
+    return (value is not None, value)
+
+
+class StaticSource:
+    # Results held in memory (contact details, a single contract). A source
+    # created with complete=False is filled batch by batch while the rows
+    # stream in, and open grids are told when more arrive.
+    is_local = True
+    truncated = False
+
+    def __init__(self, headers, rows, complete=True):
+        self.headers = list(headers)
+        self.rows = list(rows)
+        self.sorted_rows = {}
+        self.complete = complete
+        self.listeners = []
+
+    def append(self, rows):
+        self.rows.extend(rows)
+        self.sorted_rows.clear()
+        self.notify()
+
+    def finish(self):
+        self.complete = True
+        self.notify()
+
+    def notify(self):
+        for listener in list(self.listeners):
+            listener()
+
+    def has_rows(self):
+        return len(self.rows) > 0
+
+    def fetch_page(self, offset, limit, sort_column=None, descending=False):
+        rows = self.rows
+        if sort_column is not None:
+            key = (sort_column, descending)
+            if key not in self.sorted_rows:
+                index = self.headers.index(sort_column)
+                self.sorted_rows[key] = sorted(rows, key=lambda row: sort_key(row[index]), reverse=descending)
+            rows = self.sorted_rows[key]
+        return rows[offset:offset + limit]
+
+
+class StreamSource(StaticSource):
+    # The result of a report with no paged variant, filled batch by batch
+    # while its stream arrives, like a StaticSource created with
+    # complete=False. It keeps at most max_rows rows: once the stream gets
+    # there it is closed (truncate) and pages are no longer read locally. A
+    # page outside the rows kept re-runs the report with open_stream(task,
+    # timer), skips the rows before the page and keeps the max_rows from
+    # there. Sorting needs every row, so it is not offered once truncated.
+
+    def __init__(self, procedure, args, open_stream, headers, rows, max_rows=MAX_STREAM_ROWS):
+        super().__init__(headers, rows, complete=False)
+        self.procedure = procedure
+        self.args = list(args)
+        self.open_stream = open_stream
+        self.max_rows = max_rows
+        # Position of rows[0] in the whole result
+        self.start = 0
+        # Whether the rows kept run to the end of the result
+        self.at_end = False
+        # Two open grids may fetch pages at the same time
+        self.lock = threading.Lock()
+
+    @property
+    def is_local(self):
+        return not self.truncated
+
+    def truncate(self):
+        self.truncated = True
+        self.finish()
+
+    def fetch_page(self, offset, limit, sort_column=None, descending=False, timer=None):
+        if not self.truncated:
+            return super().fetch_page(offset, limit, sort_column, descending)
+        with self.lock:
+            end = self.start + len(self.rows)
+            if offset < self.start or offset + limit > end and not self.at_end:
+                self.reload(offset, timer)
+            return self.rows[offset - self.start:offset - self.start + limit]
+
+    def reload(self, offset, timer):
+        rows = []
+        read = 0
+        at_end = True
+        stream = self.open_stream(None, timer)
+        try:
+            for headers, batch in stream:
+                # Only the first result set is shown
+                if headers != self.headers:
+                    break
+                rows.extend(batch[max(offset - read, 0):])
+                read += len(batch)
+                if len(rows) >= self.max_rows:
+                    at_end = False
+                    break
+        finally:
+            stream.close()
+        self.rows = rows[:self.max_rows]
+        self.start = offset
+        self.at_end = at_end
+
+
+class ProcedurePageSource:
+    # Pages through a report with its <procedure>_page variant, which applies
+    # ORDER BY and LIMIT/OFFSET on the server
+    is_local = False
+    complete = True
+
+    def __init__(self, backend, procedure, args, cache=None):
+        # backend is a backend.MySQLBackend or a service_client.ServiceClient
+        self.backend = backend
+        self.procedure = procedure
+        self.args = list(args)
+        self.cache = cache
+        self.headers = []
+        self.prefetched = {}
+
+    def prefetch(self, limit, timer=None):
+        # Called by the report worker so the grid can show the first page immediately
+        rows = self.fetch_page(0, limit, timer=timer)
+        self.prefetched[(0, limit, None, False)] = rows
+        return rows
+
+    def has_rows(self):
+        return any(self.prefetched.values())
+
+    def fetch_page(self, offset, limit, sort_column=None, descending=False, timer=None):
+        key = (offset, limit, sort_column, descending)
+        if key in self.prefetched:
+            if timer is not None:
+                timer.cached = True
+            return self.prefetched[key]
+
+        page_procedure = f"{self.procedure}_page"
+        page_args = self.page_args(offset, limit, sort_column, descending)
+
+        def load():
+            if timer is not None:
+                timer.cached = False
+            results = self.backend.call(page_procedure, page_args, timer=timer)
+            return results[-1] if results else ([], [])
+
+        if timer is not None:
+            timer.cached = True
+        if self.cache is not None and is_cacheable(page_procedure):
+            headers, rows = self.cache.cached_call(page_procedure, page_args, load)
+        else:
+            headers, rows = load()
+        if headers:
+            self.headers = headers
+        self.page_loaded(offset, rows, sort_column)
+        return rows
+
+    def page_args(self, offset, limit, sort_column, descending):
+        return self.args + [sort_column, descending, limit, offset]
+
+    def page_loaded(self, offset, rows, sort_column):
+        pass
+
+
+class KeysetPageSource(ProcedurePageSource):
+    # For a report whose <procedure>_page variant also takes the previous
+    # page's last row (backend.KEYSET_ORDERS). In the report's own order each
+    # page after the first starts after that row instead of at an offset. The
+    # grid asks for the pages in turn, so the row ending one page is known
+    # before the next is asked for.
+
+    def __init__(self, backend, procedure, args, keys, cache=None):
+        super().__init__(backend, procedure, args, cache)
+        # Columns of the report's order, whose values make up the row
+        self.keys = keys
+        # Offset -> key values of the row just before it
+        self.after = {}
+
+    def page_args(self, offset, limit, sort_column, descending):
+        after = [None] * len(self.keys)
+        if sort_column is None and offset > 0:
+            after = self.after.get(offset, after)
+        return super().page_args(offset, limit, sort_column, descending) + after
+
+    def page_loaded(self, offset, rows, sort_column):
+        if sort_column is None and rows and self.headers:
+            indexes = [self.headers.index(key) for key in self.keys]
+            self.after[offset + len(rows)] = [rows[-1][index] for index in indexes]
+
+
+class ResultGrid(tk.Frame):
+    def __init__(self, parent, executor, source, page_size=PAGE_SIZE, bg="#000000", fg="#ffffff", monitor=None):
+        super().__init__(parent, bg=bg)
+        self.executor = executor
+        self.source = source
+        self.page_size = page_size
+        # Optional perf_monitor.PerfMonitor timing each page fetched from the server
+        self.monitor = monitor
+
+        self.offset = 0
+        self.loading = False
+        self.exhausted = False
+        self.sort_column = None
+        self.descending = False
+        # Bumped on every re-sort so pages from an older request are ignored
+        self.generation = 0
+
+        columns = list(source.headers)
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", style="Results.Treeview")
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=150, minwidth=80, stretch=True)
+
+        self.vsb = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+        hsb = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscrollcommand=self.on_scroll, xscrollcommand=hsb.set)
+
+        self.status = tk.Label(self, text="", bg=bg, fg=fg, font=("Arial", 10), anchor="w")
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        hsb.grid(row=1, column=0, sticky="ew")
+        self.status.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        if source.is_local:
+            source.listeners.append(self.on_source_changed)
+        self.load_next_page()
+
+    def on_source_changed(self):
+        # More streamed rows arrived (or the stream ended) while the grid is open
+        if self.winfo_exists() and not self.exhausted:
+            self.load_next_page()
+
+    def on_scroll(self, first, last):
+        self.vsb.set(first, last)
+        # Fetch the next page once the user nears the end of what is loaded;
+        # this also keeps loading until the visible area is filled
+        if float(last) >= 0.9:
+            self.load_next_page()
+
+    def load_next_page(self):
+        if self.loading or self.exhausted:
+            return
+
+        self.loading = True
+        generation = self.generation
+        args = (self.offset, self.page_size, self.sort_column, self.descending)
+
+        if self.source.is_local:
+            self.add_page(generation, self.source.fetch_page(*args))
+            return
+
+        timer = None
+        if self.monitor is not None:
+            timer = self.monitor.start(f"{self.source.procedure}_page", self.source.args + list(args))
+
+        self.status.config(text=f"{self.offset} rows loaded, loading more...")
+        self.executor.submit(
+            f"{self.source.procedure} page",
+            lambda task: self.source.fetch_page(*args, timer=timer),
+            on_success=lambda rows: self.add_page(generation, rows, timer),
+            on_error=lambda err: self.page_failed(generation, err, timer)
+        )
+
+    def add_page(self, generation, rows, timer=None):
+        if generation != self.generation or not self.winfo_exists():
+            if timer is not None:
+                timer.finish()
+            return
+
+        self.loading = False
+        if timer is not None:
+            with timer.rendering():
+                self.insert_rows(rows)
+            timer.finish()
+        else:
+            self.insert_rows(rows)
+        self.offset += len(rows)
+        # A short page from a source that is still streaming just means the
+        # rest has not arrived yet
+        self.exhausted = len(rows) < self.page_size and self.source.complete
+        self.update_status()
+
+    def insert_rows(self, rows):
+        for row in rows:
+            self.tree.insert("", tk.END, values=["" if value is None else str(value) for value in row])
+
+    def page_failed(self, generation, err, timer=None):
+        if timer is not None:
+            timer.finish(err)
+        if generation != self.generation or not self.winfo_exists():
+            return
+        self.loading = False
+        self.status.config(text=f"Error loading rows: {err}")
+
+    def update_status(self):
+        if not self.source.complete:
+            text = f"{self.offset} rows loaded, still receiving rows..."
+        elif self.offset == 0:
+            text = "No results found."
+        elif self.exhausted:
+            text = f"{self.offset} rows"
+        else:
+            text = f"{self.offset} rows loaded, scroll for more"
+        self.status.config(text=text)
+
+    def sort_by(self, column):
+        if not self.source.complete:
+            self.status.config(text="Sorting is available once all rows have arrived")
+            return
+        if self.source.truncated:
+            self.status.config(text="Sorting is not available for results this large")
+            return
+
+        if self.sort_column == column:
+            self.descending = not self.descending
+        else:
+            self.sort_column = column
+            self.descending = False
+
+        for heading in self.source.headers:
+            arrow = ""
+            if heading == column:
+                arrow = " ▼" if self.descending else " ▲"
+            self.tree.heading(heading, text=heading + arrow)
+
+        # Sorting is done by the source (on the server for paged reports), so
+        # start again from the first page
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.offset = 0
+        self.loading = False
+        self.exhausted = False
+        self.load_next_page()
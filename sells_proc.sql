@@ -6,6 +6,8 @@ CREATE PROCEDURE add_sells_entry(
     IN p_price DECIMAL(10,2)
 )
 BEGIN
+    DECLARE v_ph_id INT;
+    
     -- Input validation
     IF p_stock < 0 THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Stock cannot be negative';
@@ -16,23 +18,29 @@ BEGIN
     END IF;
     
     -- Check that pharmacy exists
-    IF NOT EXISTS (SELECT 1 FROM Pharmacy WHERE address = p_pharmacy_address) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address AND is_active;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist';
     END IF;
     
-    -- Check that drug exists
-    IF NOT EXISTS (SELECT 1 FROM Drug WHERE drug_id = p_drug_id) THEN
+    -- Check that drug exists; one from a company being purged is gone
+    IF NOT EXISTS (
+        SELECT 1 FROM Drug d
+        JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+        WHERE d.drug_id = p_drug_id AND pc.is_active
+    ) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Drug does not exist';
     END IF;
     
     -- Check if entry already exists
-    IF EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is already being sold at this pharmacy. Use update_sells_entry instead.';
     END IF;
     
     -- Insert the new sells relationship
-    INSERT INTO Sells(ph_address, drug_id, stock, price)
-    VALUES (p_pharmacy_address, p_drug_id, p_stock, p_price);
+    INSERT INTO Sells(ph_id, drug_id, stock, price)
+    VALUES (v_ph_id, p_drug_id, p_stock, p_price);
     
     SELECT CONCAT('Drug with ID ', p_drug_id, ' is now being sold at pharmacy at address ', p_pharmacy_address) AS result;
 END$$
@@ -44,24 +52,35 @@ CREATE PROCEDURE delete_sells_entry(
     IN p_drug_id INT
 )
 BEGIN
-	DECLARE drug_count INT;
+	DECLARE v_ph_id INT;
+	DECLARE v_drug_count INT;
+    
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
     -- Check if relationship exists
-    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is not being sold at this pharmacy';
     END IF;
     
-    -- Check if this would reduce the pharmacy's drug count below 10
-
-    SELECT COUNT(*) INTO drug_count FROM Sells WHERE ph_address = p_pharmacy_address;
+    START TRANSACTION;
+    
+    -- Check if this would reduce the pharmacy's drug count below 10, from the
+    -- counter kept by the Sells triggers (inventory_summary.sql)
+    SELECT drug_count INTO v_drug_count FROM PharmacyInventory
+    WHERE ph_id = v_ph_id FOR UPDATE;
     
-    IF drug_count <= 10 THEN
+    -- A missing summary row counts as no drugs rather than skipping the check
+    IF COALESCE(v_drug_count, 0) <= 10 THEN
+        ROLLBACK;
         SIGNAL SQLSTATE '45000' 
         SET MESSAGE_TEXT = 'Cannot remove drug from pharmacy. Each pharmacy must sell at least 10 drugs.';
     END IF;
     
     -- Delete the sells relationship
     DELETE FROM Sells
-    WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id;
+    WHERE ph_id = v_ph_id AND drug_id = p_drug_id;
+    
+    COMMIT;
     
     SELECT CONCAT('Drug with ID ', p_drug_id, ' is no longer being sold at pharmacy at address ', p_pharmacy_address) AS result;
 END$$
@@ -75,6 +94,8 @@ CREATE PROCEDURE update_sells_entry(
     IN p_price DECIMAL(10,2)
 )
 BEGIN
+    DECLARE v_ph_id INT;
+    
     -- Input validation
     IF p_stock < 0 THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Stock cannot be negative';
@@ -85,7 +106,9 @@ BEGIN
     END IF;
     
     -- Check that pharmacy exists
-    IF NOT EXISTS (SELECT 1 FROM Pharmacy WHERE address = p_pharmacy_address) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy WHERE address = p_pharmacy_address;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy does not exist';
     END IF;
     
@@ -95,7 +118,7 @@ BEGIN
     END IF;
     
     -- Check if entry exists
-    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_address = p_pharmacy_address AND drug_id = p_drug_id) THEN
+    IF NOT EXISTS (SELECT 1 FROM Sells WHERE ph_id = v_ph_id AND drug_id = p_drug_id) THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'This drug is not being sold at this pharmacy. Use add_sells_entry instead.';
     END IF;
     
@@ -103,7 +126,7 @@ BEGIN
     UPDATE Sells
     SET stock = p_stock,
         price = p_price
-    WHERE ph_address = p_pharmacy_address 
+    WHERE ph_id = v_ph_id 
     AND drug_id = p_drug_id;
     
     SELECT CONCAT('Updated inventory for drug ID ', p_drug_id, ' at pharmacy address ', p_pharmacy_address, 
@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+import mysql.connector
+
+from backend import PROCEDURES, STATEMENTS, MySQLBackend, coerce_args, is_write, signature
+from db_pool import ConnectionPool, DB_CONFIG, POOL_SIZE, is_connection_error
+from query_executor import QueryCancelled
+from report_export import json_value
+from sqlite_backend import SQLiteBackend
+from streaming import FETCH_BATCH
+
+DEFAULT_PORT = 8765
+# Largest request body accepted; a batch of calls is well under this
+MAX_BODY = 4 * 1024 * 1024
+MAX_BATCH = 100
+MAX_STREAM_BATCH = 10000
+# Batches buffered between the database thread and the socket; when the
+# client reads slowly the database thread waits instead of piling up rows
+STREAM_QUEUE = 4
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamTask:
+    # The part of query_executor.QueryTask that streaming.py uses: lets the
+    # request handler stop a stream and kill its statement when the client
+    # goes away
+    def __init__(self):
+        self.cancelled = False
+        self.connection_id = None
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise QueryCancelled("Client disconnected")
+
+
+def column_types(rows):
+    # Tags for the columns whose JSON form is a string, so clients can turn
+    # them back into Decimal and date values
+    types = []
+    for column in (zip(*rows) if rows else []):
+        kind = None
+        for value in column:
+            if value is None:
+                continue
+            if isinstance(value, Decimal):
+                kind = "decimal"
+            elif isinstance(value, datetime):
+                kind = "datetime"
+            elif isinstance(value, date):
+                kind = "date"
+            elif isinstance(value, timedelta):
+                kind = "time"
+            break
+        types.append(kind)
+    return types
+
+
+def encode_rows(rows):
+    return [[json_value(value) for value in row] for row in rows]
+
+
+def encode_results(results):
+    return [
+        {"columns": headers, "types": column_types(rows), "rows": encode_rows(rows)}
+        for headers, rows in results
+    ]
+
+
+def error_status(err):
+    if isinstance(err, HttpError):
+        return err.status
+    if isinstance(err, ValueError):
+        return HTTPStatus.BAD_REQUEST
+    if isinstance(err, mysql.connector.PoolError) or is_connection_error(err):
+        return HTTPStatus.SERVICE_UNAVAILABLE
+    if isinstance(err, mysql.connector.Error) and err.sqlstate == "45000":
+        # Rejected by a procedure's own checks
+        return HTTPStatus.UNPROCESSABLE_ENTITY
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def error_payload(err):
+    payload = {"error": getattr(err, "msg", None) or str(err)}
+    if isinstance(err, mysql.connector.Error):
+        payload["errno"] = err.errno
+        payload["sqlstate"] = err.sqlstate
+    return payload
+
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def read_request(reader):
+    # Returns (method, path, headers, body), or None when the client closed
+    # the connection between requests
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Send the request body with a Content-Length")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body is over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def parse_body(body):
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+    return payload
+
+
+class NovaService:
+    # Serves the stored procedures over HTTP/JSON. Requests are handled on an
+    # asyncio loop; the database work runs on a thread per pooled connection,
+    # so any number of clients share pool_size MySQL connections.
+    #
+    #   GET  /health              database reachable?
+    #   GET  /procedures          names, parameter types and whether each writes
+    #   POST /call/<procedure>    {"args": [...] or {...}} -> every result set
+    #   POST /batch               {"calls": [{"procedure": ..., "args": ...}, ...]}
+    #                             run in order on one connection
+    #   POST /stream/<name>       {"args": ..., "batch_size": n} -> NDJSON lines:
+    #                             {"columns", "types"} then {"rows"} per batch,
+    #                             ending with {"done", "rows"} or {"error"}
+
+    def __init__(self, backend, workers=POOL_SIZE):
+        # backend is a backend.MySQLBackend, with workers set to its pool
+        # size, or a sqlite_backend.SQLiteBackend for running without MySQL
+        self.backend = backend
+        self.workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nova-service")
+
+    async def run_db(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.workers, function, *args)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as err:
+                    await self.send_json(writer, err.status, error_payload(err), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self.dispatch(method, urlsplit(target).path, body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body, writer, keep_alive):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        try:
+            if method == "GET" and parts == ["health"]:
+                await self.run_db(self.backend.ping)
+                payload = {"status": "ok"}
+            elif method == "GET" and parts == ["procedures"]:
+                payload = self.describe()
+            elif method == "POST" and len(parts) == 2 and parts[0] == "call":
+                payload = await self.call(parts[1], parse_body(body))
+            elif method == "POST" and parts == ["batch"]:
+                payload = await self.batch(parse_body(body))
+            elif method == "POST" and len(parts) == 2 and parts[0] == "stream":
+                stream_args = self.prepare_stream(parts[1], parse_body(body))
+                payload = None
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, f"No endpoint for {method} {path}")
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as err:
+            await self.send_json(writer, error_status(err), error_payload(err), keep_alive)
+            return
+        if payload is None:
+            # Once the response has started, errors go into the stream itself
+            await self.stream(*stream_args, writer, keep_alive)
+        else:
+            await self.send_json(writer, HTTPStatus.OK, payload, keep_alive)
+
+    def describe(self):
+        described = {}
+        for name in list(PROCEDURES) + list(STATEMENTS):
+            described[name] = {
+                "params": [{"name": param, "type": kind} for param, kind in signature(name)],
+                "write": is_write(name),
+            }
+        return described
+
+    def prepare_call(self, name, args):
+        if name not in PROCEDURES:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown procedure: {name}")
+        return name, coerce_args(name, args if args is not None else []), is_write(name)
+
+    async def call(self, name, payload):
+        procedure, args, write = self.prepare_call(name, payload.get("args"))
+        results = await self.run_db(self.backend.call, procedure, args, write)
+        return {"results": encode_results(results)}
+
+    async def batch(self, payload):
+        calls = payload.get("calls")
+        if not isinstance(calls, list) or not calls:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "calls must be a non-empty list")
+        if len(calls) > MAX_BATCH:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH} calls per batch")
+
+        # Arguments are checked before anything runs; a bad call is reported
+        # in its slot and the rest still go to the database
+        prepared = []
+        outcomes = []
+        for call in calls:
+            try:
+                if not isinstance(call, dict):
+                    raise HttpError(HTTPStatus.BAD_REQUEST, "Each call must be a JSON object")
+                prepared.append(self.prepare_call(call.get("procedure"), call.get("args")))
+                outcomes.append(None)
+            except (HttpError, ValueError) as err:
+                outcomes.append(err)
+
+        if prepared:
+            results = iter(await self.run_db(self.backend.call_batch, prepared))
+            outcomes = [next(results) if outcome is None else outcome for outcome in outcomes]
+
+        return {"results": [
+            {"status": int(error_status(outcome)), **error_payload(outcome)}
+            if isinstance(outcome, Exception)
+            else {"status": int(HTTPStatus.OK), "results": encode_results(outcome)}
+            for outcome in outcomes
+        ]}
+
+    def prepare_stream(self, name, payload):
+        if name not in PROCEDURES and name not in STATEMENTS:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown procedure: {name}")
+        if name in PROCEDURES and is_write(name):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} changes data; use /call")
+        args = coerce_args(name, payload.get("args") if payload.get("args") is not None else [])
+        batch_size = payload.get("batch_size") or FETCH_BATCH
+        if not isinstance(batch_size, int) or not 0 < batch_size <= MAX_STREAM_BATCH:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"batch_size must be between 1 and {MAX_STREAM_BATCH}")
+        return name, args, batch_size
+
+    async def stream(self, name, args, batch_size, writer, keep_alive):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE)
+        task = StreamTask()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            # Runs on a database thread; blocks on put() while the queue is full
+            try:
+                stream = self.backend.stream(name, args, batch_size, task)
+                try:
+                    for headers, rows in stream:
+                        put(("rows", headers, rows))
+                finally:
+                    stream.close()
+                put(("done", None, None))
+            except Exception as err:
+                put(("error", err, None))
+
+        producer = loop.run_in_executor(self.workers, produce)
+        writer.write(response_head(HTTPStatus.OK, {
+            "Content-Type": "application/x-ndjson",
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }))
+
+        finished = False
+        try:
+            headers_sent = None
+            total = 0
+            while True:
+                kind, first, rows = await queue.get()
+                if kind == "rows":
+                    lines = []
+                    if first != headers_sent:
+                        # Start of a result set
+                        headers_sent = first
+                        lines.append({"columns": first, "types": column_types(rows)})
+                    lines.append({"rows": encode_rows(rows)})
+                    total += len(rows)
+                    await self.send_chunk(writer, lines)
+                elif kind == "done":
+                    await self.send_chunk(writer, [{"done": True, "rows": total}])
+                    break
+                else:
+                    await self.send_chunk(writer, [{**error_payload(first), "status": int(error_status(first))}])
+                    break
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            finished = True
+        finally:
+            if not finished:
+                await self.abandon_stream(task, queue, producer)
+
+    async def abandon_stream(self, task, queue, producer):
+        # The client went away mid-stream: stop the producer, kill its
+        # statement, and keep draining the queue so it is not left blocked
+        task.cancelled = True
+        connection_id = task.connection_id
+        if connection_id is not None:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self.kill_query, connection_id)
+        while not producer.done():
+            try:
+                await asyncio.wait_for(queue.get(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    def kill_query(self, connection_id):
+        try:
+            self.backend.kill_query(connection_id)
+        except mysql.connector.Error as err:
+            print(f"Failed to cancel query: {err}", file=sys.stderr)
+
+    async def send_chunk(self, writer, lines):
+        data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        writer.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def send_json(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(response_head(status, {
+            "Content-Type": "application/json",
+            "Content-Length": len(body),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }) + body)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Serving on {addresses}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.workers.shutdown(wait=False, cancel_futures=True)
+        self.backend.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the nova stored procedures over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help="MySQL connections shared by all clients")
+    parser.add_argument("--prepared", action="store_true",
+                        help="Run the hot lookups as prepared statements (see backend.PREPARED)")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="Serve a SQLite stand-in (see sqlite_backend.py) instead of MySQL")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        service = NovaService(SQLiteBackend(args.sqlite), args.pool_size)
+    else:
+        pool = ConnectionPool(DB_CONFIG, pool_size=args.pool_size, reset_session=not args.prepared)
+        service = NovaService(MySQLBackend(pool, prepared=args.prepared), args.pool_size)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import http.client
+import json
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import quote, urlsplit
+
+from streaming import FETCH_BATCH
+
+
+class ServiceError(Exception):
+    # An error reported by service.py; for database errors errno and sqlstate
+    # are those of the MySQL error
+    def __init__(self, message, status, errno=None, sqlstate=None):
+        super().__init__(message)
+        self.msg = message
+        self.status = status
+        self.errno = errno
+        self.sqlstate = sqlstate
+
+
+DECODERS = {
+    "decimal": Decimal,
+    "date": date.fromisoformat,
+    "datetime": datetime.fromisoformat,
+}
+
+
+def decode_rows(rows, types):
+    decoders = [DECODERS.get(kind) for kind in types]
+    if not any(decoders):
+        return [tuple(row) for row in rows]
+    return [
+        tuple(value if decode is None or value is None else decode(value) for value, decode in zip(row, decoders))
+        for row in rows
+    ]
+
+
+def decode_results(results):
+    return [(result["columns"], decode_rows(result["rows"], result["types"])) for result in results]
+
+
+def json_arg(value):
+    if isinstance(value, (Decimal, date)):
+        return str(value)
+    raise TypeError(f"Cannot send {type(value).__name__} to the service")
+
+
+class ServiceClient:
+    # Talks to service.py. Offers the same methods as backend.MySQLBackend,
+    # so the GUI and the batch tools can run against either without holding
+    # a MySQL connection of their own. Each thread keeps one HTTP connection
+    # open and reuses it.
+
+    def __init__(self, base_url, timeout=60.0):
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"Service URL must start with http:// or https://: {base_url}")
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def open_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.open_connection()
+        return conn
+
+    def drop_connection(self):
+        conn = getattr(self.local, "conn", None)
+        self.local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def send(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload, default=json_arg)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            conn = self.connection()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The service closed an idle keep-alive connection; the request
+                # never reached it, so sending it again on a new one is safe
+                self.drop_connection()
+                if attempt:
+                    raise
+            except Exception:
+                self.drop_connection()
+                raise
+
+    def request(self, method, path, payload=None):
+        response = self.send(method, path, payload)
+        data = json.loads(response.read() or b"{}")
+        if response.getheader("Connection", "").lower() == "close":
+            self.drop_connection()
+        if response.status != 200:
+            raise ServiceError(data.get("error", response.reason), response.status,
+                               data.get("errno"), data.get("sqlstate"))
+        return data
+
+    def ping(self):
+        self.request("GET", "/health")
+
+    def procedures(self):
+        return self.request("GET", "/procedures")
+
+    def call(self, procedure, args, write=False, task=None, timer=None):
+        # write is decided by the service; it is accepted here so callers can
+        # treat this and MySQLBackend alike
+        data = self.request("POST", f"/call/{quote(procedure, safe='')}", {"args": list(args)})
+        if timer is not None:
+            timer.server_done()
+        results = decode_results(data["results"])
+        if timer is not None:
+            timer.add_rows(sum(len(rows) for headers, rows in results))
+            timer.fetch_done()
+        return results
+
+    def call_batch(self, calls, task=None):
+        # [(procedure, args, write)] -> each call's results, or the
+        # ServiceError it failed with, in order
+        data = self.request("POST", "/batch", {
+            "calls": [{"procedure": procedure, "args": list(args)} for procedure, args, write in calls]
+        })
+        outcomes = []
+        for outcome in data["results"]:
+            if "error" in outcome:
+                outcomes.append(ServiceError(outcome["error"], outcome["status"],
+                                             outcome.get("errno"), outcome.get("sqlstate")))
+            else:
+                outcomes.append(decode_results(outcome["results"]))
+        return outcomes
+
+    def stream(self, name, args, batch_size=FETCH_BATCH, task=None, timer=None):
+        # A generator of (headers, rows) batches, like streaming.py. Closing
+        # it early drops the HTTP connection, which makes the service stop
+        # the query.
+        response = self.send("POST", f"/stream/{quote(name, safe='')}",
+                             {"args": list(args), "batch_size": batch_size})
+        if response.status != 200:
+            data = json.loads(response.read() or b"{}")
+            raise ServiceError(data.get("error", response.reason), response.status,
+                               data.get("errno"), data.get("sqlstate"))
+        if timer is not None:
+            timer.server_done()
+
+        finished = False
+        try:
+            headers, types = None, []
+            while True:
+                if task is not None:
+                    task.check_cancelled()
+                line = response.readline()
+                if not line:
+                    raise ServiceError("The service closed the stream early", 502)
+                message = json.loads(line)
+                if "columns" in message:
+                    headers, types = message["columns"], message["types"]
+                elif "rows" in message and "done" not in message:
+                    rows = decode_rows(message["rows"], types)
+                    if timer is not None:
+                        timer.add_rows(len(rows))
+                    yield headers, rows
+                elif message.get("done"):
+                    break
+                else:
+                    raise ServiceError(message.get("error"), message.get("status", 500),
+                                       message.get("errno"), message.get("sqlstate"))
+            # Reads the chunked terminator so the connection can be reused
+            response.read()
+            finished = True
+            if timer is not None:
+                timer.fetch_done()
+        finally:
+            if not finished:
+                self.drop_connection()
+
+    def kill_query(self, connection_id):
+        # Statements run on the service's connections; abandoning a stream
+        # is what stops them
+        pass
+
+    def close(self):
+        self.drop_connection()
@@ -5,20 +5,34 @@ CREATE PROCEDURE prescription_report(
     IN p_end_date DATE
 )
 BEGIN
-    SELECT
-        pr.pres_date AS Prescription_Date,
-        pt.p_name AS Patient_Name,
-        d.d_name AS Doctor_Name,
-        dr.trade_name AS Drug_Name,
-        cd.quantity AS Quantity
-    FROM Prescription pr
-    JOIN Patient pt ON pr.pid = pt.paadharid
-    JOIN Doctor d ON pr.did = d.daadharid
-    JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
-    JOIN Drug dr ON cd.drug_id = dr.drug_id
-    WHERE pr.pid = p_patient_id
-    AND pr.pres_date BETWEEN p_start_date AND p_end_date
-    ORDER BY pr.pres_date DESC;
+    -- Served from PrescriptionHistory (prescription_history.sql) and its
+    -- archive tier (prescription_archive.sql): one range read of each
+    -- (pid, pres_date) primary key. The archive reads only the yearly
+    -- partitions the date range falls in. The doctor and company are looked
+    -- up by their unique keys only to leave out those being purged.
+    (SELECT
+        h.pres_date AS Prescription_Date,
+        h.patient_name AS Patient_Name,
+        h.doctor_name AS Doctor_Name,
+        h.trade_name AS Drug_Name,
+        h.quantity AS Quantity
+    FROM PrescriptionHistory h
+    JOIN Doctor d ON d.daadharid = h.did
+    JOIN PharmaceuticalCompany pc ON pc.company_name = h.company_name
+    WHERE h.pid = p_patient_id
+    AND h.pres_date BETWEEN p_start_date AND p_end_date
+    AND d.is_active
+    AND pc.is_active)
+    UNION ALL
+    (SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.quantity
+    FROM PrescriptionArchive a
+    JOIN Doctor d ON d.daadharid = a.did
+    JOIN PharmaceuticalCompany pc ON pc.company_name = a.company_name
+    WHERE a.pid = p_patient_id
+    AND a.pres_date BETWEEN p_start_date AND p_end_date
+    AND d.is_active
+    AND pc.is_active)
+    ORDER BY Prescription_Date DESC;
 END$$
 DELIMITER ;
 
@@ -29,22 +43,31 @@ CREATE PROCEDURE print_pres_details(
     IN p_pres_date DATE
 )
 BEGIN
+    -- Served from both tiers, like prescription_report
     SELECT
-        p.pres_date AS Prescription_Date,
-        pt.p_name AS Patient_Name,
-        d.d_name AS Doctor_Name,
-        dr.trade_name AS Drug_Name,
-        dr.formula AS Drug_Formula,
-        c.quantity AS Quantity,
-        pc.company_name AS Manufacturer
-    FROM Prescription p
-    JOIN Patient pt ON p.pid = pt.paadharid
-    JOIN Doctor d ON p.did = d.daadharid
-    JOIN Contains_drug c ON p.pres_id = c.pres_id
-    JOIN Drug dr ON c.drug_id = dr.drug_id
-    JOIN PharmaceuticalCompany pc ON dr.company_name = pc.company_name
-    WHERE p.pid = p_patient_id
-    AND p.pres_date = p_pres_date;
+        h.pres_date AS Prescription_Date,
+        h.patient_name AS Patient_Name,
+        h.doctor_name AS Doctor_Name,
+        h.trade_name AS Drug_Name,
+        h.formula AS Drug_Formula,
+        h.quantity AS Quantity,
+        h.company_name AS Manufacturer
+    FROM PrescriptionHistory h
+    JOIN Doctor d ON d.daadharid = h.did
+    JOIN PharmaceuticalCompany pc ON pc.company_name = h.company_name
+    WHERE h.pid = p_patient_id
+    AND h.pres_date = p_pres_date
+    AND d.is_active
+    AND pc.is_active
+    UNION ALL
+    SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.formula, a.quantity, a.company_name
+    FROM PrescriptionArchive a
+    JOIN Doctor d ON d.daadharid = a.did
+    JOIN PharmaceuticalCompany pc ON pc.company_name = a.company_name
+    WHERE a.pid = p_patient_id
+    AND a.pres_date = p_pres_date
+    AND d.is_active
+    AND pc.is_active;
 END$$
 DELIMITER ;
 
@@ -61,8 +84,9 @@ BEGIN
         pc.company_name AS Manufacturer,
         pc.phone_number AS Contact_Number
     FROM Drug d
-    JOIN PharmaceuticalCompany pc ON d.company_name = pc.company_name
-    WHERE d.company_name = p_company_name
+    JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id
+    WHERE pc.company_name = p_company_name
+    AND pc.is_active
     ORDER BY d.trade_name;
 END$$
 DELIMITER ;
@@ -81,10 +105,12 @@ BEGIN
         s.stock AS Stock_Position,
         s.price AS Price
     FROM Pharmacy p
-    JOIN Sells s ON p.address = s.ph_address
+    JOIN Sells s ON p.ph_id = s.ph_id
     JOIN Drug d ON s.drug_id = d.drug_id
-    JOIN PharmaceuticalCompany pc ON d.company_name = pc.company_name
+    JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id
     WHERE p.address = p_pharmacy_address
+    AND p.is_active
+    AND pc.is_active
     ORDER BY d.trade_name;
 END$$
 DELIMITER ;
@@ -100,7 +126,8 @@ BEGIN
         p.address AS Pharmacy_Address,
         p.phone AS Pharmacy_Contact
     FROM Pharmacy p
-    WHERE p.address = p_pharmacy_address;
+    WHERE p.address = p_pharmacy_address
+    AND p.is_active;
 END$$
 DELIMITER ;
 
@@ -114,7 +141,8 @@ BEGIN
         c.company_name AS Company_Name,
         c.phone_number AS Company_Contact
     FROM PharmaceuticalCompany c
-    WHERE c.company_name = p_company_name;
+    WHERE c.company_name = p_company_name
+    AND c.is_active;
 END$$
 DELIMITER ;
 
@@ -132,7 +160,9 @@ BEGIN
         CASE WHEN pt.p_daadharid = p_doctor_id THEN 'Yes' ELSE 'No' END AS Is_Primary_Physician
     FROM Patient pt
     JOIN Treats t ON pt.paadharid = t.pid
+    JOIN Doctor d ON d.daadharid = t.did
     WHERE t.did = p_doctor_id
+    AND d.is_active
     ORDER BY pt.p_name;
 END$$
 DELIMITER ;
@@ -144,7 +174,8 @@ CREATE PROCEDURE display_contract(
     IN p_company_name VARCHAR(100)
 )
 BEGIN
-    DECLARE contract_count INT;
+    DECLARE v_ph_id INT;
+    DECLARE v_company_id INT;
 
     -- Input validation
     IF p_pharmacy_address IS NULL OR p_pharmacy_address = '' THEN
@@ -156,25 +187,27 @@ BEGIN
     END IF;
     
     -- Verify pharmacy exists with given address and name
-    IF NOT EXISTS (
-        SELECT 1 FROM Pharmacy 
-        WHERE address = p_pharmacy_address 
-        AND pname = p_pharmacy_name
-    ) THEN
+    SELECT ph_id INTO v_ph_id FROM Pharmacy 
+    WHERE address = p_pharmacy_address 
+    AND pname = p_pharmacy_name
+    AND is_active;
+    
+    IF v_ph_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmacy not found with the given address and name';
     END IF;
     
     -- Verify company exists
-    IF NOT EXISTS (
-        SELECT 1 FROM PharmaceuticalCompany 
-        WHERE company_name = p_company_name
-    ) THEN
+    SELECT company_id INTO v_company_id FROM PharmaceuticalCompany 
+    WHERE company_name = p_company_name
+    AND is_active;
+    
+    IF v_company_id IS NULL THEN
         SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Pharmaceutical company not found';
     END IF;
     
     -- Retrieve contract information
     SELECT 
-        c.company_name AS 'Company Name',
+        pc.company_name AS 'Company Name',
         pc.phone_number AS 'Company Phone',
         p.pname AS 'Pharmacy Name',
         p.address AS 'Pharmacy Address',
@@ -190,21 +223,359 @@ BEGIN
         END AS 'Contract Status',
         DATEDIFF(c.end_date, CURDATE()) AS 'Days Remaining'
     FROM Contract c
-    JOIN Pharmacy p ON c.ph_address = p.address
-    JOIN PharmaceuticalCompany pc ON c.company_name = pc.company_name
-    WHERE c.ph_address = p_pharmacy_address
-    AND p.pname = p_pharmacy_name
-    AND c.company_name = p_company_name;
+    JOIN Pharmacy p ON c.ph_id = p.ph_id
+    JOIN PharmaceuticalCompany pc ON c.company_id = pc.company_id
+    WHERE c.company_id = v_company_id
+    AND c.ph_id = v_ph_id;
     
     -- If no contract exists, provide a clear message
-    SELECT COUNT(*) INTO contract_count
-FROM contract
-WHERE pharmacy_id = some_pharmacy_id AND company_id = some_company_id;
+    IF NOT EXISTS (
+        SELECT 1 FROM Contract
+        WHERE company_id = v_company_id AND ph_id = v_ph_id
+    ) THEN
+        SELECT 'No contract exists between this pharmacy and pharmaceutical company' AS Message;
+    END IF;
+END$$
+DELIMITER ;
+
+
+
+
+-- Paged variants of the large reports, used by the result grid.
+-- Each takes the report's own arguments plus a sort column (one of the
+-- report's column aliases, or NULL for the default order), a sort
+-- direction and a LIMIT/OFFSET window. The sort column is checked against
+-- a fixed list before it is placed in the dynamic ORDER BY.
+
+DELIMITER $$
+CREATE PROCEDURE prescription_report_page(
+    IN p_patient_id VARCHAR(12),
+    IN p_start_date DATE,
+    IN p_end_date DATE,
+    IN p_sort_column VARCHAR(64),
+    IN p_sort_desc BOOLEAN,
+    IN p_limit INT,
+    IN p_offset INT
+)
+BEGIN
+    IF p_sort_column IN ('Prescription_Date', 'Patient_Name', 'Doctor_Name', 'Drug_Name', 'Quantity') THEN
+        SET @order_by = CONCAT('`', p_sort_column, '`', IF(p_sort_desc, ' DESC', ' ASC'));
+    ELSE
+        SET @order_by = 'Prescription_Date DESC';
+    END IF;
+
+    SET @sql = CONCAT(
+        'SELECT Prescription_Date, Patient_Name, Doctor_Name, Drug_Name, Quantity FROM (',
+        'SELECT h.pres_date AS Prescription_Date, h.patient_name AS Patient_Name, ',
+        'h.doctor_name AS Doctor_Name, h.trade_name AS Drug_Name, h.quantity AS Quantity, ',
+        'h.pres_id, h.drug_id ',
+        'FROM PrescriptionHistory h ',
+        'JOIN Doctor d ON d.daadharid = h.did ',
+        'JOIN PharmaceuticalCompany pc ON pc.company_name = h.company_name ',
+        'WHERE h.pid = ? AND h.pres_date BETWEEN ? AND ? AND d.is_active AND pc.is_active ',
+        'UNION ALL ',
+        'SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.quantity, a.pres_id, a.drug_id ',
+        'FROM PrescriptionArchive a ',
+        'JOIN Doctor d ON d.daadharid = a.did ',
+        'JOIN PharmaceuticalCompany pc ON pc.company_name = a.company_name ',
+        'WHERE a.pid = ? AND a.pres_date BETWEEN ? AND ? AND d.is_active AND pc.is_active',
+        ') t ',
+        'ORDER BY ', @order_by, ', pres_id, drug_id ',
+        'LIMIT ? OFFSET ?'
+    );
+    SET @p_patient_id = p_patient_id;
+    SET @p_start_date = p_start_date;
+    SET @p_end_date = p_end_date;
+    SET @p_limit = p_limit;
+    SET @p_offset = p_offset;
+
+    PREPARE stmt FROM @sql;
+    EXECUTE stmt USING @p_patient_id, @p_start_date, @p_end_date,
+                       @p_patient_id, @p_start_date, @p_end_date, @p_limit, @p_offset;
+    DEALLOCATE PREPARE stmt;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE drug_details_page(
+    IN p_company_name VARCHAR(100),
+    IN p_sort_column VARCHAR(64),
+    IN p_sort_desc BOOLEAN,
+    IN p_limit INT,
+    IN p_offset INT
+)
+BEGIN
+    IF p_sort_column IN ('Drug_ID', 'Drug_Name', 'Formula', 'Manufacturer', 'Contact_Number') THEN
+        SET @order_by = CONCAT('`', p_sort_column, '`', IF(p_sort_desc, ' DESC', ' ASC'));
+    ELSE
+        SET @order_by = 'Drug_Name ASC';
+    END IF;
+
+    SET @sql = CONCAT(
+        'SELECT d.drug_id AS Drug_ID, d.trade_name AS Drug_Name, d.formula AS Formula, ',
+        'pc.company_name AS Manufacturer, pc.phone_number AS Contact_Number ',
+        'FROM Drug d ',
+        'JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id ',
+        'WHERE pc.company_name = ? AND pc.is_active ',
+        'ORDER BY ', @order_by, ', d.drug_id ',
+        'LIMIT ? OFFSET ?'
+    );
+    SET @p_company_name = p_company_name;
+    SET @p_limit = p_limit;
+    SET @p_offset = p_offset;
+
+    PREPARE stmt FROM @sql;
+    EXECUTE stmt USING @p_company_name, @p_limit, @p_offset;
+    DEALLOCATE PREPARE stmt;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE print_stock_position_page(
+    IN p_pharmacy_address VARCHAR(200),
+    IN p_sort_column VARCHAR(64),
+    IN p_sort_desc BOOLEAN,
+    IN p_limit INT,
+    IN p_offset INT
+)
+BEGIN
+    IF p_sort_column IN ('Pharmacy_Name', 'Pharmacy_Address', 'Drug_Name', 'Manufacturer', 'Stock_Position', 'Price') THEN
+        SET @order_by = CONCAT('`', p_sort_column, '`', IF(p_sort_desc, ' DESC', ' ASC'));
+    ELSE
+        SET @order_by = 'Drug_Name ASC';
+    END IF;
+
+    SET @sql = CONCAT(
+        'SELECT p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, d.trade_name AS Drug_Name, ',
+        'pc.company_name AS Manufacturer, s.stock AS Stock_Position, s.price AS Price ',
+        'FROM Pharmacy p ',
+        'JOIN Sells s ON p.ph_id = s.ph_id ',
+        'JOIN Drug d ON s.drug_id = d.drug_id ',
+        'JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id ',
+        'WHERE p.address = ? AND p.is_active AND pc.is_active ',
+        'ORDER BY ', @order_by, ', d.drug_id ',
+        'LIMIT ? OFFSET ?'
+    );
+    SET @p_pharmacy_address = p_pharmacy_address;
+    SET @p_limit = p_limit;
+    SET @p_offset = p_offset;
+
+    PREPARE stmt FROM @sql;
+    EXECUTE stmt USING @p_pharmacy_address, @p_limit, @p_offset;
+    DEALLOCATE PREPARE stmt;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE print_patients_for_doctor_page(
+    IN p_doctor_id VARCHAR(12),
+    IN p_sort_column VARCHAR(64),
+    IN p_sort_desc BOOLEAN,
+    IN p_limit INT,
+    IN p_offset INT
+)
+BEGIN
+    IF p_sort_column IN ('Patient_ID', 'Patient_Name', 'Patient_Age', 'Patient_Address', 'Is_Primary_Physician') THEN
+        SET @order_by = CONCAT('`', p_sort_column, '`', IF(p_sort_desc, ' DESC', ' ASC'));
+    ELSE
+        SET @order_by = 'Patient_Name ASC';
+    END IF;
+
+    SET @sql = CONCAT(
+        'SELECT pt.paadharid AS Patient_ID, pt.p_name AS Patient_Name, pt.age AS Patient_Age, ',
+        'pt.address AS Patient_Address, ',
+        'CASE WHEN pt.p_daadharid = t.did THEN ''Yes'' ELSE ''No'' END AS Is_Primary_Physician ',
+        'FROM Patient pt ',
+        'JOIN Treats t ON pt.paadharid = t.pid ',
+        'JOIN Doctor d ON d.daadharid = t.did ',
+        'WHERE t.did = ? AND d.is_active ',
+        'ORDER BY ', @order_by, ', pt.paadharid ',
+        'LIMIT ? OFFSET ?'
+    );
+    SET @p_doctor_id = p_doctor_id;
+    SET @p_limit = p_limit;
+    SET @p_offset = p_offset;
 
-IF contract_count = 0 THEN
-    SELECT 'No contract exists between this pharmacy and pharmaceutical company' AS Message;
-END IF;
+    PREPARE stmt FROM @sql;
+    EXECUTE stmt USING @p_doctor_id, @p_limit, @p_offset;
+    DEALLOCATE PREPARE stmt;
 END$$
 DELIMITER ;
 
+-- Procedure to list the stock of every pharmacy in the chain, for exports.
+-- Ordered by the leading columns of idx_sells_pharmacy so the server can
+-- stream rows without sorting the whole table first.
+DELIMITER $$
+CREATE PROCEDURE print_chain_stock()
+BEGIN
+    SELECT
+        p.pname AS Pharmacy_Name,
+        p.address AS Pharmacy_Address,
+        d.drug_id AS Drug_ID,
+        d.trade_name AS Drug_Name,
+        pc.company_name AS Manufacturer,
+        s.stock AS Stock_Position,
+        s.price AS Price
+    FROM Sells s
+    JOIN Pharmacy p ON s.ph_id = p.ph_id
+    JOIN Drug d ON s.drug_id = d.drug_id
+    JOIN PharmaceuticalCompany pc ON d.company_id = pc.company_id
+    WHERE p.is_active
+    AND pc.is_active
+    ORDER BY s.ph_id, s.drug_id;
+END$$
+DELIMITER ;
+
+-- Procedure to find which pharmacies stock drugs whose trade name starts
+-- with a prefix, cheapest first. Only pharmacies with more than
+-- p_stock_above units are listed. Wildcards in the prefix are matched
+-- literally. The trade_name-leading unique key on Drug finds the drugs and
+-- idx_sells_drug_price on Sells their pharmacies, each drug's already by
+-- price. The ranking runs across all the matched drugs, so it is still a
+-- sort; the prefix must be at least 3 characters to keep it small.
+DELIMITER $$
+CREATE PROCEDURE drug_availability(
+    IN p_name_prefix VARCHAR(100),
+    IN p_stock_above INT
+)
+BEGIN
+    IF p_name_prefix IS NULL OR CHAR_LENGTH(p_name_prefix) < 3 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Trade name prefix must be at least 3 characters';
+    END IF;
 
+    SELECT
+        d.drug_id AS Drug_ID,
+        d.trade_name AS Drug_Name,
+        pc.company_name AS Manufacturer,
+        p.pname AS Pharmacy_Name,
+        p.address AS Pharmacy_Address,
+        p.phone AS Pharmacy_Phone,
+        s.stock AS Stock,
+        s.price AS Price
+    FROM Drug d
+    JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+    JOIN Sells s ON s.drug_id = d.drug_id
+    JOIN Pharmacy p ON s.ph_id = p.ph_id
+    WHERE d.trade_name LIKE CONCAT(REPLACE(REPLACE(REPLACE(p_name_prefix, '\\', '\\\\'), '%', '\\%'), '_', '\\_'), '%')
+    AND s.stock > p_stock_above
+    AND p.is_active
+    AND pc.is_active
+    ORDER BY s.price ASC, s.stock DESC, p.address, d.drug_id;
+END$$
+DELIMITER ;
+
+-- In the ranked order a page is read after the previous page's last row,
+-- given by p_after_price, p_after_stock, p_after_address and
+-- p_after_drug_id, rather than at p_offset. Each drug's pharmacies past the
+-- row are then a range on idx_sells_drug_price, and only one page of them is
+-- sorted however deep the user scrolls. Without a row (the first page), or
+-- when sorting by a column, p_offset is used.
+DELIMITER $$
+CREATE PROCEDURE drug_availability_page(
+    IN p_name_prefix VARCHAR(100),
+    IN p_stock_above INT,
+    IN p_sort_column VARCHAR(64),
+    IN p_sort_desc BOOLEAN,
+    IN p_limit INT,
+    IN p_offset INT,
+    IN p_after_price DECIMAL(10,2),
+    IN p_after_stock INT,
+    IN p_after_address VARCHAR(200),
+    IN p_after_drug_id INT
+)
+BEGIN
+    DECLARE v_after TEXT DEFAULT '';
+
+    IF p_name_prefix IS NULL OR CHAR_LENGTH(p_name_prefix) < 3 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Trade name prefix must be at least 3 characters';
+    END IF;
+
+    IF p_sort_column IN ('Drug_ID', 'Drug_Name', 'Manufacturer', 'Pharmacy_Name', 'Pharmacy_Address', 'Pharmacy_Phone', 'Stock', 'Price') THEN
+        SET @order_by = CONCAT('`', p_sort_column, '`', IF(p_sort_desc, ' DESC', ' ASC'));
+    ELSE
+        -- Ranked: cheapest first, then the best stocked
+        SET @order_by = 'Price ASC, Stock DESC';
+        IF p_after_price IS NOT NULL THEN
+            SET v_after = CONCAT(
+                'AND (s.price > ? OR s.price = ? AND (s.stock < ? OR s.stock = ? ',
+                'AND (p.address > ? OR p.address = ? AND d.drug_id > ?))) '
+            );
+            SET p_offset = 0;
+        END IF;
+    END IF;
+
+    SET @sql = CONCAT(
+        'SELECT d.drug_id AS Drug_ID, d.trade_name AS Drug_Name, pc.company_name AS Manufacturer, ',
+        'p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, p.phone AS Pharmacy_Phone, ',
+        's.stock AS Stock, s.price AS Price ',
+        'FROM Drug d ',
+        'JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id ',
+        'JOIN Sells s ON s.drug_id = d.drug_id ',
+        'JOIN Pharmacy p ON s.ph_id = p.ph_id ',
+        'WHERE d.trade_name LIKE ? AND s.stock > ? AND p.is_active AND pc.is_active ',
+        v_after,
+        'ORDER BY ', @order_by, ', p.address, d.drug_id ',
+        'LIMIT ? OFFSET ?'
+    );
+    SET @p_name_pattern = CONCAT(REPLACE(REPLACE(REPLACE(p_name_prefix, '\\', '\\\\'), '%', '\\%'), '_', '\\_'), '%');
+    SET @p_stock_above = p_stock_above;
+    SET @p_after_price = p_after_price;
+    SET @p_after_stock = p_after_stock;
+    SET @p_after_address = p_after_address;
+    SET @p_after_drug_id = p_after_drug_id;
+    SET @p_limit = p_limit;
+    SET @p_offset = p_offset;
+
+    PREPARE stmt FROM @sql;
+    IF v_after = '' THEN
+        EXECUTE stmt USING @p_name_pattern, @p_stock_above, @p_limit, @p_offset;
+    ELSE
+        EXECUTE stmt USING @p_name_pattern, @p_stock_above, @p_after_price, @p_after_price,
+                           @p_after_stock, @p_after_stock, @p_after_address, @p_after_address,
+                           @p_after_drug_id, @p_limit, @p_offset;
+    END IF;
+    DEALLOCATE PREPARE stmt;
+END$$
+DELIMITER ;
+
+-- Inventory dashboards, read from the summary tables maintained by the
+-- triggers in inventory_summary.sql rather than by aggregating Sells.
+DELIMITER $$
+CREATE PROCEDURE print_pharmacy_inventory()
+BEGIN
+    SELECT
+        p.pname AS Pharmacy_Name,
+        p.address AS Pharmacy_Address,
+        pi.drug_count AS Drugs_Sold,
+        pi.total_stock AS Total_Stock,
+        pi.stock_value AS Stock_Value
+    FROM PharmacyInventory pi
+    JOIN Pharmacy p ON pi.ph_id = p.ph_id
+    WHERE p.is_active
+    ORDER BY pi.stock_value DESC, p.address;
+END$$
+DELIMITER ;
+
+-- Not a one-row read on purpose: the stock totals are summed over the
+-- company's CompanyPharmacyInventory rows, one per pharmacy that stocks its
+-- drugs, never over Sells. Keeping them in CompanyInventory would make every
+-- stock write and dispense at any pharmacy update the same company row, so
+-- pharmacies would queue on it and dispenses that touch two companies could
+-- deadlock. The dashboard is read rarely; stock is written all day.
+DELIMITER $$
+CREATE PROCEDURE print_company_inventory()
+BEGIN
+    SELECT
+        pc.company_name AS Company_Name,
+        ci.drug_count AS Drugs,
+        IFNULL(SUM(cpi.pharmacy_listings), 0) AS Pharmacy_Listings,
+        IFNULL(SUM(cpi.total_stock), 0) AS Total_Stock,
+        IFNULL(SUM(cpi.stock_value), 0) AS Stock_Value
+    FROM CompanyInventory ci
+    JOIN PharmaceuticalCompany pc ON ci.company_id = pc.company_id
+    LEFT JOIN CompanyPharmacyInventory cpi ON cpi.company_id = ci.company_id
+    WHERE pc.is_active
+    GROUP BY ci.company_id, pc.company_name, ci.drug_count
+    ORDER BY Stock_Value DESC, pc.company_name;
+END$$
+DELIMITER ;
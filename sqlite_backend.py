@@ -0,0 +1,1345 @@
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+from datetime import date
+from decimal import Decimal
+
+import mysql.connector
+
+from backend import KEYSET_ORDERS, MIN_PREFIX_LENGTH, PROCEDURES, STATEMENTS, coerce_args
+from bulk_import import CHUNK_SIZE, chunked
+from datagen import COLUMNS, LOAD_ORDER, NATURAL_KEY_ROWS, DataGenerator, scaled_counts
+from streaming import FETCH_BATCH
+
+# An embedded stand-in for the MySQL database: the nova tables in SQLite and
+# the stored procedures reimplemented in Python, with the same checks, error
+# messages and result sets. Meant for running the GUI, the service and the
+# repositories on a machine without a MySQL server, e.g. for tests and load
+# runs. Errors are raised as mysql.connector errors (a failed check is
+# SQLSTATE 45000, as SIGNAL gives) so callers handle both backends alike.
+#
+# The schema is the one from before surrogate_keys.sql: Pharmacy and
+# PharmaceuticalCompany are keyed on address and company_name, and Sells,
+# Contract and Drug store those. The procedures take the same arguments and
+# return the same columns either way, so callers cannot tell, but the plans,
+# index sizes and rename costs are not MySQL's. Measure those against MySQL
+# with benchmark.py and explain_check.py, not here.
+
+CENT = Decimal("0.01")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Doctor (
+    daadharid VARCHAR(12) PRIMARY KEY,
+    d_name VARCHAR(100) NOT NULL,
+    speciality VARCHAR(100),
+    years_of_experience INT NOT NULL CHECK (years_of_experience >= 0),
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS Patient (
+    paadharid VARCHAR(12) PRIMARY KEY,
+    p_name VARCHAR(100) NOT NULL,
+    age INT NOT NULL CHECK (age >= 0),
+    address VARCHAR(100) NOT NULL,
+    p_daadharid VARCHAR(12) NOT NULL REFERENCES Doctor(daadharid)
+);
+
+CREATE TABLE IF NOT EXISTS Treats (
+    pid VARCHAR(12) NOT NULL REFERENCES Patient(paadharid) ON DELETE CASCADE,
+    did VARCHAR(12) NOT NULL REFERENCES Doctor(daadharid) ON DELETE CASCADE,
+    PRIMARY KEY (pid, did)
+);
+CREATE INDEX IF NOT EXISTS idx_treats_doctor ON Treats(did, pid);
+
+CREATE TABLE IF NOT EXISTS PharmaceuticalCompany (
+    company_name VARCHAR(100) PRIMARY KEY,
+    phone_number VARCHAR(15) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS Drug (
+    drug_id INTEGER PRIMARY KEY,
+    trade_name VARCHAR(100) NOT NULL,
+    formula VARCHAR(200) NOT NULL,
+    company_name VARCHAR(100) NOT NULL REFERENCES PharmaceuticalCompany(company_name) ON DELETE CASCADE,
+    UNIQUE (trade_name, company_name)
+);
+CREATE INDEX IF NOT EXISTS idx_drug_company_trade_name ON Drug(company_name, trade_name, formula);
+
+CREATE TABLE IF NOT EXISTS Pharmacy (
+    address VARCHAR(200) PRIMARY KEY,
+    pname VARCHAR(100) NOT NULL,
+    phone VARCHAR(15) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS Sells (
+    ph_address VARCHAR(200) NOT NULL REFERENCES Pharmacy(address) ON DELETE CASCADE,
+    drug_id INT NOT NULL REFERENCES Drug(drug_id) ON DELETE CASCADE,
+    stock INT NOT NULL DEFAULT 0 CHECK (stock >= 0),
+    price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
+    PRIMARY KEY (drug_id, ph_address)
+);
+CREATE INDEX IF NOT EXISTS idx_sells_pharmacy ON Sells(ph_address, drug_id, stock, price);
+CREATE INDEX IF NOT EXISTS idx_sells_drug_price ON Sells(drug_id, price, stock);
+
+CREATE TABLE IF NOT EXISTS Prescription (
+    pres_id INTEGER PRIMARY KEY,
+    pid VARCHAR(12) NOT NULL REFERENCES Patient(paadharid) ON DELETE CASCADE,
+    did VARCHAR(12) NOT NULL REFERENCES Doctor(daadharid) ON DELETE CASCADE,
+    pres_date DATE NOT NULL,
+    UNIQUE (pid, did)
+);
+CREATE INDEX IF NOT EXISTS idx_prescription_patient_date ON Prescription(pid, pres_date, did);
+CREATE INDEX IF NOT EXISTS idx_prescription_date ON Prescription(pres_date);
+
+CREATE TABLE IF NOT EXISTS Contains_drug (
+    pres_id INT NOT NULL REFERENCES Prescription(pres_id) ON DELETE CASCADE,
+    drug_id INT NOT NULL REFERENCES Drug(drug_id) ON DELETE CASCADE,
+    quantity INT NOT NULL CHECK (quantity > 0),
+    PRIMARY KEY (pres_id, drug_id)
+);
+
+CREATE TABLE IF NOT EXISTS Contract (
+    company_name VARCHAR(100) NOT NULL REFERENCES PharmaceuticalCompany(company_name) ON DELETE CASCADE,
+    ph_address VARCHAR(200) NOT NULL REFERENCES Pharmacy(address) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    supervisor VARCHAR(100) NOT NULL,
+    PRIMARY KEY (company_name, ph_address),
+    CHECK (start_date <= end_date)
+);
+
+CREATE TABLE IF NOT EXISTS PurgeJob (
+    job_id INTEGER PRIMARY KEY,
+    entity VARCHAR(30) NOT NULL,
+    entity_key VARCHAR(200) NOT NULL,
+    step VARCHAR(30) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'running',
+    rows_deleted BIGINT NOT NULL DEFAULT 0,
+    started_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+    updated_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+    finished_at TEXT
+);
+
+-- Filled prescriptions, as in dispense.sql
+CREATE TABLE IF NOT EXISTS PrescriptionDispensed (
+    pres_id INT PRIMARY KEY REFERENCES Prescription(pres_id) ON DELETE CASCADE,
+    ph_address VARCHAR(200) NOT NULL,
+    dispensed_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- add_patient and datagen.py count on a patient's primary physician being
+-- added to Treats when the patient is inserted
+CREATE TRIGGER IF NOT EXISTS ensure_primary_physician_treats AFTER INSERT ON Patient
+BEGIN
+    INSERT OR IGNORE INTO Treats(pid, did) VALUES (NEW.paadharid, NEW.p_daadharid);
+END;
+
+-- The archive tier of prescription_archive.sql, without the partitioning
+CREATE TABLE IF NOT EXISTS PrescriptionArchive (
+    pid VARCHAR(12) NOT NULL,
+    pres_date DATE NOT NULL,
+    pres_id INT NOT NULL,
+    drug_id INT NOT NULL,
+    did VARCHAR(12) NOT NULL,
+    patient_name VARCHAR(100) NOT NULL,
+    doctor_name VARCHAR(100) NOT NULL,
+    trade_name VARCHAR(100) NOT NULL,
+    formula VARCHAR(200) NOT NULL,
+    company_name VARCHAR(100) NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (pid, pres_date, pres_id, drug_id)
+);
+CREATE INDEX IF NOT EXISTS idx_archive_doctor ON PrescriptionArchive(did);
+CREATE INDEX IF NOT EXISTS idx_archive_drug ON PrescriptionArchive(drug_id);
+
+-- Renames and deletes reach the archive as they reach the hot tables. In
+-- SQLite the cascades fire triggers too, so a company's drugs are covered
+-- by the Drug triggers.
+CREATE TRIGGER IF NOT EXISTS patient_after_update_archive AFTER UPDATE OF p_name ON Patient
+BEGIN
+    UPDATE PrescriptionArchive SET patient_name = NEW.p_name WHERE pid = NEW.paadharid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS doctor_after_update_archive AFTER UPDATE OF d_name ON Doctor
+BEGIN
+    UPDATE PrescriptionArchive SET doctor_name = NEW.d_name WHERE did = NEW.daadharid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS drug_after_update_archive AFTER UPDATE OF trade_name, formula, company_name ON Drug
+BEGIN
+    UPDATE PrescriptionArchive
+    SET trade_name = NEW.trade_name, formula = NEW.formula, company_name = NEW.company_name
+    WHERE drug_id = NEW.drug_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS patient_after_delete_archive AFTER DELETE ON Patient
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE pid = OLD.paadharid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS doctor_after_delete_archive AFTER DELETE ON Doctor
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE did = OLD.daadharid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS drug_after_delete_archive AFTER DELETE ON Drug
+BEGIN
+    DELETE FROM PrescriptionArchive WHERE drug_id = OLD.drug_id;
+END;
+
+-- A new prescription replaces the older archived ones for the same patient
+-- and doctor, as add_prescription replaces the hot ones
+CREATE TRIGGER IF NOT EXISTS prescription_after_insert_archive AFTER INSERT ON Prescription
+BEGIN
+    DELETE FROM PrescriptionArchive
+    WHERE pid = NEW.pid AND did = NEW.did AND pres_date < NEW.pres_date;
+END;
+"""
+
+# The reports, as (query, sortable columns, default order). {order} is filled
+# in with the default order, or the paged variant's sort column; the keys
+# after it keep the order stable across pages.
+REPORTS = {
+    # The prescription reports read the hot tables and the archive; the
+    # numbered parameters are used by both halves
+    "prescription_report": (
+        """
+        SELECT Prescription_Date, Patient_Name, Doctor_Name, Drug_Name, Quantity FROM (
+            SELECT pr.pres_date AS Prescription_Date, pt.p_name AS Patient_Name, d.d_name AS Doctor_Name,
+                   dr.trade_name AS Drug_Name, cd.quantity AS Quantity, pr.pres_id, dr.drug_id
+            FROM Prescription pr
+            JOIN Patient pt ON pr.pid = pt.paadharid
+            JOIN Doctor d ON pr.did = d.daadharid
+            JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
+            JOIN Drug dr ON cd.drug_id = dr.drug_id
+            JOIN PharmaceuticalCompany pc ON dr.company_name = pc.company_name
+            WHERE pr.pid = ?1 AND pr.pres_date BETWEEN ?2 AND ?3 AND d.is_active AND pc.is_active
+            UNION ALL
+            SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.quantity, a.pres_id, a.drug_id
+            FROM PrescriptionArchive a
+            JOIN Doctor d ON a.did = d.daadharid
+            JOIN PharmaceuticalCompany pc ON a.company_name = pc.company_name
+            WHERE a.pid = ?1 AND a.pres_date BETWEEN ?2 AND ?3 AND d.is_active AND pc.is_active
+        )
+        ORDER BY {order}, pres_id, drug_id
+        """,
+        ["Prescription_Date", "Patient_Name", "Doctor_Name", "Drug_Name", "Quantity"],
+        "Prescription_Date DESC",
+    ),
+    "print_pres_details": (
+        """
+        SELECT Prescription_Date, Patient_Name, Doctor_Name, Drug_Name, Drug_Formula, Quantity, Manufacturer FROM (
+            SELECT pr.pres_date AS Prescription_Date, pt.p_name AS Patient_Name, d.d_name AS Doctor_Name,
+                   dr.trade_name AS Drug_Name, dr.formula AS Drug_Formula, cd.quantity AS Quantity,
+                   dr.company_name AS Manufacturer, pr.pres_id, dr.drug_id
+            FROM Prescription pr
+            JOIN Patient pt ON pr.pid = pt.paadharid
+            JOIN Doctor d ON pr.did = d.daadharid
+            JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
+            JOIN Drug dr ON cd.drug_id = dr.drug_id
+            JOIN PharmaceuticalCompany pc ON dr.company_name = pc.company_name
+            WHERE pr.pid = ?1 AND pr.pres_date = ?2 AND d.is_active AND pc.is_active
+            UNION ALL
+            SELECT a.pres_date, a.patient_name, a.doctor_name, a.trade_name, a.formula, a.quantity, a.company_name,
+                   a.pres_id, a.drug_id
+            FROM PrescriptionArchive a
+            JOIN Doctor d ON a.did = d.daadharid
+            JOIN PharmaceuticalCompany pc ON a.company_name = pc.company_name
+            WHERE a.pid = ?1 AND a.pres_date = ?2 AND d.is_active AND pc.is_active
+        )
+        ORDER BY {order}, pres_id, drug_id
+        """,
+        [],
+        "pres_id",
+    ),
+    "drug_details": (
+        """
+        SELECT d.drug_id AS Drug_ID, d.trade_name AS Drug_Name, d.formula AS Formula,
+               pc.company_name AS Manufacturer, pc.phone_number AS Contact_Number
+        FROM Drug d
+        JOIN PharmaceuticalCompany pc ON d.company_name = pc.company_name
+        WHERE d.company_name = ? AND pc.is_active
+        ORDER BY {order}, d.drug_id
+        """,
+        ["Drug_ID", "Drug_Name", "Formula", "Manufacturer", "Contact_Number"],
+        "Drug_Name ASC",
+    ),
+    "print_stock_position": (
+        """
+        SELECT p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, d.trade_name AS Drug_Name,
+               pc.company_name AS Manufacturer, s.stock AS Stock_Position, s.price AS Price
+        FROM Pharmacy p
+        JOIN Sells s ON p.address = s.ph_address
+        JOIN Drug d ON s.drug_id = d.drug_id
+        JOIN PharmaceuticalCompany pc ON d.company_name = pc.company_name
+        WHERE p.address = ? AND p.is_active AND pc.is_active
+        ORDER BY {order}, d.drug_id
+        """,
+        ["Pharmacy_Name", "Pharmacy_Address", "Drug_Name", "Manufacturer", "Stock_Position", "Price"],
+        "Drug_Name ASC",
+    ),
+    "print_pharmacy_contact": (
+        """
+        SELECT p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, p.phone AS Pharmacy_Contact
+        FROM Pharmacy p
+        WHERE p.address = ? AND p.is_active
+        ORDER BY {order}
+        """,
+        [],
+        "p.address",
+    ),
+    "print_company_contact": (
+        """
+        SELECT c.company_name AS Company_Name, c.phone_number AS Company_Contact
+        FROM PharmaceuticalCompany c
+        WHERE c.company_name = ? AND c.is_active
+        ORDER BY {order}
+        """,
+        [],
+        "c.company_name",
+    ),
+    "print_patients_for_doctor": (
+        """
+        SELECT pt.paadharid AS Patient_ID, pt.p_name AS Patient_Name, pt.age AS Patient_Age,
+               pt.address AS Patient_Address,
+               CASE WHEN pt.p_daadharid = t.did THEN 'Yes' ELSE 'No' END AS Is_Primary_Physician
+        FROM Patient pt
+        JOIN Treats t ON pt.paadharid = t.pid
+        JOIN Doctor d ON d.daadharid = t.did
+        WHERE t.did = ? AND d.is_active
+        ORDER BY {order}, pt.paadharid
+        """,
+        ["Patient_ID", "Patient_Name", "Patient_Age", "Patient_Address", "Is_Primary_Physician"],
+        "Patient_Name ASC",
+    ),
+    "print_chain_stock": (
+        """
+        SELECT p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, d.drug_id AS Drug_ID,
+               d.trade_name AS Drug_Name, pc.company_name AS Manufacturer, s.stock AS Stock_Position,
+               s.price AS Price
+        FROM Sells s
+        JOIN Pharmacy p ON s.ph_address = p.address
+        JOIN Drug d ON s.drug_id = d.drug_id
+        JOIN PharmaceuticalCompany pc ON d.company_name = pc.company_name
+        WHERE p.is_active AND pc.is_active
+        ORDER BY {order}, s.drug_id
+        """,
+        [],
+        "s.ph_address",
+    ),
+    "drug_availability": (
+        """
+        SELECT d.drug_id AS Drug_ID, d.trade_name AS Drug_Name, d.company_name AS Manufacturer,
+               p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, p.phone AS Pharmacy_Phone,
+               s.stock AS Stock, s.price AS Price
+        FROM Drug d
+        JOIN PharmaceuticalCompany pc ON pc.company_name = d.company_name
+        JOIN Sells s ON s.drug_id = d.drug_id
+        JOIN Pharmacy p ON s.ph_address = p.address
+        WHERE d.trade_name LIKE ? ESCAPE '\\' AND s.stock > ? AND p.is_active AND pc.is_active {after}
+        ORDER BY {order}, p.address, d.drug_id
+        """,
+        ["Drug_ID", "Drug_Name", "Manufacturer", "Pharmacy_Name", "Pharmacy_Address", "Pharmacy_Phone",
+         "Stock", "Price"],
+        "Price ASC, Stock DESC",
+    ),
+    # The summary tables are not kept here; the dashboards aggregate Sells
+    "print_pharmacy_inventory": (
+        """
+        SELECT p.pname AS Pharmacy_Name, p.address AS Pharmacy_Address, COUNT(s.drug_id) AS Drugs_Sold,
+               IFNULL(SUM(s.stock), 0) AS Total_Stock,
+               IFNULL(SUM(s.stock * s.price), 0) AS "Stock_Value [DECIMAL]"
+        FROM Pharmacy p
+        LEFT JOIN Sells s ON s.ph_address = p.address
+        WHERE p.is_active
+        GROUP BY p.address
+        ORDER BY {order}, p.address
+        """,
+        [],
+        "5 DESC",
+    ),
+    "print_company_inventory": (
+        """
+        SELECT pc.company_name AS Company_Name,
+               (SELECT COUNT(*) FROM Drug d WHERE d.company_name = pc.company_name) AS Drugs,
+               COUNT(s.drug_id) AS Pharmacy_Listings,
+               IFNULL(SUM(s.stock), 0) AS Total_Stock,
+               IFNULL(SUM(s.stock * s.price), 0) AS "Stock_Value [DECIMAL]"
+        FROM PharmaceuticalCompany pc
+        LEFT JOIN Drug d ON d.company_name = pc.company_name
+        LEFT JOIN Sells s ON s.drug_id = d.drug_id
+        WHERE pc.is_active
+        GROUP BY pc.company_name
+        ORDER BY {order}, pc.company_name
+        """,
+        [],
+        "5 DESC",
+    ),
+    "print_purge_jobs": (
+        """
+        SELECT job_id AS Job_ID, entity AS Entity, entity_key AS Entity_Key, step AS Step, status AS Status,
+               rows_deleted AS Rows_Deleted, started_at AS Started_At, updated_at AS Updated_At,
+               finished_at AS Finished_At
+        FROM PurgeJob
+        ORDER BY {order}
+        """,
+        [],
+        "job_id DESC",
+    ),
+}
+
+CONTRACT_DETAILS = """
+    SELECT
+        c.company_name AS "Company Name",
+        pc.phone_number AS "Company Phone",
+        p.pname AS "Pharmacy Name",
+        p.address AS "Pharmacy Address",
+        p.phone AS "Pharmacy Phone",
+        c.start_date AS "Contract Start Date",
+        c.end_date AS "Contract End Date",
+        c.supervisor AS "Contract Supervisor",
+        c.content AS "Contract Content",
+        CASE
+            WHEN c.end_date < date('now', 'localtime') THEN 'Expired'
+            WHEN c.start_date > date('now', 'localtime') THEN 'Future'
+            ELSE 'Active'
+        END AS "Contract Status",
+        CAST(julianday(c.end_date) - julianday(date('now', 'localtime')) AS INTEGER) AS "Days Remaining"
+    FROM Contract c
+    JOIN Pharmacy p ON c.ph_address = p.address
+    JOIN PharmaceuticalCompany pc ON c.company_name = pc.company_name
+    WHERE c.ph_address = ?
+    AND p.pname = ?
+    AND c.company_name = ?
+    AND p.is_active
+    AND pc.is_active
+"""
+
+# purge_step's steps for each entity, in order, as (step, DELETE of at most
+# ? dependents of the entity with key ?); the entity itself goes last.
+# SQLite's DELETE takes no LIMIT, so each batch is picked by rowid.
+PURGE_STEPS = {
+    "Doctor": [
+        ("treats", "DELETE FROM Treats WHERE rowid IN (SELECT rowid FROM Treats WHERE did = ? LIMIT ?)"),
+        ("prescriptions",
+         "DELETE FROM Prescription WHERE pres_id IN (SELECT pres_id FROM Prescription WHERE did = ? LIMIT ?)"),
+        ("archive",
+         "DELETE FROM PrescriptionArchive WHERE rowid IN (SELECT rowid FROM PrescriptionArchive WHERE did = ? LIMIT ?)"),
+    ],
+    "Pharmacy": [
+        ("contracts", "DELETE FROM Contract WHERE rowid IN (SELECT rowid FROM Contract WHERE ph_address = ? LIMIT ?)"),
+        ("stock", "DELETE FROM Sells WHERE rowid IN (SELECT rowid FROM Sells WHERE ph_address = ? LIMIT ?)"),
+    ],
+    "PharmaceuticalCompany": [
+        ("contracts",
+         "DELETE FROM Contract WHERE rowid IN (SELECT rowid FROM Contract WHERE company_name = ? LIMIT ?)"),
+        ("stock",
+         "DELETE FROM Sells WHERE rowid IN (SELECT s.rowid FROM Sells s JOIN Drug d ON d.drug_id = s.drug_id "
+         "WHERE d.company_name = ? LIMIT ?)"),
+        ("prescribed_drugs",
+         "DELETE FROM Contains_drug WHERE rowid IN (SELECT cd.rowid FROM Contains_drug cd "
+         "JOIN Drug d ON d.drug_id = cd.drug_id WHERE d.company_name = ? LIMIT ?)"),
+        ("archive",
+         "DELETE FROM PrescriptionArchive WHERE rowid IN (SELECT a.rowid FROM PrescriptionArchive a "
+         "JOIN Drug d ON d.drug_id = a.drug_id WHERE d.company_name = ? LIMIT ?)"),
+        ("drugs", "DELETE FROM Drug WHERE drug_id IN (SELECT drug_id FROM Drug WHERE company_name = ? LIMIT ?)"),
+    ],
+}
+# Entity -> (table, key column)
+PURGE_ENTITIES = {
+    "Doctor": ("Doctor", "daadharid"),
+    "Pharmacy": ("Pharmacy", "address"),
+    "PharmaceuticalCompany": ("PharmaceuticalCompany", "company_name"),
+}
+
+# The form pickers' key lists, as in backend.STATEMENTS
+KEY_LISTS = {
+    "doctor_keys": "SELECT daadharid AS Doctor_ID, d_name AS Doctor_Name FROM Doctor WHERE is_active",
+    "patient_keys": "SELECT paadharid AS Patient_ID, p_name AS Patient_Name FROM Patient",
+    "drug_keys": (
+        "SELECT d.drug_id AS Drug_ID, d.trade_name || ' (' || d.company_name || ')' AS Drug_Name FROM Drug d "
+        "JOIN PharmaceuticalCompany pc ON pc.company_name = d.company_name WHERE pc.is_active"
+    ),
+    "pharmacy_keys": "SELECT address AS Pharmacy_Address, pname AS Pharmacy_Name FROM Pharmacy WHERE is_active",
+}
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()).quantize(CENT))
+
+
+class Signal(Exception):
+    # A procedure's own check failed; becomes SQLSTATE 45000
+    pass
+
+
+def signal(message):
+    raise Signal(message)
+
+
+def driver_error(err):
+    # The mysql.connector error MySQL would have raised for a SQLite error
+    if isinstance(err, Signal):
+        return mysql.connector.errors.DatabaseError(msg=str(err), errno=1644, sqlstate="45000")
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        if message.startswith("UNIQUE") or "PRIMARY KEY" in message:
+            return mysql.connector.errors.IntegrityError(msg=message, errno=1062, sqlstate="23000")
+        if "FOREIGN KEY" in message:
+            return mysql.connector.errors.IntegrityError(msg=message, errno=1452, sqlstate="23000")
+        if message.startswith("NOT NULL"):
+            return mysql.connector.errors.IntegrityError(msg=message, errno=1048, sqlstate="23000")
+        return mysql.connector.errors.DatabaseError(msg=message, errno=3819, sqlstate="HY000")
+    if isinstance(err, sqlite3.OperationalError) and "locked" in message:
+        return mysql.connector.errors.DatabaseError(msg=message, errno=1205, sqlstate="HY000")
+    return mysql.connector.errors.DatabaseError(msg=message)
+
+
+def concat(*parts):
+    # MySQL's CONCAT: NULL if any part is NULL
+    if any(part is None for part in parts):
+        return None
+    return "".join(str(part) for part in parts)
+
+
+def message(text):
+    return [(["result"], [(text,)])]
+
+
+def exists(cur, sql, *params):
+    return cur.execute(f"SELECT EXISTS ({sql})", params).fetchone()[0] == 1
+
+
+def select(cur, sql, params=()):
+    cur.execute(sql, params)
+    return [d[0] for d in cur.description], cur.fetchall()
+
+
+def price(value):
+    # A DECIMAL(10,2) parameter
+    return None if value is None else Decimal(value).quantize(CENT)
+
+
+def like_prefix(prefix):
+    if prefix is None:
+        return None
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def doctor_active(cur, doctor_id):
+    # Whether the doctor exists and is not being purged; the other
+    # procedures may only add records for such a doctor
+    return exists(cur, "SELECT 1 FROM Doctor WHERE daadharid = ? AND is_active", doctor_id)
+
+
+def drug_active(cur, drug_id):
+    # Whether the drug exists and its company is not being purged
+    return exists(cur, "SELECT 1 FROM Drug d JOIN PharmaceuticalCompany pc ON pc.company_name = d.company_name "
+                       "WHERE d.drug_id = ? AND pc.is_active", drug_id)
+
+
+# The procedures. Each takes a cursor and the procedure's arguments, already
+# converted by backend.coerce_args, and returns its result sets.
+
+def add_patient(cur, p_id, p_name, p_age, p_address, p_primary_physician_id, p_additional_doctor_id):
+    if p_age is not None and p_age < 0:
+        signal("Age cannot be negative.")
+    if not doctor_active(cur, p_primary_physician_id):
+        signal("Primary physician does not exist.")
+    if p_additional_doctor_id is not None and not doctor_active(cur, p_additional_doctor_id):
+        signal("Additional doctor does not exist.")
+    cur.execute("INSERT INTO Patient(paadharid, p_name, age, address, p_daadharid) VALUES (?, ?, ?, ?, ?)",
+                (p_id, p_name, p_age, p_address, p_primary_physician_id))
+    additional = p_additional_doctor_id is not None and p_additional_doctor_id != p_primary_physician_id
+    if additional:
+        cur.execute("INSERT INTO Treats(pid, did) VALUES (?, ?)", (p_id, p_additional_doctor_id))
+    return message(concat("Patient ", p_id, " added successfully with primary physician ", p_primary_physician_id,
+                          concat(" and additional doctor ", p_additional_doctor_id) if additional else ""))
+
+
+def update_patient(cur, p_patient_id, p_patient_name, p_age, p_address, p_primary_physician_id,
+                   p_additional_doctor_id):
+    if p_age is not None and p_age < 0:
+        signal("Age cannot be negative")
+    if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", p_patient_id):
+        signal("Patient does not exist")
+    if not doctor_active(cur, p_primary_physician_id):
+        signal("Primary physician does not exist")
+    if p_additional_doctor_id is not None and not doctor_active(cur, p_additional_doctor_id):
+        signal("Additional doctor does not exist")
+    cur.execute("UPDATE Patient SET p_name = ?, age = ?, address = ?, p_daadharid = ? WHERE paadharid = ?",
+                (p_patient_name, p_age, p_address, p_primary_physician_id, p_patient_id))
+    if p_additional_doctor_id is not None and p_additional_doctor_id != p_primary_physician_id:
+        cur.execute("INSERT OR IGNORE INTO Treats(pid, did) VALUES (?, ?)", (p_patient_id, p_additional_doctor_id))
+    return message(concat("Patient ", p_patient_id, " updated successfully"))
+
+
+def delete_patient(cur, p_patient_id):
+    # The procedure's exit handler turns every error, its own checks
+    # included, into one message
+    try:
+        if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", p_patient_id):
+            signal("Patient does not exist")
+        doctor_id = cur.execute("SELECT p_daadharid FROM Patient WHERE paadharid = ?", (p_patient_id,)).fetchone()[0]
+        patient_count = cur.execute("SELECT COUNT(*) FROM Treats WHERE did = ?", (doctor_id,)).fetchone()[0]
+        if patient_count <= 1:
+            signal("Cannot delete patient: This is the only patient for their doctor. "
+                   "Every doctor must have at least one patient.")
+        cur.execute("DELETE FROM Treats WHERE pid = ?", (p_patient_id,))
+        cur.execute("DELETE FROM Prescription WHERE pid = ?", (p_patient_id,))
+        cur.execute("DELETE FROM Patient WHERE paadharid = ?", (p_patient_id,))
+    except (Signal, sqlite3.DatabaseError):
+        signal("Failed to delete patient - constraint violation")
+    return message(concat("Patient ", p_patient_id, " successfully deleted with all related records"))
+
+
+def add_doctor(cur, p_id, p_name, p_speciality, p_years_exp):
+    if p_years_exp is not None and p_years_exp < 0:
+        signal("Years of experience cannot be negative.")
+    cur.execute("INSERT INTO Doctor(daadharid, d_name, speciality, years_of_experience) VALUES (?, ?, ?, ?)",
+                (p_id, p_name, p_speciality, p_years_exp))
+    return message(concat("Doctor ", p_id,
+                          " added successfully. Remember to assign at least one patient to this doctor."))
+
+
+def update_doctor(cur, d_id, new_name, new_spec, new_exp, new_pid):
+    if not exists(cur, "SELECT 1 FROM Doctor WHERE daadharid = ?", d_id):
+        signal("Doctor not found.")
+    if new_exp is not None and new_exp < 0:
+        signal("Invalid experience.")
+    cur.execute("UPDATE Doctor SET d_name = ?, speciality = ?, years_of_experience = ? WHERE daadharid = ?",
+                (new_name, new_spec, new_exp, d_id))
+    if new_pid is not None:
+        if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", new_pid):
+            signal("Patient not found.")
+        cur.execute("INSERT OR IGNORE INTO Treats(did, pid) VALUES (?, ?)", (d_id, new_pid))
+    return message(concat("Doctor ", d_id, " updated successfully"))
+
+
+def delete_doctor(cur, p_doctor_id):
+    if not exists(cur, "SELECT 1 FROM Doctor WHERE daadharid = ?", p_doctor_id):
+        signal("Doctor does not exist")
+    if exists(cur, "SELECT 1 FROM Patient WHERE p_daadharid = ?", p_doctor_id):
+        signal("Cannot delete doctor: Doctor is the primary physician for one or more patients")
+    cur.execute("DELETE FROM Treats WHERE did = ?", (p_doctor_id,))
+    cur.execute("DELETE FROM Prescription WHERE did = ?", (p_doctor_id,))
+    cur.execute("DELETE FROM Doctor WHERE daadharid = ?", (p_doctor_id,))
+    return message(concat("Doctor ", p_doctor_id, " successfully deleted"))
+
+
+def add_treats_entry(cur, p_doctor_id, p_patient_id):
+    if not doctor_active(cur, p_doctor_id):
+        signal("Doctor does not exist.")
+    if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", p_patient_id):
+        signal("Patient does not exist.")
+    if exists(cur, "SELECT 1 FROM Treats WHERE did = ? AND pid = ?", p_doctor_id, p_patient_id):
+        signal("This doctor-patient relationship already exists.")
+    cur.execute("INSERT INTO Treats(did, pid) VALUES (?, ?)", (p_doctor_id, p_patient_id))
+    return message(concat("Doctor ", p_doctor_id, " now treats patient ", p_patient_id))
+
+
+def delete_treats_entry(cur, p_doctor_id, p_patient_id):
+    if not exists(cur, "SELECT 1 FROM Treats WHERE did = ? AND pid = ?", p_doctor_id, p_patient_id):
+        signal("This doctor-patient relationship does not exist.")
+    if cur.execute("SELECT COUNT(*) FROM Treats WHERE did = ?", (p_doctor_id,)).fetchone()[0] <= 1:
+        signal("Cannot remove the only patient from a doctor. Every doctor must have at least one patient.")
+    if exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ? AND p_daadharid = ?", p_patient_id, p_doctor_id):
+        signal("Cannot remove relationship with primary physician. Update patient's primary physician first.")
+    cur.execute("DELETE FROM Treats WHERE did = ? AND pid = ?", (p_doctor_id, p_patient_id))
+    return message(concat("Relationship between doctor ", p_doctor_id, " and patient ", p_patient_id,
+                          " removed successfully"))
+
+
+def add_company(cur, p_company_name, p_phone_number):
+    cur.execute("INSERT INTO PharmaceuticalCompany(company_name, phone_number) VALUES (?, ?)",
+                (p_company_name, p_phone_number))
+    return message(concat("Pharmaceutical company ", p_company_name, " added successfully"))
+
+
+def update_company(cur, p_old_name, p_new_name, p_new_phone):
+    # Like the procedure's exit handler, every error gives one message; a
+    # company that still has drugs cannot be renamed (the foreign key on
+    # Drug has no ON UPDATE)
+    try:
+        if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ?", p_old_name):
+            signal("Company does not exist")
+        if exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ? AND NOT is_active", p_old_name):
+            signal("Company is being purged")
+        if p_old_name != p_new_name and exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ?",
+                                               p_new_name):
+            signal("A company with the new name already exists")
+        cur.execute("UPDATE PharmaceuticalCompany SET company_name = ?, phone_number = ? WHERE company_name = ?",
+                    (p_new_name, p_new_phone, p_old_name))
+        if p_old_name != p_new_name:
+            cur.execute("UPDATE Drug SET company_name = ? WHERE company_name = ?", (p_new_name, p_old_name))
+            cur.execute("UPDATE Contract SET company_name = ? WHERE company_name = ?", (p_new_name, p_old_name))
+    except (Signal, sqlite3.DatabaseError):
+        signal("Failed to update company information")
+    return message(concat("Company ", p_old_name, " updated to ", p_new_name, " successfully"))
+
+
+def delete_company(cur, p_company_name):
+    if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ?", p_company_name):
+        signal("Company does not exist")
+    cur.execute("DELETE FROM Contract WHERE company_name = ?", (p_company_name,))
+    cur.execute("DELETE FROM PharmaceuticalCompany WHERE company_name = ?", (p_company_name,))
+    return message(concat("Pharmaceutical company ", p_company_name, " deleted successfully"))
+
+
+def add_drug(cur, p_trade_name, p_formula, p_company_name):
+    if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ? AND is_active", p_company_name):
+        signal("Pharmaceutical company does not exist.")
+    if exists(cur, "SELECT 1 FROM Drug WHERE trade_name = ? AND company_name = ?", p_trade_name, p_company_name):
+        signal("This drug already exists for this company.")
+    cur.execute("INSERT INTO Drug(trade_name, formula, company_name) VALUES (?, ?, ?)",
+                (p_trade_name, p_formula, p_company_name))
+    return message(concat("Drug ", p_trade_name, " added successfully for company ", p_company_name))
+
+
+def drug_id_for(cur, trade_name, company_name):
+    row = cur.execute("SELECT drug_id FROM Drug WHERE trade_name = ? AND company_name = ?",
+                      (trade_name, company_name)).fetchone()
+    return row[0] if row else None
+
+
+def update_drug(cur, p_old_trade_name, p_company_name, p_new_trade_name, p_new_formula):
+    if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ?", p_company_name):
+        signal("Pharmaceutical company does not exist.")
+    drug_id = drug_id_for(cur, p_old_trade_name, p_company_name)
+    if drug_id is None:
+        signal("Drug does not exist.")
+    if p_old_trade_name != p_new_trade_name and exists(
+            cur, "SELECT 1 FROM Drug WHERE trade_name = ? AND company_name = ?", p_new_trade_name, p_company_name):
+        signal("A drug with the new trade name already exists for this company.")
+    cur.execute("UPDATE Drug SET trade_name = ?, formula = CASE WHEN ? IS NULL OR ? = '' THEN formula ELSE ? END "
+                "WHERE drug_id = ?", (p_new_trade_name, p_new_formula, p_new_formula, p_new_formula, drug_id))
+    return message(concat("Drug updated from ", p_old_trade_name, " to ", p_new_trade_name, " for company ",
+                          p_company_name, " successfully"))
+
+
+def delete_drug(cur, p_trade_name, p_company_name):
+    drug_id = drug_id_for(cur, p_trade_name, p_company_name)
+    if drug_id is None:
+        signal("Drug does not exist.")
+    cur.execute("DELETE FROM Drug WHERE drug_id = ?", (drug_id,))
+    return message(concat("Drug ", p_trade_name, " from company ", p_company_name, " deleted successfully"))
+
+
+def add_pharmacy(cur, p_name, p_address, p_phone):
+    cur.execute("INSERT INTO Pharmacy(pname, address, phone) VALUES (?, ?, ?)", (p_name, p_address, p_phone))
+    return message(concat("Pharmacy at address ", p_address, " added successfully"))
+
+
+def update_pharmacy(cur, p_address, p_name, p_phone):
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ?", p_address):
+        signal("Pharmacy not found")
+    cur.execute("UPDATE Pharmacy SET pname = ?, phone = ? WHERE address = ?", (p_name, p_phone, p_address))
+    return message(concat("Pharmacy at address ", p_address, " updated successfully"))
+
+
+def delete_pharmacy(cur, p_address):
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ?", p_address):
+        signal("Pharmacy not found")
+    cur.execute("DELETE FROM Sells WHERE ph_address = ?", (p_address,))
+    cur.execute("DELETE FROM Contract WHERE ph_address = ?", (p_address,))
+    cur.execute("DELETE FROM Pharmacy WHERE address = ?", (p_address,))
+    return message(concat("Pharmacy at address ", p_address, " deleted successfully"))
+
+
+def check_stock_entry(cur, address, drug_id, stock, unit_price, adding=False):
+    # The checks shared by the procedures that add or change a Sells row;
+    # nothing may be added to a pharmacy, or from a company, being purged
+    if stock is not None and stock < 0:
+        signal("Stock cannot be negative")
+    if unit_price is not None and unit_price <= 0:
+        signal("Price must be positive")
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ?" + (" AND is_active" if adding else ""), address):
+        signal("Pharmacy does not exist")
+    if adding:
+        drug_found = drug_active(cur, drug_id)
+    else:
+        drug_found = exists(cur, "SELECT 1 FROM Drug WHERE drug_id = ?", drug_id)
+    if not drug_found:
+        signal("Drug does not exist")
+    return exists(cur, "SELECT 1 FROM Sells WHERE ph_address = ? AND drug_id = ?", address, drug_id)
+
+
+def remove_stock_entry(cur, address, drug_id):
+    if not exists(cur, "SELECT 1 FROM Sells WHERE ph_address = ? AND drug_id = ?", address, drug_id):
+        signal("This drug is not being sold at this pharmacy")
+    if cur.execute("SELECT COUNT(*) FROM Sells WHERE ph_address = ?", (address,)).fetchone()[0] <= 10:
+        signal("Cannot remove drug from pharmacy. Each pharmacy must sell at least 10 drugs.")
+    cur.execute("DELETE FROM Sells WHERE ph_address = ? AND drug_id = ?", (address, drug_id))
+    return message(concat("Drug with ID ", drug_id, " is no longer being sold at pharmacy at address ", address))
+
+
+def add_drug_to_pharmacy(cur, p_pharmacy_address, p_drug_id, p_stock, p_price):
+    p_price = price(p_price)
+    if check_stock_entry(cur, p_pharmacy_address, p_drug_id, p_stock, p_price, adding=True):
+        signal("This drug is already being sold at this pharmacy. Use update_drug_quantity instead.")
+    cur.execute("INSERT INTO Sells(ph_address, drug_id, stock, price) VALUES (?, ?, ?, ?)",
+                (p_pharmacy_address, p_drug_id, p_stock, p_price))
+    return message(concat("Drug with ID ", p_drug_id, " is now being sold at pharmacy at address ",
+                          p_pharmacy_address, " with initial stock of ", p_stock, " units at $", p_price,
+                          " per unit"))
+
+
+def update_drug_quantity(cur, p_pharmacy_address, p_drug_id, p_new_stock, p_new_price):
+    p_new_price = price(p_new_price)
+    if not check_stock_entry(cur, p_pharmacy_address, p_drug_id, p_new_stock, p_new_price):
+        signal("This drug is not being sold at this pharmacy. Use add_drug_to_pharmacy instead.")
+    cur.execute("UPDATE Sells SET stock = ?, price = ? WHERE ph_address = ? AND drug_id = ?",
+                (p_new_stock, p_new_price, p_pharmacy_address, p_drug_id))
+    return message(concat("Updated inventory for drug ID ", p_drug_id, " at pharmacy address ", p_pharmacy_address,
+                          ". New stock: ", p_new_stock, " units, New price: $", p_new_price, " per unit"))
+
+
+def delete_drug_from_pharmacy(cur, p_pharmacy_address, p_drug_id):
+    return remove_stock_entry(cur, p_pharmacy_address, p_drug_id)
+
+
+def add_sells_entry(cur, p_pharmacy_address, p_drug_id, p_stock, p_price):
+    p_price = price(p_price)
+    if check_stock_entry(cur, p_pharmacy_address, p_drug_id, p_stock, p_price, adding=True):
+        signal("This drug is already being sold at this pharmacy. Use update_sells_entry instead.")
+    cur.execute("INSERT INTO Sells(ph_address, drug_id, stock, price) VALUES (?, ?, ?, ?)",
+                (p_pharmacy_address, p_drug_id, p_stock, p_price))
+    return message(concat("Drug with ID ", p_drug_id, " is now being sold at pharmacy at address ",
+                          p_pharmacy_address))
+
+
+def update_sells_entry(cur, p_pharmacy_address, p_drug_id, p_stock, p_price):
+    p_price = price(p_price)
+    if not check_stock_entry(cur, p_pharmacy_address, p_drug_id, p_stock, p_price):
+        signal("This drug is not being sold at this pharmacy. Use add_sells_entry instead.")
+    cur.execute("UPDATE Sells SET stock = ?, price = ? WHERE ph_address = ? AND drug_id = ?",
+                (p_stock, p_price, p_pharmacy_address, p_drug_id))
+    return message(concat("Updated inventory for drug ID ", p_drug_id, " at pharmacy address ", p_pharmacy_address,
+                          ". New stock: ", p_stock, ", New price: $", p_price))
+
+
+def delete_sells_entry(cur, p_pharmacy_address, p_drug_id):
+    return remove_stock_entry(cur, p_pharmacy_address, p_drug_id)
+
+
+def check_prescriber(cur, pid, did):
+    if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", pid):
+        signal("Patient does not exist.")
+    if not doctor_active(cur, did):
+        signal("Doctor does not exist.")
+
+
+def insert_prescription(cur, pid, did, pres_date, items):
+    # Replaces older prescriptions from the same doctor for the patient
+    cur.execute("DELETE FROM Prescription WHERE pid = ? AND did = ? AND pres_date < ?", (pid, did, pres_date))
+    cur.execute("INSERT INTO Prescription(pid, did, pres_date) VALUES (?, ?, ?)", (pid, did, pres_date))
+    pres_id = cur.lastrowid
+    cur.executemany("INSERT INTO Contains_drug(pres_id, drug_id, quantity) VALUES (?, ?, ?)",
+                    [(pres_id, drug_id, quantity) for drug_id, quantity in items])
+
+
+def add_prescription(cur, p_pid, p_did, p_pres_date, p_drug_id, p_quantity):
+    check_prescriber(cur, p_pid, p_did)
+    if not drug_active(cur, p_drug_id):
+        signal("Drug does not exist.")
+    if p_quantity is not None and p_quantity <= 0:
+        signal("Quantity must be positive.")
+    if not exists(cur, "SELECT 1 FROM Treats WHERE did = ? AND pid = ?", p_did, p_pid):
+        signal("This doctor does not treat this patient.")
+    insert_prescription(cur, p_pid, p_did, p_pres_date, [(p_drug_id, p_quantity)])
+    return message(concat("Prescription added successfully for patient ", p_pid, " from doctor ", p_did,
+                          " on date ", p_pres_date))
+
+
+def add_prescription_multi(cur, p_pid, p_did, p_pres_date, p_items):
+    check_prescriber(cur, p_pid, p_did)
+    if not exists(cur, "SELECT 1 FROM Treats WHERE did = ? AND pid = ?", p_did, p_pid):
+        signal("This doctor does not treat this patient.")
+    items = json.loads(p_items) if p_items is not None else None
+    if not isinstance(items, list) or not items:
+        signal("A prescription needs at least one drug.")
+
+    def field(item, name):
+        value = item.get(name) if isinstance(item, dict) else None
+        return None if value is None else int(value)
+
+    items = [(field(item, "drug_id"), field(item, "quantity")) for item in items]
+    missing = []
+    for drug_id, quantity in items:
+        if drug_id is None:
+            missing.append("NULL")
+        elif not drug_active(cur, drug_id):
+            missing.append(str(drug_id))
+    if missing:
+        signal(("Drug does not exist: " + ",".join(missing))[:255])
+    if any(quantity is None or quantity <= 0 for drug_id, quantity in items):
+        signal("Quantity must be positive.")
+    if len({drug_id for drug_id, quantity in items}) < len(items):
+        signal("A drug is listed more than once in this prescription.")
+    insert_prescription(cur, p_pid, p_did, p_pres_date, items)
+    return message(concat("Prescription with ", len(items), " drug(s) added successfully for patient ", p_pid,
+                          " from doctor ", p_did, " on date ", p_pres_date))
+
+
+def update_prescription(cur, p_old_pid, p_old_did, p_old_pres_date, p_new_pid, p_new_did, p_new_pres_date,
+                        p_new_drug_id, p_new_quantity):
+    row = cur.execute("SELECT pres_id FROM Prescription WHERE pid = ? AND did = ? AND pres_date = ?",
+                      (p_old_pid, p_old_did, p_old_pres_date)).fetchone()
+    if row is None:
+        signal("Original prescription not found.")
+    if not exists(cur, "SELECT 1 FROM Patient WHERE paadharid = ?", p_new_pid):
+        signal("New patient does not exist.")
+    if not doctor_active(cur, p_new_did):
+        signal("New doctor does not exist.")
+    if not drug_active(cur, p_new_drug_id):
+        signal("New drug does not exist.")
+    if p_new_quantity is not None and p_new_quantity <= 0:
+        signal("Quantity must be positive.")
+    if not exists(cur, "SELECT 1 FROM Treats WHERE did = ? AND pid = ?", p_new_did, p_new_pid):
+        signal("The new doctor does not treat the new patient.")
+    pres_id = row[0]
+    cur.execute("UPDATE Prescription SET pid = ?, did = ?, pres_date = ? WHERE pres_id = ?",
+                (p_new_pid, p_new_did, p_new_pres_date, pres_id))
+    cur.execute("DELETE FROM Contains_drug WHERE pres_id = ?", (pres_id,))
+    cur.execute("INSERT INTO Contains_drug(pres_id, drug_id, quantity) VALUES (?, ?, ?)",
+                (pres_id, p_new_drug_id, p_new_quantity))
+    return message("Prescription updated successfully")
+
+
+def delete_prescription(cur, p_pid, p_did, p_pres_date):
+    row = cur.execute("SELECT pres_id FROM Prescription WHERE pid = ? AND did = ? AND pres_date = ?",
+                      (p_pid, p_did, p_pres_date)).fetchone()
+    if row is None:
+        signal("Prescription not found.")
+    cur.execute("DELETE FROM Prescription WHERE pres_id = ?", (row[0],))
+    return message(concat("Prescription for patient ", p_pid, " from doctor ", p_did, " on date ", p_pres_date,
+                          " deleted successfully"))
+
+
+def dispense_prescription(cur, p_pid, p_did, p_pres_date, p_pharmacy_address):
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ? AND is_active", p_pharmacy_address):
+        signal("Pharmacy does not exist")
+    row = cur.execute("SELECT pres_id FROM Prescription WHERE pid = ? AND did = ? AND pres_date = ?",
+                      (p_pid, p_did, p_pres_date)).fetchone()
+    if row is None:
+        signal("Prescription not found.")
+    pres_id = row[0]
+    if exists(cur, "SELECT 1 FROM PrescriptionDispensed WHERE pres_id = ?", pres_id):
+        signal("Prescription has already been dispensed")
+    lines = cur.execute("SELECT COUNT(*) FROM Contains_drug WHERE pres_id = ?", (pres_id,)).fetchone()[0]
+    if lines == 0:
+        signal("Prescription has no drugs to dispense")
+    # The short drug is found before the decrement here, as the whole call
+    # is rolled back on the signal anyway
+    short = cur.execute("""
+        SELECT cd.drug_id FROM Contains_drug cd
+        LEFT JOIN Sells s ON s.drug_id = cd.drug_id AND s.ph_address = ?
+        WHERE cd.pres_id = ? AND (s.stock IS NULL OR s.stock < cd.quantity)
+        ORDER BY cd.drug_id LIMIT 1
+        """, (p_pharmacy_address, pres_id)).fetchone()
+    if short is not None:
+        signal(concat("Insufficient stock to dispense drug ", short[0], " at this pharmacy"))
+    cur.execute("""
+        UPDATE Sells SET stock = stock - (
+            SELECT quantity FROM Contains_drug WHERE pres_id = ? AND drug_id = Sells.drug_id
+        )
+        WHERE ph_address = ? AND drug_id IN (SELECT drug_id FROM Contains_drug WHERE pres_id = ?)
+        """, (pres_id, p_pharmacy_address, pres_id))
+    cur.execute("INSERT INTO PrescriptionDispensed(pres_id, ph_address) VALUES (?, ?)", (pres_id, p_pharmacy_address))
+    return message(concat("Prescription for patient ", p_pid, " from doctor ", p_did, " on date ", p_pres_date,
+                          " dispensed at pharmacy at address ", p_pharmacy_address)) + [select(cur, """
+        SELECT cd.drug_id AS Drug_ID, d.trade_name AS Drug_Name, cd.quantity AS Dispensed, s.stock AS Stock_Left
+        FROM Contains_drug cd
+        JOIN Drug d ON d.drug_id = cd.drug_id
+        JOIN Sells s ON s.drug_id = cd.drug_id AND s.ph_address = ?
+        WHERE cd.pres_id = ?
+        ORDER BY cd.drug_id
+        """, (p_pharmacy_address, pres_id))]
+
+
+def contract_exists(cur, company_name, address):
+    return exists(cur, "SELECT 1 FROM Contract WHERE company_name = ? AND ph_address = ?", company_name, address)
+
+
+def add_contract(cur, p_company_name, p_pharmacy_address, p_content, p_start_date, p_end_date, p_supervisor):
+    if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ? AND is_active", p_company_name):
+        signal("Pharmaceutical company does not exist.")
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ? AND is_active", p_pharmacy_address):
+        signal("Pharmacy does not exist.")
+    if p_start_date is not None and p_end_date is not None and p_start_date > p_end_date:
+        signal("Contract start date must be before end date.")
+    if contract_exists(cur, p_company_name, p_pharmacy_address):
+        signal("A contract already exists between this company and pharmacy.")
+    cur.execute("INSERT INTO Contract(company_name, ph_address, content, start_date, end_date, supervisor) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (p_company_name, p_pharmacy_address, p_content, p_start_date, p_end_date, p_supervisor))
+    return message(concat("Contract between ", p_company_name, " and pharmacy at ", p_pharmacy_address,
+                          " added successfully"))
+
+
+def update_contract(cur, p_company_name, p_pharmacy_address, p_content, p_start_date, p_end_date, p_supervisor):
+    if not contract_exists(cur, p_company_name, p_pharmacy_address):
+        signal("Contract not found.")
+    if p_start_date is not None and p_end_date is not None and p_start_date > p_end_date:
+        signal("Start date must be before end date.")
+    cur.execute("UPDATE Contract SET content = ?, start_date = ?, end_date = ?, supervisor = ? "
+                "WHERE company_name = ? AND ph_address = ?",
+                (p_content, p_start_date, p_end_date, p_supervisor, p_company_name, p_pharmacy_address))
+    return message(concat("Contract between ", p_company_name, " and pharmacy at ", p_pharmacy_address,
+                          " updated successfully"))
+
+
+def update_contract_supervisor(cur, p_company_name, p_pharmacy_address, p_new_supervisor):
+    if not contract_exists(cur, p_company_name, p_pharmacy_address):
+        signal("Contract does not exist.")
+    cur.execute("UPDATE Contract SET supervisor = ? WHERE company_name = ? AND ph_address = ?",
+                (p_new_supervisor, p_company_name, p_pharmacy_address))
+    return message(concat("Supervisor for contract between ", p_company_name, " and pharmacy at ",
+                          p_pharmacy_address, " updated to ", p_new_supervisor))
+
+
+def delete_contract(cur, p_company_name, p_pharmacy_address):
+    if not contract_exists(cur, p_company_name, p_pharmacy_address):
+        signal("Contract does not exist.")
+    cur.execute("DELETE FROM Contract WHERE company_name = ? AND ph_address = ?",
+                (p_company_name, p_pharmacy_address))
+    return message(concat("Contract between ", p_company_name, " and pharmacy at ", p_pharmacy_address,
+                          " deleted successfully"))
+
+
+def display_contract(cur, p_pharmacy_address, p_pharmacy_name, p_company_name):
+    if not p_pharmacy_address:
+        signal("Pharmacy address is required")
+    if not p_company_name:
+        signal("Pharmaceutical company name is required")
+    if not exists(cur, "SELECT 1 FROM Pharmacy WHERE address = ? AND pname = ? AND is_active", p_pharmacy_address,
+                  p_pharmacy_name):
+        signal("Pharmacy not found with the given address and name")
+    if not exists(cur, "SELECT 1 FROM PharmaceuticalCompany WHERE company_name = ? AND is_active", p_company_name):
+        signal("Pharmaceutical company not found")
+    results = [select(cur, CONTRACT_DETAILS, (p_pharmacy_address, p_pharmacy_name, p_company_name))]
+    if not results[0][1]:
+        results.append((["Message"], [("No contract exists between this pharmacy and pharmaceutical company",)]))
+    return results
+
+
+def start_purge(cur, entity, key, text):
+    table, column = PURGE_ENTITIES[entity]
+    cur.execute(f"UPDATE {table} SET is_active = 0 WHERE {column} = ?", (key,))
+    cur.execute("INSERT INTO PurgeJob(entity, entity_key, step) VALUES (?, ?, ?)",
+                (entity, key, PURGE_STEPS[entity][0][0]))
+    job_id = cur.lastrowid
+    return [(["result", "Job_ID"], [(concat(text, " is being purged (job ", job_id, ")"), job_id)])]
+
+
+def purge_doctor(cur, p_doctor_id):
+    row = cur.execute("SELECT is_active FROM Doctor WHERE daadharid = ?", (p_doctor_id,)).fetchone()
+    if row is None:
+        signal("Doctor does not exist")
+    if not row[0]:
+        signal("Doctor is already being purged")
+    if exists(cur, "SELECT 1 FROM Patient WHERE p_daadharid = ?", p_doctor_id):
+        signal("Cannot delete doctor: Doctor is the primary physician for one or more patients")
+    return start_purge(cur, "Doctor", p_doctor_id, concat("Doctor ", p_doctor_id))
+
+
+def purge_pharmacy(cur, p_address):
+    row = cur.execute("SELECT is_active FROM Pharmacy WHERE address = ?", (p_address,)).fetchone()
+    if row is None:
+        signal("Pharmacy not found")
+    if not row[0]:
+        signal("Pharmacy is already being purged")
+    return start_purge(cur, "Pharmacy", p_address, concat("Pharmacy at address ", p_address))
+
+
+def purge_company(cur, p_company_name):
+    row = cur.execute("SELECT is_active FROM PharmaceuticalCompany WHERE company_name = ?",
+                      (p_company_name,)).fetchone()
+    if row is None:
+        signal("Company does not exist")
+    if not row[0]:
+        signal("Company is already being purged")
+    return start_purge(cur, "PharmaceuticalCompany", p_company_name,
+                       concat("Pharmaceutical company ", p_company_name))
+
+
+def purge_step(cur, p_job_id, p_batch_size):
+    if p_batch_size is None or p_batch_size <= 0:
+        p_batch_size = 1000
+    row = cur.execute("SELECT entity, entity_key, step, status FROM PurgeJob WHERE job_id = ?",
+                      (p_job_id,)).fetchone()
+    if row is None:
+        signal("Purge job not found")
+    entity, key, step, status = row
+    table, column = PURGE_ENTITIES[entity]
+    steps = dict(PURGE_STEPS[entity])
+    order = [name for name, sql in PURGE_STEPS[entity]] + ["entity"]
+    deleted = 0
+    if not exists(cur, f"SELECT 1 FROM {table} WHERE {column} = ?", key):
+        status = "done"
+    while status == "running":
+        if step == "entity":
+            deleted = cur.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,)).rowcount
+            status = "done"
+        else:
+            deleted = cur.execute(steps[step], (key, p_batch_size)).rowcount
+            if deleted == 0:
+                step = order[order.index(step) + 1]
+        if deleted > 0:
+            break
+    cur.execute("UPDATE PurgeJob SET step = ?, status = ?, rows_deleted = rows_deleted + ?, "
+                "updated_at = datetime('now', 'localtime'), "
+                "finished_at = CASE WHEN ? = 'done' THEN IFNULL(finished_at, datetime('now', 'localtime')) END "
+                "WHERE job_id = ?", (step, status, deleted, status, p_job_id))
+    return [select(cur, "SELECT job_id AS Job_ID, entity AS Entity, entity_key AS Entity_Key, step AS Step, "
+                        "status AS Status, rows_deleted AS Rows_Deleted FROM PurgeJob WHERE job_id = ?",
+                   (p_job_id,))]
+
+
+def archive_prescriptions(cur, p_before, p_batch_size):
+    if p_before is None:
+        signal("Archive cutoff date is required")
+    if p_before > date.today():
+        signal("Archive cutoff date cannot be in the future")
+    if p_batch_size is None or p_batch_size <= 0:
+        p_batch_size = 1000
+    # Picks the same prescriptions for the copy and the delete, as nothing
+    # else writes inside the call
+    batch = "SELECT pres_id FROM Prescription WHERE pres_date < ? ORDER BY pres_date, pres_id LIMIT ?"
+    prescriptions = cur.execute(f"SELECT COUNT(*) FROM ({batch})", (p_before, p_batch_size)).fetchone()[0]
+    rows = cur.execute(f"""
+        INSERT INTO PrescriptionArchive(pid, pres_date, pres_id, drug_id, did, patient_name, doctor_name,
+                                        trade_name, formula, company_name, quantity)
+        SELECT pr.pid, pr.pres_date, pr.pres_id, dr.drug_id, pr.did, pt.p_name, d.d_name,
+               dr.trade_name, dr.formula, dr.company_name, cd.quantity
+        FROM Prescription pr
+        JOIN Patient pt ON pr.pid = pt.paadharid
+        JOIN Doctor d ON pr.did = d.daadharid
+        JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
+        JOIN Drug dr ON cd.drug_id = dr.drug_id
+        WHERE pr.pres_id IN ({batch})
+        """, (p_before, p_batch_size)).rowcount
+    cur.execute(f"DELETE FROM Prescription WHERE pres_id IN ({batch})", (p_before, p_batch_size))
+    return [(["result", "Prescriptions", "Rows_Archived"],
+             [(concat("Archived ", prescriptions, " prescription(s) dated before ", p_before), prescriptions, rows)])]
+
+
+# Rows after the previous page's last row in a KEYSET_ORDERS report's own
+# order; each value is bound twice
+KEYSET_AFTER = {
+    "drug_availability": "AND (s.price > ? OR s.price = ? AND (s.stock < ? OR s.stock = ? "
+                         "AND (p.address > ? OR p.address = ? AND d.drug_id > ?)))",
+}
+
+
+def report(cur, name, args, sort_column=None, sort_desc=False, limit=None, offset=None, after=None):
+    query, columns, order = REPORTS[name]
+    params = list(args)
+    after_params = []
+    if sort_column in columns:
+        order = f'"{sort_column}" {"DESC" if sort_desc else "ASC"}'
+    elif after and after[0] is not None:
+        after_params = [value for value in after[:-1] for _ in range(2)] + after[-1:]
+        offset = 0
+    query = query.format(order=order, after=KEYSET_AFTER[name] if after_params else "")
+    if name == "drug_availability":
+        if params[0] is None or len(params[0]) < MIN_PREFIX_LENGTH:
+            signal(f"Trade name prefix must be at least {MIN_PREFIX_LENGTH} characters")
+        params[0] = like_prefix(params[0])
+    params += after_params
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset or 0]
+    return [select(cur, query, params)]
+
+
+def report_procedure(name):
+    return lambda cur, *args: report(cur, name, args)
+
+
+def page_procedure(name):
+    def run(cur, *args):
+        after = None
+        if name in KEYSET_ORDERS:
+            after = list(args[-len(KEYSET_ORDERS[name]):])
+            args = args[:-len(KEYSET_ORDERS[name])]
+        *report_args, sort_column, sort_desc, limit, offset = args
+        return report(cur, name, report_args, sort_column, sort_desc, limit, offset, after)
+    return run
+
+
+IMPLEMENTATIONS = {
+    name: function for name, function in globals().items()
+    if name in PROCEDURES and callable(function)
+}
+IMPLEMENTATIONS.update({name: report_procedure(name) for name in REPORTS})
+IMPLEMENTATIONS.update({f"{name}_page": page_procedure(name) for name in REPORTS if f"{name}_page" in PROCEDURES})
+
+STATEMENT_IMPLEMENTATIONS = {
+    "contract_details": lambda cur, *args: [select(cur, CONTRACT_DETAILS, args)],
+}
+STATEMENT_IMPLEMENTATIONS.update({
+    name: lambda cur, sql=sql: [select(cur, sql)] for name, sql in KEY_LISTS.items()
+})
+
+# Keeps this file in step with the catalog in backend.py
+unimplemented = set(PROCEDURES) - set(IMPLEMENTATIONS) | set(STATEMENTS) - set(STATEMENT_IMPLEMENTATIONS)
+if unimplemented:
+    raise ImportError(f"sqlite_backend has no implementation of: {', '.join(sorted(unimplemented))}")
+
+
+class SQLiteBackend:
+    # Offers the same methods as backend.MySQLBackend. Everything runs on one
+    # SQLite connection, one call at a time, each call in its own
+    # transaction; path may be a file or ":memory:".
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def run(self, function, args):
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                results = function(cur, *args)
+                cur.execute("COMMIT")
+                return results
+            except (Signal, sqlite3.Error) as err:
+                if self.conn.in_transaction:
+                    cur.execute("ROLLBACK")
+                raise driver_error(err) from err
+            except Exception:
+                if self.conn.in_transaction:
+                    cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+
+    def ping(self):
+        with self.lock:
+            self.conn.execute("SELECT 1")
+
+    def call(self, procedure, args, write=False, task=None, timer=None):
+        if procedure not in IMPLEMENTATIONS:
+            raise mysql.connector.errors.ProgrammingError(msg=f"PROCEDURE nova.{procedure} does not exist",
+                                                          errno=1305, sqlstate="42000")
+        if task is not None:
+            task.check_cancelled()
+        results = self.run(IMPLEMENTATIONS[procedure], coerce_args(procedure, args))
+        if timer is not None:
+            timer.server_done()
+            timer.add_rows(sum(len(rows) for headers, rows in results))
+            timer.fetch_done()
+        return results
+
+    def call_batch(self, calls, task=None):
+        outcomes = []
+        for procedure, args, write in calls:
+            if task is not None:
+                task.check_cancelled()
+            try:
+                outcomes.append(self.call(procedure, args, write))
+            except mysql.connector.Error as err:
+                outcomes.append(err)
+        return outcomes
+
+    def stream(self, name, args, batch_size=FETCH_BATCH, task=None, timer=None):
+        # The whole result is read under the lock, then handed out in batches
+        if name in STATEMENTS:
+            results = self.run(STATEMENT_IMPLEMENTATIONS[name], coerce_args(name, args))
+            if timer is not None:
+                timer.server_done()
+        else:
+            results = self.call(procedure=name, args=args, task=task)
+            if timer is not None:
+                timer.server_done()
+        for headers, rows in results:
+            for start in range(0, len(rows), batch_size):
+                if task is not None:
+                    task.check_cancelled()
+                batch = rows[start:start + batch_size]
+                if timer is not None:
+                    timer.add_rows(len(batch))
+                yield headers, batch
+        if timer is not None:
+            timer.fetch_done()
+
+    def load(self, table, columns, rows):
+        # Bulk insert for seeding, e.g. with datagen.DataGenerator rows. IGNORE
+        # on Treats because the trigger may already have added the primary
+        # physician
+        verb = "INSERT OR IGNORE" if table == "Treats" else "INSERT"
+        statement = f"{verb} INTO {table}({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.execute("BEGIN")
+                    self.conn.executemany(statement, rows)
+            except sqlite3.Error as err:
+                raise driver_error(err) from err
+
+    def kill_query(self, connection_id):
+        # Calls are not interruptible; a cancelled task stops between batches
+        pass
+
+    def close(self):
+        self.conn.close()
+
+
+def generate(backend, scale=0.01, seed=0, chunk_size=CHUNK_SIZE, progress=None):
+    # datagen.py's synthetic data, loaded into an empty SQLiteBackend. The
+    # stand-in keeps the natural keys that the procedures take.
+    generator = DataGenerator(scaled_counts(scale), seed)
+    loaded = {}
+    for table in LOAD_ORDER:
+        columns, natural = NATURAL_KEY_ROWS.get(table, (COLUMNS[table], None))
+        loaded[table] = 0
+        for chunk in chunked(generator.rows(table), chunk_size):
+            if natural is not None:
+                chunk = [natural(row) for row in chunk]
+            backend.load(table, columns, chunk)
+            loaded[table] += len(chunk)
+            if progress:
+                progress(table, loaded[table])
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create a SQLite stand-in for the nova database")
+    parser.add_argument("path", help="SQLite database file to create")
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="Fill it with datagen.py data at this scale; 0 leaves it empty (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    backend = SQLiteBackend(args.path)
+
+    def progress(table, loaded):
+        print(f"{table}: {loaded} rows", file=sys.stderr)
+
+    try:
+        if args.scale > 0:
+            loaded = generate(backend, args.scale, args.seed, progress=progress)
+            for table, count in loaded.items():
+                print(f"{table:<22} {count:>10}")
+    except mysql.connector.Error as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import argparse
+import csv
+import sys
+
+from bulk_import import CHUNK_SIZE, RowError, chunked, get_decimal, get_int, placeholders, read_rows
+from db_pool import ConnectionPool, DB_CONFIG
+
+INSERTED = "inserted"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+REJECTED = "rejected"
+
+
+def clean_item(row):
+    # Same rules as add_drug_to_pharmacy and update_drug_quantity
+    drug_id = get_int(row, "drug_id")
+    stock = get_int(row, "stock")
+    price = get_decimal(row, "price")
+    if stock < 0:
+        raise RowError("Stock cannot be negative")
+    if price <= 0:
+        raise RowError("Price must be positive")
+    return (drug_id, stock, price)
+
+
+def pharmacy_id(pool, ph_address):
+    # The pharmacy's ph_id, or None if there is no pharmacy at the address
+    # or it is being purged
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT ph_id FROM Pharmacy WHERE address = %s AND is_active", (ph_address,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+
+def apply_chunk(conn, ph_id, items):
+    # items are (line_no, drug_id, stock, price) that passed clean_item.
+    # Returns [(line_no, drug_id, outcome, message)].
+    outcomes = []
+    cursor = conn.cursor()
+    try:
+        drug_ids = [item[1] for item in items]
+        # A drug from a company being purged counts as missing
+        cursor.execute(
+            "SELECT d.drug_id FROM Drug d "
+            "JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id "
+            f"WHERE d.drug_id IN ({placeholders(len(drug_ids))}) AND pc.is_active",
+            drug_ids
+        )
+        drugs = {row[0] for row in cursor.fetchall()}
+
+        # Lock the rows being changed so the outcomes reported match what the
+        # upsert below does
+        cursor.execute(
+            "SELECT drug_id, stock, price FROM Sells "
+            f"WHERE ph_id = %s AND drug_id IN ({placeholders(len(drug_ids))}) FOR UPDATE",
+            [ph_id] + drug_ids
+        )
+        current = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+        rows = []
+        for line_no, drug_id, stock, price in items:
+            if drug_id not in drugs:
+                outcomes.append((line_no, drug_id, REJECTED, "Drug does not exist"))
+                continue
+            if drug_id not in current:
+                outcome = INSERTED
+            elif current[drug_id] == (stock, price):
+                outcomes.append((line_no, drug_id, UNCHANGED, ""))
+                continue
+            else:
+                outcome = UPDATED
+            rows.append((ph_id, drug_id, stock, price))
+            outcomes.append((line_no, drug_id, outcome, ""))
+
+        if rows:
+            # One multi-row statement for the whole chunk; executemany sends
+            # the rows as a single INSERT with many VALUES lists
+            cursor.executemany(
+                "INSERT INTO Sells(ph_id, drug_id, stock, price) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE stock = VALUES(stock), price = VALUES(price)",
+                rows
+            )
+        conn.commit()
+        return outcomes
+    finally:
+        cursor.close()
+
+
+def update_stock(pool, ph_address, rows, chunk_size=CHUNK_SIZE, progress=None, should_stop=None):
+    # Applies a price list for one pharmacy. rows yields (line_no, row dict,
+    # parse error) as read_rows does; each row needs drug_id, stock and price.
+    # Drugs already sold are updated, new ones added; nothing is removed.
+    # Returns the counts per outcome and [(line_no, drug_id, outcome, message)].
+    ph_id = pharmacy_id(pool, ph_address)
+    if ph_id is None:
+        raise ValueError("Pharmacy does not exist")
+
+    outcomes = []
+    seen = set()
+    for chunk in chunked(rows, chunk_size):
+        if should_stop:
+            should_stop()
+
+        items = []
+        for line_no, row, error in chunk:
+            drug_id = row.get("drug_id") if row else None
+            if error is None:
+                try:
+                    drug_id, stock, price = clean_item(row)
+                    if drug_id in seen:
+                        raise RowError("Drug is listed more than once")
+                    seen.add(drug_id)
+                    items.append((line_no, drug_id, stock, price))
+                    continue
+                except RowError as e:
+                    error = str(e)
+            outcomes.append((line_no, drug_id, REJECTED, error))
+
+        if items:
+            with pool.connection() as conn:
+                outcomes.extend(apply_chunk(conn, ph_id, items))
+        if progress:
+            progress(len(outcomes))
+
+    outcomes.sort(key=lambda outcome: outcome[0])
+    counts = {status: 0 for status in (INSERTED, UPDATED, UNCHANGED, REJECTED)}
+    for outcome in outcomes:
+        counts[outcome[2]] += 1
+    return {**counts, "outcomes": outcomes}
+
+
+def write_outcomes(path, outcomes):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["line", "drug_id", "outcome", "message"])
+        writer.writerows(outcomes)
+
+
+def update_stock_file(pool, ph_address, path, outcome_path=None, chunk_size=CHUNK_SIZE,
+                      progress=None, should_stop=None):
+    result = update_stock(pool, ph_address, read_rows(path), chunk_size, progress, should_stop)
+    result["outcome_report"] = outcome_path or f"{path}.outcomes.csv"
+    write_outcomes(result["outcome_report"], result["outcomes"])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a stock and price list to one pharmacy")
+    parser.add_argument("ph_address", help="Address of the pharmacy")
+    parser.add_argument("path", help="CSV with drug_id, stock and price columns, or JSONL with those keys")
+    parser.add_argument("--outcomes", help="Where to write the per-row outcomes (default: <path>.outcomes.csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(DB_CONFIG, pool_size=1)
+
+    def progress(processed):
+        print(f"Processed {processed} rows", file=sys.stderr)
+
+    try:
+        result = update_stock_file(pool, args.ph_address, args.path, args.outcomes, args.chunk_size, progress)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"{result['inserted']} added, {result['updated']} updated, {result['unchanged']} unchanged, "
+          f"{result['rejected']} rejected (see {result['outcome_report']})")
+    return 1 if result["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import mysql.connector
+
+# Rows pulled from the server per fetchmany() call
+FETCH_BATCH = 500
+
+
+def stream_statement(pool, statement, params=(), batch_size=FETCH_BATCH, task=None, timer=None):
+    # Generator yielding (headers, rows) with at most batch_size rows at a time.
+    # The cursor is unbuffered, so rows stay on the server until they are asked
+    # for and memory use does not grow with the size of the result. A statement
+    # that returns several result sets (a CALL) yields each one in turn; a new
+    # headers list marks the start of the next result set. An optional
+    # perf_monitor timer is told when the server answered and how many rows
+    # were fetched.
+    conn = pool.checkout()
+    finished = False
+    cursor = None
+    try:
+        if task is not None:
+            task.connection_id = conn.connection_id
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(statement, params)
+        if timer is not None:
+            timer.server_done()
+
+        while True:
+            if cursor.description:
+                headers = [i[0] for i in cursor.description]
+                while True:
+                    if task is not None:
+                        task.check_cancelled()
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if timer is not None:
+                        timer.add_rows(len(rows))
+                    yield headers, rows
+            if not cursor.nextset():
+                break
+        finished = True
+        if timer is not None:
+            timer.fetch_done()
+    finally:
+        if task is not None:
+            task.connection_id = None
+        if not finished:
+            # Abandoned mid-stream: draining the rest could mean reading millions
+            # of rows, so drop the socket and let the pool reconnect it instead
+            try:
+                conn._cnx.disconnect()
+            except mysql.connector.Error:
+                pass
+        elif cursor is not None:
+            cursor.close()
+        pool.release(conn)
+
+
+def stream_procedure(pool, procedure, args, batch_size=FETCH_BATCH, task=None, timer=None):
+    # callproc() buffers every result set on the client, so issue the CALL
+    # as a plain statement to keep it streaming
+    placeholders = ", ".join(["%s"] * len(args))
+    statement = f"CALL {procedure}({placeholders})"
+    return stream_statement(pool, statement, list(args), batch_size, task, timer)
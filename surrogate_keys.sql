@@ -0,0 +1,250 @@
+-- Integer surrogate keys for Pharmacy (ph_id) and PharmaceuticalCompany
+-- (company_id). Sells, Contract and Drug used to copy the pharmacy address
+-- (VARCHAR(200)) and company name (VARCHAR(100)) into every row and every
+-- secondary index, and renaming a company rewrote all of its Drug and
+-- Contract rows. The address and name stay as unique keys and the procedures
+-- still take them, so the GUI, the service and the repositories are unchanged.
+--
+-- Apply after tables_def.sql, on a new install or an existing nova database.
+-- A database created before the surrogate keys is converted in place; one
+-- already converted is left as it is. Either way the procedures and triggers
+-- that read the key columns are dropped here, so reload afterwards, in order:
+-- company_CRUD.sql, pharmacy_CRUD.sql, drug_CRUD.sql, sells_proc.sql,
+-- contract_CRUD.sql, specific_procs.sql, inventory_summary.sql and
+-- prescription_history.sql (the last two refill their tables).
+-- ALTER TABLE commits as it goes, so take a backup first and run it while the
+-- chain is quiet.
+--
+-- To measure the change on a large seeded database, before converting it:
+--   python datagen.py --scale 1.0 --reset
+--   python benchmark.py --sizes --json before.json
+-- then apply this file, reload the procedures, and:
+--   python benchmark.py --sizes --json after.json
+--   python benchmark.py --compare before.json after.json
+USE nova;
+
+DROP PROCEDURE IF EXISTS add_company;
+DROP PROCEDURE IF EXISTS update_company;
+DROP PROCEDURE IF EXISTS delete_company;
+DROP PROCEDURE IF EXISTS add_pharmacy;
+DROP PROCEDURE IF EXISTS update_pharmacy;
+DROP PROCEDURE IF EXISTS delete_pharmacy;
+DROP PROCEDURE IF EXISTS add_drug_to_pharmacy;
+DROP PROCEDURE IF EXISTS delete_drug_from_pharmacy;
+DROP PROCEDURE IF EXISTS update_drug_quantity;
+DROP PROCEDURE IF EXISTS add_drug;
+DROP PROCEDURE IF EXISTS delete_drug;
+DROP PROCEDURE IF EXISTS update_drug;
+DROP PROCEDURE IF EXISTS add_sells_entry;
+DROP PROCEDURE IF EXISTS delete_sells_entry;
+DROP PROCEDURE IF EXISTS update_sells_entry;
+DROP PROCEDURE IF EXISTS add_contract;
+DROP PROCEDURE IF EXISTS update_contract;
+DROP PROCEDURE IF EXISTS update_contract_supervisor;
+DROP PROCEDURE IF EXISTS delete_contract;
+DROP PROCEDURE IF EXISTS prescription_report;
+DROP PROCEDURE IF EXISTS print_pres_details;
+DROP PROCEDURE IF EXISTS drug_details;
+DROP PROCEDURE IF EXISTS print_stock_position;
+DROP PROCEDURE IF EXISTS print_pharmacy_contact;
+DROP PROCEDURE IF EXISTS print_company_contact;
+DROP PROCEDURE IF EXISTS print_patients_for_doctor;
+DROP PROCEDURE IF EXISTS display_contract;
+DROP PROCEDURE IF EXISTS prescription_report_page;
+DROP PROCEDURE IF EXISTS drug_details_page;
+DROP PROCEDURE IF EXISTS print_stock_position_page;
+DROP PROCEDURE IF EXISTS print_patients_for_doctor_page;
+DROP PROCEDURE IF EXISTS print_chain_stock;
+DROP PROCEDURE IF EXISTS drug_availability;
+DROP PROCEDURE IF EXISTS drug_availability_page;
+DROP PROCEDURE IF EXISTS print_pharmacy_inventory;
+DROP PROCEDURE IF EXISTS print_company_inventory;
+DROP PROCEDURE IF EXISTS adjust_pharmacy_inventory;
+DROP PROCEDURE IF EXISTS adjust_company_inventory;
+DROP PROCEDURE IF EXISTS rebuild_inventory_summary;
+DROP PROCEDURE IF EXISTS rebuild_prescription_history;
+
+DROP TRIGGER IF EXISTS sells_after_insert;
+DROP TRIGGER IF EXISTS sells_after_update;
+DROP TRIGGER IF EXISTS sells_after_delete;
+DROP TRIGGER IF EXISTS pharmacy_after_insert;
+DROP TRIGGER IF EXISTS pharmacy_before_delete;
+DROP TRIGGER IF EXISTS drug_after_insert;
+DROP TRIGGER IF EXISTS drug_after_update;
+DROP TRIGGER IF EXISTS drug_before_delete;
+DROP TRIGGER IF EXISTS company_after_insert;
+DROP TRIGGER IF EXISTS company_after_update;
+DROP TRIGGER IF EXISTS company_before_delete;
+DROP TRIGGER IF EXISTS contains_drug_after_insert;
+DROP TRIGGER IF EXISTS contains_drug_after_update;
+DROP TRIGGER IF EXISTS prescription_after_update;
+DROP TRIGGER IF EXISTS patient_after_update_history;
+DROP TRIGGER IF EXISTS doctor_after_update_history;
+DROP TRIGGER IF EXISTS drug_after_update_history;
+DROP TRIGGER IF EXISTS company_after_update_history;
+
+-- Drops the foreign keys from p_table to p_referenced, whatever they are named
+DELIMITER $$
+CREATE PROCEDURE drop_foreign_keys_to(
+    IN p_table VARCHAR(64),
+    IN p_referenced VARCHAR(64)
+)
+BEGIN
+    DECLARE v_drops TEXT;
+
+    SELECT GROUP_CONCAT(CONCAT('DROP FOREIGN KEY `', CONSTRAINT_NAME, '`') SEPARATOR ', ')
+    INTO v_drops
+    FROM information_schema.REFERENTIAL_CONSTRAINTS
+    WHERE CONSTRAINT_SCHEMA = DATABASE()
+    AND TABLE_NAME = p_table
+    AND REFERENCED_TABLE_NAME = p_referenced;
+
+    IF v_drops IS NOT NULL THEN
+        SET @sql = CONCAT('ALTER TABLE `', p_table, '` ', v_drops);
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Drops the secondary indexes of p_table that include p_column; the primary
+-- key is replaced by the caller
+DELIMITER $$
+CREATE PROCEDURE drop_indexes_on(
+    IN p_table VARCHAR(64),
+    IN p_column VARCHAR(64)
+)
+BEGIN
+    DECLARE v_drops TEXT;
+
+    SELECT GROUP_CONCAT(DISTINCT CONCAT('DROP INDEX `', INDEX_NAME, '`') SEPARATOR ', ')
+    INTO v_drops
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE()
+    AND TABLE_NAME = p_table
+    AND COLUMN_NAME = p_column
+    AND INDEX_NAME != 'PRIMARY';
+
+    IF v_drops IS NOT NULL THEN
+        SET @sql = CONCAT('ALTER TABLE `', p_table, '` ', v_drops);
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+DELIMITER $$
+CREATE PROCEDURE migrate_to_surrogate_keys()
+migration: BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'Pharmacy' AND COLUMN_NAME = 'ph_id'
+    ) THEN
+        SELECT 'Surrogate keys already in place' AS result;
+        LEAVE migration;
+    END IF;
+
+    -- Keyed by address and name; inventory_summary.sql recreates and refills them
+    DROP TABLE IF EXISTS PharmacyInventory, CompanyInventory;
+
+    CALL drop_foreign_keys_to('Drug', 'PharmaceuticalCompany');
+    CALL drop_foreign_keys_to('Contract', 'PharmaceuticalCompany');
+    CALL drop_foreign_keys_to('Sells', 'Pharmacy');
+    CALL drop_foreign_keys_to('Contract', 'Pharmacy');
+
+    -- Existing rows are numbered in key order
+    ALTER TABLE PharmaceuticalCompany
+        DROP PRIMARY KEY,
+        ADD COLUMN company_id INT NOT NULL AUTO_INCREMENT FIRST,
+        ADD PRIMARY KEY (company_id),
+        ADD UNIQUE KEY uq_company_name (company_name);
+
+    ALTER TABLE Pharmacy
+        DROP PRIMARY KEY,
+        ADD COLUMN ph_id INT NOT NULL AUTO_INCREMENT FIRST,
+        ADD PRIMARY KEY (ph_id),
+        ADD UNIQUE KEY uq_pharmacy_address (address);
+
+    -- Each referencing table gets the id next to the old column, filled in by
+    -- a join, and then loses the old column and the indexes built on it
+    ALTER TABLE Drug ADD COLUMN company_id INT NULL AFTER formula;
+    UPDATE Drug d
+    JOIN PharmaceuticalCompany pc ON pc.company_name = d.company_name
+    SET d.company_id = pc.company_id;
+    CALL drop_indexes_on('Drug', 'company_name');
+    ALTER TABLE Drug
+        DROP COLUMN company_name,
+        MODIFY company_id INT NOT NULL,
+        ADD UNIQUE KEY uq_drug_trade_name_company (trade_name, company_id),
+        ADD INDEX idx_drug_company_trade_name (company_id, trade_name, formula),
+        ADD FOREIGN KEY (company_id) REFERENCES PharmaceuticalCompany(company_id) ON DELETE CASCADE;
+
+    ALTER TABLE Sells ADD COLUMN ph_id INT NULL FIRST;
+    UPDATE Sells s
+    JOIN Pharmacy p ON p.address = s.ph_address
+    SET s.ph_id = p.ph_id;
+    CALL drop_indexes_on('Sells', 'ph_address');
+    ALTER TABLE Sells
+        DROP PRIMARY KEY,
+        DROP COLUMN ph_address,
+        MODIFY ph_id INT NOT NULL,
+        ADD PRIMARY KEY (drug_id, ph_id),
+        ADD INDEX idx_sells_pharmacy (ph_id, drug_id, stock, price),
+        ADD FOREIGN KEY (ph_id) REFERENCES Pharmacy(ph_id) ON DELETE CASCADE;
+
+    ALTER TABLE Contract
+        ADD COLUMN company_id INT NULL FIRST,
+        ADD COLUMN ph_id INT NULL AFTER company_id;
+    UPDATE Contract c
+    JOIN PharmaceuticalCompany pc ON pc.company_name = c.company_name
+    JOIN Pharmacy p ON p.address = c.ph_address
+    SET c.company_id = pc.company_id,
+        c.ph_id = p.ph_id;
+    CALL drop_indexes_on('Contract', 'company_name');
+    CALL drop_indexes_on('Contract', 'ph_address');
+    ALTER TABLE Contract
+        DROP PRIMARY KEY,
+        DROP COLUMN company_name,
+        DROP COLUMN ph_address,
+        MODIFY company_id INT NOT NULL,
+        MODIFY ph_id INT NOT NULL,
+        ADD PRIMARY KEY (company_id, ph_id),
+        ADD INDEX idx_contract_pharmacy (ph_id, company_id),
+        ADD FOREIGN KEY (company_id) REFERENCES PharmaceuticalCompany(company_id) ON DELETE CASCADE,
+        ADD FOREIGN KEY (ph_id) REFERENCES Pharmacy(ph_id) ON DELETE CASCADE;
+
+    SELECT 'Pharmacy and PharmaceuticalCompany now use surrogate keys' AS result;
+END$$
+DELIMITER ;
+
+CALL migrate_to_surrogate_keys();
+
+DROP PROCEDURE migrate_to_surrogate_keys;
+DROP PROCEDURE drop_indexes_on;
+DROP PROCEDURE drop_foreign_keys_to;
+
+ANALYZE TABLE PharmaceuticalCompany, Drug, Pharmacy, Sells, Contract;
+
+-- The tables in their old shape, with the company name and pharmacy address
+-- in place of the ids, for reports and tools written against the natural
+-- keys (bulk_import.py and benchmark.py read through them). They are plain
+-- joins, so a filter on a name or address still uses the unique keys, and
+-- stock, price and contract columns can be updated through them.
+CREATE OR REPLACE VIEW DrugView AS
+SELECT d.drug_id, d.trade_name, d.formula, pc.company_name, d.company_id
+FROM Drug d
+JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id;
+
+CREATE OR REPLACE VIEW SellsView AS
+SELECT p.address AS ph_address, s.drug_id, s.stock, s.price, s.ph_id
+FROM Sells s
+JOIN Pharmacy p ON p.ph_id = s.ph_id;
+
+CREATE OR REPLACE VIEW ContractView AS
+SELECT pc.company_name, p.address AS ph_address, c.content, c.start_date, c.end_date, c.supervisor,
+       c.company_id, c.ph_id
+FROM Contract c
+JOIN PharmaceuticalCompany pc ON pc.company_id = c.company_id
+JOIN Pharmacy p ON p.ph_id = c.ph_id;
@@ -1,12 +1,14 @@
 CREATE SCHEMA IF NOT EXISTS nova;
 USE nova;
 
--- Doctor table with primary key daadharid
+-- Doctor table with primary key daadharid. is_active is cleared while a
+-- purge (purge.sql) deletes the doctor's records
 CREATE TABLE Doctor (
     daadharid VARCHAR(12) PRIMARY KEY,
     d_name VARCHAR(100) NOT NULL,
     speciality VARCHAR(100),
-    years_of_experience INT NOT NULL CHECK (years_of_experience >= 0)
+    years_of_experience INT NOT NULL CHECK (years_of_experience >= 0),
+    is_active BOOLEAN NOT NULL DEFAULT TRUE
 );
 
 -- Patient table with primary key paadharid and reference to primary physician
@@ -24,14 +26,21 @@ CREATE TABLE Treats (
     pid VARCHAR(12) NOT NULL,
     did VARCHAR(12) NOT NULL,
     PRIMARY KEY (pid, did),
+    -- print_patients_for_doctor looks patients up by doctor
+    INDEX idx_treats_doctor (did, pid),
     FOREIGN KEY (pid) REFERENCES Patient(paadharid) ON DELETE CASCADE,
     FOREIGN KEY (did) REFERENCES Doctor(daadharid) ON DELETE CASCADE
 );
 
--- Pharmaceutical Company table
+-- Pharmaceutical Company table. Other tables refer to it by the compact
+-- company_id; the name stays unique and is what the procedures take.
+-- is_active is cleared while a purge deletes the company's records
 CREATE TABLE PharmaceuticalCompany (
-    company_name VARCHAR(100) PRIMARY KEY,
-    phone_number VARCHAR(15) NOT NULL
+    company_id INT AUTO_INCREMENT PRIMARY KEY,
+    company_name VARCHAR(100) NOT NULL,
+    phone_number VARCHAR(15) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE KEY uq_company_name (company_name)
 );
 
 -- Drug table with composite unique constraint
@@ -39,26 +48,37 @@ CREATE TABLE Drug (
     drug_id INT AUTO_INCREMENT PRIMARY KEY,
     trade_name VARCHAR(100) NOT NULL,
     formula VARCHAR(200) NOT NULL,
-    company_name VARCHAR(100) NOT NULL,
-    UNIQUE (trade_name, company_name),
-    FOREIGN KEY (company_name) REFERENCES PharmaceuticalCompany(company_name) ON DELETE CASCADE
+    company_id INT NOT NULL,
+    UNIQUE KEY uq_drug_trade_name_company (trade_name, company_id),
+    -- drug_details lists a company's drugs ordered by trade name
+    INDEX idx_drug_company_trade_name (company_id, trade_name, formula),
+    FOREIGN KEY (company_id) REFERENCES PharmaceuticalCompany(company_id) ON DELETE CASCADE
 );
 
--- Pharmacy table
+-- Pharmacy table. Other tables refer to it by the compact ph_id; the
+-- address stays unique and is what the procedures take. is_active is
+-- cleared while a purge deletes the pharmacy's records
 CREATE TABLE Pharmacy (
-    address VARCHAR(200) PRIMARY KEY,
+    ph_id INT AUTO_INCREMENT PRIMARY KEY,
+    address VARCHAR(200) NOT NULL,
     pname VARCHAR(100) NOT NULL,
-    phone VARCHAR(15) NOT NULL
+    phone VARCHAR(15) NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE KEY uq_pharmacy_address (address)
 );
 
 -- Sells relationship table between Pharmacy and Drug
 CREATE TABLE Sells (
-    ph_address VARCHAR(200) NOT NULL,
+    ph_id INT NOT NULL,
     drug_id INT NOT NULL,
-    PRIMARY KEY (drug_id, ph_address),
+    PRIMARY KEY (drug_id, ph_id),
     stock INT NOT NULL CHECK (stock >= 0) DEFAULT 0,
     price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
-    FOREIGN KEY (ph_address) REFERENCES Pharmacy(address) ON DELETE CASCADE,
+    -- print_stock_position reads a pharmacy's stock without touching the table rows
+    INDEX idx_sells_pharmacy (ph_id, drug_id, stock, price),
+    -- drug_availability lists the pharmacies selling a drug, cheapest first
+    INDEX idx_sells_drug_price (drug_id, price, stock),
+    FOREIGN KEY (ph_id) REFERENCES Pharmacy(ph_id) ON DELETE CASCADE,
     FOREIGN KEY (drug_id) REFERENCES Drug(drug_id) ON DELETE CASCADE
 );
 
@@ -70,7 +90,11 @@ CREATE TABLE Prescription (
     pres_date DATE NOT NULL,
     FOREIGN KEY (pid) REFERENCES Patient(paadharid) ON DELETE CASCADE,
     FOREIGN KEY (did) REFERENCES Doctor(daadharid) ON DELETE CASCADE,
-    UNIQUE (pid, did)
+    UNIQUE (pid, did),
+    -- prescription_report filters by patient and a date range, newest first
+    INDEX idx_prescription_patient_date (pid, pres_date, did),
+    -- archive_prescriptions (prescription_archive.sql) moves the oldest out
+    INDEX idx_prescription_date (pres_date)
 );
 
 -- Contains_drug table to represent drugs in a prescription
@@ -85,14 +109,16 @@ CREATE TABLE Contains_drug (
 
 -- Contract table between Pharmaceutical Company and Pharmacy
 CREATE TABLE Contract (
-    company_name VARCHAR(100) NOT NULL,
-    ph_address VARCHAR(200) NOT NULL,
-    PRIMARY KEY (company_name, ph_address),
+    company_id INT NOT NULL,
+    ph_id INT NOT NULL,
+    PRIMARY KEY (company_id, ph_id),
     content TEXT NOT NULL,
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
     supervisor VARCHAR(100) NOT NULL,
-    FOREIGN KEY (company_name) REFERENCES PharmaceuticalCompany(company_name) ON DELETE CASCADE,
-    FOREIGN KEY (ph_address) REFERENCES Pharmacy(address) ON DELETE CASCADE,
+    -- delete_pharmacy and the contract lookups start from the pharmacy
+    INDEX idx_contract_pharmacy (ph_id, company_id),
+    FOREIGN KEY (company_id) REFERENCES PharmaceuticalCompany(company_id) ON DELETE CASCADE,
+    FOREIGN KEY (ph_id) REFERENCES Pharmacy(ph_id) ON DELETE CASCADE,
     CHECK (start_date <= end_date)
 );
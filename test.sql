@@ -67,8 +67,13 @@ CALL add_drug_to_pharmacy('111 New St, City', 11, 100, 9.99);
 SELECT 'Test 2.7: Now try to delete a drug (should succeed)' AS '';
 CALL delete_drug_from_pharmacy('111 New St, City', 11);
 
--- Test 2.8: Delete pharmacy
-SELECT 'Test 2.8: Delete pharmacy' AS '';
+-- Test 2.8: Add a drug at a price of 0 (should fail)
+SELECT 'Test 2.8: Add a drug at a price of 0 (should fail)' AS '';
+-- This should fail
+CALL add_drug_to_pharmacy('111 New St, City', 11, 100, 0);
+
+-- Test 2.9: Delete pharmacy
+SELECT 'Test 2.9: Delete pharmacy' AS '';
 CALL delete_pharmacy('111 New St, City');
 
 -- Test Group 3: Doctor Tests
@@ -181,6 +186,20 @@ CALL update_prescription('PAT101', 'DOC102', CURDATE(), 'PAT101', 'DOC102', CURD
 SELECT 'Test 6.4: Delete prescription' AS '';
 CALL delete_prescription('PAT101', 'DOC102', CURDATE());
 
+-- Test 6.5: Create prescription with several drugs in one call
+SELECT 'Test 6.5: Create prescription with several drugs' AS '';
+CALL add_prescription_multi('PAT101', 'DOC102', CURDATE(), '[{"drug_id": 1, "quantity": 30}, {"drug_id": 2, "quantity": 10}, {"drug_id": 3, "quantity": 5}]');
+CALL print_pres_details('PAT101', CURDATE());
+
+-- Test 6.6: Try to create prescription with a missing drug (should fail, nothing inserted)
+SELECT 'Test 6.6: Try to create prescription with a missing drug (should fail)' AS '';
+-- This should fail
+CALL add_prescription_multi('PAT101', 'DOC102', DATE_ADD(CURDATE(), INTERVAL 1 DAY), '[{"drug_id": 1, "quantity": 30}, {"drug_id": 999999, "quantity": 1}]');
+
+-- Test 6.7: Delete multi-drug prescription
+SELECT 'Test 6.7: Delete multi-drug prescription' AS '';
+CALL delete_prescription('PAT101', 'DOC102', CURDATE());
+
 -- Test Group 7: Contract Tests
 SELECT '========== CONTRACT TESTS ==========' AS '';
 
@@ -267,6 +286,242 @@ SELECT 'Test 9.6: Patient prescription report' AS '';
 -- Using date range that includes our test data
 CALL prescription_report('PAT007', DATE_SUB(CURDATE(), INTERVAL 30 DAY), CURDATE());
 
+-- Test 9.7: Paged stock position, sorted by price descending
+SELECT 'Test 9.7: Paged stock position, sorted by price descending' AS '';
+CALL print_stock_position_page('123 Main St, City', 'Price', TRUE, 5, 0);
+CALL print_stock_position_page('123 Main St, City', 'Price', TRUE, 5, 5);
+
+-- Test 9.8: Paged report with an unknown sort column falls back to the default order
+SELECT 'Test 9.8: Paged report with an unknown sort column falls back to the default order' AS '';
+CALL prescription_report_page('PAT007', DATE_SUB(CURDATE(), INTERVAL 30 DAY), CURDATE(), 'pres_id; DROP TABLE Drug', FALSE, 10, 0);
+
+-- Test 9.9: Chain-wide availability by trade name prefix, cheapest first
+SELECT 'Test 9.9: Chain-wide availability by trade name prefix, cheapest first' AS '';
+CALL drug_availability('Test', 0);
+CALL drug_availability_page('Test', 0, NULL, FALSE, 5, 0, NULL, NULL, NULL, NULL);
+-- The next page, read after the first page's last row
+SELECT s.price, s.stock, p.address, d.drug_id INTO @after_price, @after_stock, @after_address, @after_drug_id
+FROM Drug d
+JOIN Sells s ON s.drug_id = d.drug_id
+JOIN Pharmacy p ON s.ph_id = p.ph_id
+JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+WHERE d.trade_name LIKE 'Test%' AND p.is_active AND pc.is_active
+ORDER BY s.price ASC, s.stock DESC, p.address, d.drug_id
+LIMIT 4, 1;
+CALL drug_availability_page('Test', 0, NULL, FALSE, 5, 5, @after_price, @after_stock, @after_address, @after_drug_id);
+
+-- Test 9.10: Wildcards in the prefix are matched literally (should return no rows)
+SELECT 'Test 9.10: Wildcards in the prefix are matched literally (should return no rows)' AS '';
+CALL drug_availability('%%%', 0);
+
+-- Test 9.11: A trade name prefix shorter than 3 characters (should fail)
+SELECT 'Test 9.11: A trade name prefix shorter than 3 characters (should fail)' AS '';
+CALL drug_availability('Te', 0);
+
+-- Test 9.12: Inventory dashboards from the summary tables
+SELECT 'Test 9.12: Inventory dashboards from the summary tables' AS '';
+CALL print_pharmacy_inventory();
+CALL print_company_inventory();
+
+-- Test 9.13: Summary tables match the base tables after the tests above (should return no rows)
+SELECT 'Test 9.13: Summary tables match the base tables after the tests above (should return no rows)' AS '';
+SELECT p.address, pi.drug_count, COUNT(s.drug_id) AS actual_count, pi.stock_value,
+       IFNULL(SUM(s.stock * s.price), 0) AS actual_value
+FROM Pharmacy p
+LEFT JOIN PharmacyInventory pi ON pi.ph_id = p.ph_id
+LEFT JOIN Sells s ON s.ph_id = p.ph_id
+GROUP BY p.ph_id, p.address, pi.drug_count, pi.stock_value
+HAVING pi.drug_count IS NULL OR pi.drug_count != actual_count OR pi.stock_value != actual_value;
+SELECT pc.company_name, ci.drug_count
+FROM PharmaceuticalCompany pc
+LEFT JOIN CompanyInventory ci ON ci.company_id = pc.company_id
+WHERE ci.company_id IS NULL
+OR ci.drug_count != (SELECT COUNT(*) FROM Drug d WHERE d.company_id = pc.company_id);
+SELECT d.company_id, s.ph_id, COUNT(*) AS actual_listings, SUM(s.stock) AS actual_stock,
+       cpi.pharmacy_listings, cpi.total_stock
+FROM Sells s
+JOIN Drug d ON s.drug_id = d.drug_id
+LEFT JOIN CompanyPharmacyInventory cpi ON cpi.company_id = d.company_id AND cpi.ph_id = s.ph_id
+GROUP BY d.company_id, s.ph_id, cpi.pharmacy_listings, cpi.total_stock
+HAVING cpi.total_stock IS NULL OR cpi.pharmacy_listings != actual_listings OR cpi.total_stock != actual_stock;
+
+-- Test 9.14: Prescription history matches the base tables (should return no rows)
+SELECT 'Test 9.14: Prescription history matches the base tables (should return no rows)' AS '';
+SELECT pr.pres_id, cd.drug_id
+FROM Prescription pr
+JOIN Patient pt ON pr.pid = pt.paadharid
+JOIN Doctor d ON pr.did = d.daadharid
+JOIN Contains_drug cd ON pr.pres_id = cd.pres_id
+JOIN Drug dr ON cd.drug_id = dr.drug_id
+JOIN PharmaceuticalCompany pc ON dr.company_id = pc.company_id
+LEFT JOIN PrescriptionHistory h ON h.pres_id = cd.pres_id AND h.drug_id = cd.drug_id
+WHERE h.pres_id IS NULL
+OR h.pid != pr.pid OR h.pres_date != pr.pres_date OR h.quantity != cd.quantity
+OR h.patient_name != pt.p_name OR h.doctor_name != d.d_name OR h.trade_name != dr.trade_name
+OR h.company_name != pc.company_name;
+
+-- Test 9.15: Rebuild the prescription history in small batches
+SELECT 'Test 9.15: Rebuild the prescription history in small batches' AS '';
+CALL rebuild_prescription_history(2);
+CALL prescription_report('PAT007', DATE_SUB(CURDATE(), INTERVAL 30 DAY), CURDATE());
+
+-- Test 9.16: Renaming a company keeps its drugs and contracts, which refer to it by id
+SELECT 'Test 9.16: Renaming a company keeps its drugs and contracts, which refer to it by id' AS '';
+CALL add_company('Rename Test Co', '1231231234');
+CALL add_drug('RenameTestDrug', 'C8H9NO2', 'Rename Test Co');
+CALL add_contract('Rename Test Co', '123 Main St, City', 'Rename test contract', CURDATE(), DATE_ADD(CURDATE(), INTERVAL 1 YEAR), 'Test Supervisor');
+CALL update_company('Rename Test Co', 'Renamed Test Co', '1231231234');
+CALL drug_details('Renamed Test Co');
+
+-- Test 9.17: The compatibility views show the new name (should return one row each)
+SELECT 'Test 9.17: The compatibility views show the new name (should return one row each)' AS '';
+SELECT trade_name, company_name FROM DrugView WHERE company_name = 'Renamed Test Co';
+SELECT company_name, ph_address, supervisor FROM ContractView WHERE company_name = 'Renamed Test Co';
+SELECT ph_address, drug_id, stock, price FROM SellsView WHERE ph_address = '123 Main St, City' LIMIT 1;
+CALL delete_company('Renamed Test Co');
+
+-- Test 9.18: Purge a company in small batches
+SELECT 'Test 9.18: Purge a company in small batches' AS '';
+CALL add_company('Purge Test Co', '3213213214');
+CALL add_drug('PurgeTestDrug', 'C9H8O4', 'Purge Test Co');
+CALL add_contract('Purge Test Co', '123 Main St, City', 'Purge test contract', CURDATE(), DATE_ADD(CURDATE(), INTERVAL 1 YEAR), 'Test Supervisor');
+SELECT drug_id INTO @purge_drug FROM Drug WHERE trade_name = 'PurgeTestDrug';
+CALL add_sells_entry('123 Main St, City', @purge_drug, 10, 2.50);
+CALL purge_company('Purge Test Co');
+SELECT MAX(job_id) INTO @purge_job FROM PurgeJob;
+
+-- Test 9.19: A company being purged is hidden and cannot be used (should fail)
+SELECT 'Test 9.19: A company being purged is hidden and cannot be used (should fail)' AS '';
+CALL drug_details('Purge Test Co');
+CALL add_drug('PurgeTestDrug2', 'C9H8O4', 'Purge Test Co');
+CALL purge_company('Purge Test Co');
+-- Its drugs leave the stock position and cannot be stocked or prescribed
+CALL print_stock_position('123 Main St, City');
+CALL add_sells_entry('456 Oak Ave, Town', @purge_drug, 10, 2.50);
+CALL add_drug_to_pharmacy('456 Oak Ave, Town', @purge_drug, 10, 2.50);
+SELECT pid, did INTO @purge_patient, @purge_doctor FROM Treats LIMIT 1;
+CALL add_prescription(@purge_patient, @purge_doctor, CURDATE(), @purge_drug, 1);
+SELECT pid, did, pres_date INTO @purge_pres_pid, @purge_pres_did, @purge_pres_date FROM Prescription LIMIT 1;
+CALL update_prescription(@purge_pres_pid, @purge_pres_did, @purge_pres_date,
+                         @purge_pres_pid, @purge_pres_did, @purge_pres_date, @purge_drug, 1);
+
+-- Test 9.20: Each step deletes at most one batch; the last call reports the job done
+SELECT 'Test 9.20: Each step deletes at most one batch; the last call reports the job done' AS '';
+CALL purge_step(@purge_job, 1);
+CALL purge_step(@purge_job, 1);
+CALL purge_step(@purge_job, 1);
+CALL purge_step(@purge_job, 1000);
+SELECT COUNT(*) AS remaining FROM PharmaceuticalCompany WHERE company_name = 'Purge Test Co';
+CALL print_purge_jobs();
+
+-- Test 9.21: Purge a pharmacy and a doctor with no patients
+SELECT 'Test 9.21: Purge a pharmacy and a doctor with no patients' AS '';
+CALL add_pharmacy('Purge Test Pharmacy', '999 Purge St, City', '9998887777');
+CALL add_drug_to_pharmacy('999 Purge St, City', 1, 10, 1.99);
+CALL purge_pharmacy('999 Purge St, City');
+CALL add_drug_to_pharmacy('999 Purge St, City', 2, 10, 1.99);
+SELECT MAX(job_id) INTO @purge_job FROM PurgeJob;
+CALL purge_step(@purge_job, 1000);
+CALL add_doctor('DOC301', 'Dr. Purge Test', 'Dermatology', 3);
+CALL purge_doctor('DOC301');
+CALL add_patient('PAT301', 'Purge Test Patient', 30, '301 Test St', 'DOC301', NULL);
+SELECT MAX(job_id) INTO @purge_job FROM PurgeJob;
+CALL purge_step(@purge_job, 1000);
+
+-- Test 9.22: A doctor who is still a primary physician cannot be purged (should fail)
+SELECT 'Test 9.22: A doctor who is still a primary physician cannot be purged (should fail)' AS '';
+CALL purge_doctor('DOC201');
+
+-- Test 9.23: Archive an old prescription; the reports still show it
+SELECT 'Test 9.23: Archive an old prescription; the reports still show it' AS '';
+CALL add_patient('PAT401', 'Archive Test Patient', 60, '401 Test St', 'DOC102', NULL);
+CALL add_prescription('PAT401', 'DOC102', DATE_SUB(CURDATE(), INTERVAL 2 YEAR), 1, 5);
+CALL archive_prescriptions(DATE_SUB(CURDATE(), INTERVAL 1 YEAR), 1000);
+SELECT COUNT(*) AS hot_rows FROM Prescription WHERE pid = 'PAT401';
+SELECT COUNT(*) AS archived_rows FROM PrescriptionArchive WHERE pid = 'PAT401';
+CALL prescription_report('PAT401', DATE_SUB(CURDATE(), INTERVAL 3 YEAR), CURDATE());
+CALL print_pres_details('PAT401', DATE_SUB(CURDATE(), INTERVAL 2 YEAR));
+
+-- Test 9.24: Nothing left to archive (should return 0 prescriptions)
+SELECT 'Test 9.24: Nothing left to archive (should return 0 prescriptions)' AS '';
+CALL archive_prescriptions(DATE_SUB(CURDATE(), INTERVAL 1 YEAR), 1000);
+
+-- Test 9.25: A range inside one year reads one archive partition
+SELECT 'Test 9.25: A range inside one year reads one archive partition' AS '';
+EXPLAIN SELECT * FROM PrescriptionArchive
+WHERE pid = 'PAT401' AND pres_date BETWEEN DATE_SUB(CURDATE(), INTERVAL 2 YEAR) AND DATE_SUB(CURDATE(), INTERVAL 2 YEAR);
+
+-- Test 9.26: Archive cutoff in the future (should fail)
+SELECT 'Test 9.26: Archive cutoff in the future (should fail)' AS '';
+CALL archive_prescriptions(DATE_ADD(CURDATE(), INTERVAL 1 DAY), 1000);
+
+-- Test 9.27: A newer prescription replaces the archived one (should return 0 archived rows)
+SELECT 'Test 9.27: A newer prescription replaces the archived one (should return 0 archived rows)' AS '';
+CALL add_prescription('PAT401', 'DOC102', DATE_SUB(CURDATE(), INTERVAL 1 DAY), 1, 5);
+SELECT COUNT(*) AS archived_rows FROM PrescriptionArchive WHERE pid = 'PAT401';
+CALL prescription_report('PAT401', DATE_SUB(CURDATE(), INTERVAL 3 YEAR), CURDATE());
+
+-- Test 9.28: Deleting the patient removes the archived rows (should return 0)
+SELECT 'Test 9.28: Deleting the patient removes the archived rows (should return 0)' AS '';
+CALL delete_patient('PAT401');
+SELECT COUNT(*) AS archived_rows FROM PrescriptionArchive WHERE pid = 'PAT401';
+
+-- Test 9.29: Dispense a prescription; every drug is taken off the pharmacy's stock
+SELECT 'Test 9.29: Dispense a prescription; every drug is taken off the pharmacy''s stock' AS '';
+CALL add_pharmacy('Dispense Test Pharmacy', '501 Dispense St, City', '5015015015');
+CALL add_drug_to_pharmacy('501 Dispense St, City', 1, 100, 9.99);
+CALL add_patient('PAT501', 'Dispense Test Patient', 33, '501 Test St', 'DOC102', NULL);
+CALL add_prescription('PAT501', 'DOC102', DATE_SUB(CURDATE(), INTERVAL 1 DAY), 1, 30);
+CALL dispense_prescription('PAT501', 'DOC102', DATE_SUB(CURDATE(), INTERVAL 1 DAY), '501 Dispense St, City');
+
+-- Test 9.30: Dispense the same prescription again (should fail and leave the stock at 70)
+SELECT 'Test 9.30: Dispense the same prescription again (should fail and leave the stock at 70)' AS '';
+CALL dispense_prescription('PAT501', 'DOC102', DATE_SUB(CURDATE(), INTERVAL 1 DAY), '501 Dispense St, City');
+SELECT s.stock FROM Sells s JOIN Pharmacy p ON p.ph_id = s.ph_id
+WHERE p.address = '501 Dispense St, City' AND s.drug_id = 1;
+
+-- Test 9.31: Dispense more than is in stock (should fail and leave the stock at 70)
+SELECT 'Test 9.31: Dispense more than is in stock (should fail and leave the stock at 70)' AS '';
+CALL add_prescription('PAT501', 'DOC102', CURDATE(), 1, 80);
+CALL dispense_prescription('PAT501', 'DOC102', CURDATE(), '501 Dispense St, City');
+SELECT s.stock FROM Sells s JOIN Pharmacy p ON p.ph_id = s.ph_id
+WHERE p.address = '501 Dispense St, City' AND s.drug_id = 1;
+
+-- Test 9.32: Dispense at a pharmacy that does not exist (should fail)
+SELECT 'Test 9.32: Dispense at a pharmacy that does not exist (should fail)' AS '';
+CALL dispense_prescription('PAT501', 'DOC102', CURDATE(), '999 Nowhere St, City');
+CALL delete_patient('PAT501');
+CALL delete_pharmacy('501 Dispense St, City');
+
+-- Test 9.33: Writes to the replicated tables are logged for the branch replicas
+SELECT 'Test 9.33: Writes to the replicated tables are logged' AS '';
+SET @log_start = (SELECT IFNULL(MAX(change_id), 0) FROM ChangeLog);
+CALL add_company('Replica Pharma', '5550001111');
+CALL add_pharmacy('Replica Pharmacy', '601 Replica St, City', '5550002222');
+CALL add_drug('Replicol', 'C1H1', 'Replica Pharma');
+SET @replica_drug = (SELECT d.drug_id FROM Drug d JOIN PharmaceuticalCompany pc ON pc.company_id = d.company_id
+                     WHERE d.trade_name = 'Replicol' AND pc.company_name = 'Replica Pharma');
+CALL add_sells_entry('601 Replica St, City', @replica_drug, 10, 2.50);
+CALL add_contract('Replica Pharma', '601 Replica St, City', 'Replica contract', CURDATE(),
+                  DATE_ADD(CURDATE(), INTERVAL 1 YEAR), 'Replica Supervisor');
+-- Should show one insert each for PharmaceuticalCompany, Pharmacy, Drug, Sells and Contract,
+-- the last two with the pharmacy's ph_id
+SELECT table_name, row_id, ph_id FROM ChangeLog WHERE change_id > @log_start ORDER BY change_id;
+
+-- Test 9.34: Updates and deletes are logged too
+SELECT 'Test 9.34: Updates and deletes are logged' AS '';
+SET @log_start = (SELECT MAX(change_id) FROM ChangeLog);
+CALL update_sells_entry('601 Replica St, City', @replica_drug, 7, 2.50);
+CALL delete_contract('Replica Pharma', '601 Replica St, City');
+-- Should show Sells then Contract
+SELECT table_name, row_id, ph_id FROM ChangeLog WHERE change_id > @log_start ORDER BY change_id;
+CALL delete_pharmacy('601 Replica St, City');
+CALL delete_company('Replica Pharma');
+
+-- Test 9.35: Prune with a negative number of days (should fail)
+SELECT 'Test 9.35: Prune the change log with a negative number of days (should fail)' AS '';
+CALL prune_change_log(-1, 1000);
+
 -- Clean up final test data
 DROP PROCEDURE IF EXISTS cleanup_test_data;
 DELIMITER $$
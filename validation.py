@@ -0,0 +1,137 @@
+from backend import coerce
+from key_index import FIELD_ENTITIES, NEW_KEY_FIELDS
+
+# Checks a form's values before its procedure is called, so typos, bad dates
+# and out-of-range numbers are reported without a round-trip and a rollback.
+# The procedures still check everything themselves and have the final say.
+
+# Largest value of an INT column
+INT_MAX = 2 ** 31 - 1
+# Largest value of a DECIMAL(10,2) column
+PRICE_MAX = 10 ** 8
+
+# Form field -> (label, kind, VARCHAR length)
+FIELDS = {
+    "p_id": ("Patient ID", "str", 12),
+    "old_p_id": ("Old Patient ID", "str", 12),
+    "new_p_id": ("New Patient ID", "str", 12),
+    "d_patient_id": ("Patient ID to Add", "str", 12),
+    "p_name": ("Name", "str", 100),
+    "p_age": ("Age", "int", None),
+    "p_address": ("Address", "str", 100),
+    "p_primary_physician_id": ("Primary Physician ID", "str", 12),
+    "p_additional_doctor_id": ("Additional Doctor ID", "str", 12),
+    "d_id": ("Doctor ID", "str", 12),
+    "old_d_id": ("Old Doctor ID", "str", 12),
+    "new_d_id": ("New Doctor ID", "str", 12),
+    "d_name": ("Name", "str", 100),
+    "d_speciality": ("Speciality", "str", 100),
+    "d_years_exp": ("Years of Experience", "int", None),
+    "ph_name": ("Pharmacy Name", "str", 100),
+    "ph_address": ("Pharmacy Address", "str", 200),
+    "ph_phone": ("Phone", "str", 15),
+    "company_name": ("Company Name", "str", 100),
+    "new_company_name": ("New Company Name", "str", 100),
+    "company_phone": ("Phone Number", "str", 15),
+    "trade_name": ("Trade Name", "str", 100),
+    "formula": ("Formula", "str", 200),
+    "drug_id": ("Drug ID", "int", None),
+    "new_drug_id": ("New Drug ID", "int", None),
+    "quantity": ("Quantity", "int", None),
+    "new_quantity": ("New Quantity", "int", None),
+    "stock": ("Stock", "int", None),
+    "price": ("Price", "decimal", None),
+    "pres_date": ("Prescription Date", "date", None),
+    "old_pres_date": ("Old Prescription Date", "date", None),
+    "new_pres_date": ("New Prescription Date", "date", None),
+    "start_date": ("Start Date", "date", None),
+    "end_date": ("End Date", "date", None),
+    "supervisor": ("Supervisor", "str", 100),
+    "content": ("Content", "str", None),
+}
+
+# Smallest allowed values, from the tables' CHECK constraints
+MINIMUMS = {
+    "p_age": 0,
+    "d_years_exp": 0,
+    "stock": 0,
+    "quantity": 1,
+    "new_quantity": 1,
+}
+
+# Fields that must be greater than 0; the procedures refuse a price of 0
+# although the column's CHECK allows it
+POSITIVE = {"price"}
+
+# Number and date fields that may be left empty on a form; empty text is
+# left for the procedure to judge
+OPTIONAL = {
+    # The drug list editor holds the prescription's drugs
+    ("Prescription", "Add"): {"drug_id", "quantity"},
+}
+
+# Pairs of date fields where the first may not come after the second
+DATE_RANGES = [("start_date", "end_date")]
+
+
+def check_value(field, value):
+    # The value as its procedure parameter, or ValueError with a message
+    label, kind, length = FIELDS[field]
+    value = coerce(value, kind, label)
+    if length is not None and len(value) > length:
+        raise ValueError(f"{label} can be at most {length} characters long")
+    if kind == "int" and abs(value) > INT_MAX:
+        raise ValueError(f"{label} is too large")
+    if kind == "decimal" and abs(value) >= PRICE_MAX:
+        raise ValueError(f"{label} is too large")
+    if field in MINIMUMS and value < MINIMUMS[field]:
+        if MINIMUMS[field] == 0:
+            raise ValueError(f"{label} cannot be negative")
+        raise ValueError(f"{label} must be at least {MINIMUMS[field]}")
+    if field in POSITIVE and value <= 0:
+        raise ValueError(f"{label} must be greater than 0")
+    return value
+
+
+def check_form(table, operation, values, key_index=None):
+    # Returns (errors, warnings) for a form's values. Errors are certain to
+    # fail the call. Warnings are keys that the loaded key_index.KeyIndex
+    # says are unknown (or, for a new row, already taken); the index may lag
+    # other clients' writes, so the user may still submit.
+    errors = []
+    warnings = []
+    optional = OPTIONAL.get((table, operation), set())
+    checked = {}
+
+    for field, value in values.items():
+        if field not in FIELDS:
+            continue
+        if value == "":
+            if FIELDS[field][1] != "str" and field not in optional:
+                errors.append(f"{FIELDS[field][0]} is required")
+            continue
+        try:
+            checked[field] = check_value(field, value)
+        except ValueError as err:
+            errors.append(str(err))
+
+    for first, second in DATE_RANGES:
+        if first in checked and second in checked and checked[first] > checked[second]:
+            errors.append(f"{FIELDS[first][0]} cannot be after {FIELDS[second][0]}")
+
+    if key_index is not None:
+        new_key = NEW_KEY_FIELDS.get((table, operation))
+        for field, value in checked.items():
+            entity = FIELD_ENTITIES.get(field)
+            if entity is None:
+                continue
+            known = key_index.contains(entity, value)
+            if known is None:
+                continue
+            if field == new_key and known:
+                warnings.append(f"{FIELDS[field][0]} {value} already exists")
+            elif field != new_key and not known:
+                warnings.append(f"{FIELDS[field][0]} {value} is not a known {entity.lower()}")
+
+    return errors, warnings
+